@@ -10,19 +10,41 @@ import asyncio
 from datetime import datetime, tzinfo
 import json
 import pathlib
-from typing import List, Dict, Any
+import time
+from typing import List, Dict, Any, Tuple, TYPE_CHECKING
 
 from API.APIServer import APIServer
+from API.ClientConnection import ConnectionStatistics, SlowClientPolicy
+from API.DeltaEncoder import DeltaEncoder, DeltaMessage
+from API.FrameEncoder import Frame, FrameEncoder
+from API.MessageDispatcher import DispatchStatistics, MessageDispatcher
+from API.StreamFilter import StreamFilter
+from FrameAnalyzer.DetectionBatch import DetectionBatch
 from Positioner.DetectedObjectPosition import DetectedObjectPosition
+from Positioner.TrackStore import TrackStore
 import argparse
 import socket
 
+if TYPE_CHECKING:  # pragma: no cover
+    # The rollup store is an analytics module, which imports the controller itself
+    from Positioner.Analytics.RollupStore import RollupStore
+
 
 class APIController:
     """Controller object for the API"""
     server: APIServer = None
+    dispatcher: MessageDispatcher = None
+    """Sends the messages of the pipeline threads on the loop of the server"""
+    deltaParameters: tuple = (30, 5.0, 0.05)
+    """The (keyframeFrames, keyframeSeconds, epsilon) of the delta streams"""
+    DELTA_TIMEOUT = 60.0
+    """The number of seconds after which the state of an unused delta stream is forgotten"""
+    trackStore: TrackStore = None
+    rollupStore: 'RollupStore' = None
 
-    def __init__(self, loop, encryption=False):
+    def __init__(self, loop, encryption=False, highWaterMark: int = 4 << 20,
+                 slowClientPolicy: SlowClientPolicy = SlowClientPolicy.Drop, keyframeFrames: int = 30,
+                 keyframeSeconds: float = 5.0, deltaEpsilon: float = 0.05):
         """
         Constructor for the APIController.
 
@@ -32,12 +54,23 @@ class APIController:
             The loop used to create futures
         encryption : bool
             Check if the encryption is used
+        highWaterMark : int
+            The maximum number of bytes waiting to be sent to a client
+        slowClientPolicy : SlowClientPolicy
+            What happens when the backlog of a client is above the high-water mark
+        keyframeFrames, keyframeSeconds, deltaEpsilon : int, float, float
+            The keyframe interval and the quantization step of the delta streams, see DeltaEncoder
         """
         if not encryption:
             print("WARNING: API Encryption disabled!")
         if loop is None:
             raise TypeError("No loop given, need a loop to create futures.")
-        self.server = APIServer(loop, pathlib.Path(__file__) if encryption else None)
+        self.server = APIServer(loop, pathlib.Path(__file__) if encryption else None, highWaterMark,
+                                slowClientPolicy)
+        self.server.commandHandlers['connections'] = self._OnConnectionsCommand
+        self.dispatcher = MessageDispatcher(loop, self.server, self._EncodeStream)
+        self.deltaParameters = (keyframeFrames, keyframeSeconds, deltaEpsilon)
+        self._deltaEncoders = {}
 
     @staticmethod
     def AddApiArguments(parser: argparse.ArgumentParser):  # pragma: no cover
@@ -58,6 +91,18 @@ class APIController:
                             default="8080",
                             help="port of the API server")
         parser.add_argument("-ne", "--noEncryption", action="store_true", default=False)
+        parser.add_argument("-aqb", "--apiQueueBytes", type=int, default=4 << 20,
+                            help="The maximum number of bytes waiting to be sent to a client of the API.")
+        parser.add_argument("-asp", "--apiSlowClientPolicy", type=str, default=SlowClientPolicy.Drop.value,
+                            help="What happens when more bytes are waiting for a client: " +
+                                 ", ".join(policy.value for policy in SlowClientPolicy) + ".")
+        parser.add_argument("-akf", "--apiKeyframeFrames", type=int, default=30,
+                            help="The maximum number of frames between keyframes of a delta stream.")
+        parser.add_argument("-aks", "--apiKeyframeSeconds", type=float, default=5.0,
+                            help="The maximum number of seconds between keyframes of a delta stream.")
+        parser.add_argument("-ade", "--apiDeltaEpsilon", type=float, default=0.05,
+                            help="The distance in meters an object moves before it is in a delta, and the "
+                                 "quantization step of its position.")
 
     @staticmethod
     def ValidateApiArguments(arguments: Dict[str, Any]):
@@ -89,6 +134,15 @@ class APIController:
         if connectionFailed:
             raise RuntimeError(f"Port {port} already in use. Please choose a different port")
         testSock.close()
+        if not isinstance(arguments["apiQueueBytes"], int) or arguments["apiQueueBytes"] < 1:
+            raise ValueError("API queue bytes must be a positive number.")
+        if arguments["apiSlowClientPolicy"] not in [policy.value for policy in SlowClientPolicy]:
+            raise ValueError("API slow client policy must be one of " +
+                             ", ".join(policy.value for policy in SlowClientPolicy) + ".")
+        if not isinstance(arguments["apiKeyframeFrames"], int) or arguments["apiKeyframeFrames"] < 1:
+            raise ValueError("API keyframe frames must be a positive number.")
+        if arguments["apiKeyframeSeconds"] <= 0 or arguments["apiDeltaEpsilon"] <= 0:
+            raise ValueError("API keyframe seconds and delta epsilon must be positive.")
 
     async def Start(self, port=8080, interface=""):
         """
@@ -115,17 +169,121 @@ class APIController:
         return self.server.UntilConnected()
 
     def Stop(self):
-        """Stop the API server"""
+        """Stop the API server, the messages that are not sent yet are dropped"""
+        self.dispatcher.Close()
         self.server.Stop()
 
-    def Send(self, detectedObjects: List[DetectedObjectPosition], frameIndex: int, frameTimeStamp: datetime = None):
+    async def Flush(self):
+        """Wait until the messages that were sent are written to the clients"""
+        await self.dispatcher.Flush()
+        await self.server.Flush()
+
+    def GetStatistics(self) -> DispatchStatistics:
+        """
+        Get the counters and the enqueue to wire latency of the sent messages
+
+        Returns
+        -------
+        DispatchStatistics
+            The statistics of the dispatcher
+        """
+        return self.dispatcher.GetStatistics()
+
+    def GetConnectionStatistics(self) -> List[ConnectionStatistics]:
+        """
+        Get the counters and the lag of the send queue of every client, also answered to the command
+        {"type": "connections"}
+
+        Returns
+        -------
+        [ConnectionStatistics]
+            The statistics of the connected clients
+        """
+        return self.server.GetConnectionStatistics()
+
+    def _OnConnectionsCommand(self, command: dict) -> Dict[str, Any]:
+        """
+        Responds with the statistics of the send queues of the clients.
+        """
+        return {"type": "connections",
+                "connections": [statistics._asdict() for statistics in self.GetConnectionStatistics()]}
+
+    def SetTrackStore(self, trackStore: TrackStore):
+        """
+        Lets the clients query the tracks of the store, with the commands
+        {"type": "tracks"} and {"type": "track", "id": id, "seconds": seconds}, where seconds is optional.
+
+        Parameters
+        ----------
+        trackStore : TrackStore
+            The store that is queried
+        """
+        self.trackStore = trackStore
+        self.server.commandHandlers['tracks'] = self._OnTracksCommand
+        self.server.commandHandlers['track'] = self._OnTrackCommand
+
+    def _OnTracksCommand(self, command: dict) -> Dict[str, Any]:
+        """
+        Responds with the ids of all tracks and the state of the track store.
+        """
+        return {
+            "type": "tracks",
+            "ids": self.trackStore.GetTrackIds(),
+            "statistics": self.trackStore.GetStatistics()._asdict()
+        }
+
+    def _OnTrackCommand(self, command: dict) -> Dict[str, Any]:
+        """
+        Responds with the state and the samples of a track, the track is None if it is unknown.
+        """
+        objectId = command.get('id')
+        seconds = command.get('seconds')
+        if not isinstance(objectId, int) or (seconds is not None and not isinstance(seconds, (int, float))):
+            return {"type": "track", "id": objectId, "track": None}
+        return {"type": "track", "id": objectId, "track": self.trackStore.ToDictionary(objectId, seconds)}
+
+    def SetRollupStore(self, rollupStore: 'RollupStore'):
+        """
+        Lets the clients query the occupancy history of the rollup store, with the command
+        {"type": "history", "series": [names], "start": start, "end": end, "maxPoints": maxPoints,
+        "aggregate": aggregate}, where the series (the total by default), maxPoints and aggregate are optional.
+
+        Parameters
+        ----------
+        rollupStore : RollupStore
+            The store that is queried
+        """
+        self.rollupStore = rollupStore
+        self.server.commandHandlers['history'] = self._OnHistoryCommand
+
+    def _OnHistoryCommand(self, command: dict) -> Dict[str, Any]:
+        """
+        Responds with the buckets or the aggregate of the series in the range, the history is None if the command
+        is invalid.
+        """
+        series = command.get('series', ['total'])
+        (start, end) = (command.get('start'), command.get('end'))
+        maxPoints = command.get('maxPoints', 500)
+        if not isinstance(series, list) or not all(isinstance(name, str) for name in series) or \
+                not isinstance(start, (int, float)) or not isinstance(end, (int, float)) or \
+                not isinstance(maxPoints, int) or maxPoints < 1:
+            return {"type": "history", "history": None}
+        if command.get('aggregate', False):
+            return {"type": "history", "history": self.rollupStore.Aggregate(series, start, end)}
+        return {"type": "history", "history": self.rollupStore.GetSeries(series, start, end, maxPoints)}
+
+    def Send(self, detectedObjects: DetectionBatch or List[DetectedObjectPosition], frameIndex: int,
+             frameTimeStamp: datetime = None):
         """
-        Send DetectedObjectPosition[] data to all the clients connected to the API
+        Send DetectionBatch or DetectedObjectPosition[] data to all the clients connected to the API, in the format
+        and with the filter each client chose (see FrameEncoder, StreamFilter and DeltaEncoder). Can be called from
+        any thread, the data is serialized and sent on the loop of the server later, see MessageDispatcher.
+        The batch or list must not be changed afterwards.
 
         Parameters
         ----------
-        detectedObjects : List[DetectedObjectPosition]
-            The DetectedObjectPosition[] data to be broadcast
+        detectedObjects : DetectionBatch or List[DetectedObjectPosition]
+            The data to be broadcast
         frameIndex : int
             The index of the frame belonging to the DetectedObjectPosition[] data
         frameTimeStamp : datetime
@@ -133,13 +291,72 @@ class APIController:
         """
         if detectedObjects is None:
             return
-        data = {
-            "frameIndex": frameIndex,
-            "frameTimeStamp":
-                frameTimeStamp.astimezone().isoformat() if frameTimeStamp is not None
-                else '0001-01-01T00:00:00',
+        self.dispatcher.EnqueueFrame(Frame(detectedObjects, frameIndex, frameTimeStamp))
+
+    def AddChannel(self, channel: str):
+        """
+        Adds a channel the clients can subscribe to with {"type": "subscribe", "channel": channel}.
+
+        Parameters
+        ----------
+        channel : str
+            The name of the channel
+        """
+        self.server.AddChannel(channel)
+
+    def SendChannel(self, channel: str, data: Dict[str, Any]):
+        """
+        Send data to the clients that subscribed to a channel, from any thread like Send.
+
+        Parameters
+        ----------
+        channel : str
+            The channel, see AddChannel
+        data : Dict[str, Any]
+            The data to be sent, it must be serializable to JSON
+        """
+        self.dispatcher.Enqueue(lambda: {
+            "channel": channel,
             "sentTimeStamp": datetime.now().astimezone().isoformat(),
-            "detectedObjects": [{key: value for key, value in detectedObject._asdict().items() if value is not None}
-                                for detectedObject in detectedObjects]
-        }
-        self.server.BroadcastData(json.dumps(data))
+            "data": data
+        }, channel)
+
+    def _EncodeStream(self, frames: List[Frame], stream: Tuple[str, int, StreamFilter, bool],
+                      keyframe: bool) -> str or bytes or DeltaMessage:
+        """
+        Encodes consecutive frames as a single message of a stream, the objects that don't pass its filter are
+        left out. A stream that does not accept several frames in a message (see FrameEncoder.Coalesces) only
+        receives the latest frame. Runs on the serializer thread of the dispatcher.
+
+        Parameters
+        ----------
+        frames : [Frame]
+            The frames
+        stream : (str, int, StreamFilter, bool)
+            The format, the version of the format, the filter and whether the stream is delta encoded
+        keyframe : bool
+            Whether a delta stream must start with a keyframe
+
+        Returns
+        -------
+        str|bytes|DeltaMessage
+            The message
+        """
+        (encoding, version, streamFilter, delta) = stream
+        # A client that did not opt in to several frames in a message receives the latest frame
+        if not FrameEncoder.Coalesces(encoding, version):
+            frames = frames[-1:]
+        frames = [streamFilter.Apply(frame) for frame in frames]
+        if not delta:
+            return FrameEncoder.Encode(frames, encoding)
+
+        now = time.monotonic()
+        if stream not in self._deltaEncoders:
+            # The encoders of streams that were not used for a while are forgotten, they restart with a keyframe
+            self._deltaEncoders = {key: value for key, value in self._deltaEncoders.items()
+                                   if now - value[1] < self.DELTA_TIMEOUT}
+            self._deltaEncoders[stream] = (DeltaEncoder(*self.deltaParameters), now)
+        encoder = self._deltaEncoders[stream][0]
+        self._deltaEncoders[stream] = (encoder, now)
+        frames = [encoder.Encode(frame, keyframe and i == 0, now) for i, frame in enumerate(frames)]
+        return DeltaMessage(FrameEncoder.Encode(frames, encoding), frames[0].keyframe)
@@ -10,18 +10,49 @@ import asyncio
 import json
 import pathlib
 import ssl
-from typing import Optional
+import traceback
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 
 import websockets
 from websockets.exceptions import ConnectionClosedOK, ConnectionClosedError
 
+from API.ClientConnection import ClientConnection, ConnectionStatistics, SlowClientPolicy
+from API.FrameEncoder import FrameEncoder
+from API.StreamFilter import StreamFilter
+
 
 class APIServer:
-    """A WebSocket server that can broadcast data to all connected clients"""
+    """
+    A WebSocket server that can broadcast data to all connected clients, every client has its own send queue so a
+    slow client doesn't hold up the others
+    """
     clients: set = set()
+    connections: Dict[Any, ClientConnection] = None
+    """The send queue of every connected client"""
+    highWaterMark: int = 4 << 20
+    """The maximum number of bytes waiting to be sent to a client"""
+    slowClientPolicy: SlowClientPolicy = SlowClientPolicy.Drop
+    """What happens when the backlog of a client is above the high-water mark"""
+    onWritten: Callable[[float], None] = None
+    """Called with the number of seconds from queueing a message until it was written, for every written message"""
     sslContext: ssl.SSLContext = None
+    commandHandlers: Dict[str, Callable[[dict], Any]] = None
+    """Handlers of the client commands by type, the result of a handler is sent back to the client"""
+    subscriptions: Dict[str, set] = None
+    """The clients that subscribed to each channel"""
+    clientFormats: Dict[Any, Tuple[str, int]] = None
+    """The format and version of the position stream of the clients that chose one, the others receive the default"""
+    clientFilters: Dict[Any, StreamFilter] = None
+    """The filter of the position stream of the clients that chose one, the others receive every object"""
+    deltaClients: set = None
+    """The clients that receive the position stream as keyframes and deltas, see DeltaEncoder"""
+    syncedClients: set = None
+    """The delta clients that received a keyframe and the deltas after it, the others wait for a keyframe"""
+    keyframeRequests: set = None
+    """The delta streams that need a keyframe, because a client joined them or lost track"""
 
-    def __init__(self, loop, serverCertificateFolder: Optional[pathlib.Path]):
+    def __init__(self, loop, serverCertificateFolder: Optional[pathlib.Path], highWaterMark: int = 4 << 20,
+                 slowClientPolicy: SlowClientPolicy = SlowClientPolicy.Drop):
         """
         Initializes the server, but doesn't start it yet (See `Start` for that)
 
@@ -33,12 +64,28 @@ class APIServer:
             Optional path to the folder containing a file named 'server.pem'
             The 'server.pem' is the certificate this server should use for TLS connections.
             When `None`, the server uses the raw WebSocket protocol without encryption
+        highWaterMark : int
+            The maximum number of bytes waiting to be sent to a client, see ClientConnection
+        slowClientPolicy : SlowClientPolicy
+            What happens when the backlog of a client is above the high-water mark
         """
         if serverCertificateFolder:     # pragma: no cover
             self.sslContext = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
             self.sslContext.load_cert_chain(serverCertificateFolder.with_name('server.pem'))
             self.sslContext.verify_mode = ssl.CERT_REQUIRED
             self.sslContext.load_verify_locations(cafile=serverCertificateFolder.with_name('ca.crt'))
+        self.clients = set()
+        self.connections = {}
+        self.highWaterMark = highWaterMark
+        self.slowClientPolicy = slowClientPolicy
+        self._loop = loop
+        self.commandHandlers = {}
+        self.subscriptions = {}
+        self.clientFormats = {}
+        self.clientFilters = {}
+        self.deltaClients = set()
+        self.syncedClients = set()
+        self.keyframeRequests = set()
         self.connectFuture = loop.create_future()
         self.doneFuture = loop.create_future()
 
@@ -69,7 +116,9 @@ class APIServer:
         return self.connectFuture
 
     def Stop(self):
-        """Stop the API server."""
+        """Stop the API server, the messages that are not sent yet are dropped."""
+        for connection in self.connections.values():
+            connection.Close()
         self.doneFuture.set_result(None)
 
     async def _ClientHandler(self, websocket: websockets.WebSocketServerProtocol):  # pragma: no cover
@@ -91,18 +140,23 @@ class APIServer:
         print(f'Connection by {identifier}')
 
         try:
-            self.clients.add(websocket)
+            self.AddClient(websocket, str(identifier))
             isOpen = True
             while isOpen:
                 message = await websocket.recv()
-                isOpen = await self._OnClientCommand(websocket, json.loads(message))
+                try:
+                    command = json.loads(message)
+                except ValueError:
+                    # Messages that are not JSON are ignored, like commands without type
+                    command = None
+                isOpen = await self._OnClientCommand(websocket, command)
             print(f'Connection from {identifier} closed by exit command')
         except ConnectionClosedOK:
             print(f'Connection from {identifier} closed')
         except ConnectionClosedError as e:
             print(f'Connection from {identifier} closed incorrectly: {e}')
         finally:
-            self.clients.remove(websocket)  # Removes the client from the set if it was already added
+            self.RemoveClient(websocket)
 
     async def _OnClientCommand(self, websocket: websockets.WebSocketServerProtocol, command):  # pragma: no cover
         """
@@ -115,14 +169,301 @@ class APIServer:
         command : str|dict
             The command that was sent by the client
         """
-        if command is not dict or 'type' not in command:
+        if not isinstance(command, dict) or not isinstance(command.get('type'), str):
             return True
 
         if command['type'] == 'exit':
             return False
+
+        response = self.HandleClientCommand(websocket, command)
+        if response is not None:
+            await websocket.send(json.dumps(response))
         return True
 
-    def BroadcastData(self, data):
+    def HandleClientCommand(self, websocket, command: dict) -> Any:
+        """
+        Runs a command of a client, the commands of the server itself or the handler of the command.
+        A command that fails is answered with {"type": type, "success": false, "error": message}, so a command
+        with wrong values does not close the connection.
+
+        Parameters
+        ----------
+        websocket : websockets.WebSocketServerProtocol
+            The websocket the client is connected to
+        command : dict
+            The command that was sent by the client, with its type
+
+        Returns
+        -------
+        Any
+            The response for the client, or None if there is nothing to respond
+        """
+        try:
+            if command['type'] == 'subscribe':
+                return {"type": "subscribed", "channel": command.get('channel'),
+                        "success": self.Subscribe(websocket, command.get('channel'))}
+            if command['type'] == 'unsubscribe':
+                self.Unsubscribe(websocket, command.get('channel'))
+                return {"type": "unsubscribed", "channel": command.get('channel')}
+            if command['type'] == 'format':
+                (encoding, version, delta) = (command.get('format'), command.get('version', 1),
+                                              command.get('delta', False))
+                return {"type": "format", "format": encoding, "version": version, "delta": delta,
+                        "success": self.SetFormat(websocket, encoding, version, delta is True)}
+            if command['type'] == 'filter':
+                return {"type": "filter", "success": self.SetFilter(websocket, command)}
+            return self.HandleCommand(command)
+        except Exception as error:
+            traceback.print_exc()
+            return {"type": command['type'], "success": False, "error": str(error)}
+
+    def AddClient(self, websocket, identifier: str) -> ClientConnection:
+        """
+        Adds a connected client and starts writing its send queue.
+
+        Parameters
+        ----------
+        websocket : websockets.WebSocketServerProtocol
+            The websocket the client is connected to
+        identifier : str
+            The address or name of the client
+
+        Returns
+        -------
+        ClientConnection
+            The send queue of the client
+        """
+        connection = ClientConnection(websocket, identifier, self.highWaterMark, self.slowClientPolicy,
+                                      self.onWritten)
+        self.connections[websocket] = connection
+        self.clients.add(websocket)
+        self._loop.create_task(connection.Run())
+        return connection
+
+    def RemoveClient(self, websocket):
+        """
+        Removes a client whose connection is closed, with its send queue, subscriptions, format and filter.
+
+        Parameters
+        ----------
+        websocket : websockets.WebSocketServerProtocol
+            The websocket the client was connected to
+        """
+        self.clients.discard(websocket)
+        connection = self.connections.pop(websocket, None)
+        if connection is not None:
+            connection.Close()
+        self.Unsubscribe(websocket)
+        self.clientFormats.pop(websocket, None)
+        self.clientFilters.pop(websocket, None)
+        self.deltaClients.discard(websocket)
+        self.syncedClients.discard(websocket)
+
+    async def Flush(self):
+        """
+        Waits until the send queues of all clients are written.
+        """
+        while not all(connection.IsIdle() for connection in self.connections.values()):
+            await asyncio.sleep(0.001)
+
+    def GetConnectionStatistics(self) -> List[ConnectionStatistics]:
+        """
+        Returns
+        -------
+        [ConnectionStatistics]
+            The counters and the lag of the send queue of every client
+        """
+        return [connection.GetStatistics() for connection in self.connections.values()]
+
+    def HandleCommand(self, command: dict) -> Any:
+        """
+        Runs the handler of a client command.
+
+        Parameters
+        ----------
+        command : dict
+            The command that was sent by the client, with its type
+
+        Returns
+        -------
+        Any
+            The response for the client, or None if there is no handler or nothing to respond
+        """
+        handler = self.commandHandlers.get(command.get('type'))
+        if handler is None:
+            return None
+        return handler(command)
+
+    def Subscribe(self, websocket, channel: str) -> bool:
+        """
+        Lets a client receive the messages of a channel.
+
+        Parameters
+        ----------
+        websocket : websockets.WebSocketServerProtocol
+            The websocket the client is connected to
+        channel : str
+            The channel, it must have been registered with AddChannel
+
+        Returns
+        -------
+        bool
+            Whether the channel exists
+        """
+        if channel not in self.subscriptions:
+            return False
+        self.subscriptions[channel].add(websocket)
+        return True
+
+    def Unsubscribe(self, websocket, channel: str = None):
+        """
+        Stops sending the messages of a channel to a client.
+
+        Parameters
+        ----------
+        websocket : websockets.WebSocketServerProtocol
+            The websocket the client is connected to
+        channel : str|None
+            The channel, or None for all channels
+        """
+        for name, subscribers in self.subscriptions.items():
+            if channel is None or name == channel:
+                subscribers.discard(websocket)
+
+    def AddChannel(self, channel: str):
+        """
+        Adds a channel the clients can subscribe to, next to the position stream that every client receives.
+
+        Parameters
+        ----------
+        channel : str
+            The name of the channel
+        """
+        self.subscriptions.setdefault(channel, set())
+
+    def SetFormat(self, websocket, encoding: str, version: int = 1, delta: bool = False) -> bool:
+        """
+        Chooses the format of the position stream of a client, with {"type": "format", "format": format,
+        "version": version, "delta": delta}, where delta is optional. The responses to commands and the channels
+        stay JSON. A delta client receives keyframes and deltas (see DeltaEncoder), starting with a keyframe.
+        Only the clients of a version that accepts several frames in a message (see FrameEncoder.Coalesces) receive
+        the frames that waited together in one message, the others receive the latest of them.
+
+        Parameters
+        ----------
+        websocket : websockets.WebSocketServerProtocol
+            The websocket the client is connected to
+        encoding : str
+            The format, see FrameEncoder.FORMATS
+        version : int
+            The version of the format the client understands
+        delta : bool
+            Whether the client receives keyframes and deltas
+
+        Returns
+        -------
+        bool
+            Whether the format and version are supported, otherwise the format of the client is not changed
+        """
+        if not isinstance(encoding, str) or not isinstance(version, int) or \
+                version not in FrameEncoder.FORMATS.get(encoding, ()):
+            return False
+        if (encoding, version) == (FrameEncoder.DEFAULT_FORMAT, FrameEncoder.DEFAULT_VERSION):
+            self.clientFormats.pop(websocket, None)
+        else:
+            self.clientFormats[websocket] = (encoding, version)
+        if delta:
+            self.deltaClients.add(websocket)
+        else:
+            self.deltaClients.discard(websocket)
+        self._Resync(websocket)
+        return True
+
+    def SetFilter(self, websocket, command: dict) -> bool:
+        """
+        Chooses the objects and the rate of the position stream of a client, see StreamFilter.FromCommand.
+        A command without fields removes the filter.
+
+        Parameters
+        ----------
+        websocket : websockets.WebSocketServerProtocol
+            The websocket the client is connected to
+        command : dict
+            The filter command
+
+        Returns
+        -------
+        bool
+            Whether the filter is valid, otherwise the filter of the client is not changed
+        """
+        try:
+            streamFilter = StreamFilter.FromCommand(command)
+        except ValueError:
+            return False
+        if streamFilter == StreamFilter():
+            self.clientFilters.pop(websocket, None)
+        else:
+            self.clientFilters[websocket] = streamFilter
+        self._Resync(websocket)
+        return True
+
+    def GetStream(self, websocket) -> Tuple[str, int, StreamFilter, bool]:
+        """
+        Returns
+        -------
+        (str, int, StreamFilter, bool)
+            The format, the version of the format, the filter and whether the position stream of a client is delta
+            encoded
+        """
+        (encoding, version) = self.clientFormats.get(websocket,
+                                                     (FrameEncoder.DEFAULT_FORMAT, FrameEncoder.DEFAULT_VERSION))
+        return encoding, version, self.clientFilters.get(websocket, StreamFilter()), websocket in self.deltaClients
+
+    def GetStreams(self) -> Set[Tuple[str, int, StreamFilter, bool]]:
+        """
+        Returns
+        -------
+        {(str, int, StreamFilter, bool)}
+            The distinct streams of the position stream the connected clients use, see GetStream
+        """
+        return {self.GetStream(client) for client in self.clients}
+
+    def TakeKeyframeRequests(self) -> Set[Tuple[str, int, StreamFilter, bool]]:
+        """
+        Returns
+        -------
+        {(str, int, StreamFilter, bool)}
+            The streams that need a keyframe, the requests are cleared
+        """
+        requests = self.keyframeRequests & self.GetStreams()
+        self.keyframeRequests = set()
+        return requests
+
+    def _Resync(self, websocket):
+        """
+        Stops sending deltas to a client until it received a keyframe, which is requested.
+        """
+        self.syncedClients.discard(websocket)
+        if websocket in self.deltaClients:
+            self.keyframeRequests.add(self.GetStream(websocket))
+
+    def BroadcastChannel(self, channel: str, data, enqueueTime: float = None):
+        """
+        Broadcast data to the clients that subscribed to a channel, an unsent message of the channel is replaced.
+
+        Parameters
+        ----------
+        channel : str
+            The channel
+        data : Any
+            The data to be broadcast to the subscribers
+        enqueueTime : float|None
+            The time at which the data was queued, see ClientConnection.Send
+        """
+        for client in self.subscriptions.get(channel, ()):
+            self._Send(client, ('channel', channel), data, enqueueTime)
+
+    def BroadcastData(self, data, enqueueTime: float = None):
         """
         Broadcast data to all the currently connected clients.
 
@@ -130,5 +471,47 @@ class APIServer:
         ----------
         data : Any
             The data to be broadcast to the clients
+        enqueueTime : float|None
+            The time at which the data was queued, see ClientConnection.Send
+        """
+        state = object()
+        for client in self.clients:
+            self._Send(client, state, data, enqueueTime)
+
+    def BroadcastFrames(self, messages: Dict[Tuple[str, int, StreamFilter, bool], Any], enqueueTime: float = None):
+        """
+        Broadcast frames of the position stream to all the currently connected clients, in their own format and
+        with their own filter. An unsent message of the position stream is replaced.
+        A delta client only receives a delta when it received everything since its last keyframe, otherwise it
+        waits for the keyframe that is requested for its stream.
+
+        Parameters
+        ----------
+        messages : Dict[(str, int, StreamFilter, bool), Any]
+            The encoded frames of the streams the clients use (see GetStreams), a DeltaMessage for a delta stream.
+            The clients of a stream without message receive nothing
+        enqueueTime : float|None
+            The time at which the oldest of the frames was queued, see ClientConnection.Send
+        """
+        for client in self.clients:
+            stream = self.GetStream(client)
+            message = messages.get(stream)
+            connection = self.connections.get(client)
+            if message is None or connection is None:
+                continue
+            if not stream[3]:
+                connection.Send('frames', message, enqueueTime)
+            elif message.keyframe and connection.Send('frames', message.message, enqueueTime):
+                self.syncedClients.add(client)
+            elif message.keyframe or client not in self.syncedClients or connection.IsQueued('frames') or \
+                    not connection.Send('frames', message.message, enqueueTime):
+                # Replacing or dropping a delta would leave the client with wrong positions
+                self._Resync(client)
+
+    def _Send(self, websocket, state: Any, message, enqueueTime: float = None):
+        """
+        Queues a message in the send queue of a client, see ClientConnection.Send.
         """
-        websockets.broadcast(self.clients, data)
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            connection.Send(state, message, enqueueTime)
@@ -0,0 +1,219 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+"""
+The send queue of a single client of the API server.
+"""
+
+import asyncio
+import collections
+import time
+from enum import Enum
+from typing import Any, Callable, NamedTuple
+
+from websockets.exceptions import ConnectionClosed
+
+
+class SlowClientPolicy(Enum):
+    """What happens when a message is sent to a client whose backlog is above the high-water mark"""
+    Drop = 'drop'
+    """The message is dropped, the client receives the next message that fits"""
+    Disconnect = 'disconnect'
+    """The connection is closed, the client can reconnect"""
+
+
+class ConnectionStatistics(NamedTuple):
+    """The state of the send queue of a ClientConnection"""
+    identifier: str
+    """The address or name of the client"""
+    sent: int
+    """The number of messages written to the connection"""
+    conflated: int
+    """The number of messages replaced by a newer message of the same state before they were sent"""
+    dropped: int
+    """The number of messages dropped because the backlog was above the high-water mark or the connection closed"""
+    queued: int
+    """The number of messages waiting in the queue"""
+    backlogBytes: int
+    """The number of bytes waiting in the queue and the write buffer of the connection"""
+    lag: float
+    """The number of seconds the oldest waiting message has waited"""
+    maxLag: float
+    """The largest number of seconds from queueing a message until it was written"""
+
+
+class ClientConnection:
+    """
+    A bounded send queue of a client, which a writer task writes to the connection at the speed of the client.
+    Every message belongs to a state, like the position stream or a channel, and a new message replaces the unsent
+    message of the same state (latest state conflation), so a slow client skips states instead of falling behind.
+    When the backlog of a client is above the high-water mark, a message of a new state is handled by the policy.
+    The queue must only be used on the loop of the connection.
+    """
+    websocket: Any = None
+    """The websocket the client is connected to"""
+    identifier: str = None
+    highWaterMark: int = 4 << 20
+    """The maximum number of bytes waiting in the queue and the write buffer"""
+    policy: SlowClientPolicy = SlowClientPolicy.Drop
+    onWritten: Callable[[float], None] = None
+    """Called with the number of seconds from queueing a message until it was written, for every written message"""
+    CLOSE_CODE = 1013
+    """The close code of a slow client (try again later)"""
+
+    def __init__(self, websocket, identifier: str, highWaterMark: int = 4 << 20,
+                 policy: SlowClientPolicy = SlowClientPolicy.Drop, onWritten: Callable[[float], None] = None):
+        """
+        Constructor of the connection, the writer task is started with Run.
+
+        Parameters
+        ----------
+        websocket : websockets.WebSocketServerProtocol
+            The websocket the client is connected to
+        identifier : str
+            The address or name of the client
+        highWaterMark : int
+            The maximum number of bytes waiting in the queue and the write buffer
+        policy : SlowClientPolicy
+            What happens when the backlog is above the high-water mark
+        onWritten : Callable[[float], None]|None
+            Called with the number of seconds from queueing a message until it was written
+        """
+        if highWaterMark < 1:
+            raise ValueError("The high-water mark must be positive.")
+
+        self.websocket = websocket
+        self.identifier = identifier
+        self.highWaterMark = highWaterMark
+        self.policy = policy
+        self.onWritten = onWritten
+
+        self._queue = collections.OrderedDict()
+        self._queuedBytes = 0
+        self._ready = asyncio.Event()
+        self._sending = False
+        self._closed = False
+
+        self._sent = 0
+        self._conflated = 0
+        self._dropped = 0
+        self._maxLag = 0.0
+
+    def Send(self, state: Any, message: str or bytes, enqueueTime: float = None) -> bool:
+        """
+        Queues a message for the writer task.
+
+        Parameters
+        ----------
+        state : Any
+            The state the message belongs to, an unsent message of the same state is replaced
+        message : str|bytes
+            The message
+        enqueueTime : float|None
+            The time.perf_counter() at which the message was first queued, like in the MessageDispatcher, now by
+            default. The lag and the written latency are measured from it
+
+        Returns
+        -------
+        bool
+            Whether the message was queued
+        """
+        if self._closed:
+            self._dropped += 1
+            return False
+
+        if state in self._queue:
+            # The newer state replaces the older state, it keeps the place and the age of the older message
+            (oldMessage, enqueueTime) = self._queue[state]
+            self._queue[state] = (message, enqueueTime)
+            self._queuedBytes += len(message) - len(oldMessage)
+            self._conflated += 1
+            return True
+
+        if self.GetBacklog() + len(message) > self.highWaterMark:
+            self._dropped += 1
+            if self.policy == SlowClientPolicy.Disconnect:
+                self.Close()
+                asyncio.ensure_future(self.websocket.close(self.CLOSE_CODE, "Client too slow"))
+            return False
+
+        self._queue[state] = (message, time.perf_counter() if enqueueTime is None else enqueueTime)
+        self._queuedBytes += len(message)
+        self._ready.set()
+        return True
+
+    async def Run(self):
+        """
+        Writes the queued messages to the connection until it is closed.
+        """
+        try:
+            while not self._closed:
+                await self._ready.wait()
+                if not self._queue:
+                    self._ready.clear()
+                    continue
+                (_, (message, enqueueTime)) = self._queue.popitem(last=False)
+                self._queuedBytes -= len(message)
+                self._sending = True
+                try:
+                    await self.websocket.send(message)
+                finally:
+                    self._sending = False
+                self._sent += 1
+                latency = time.perf_counter() - enqueueTime
+                self._maxLag = max(self._maxLag, latency)
+                if self.onWritten is not None:
+                    self.onWritten(latency)
+        except ConnectionClosed:
+            self.Close()
+
+    def Close(self):
+        """
+        Stops the writer task, the messages that are not sent yet are dropped.
+        """
+        self._closed = True
+        self._dropped += len(self._queue)
+        self._queue.clear()
+        self._queuedBytes = 0
+        self._ready.set()
+
+    def IsQueued(self, state: Any) -> bool:
+        """
+        Returns
+        -------
+        bool
+            Whether an unsent message of a state is waiting in the queue
+        """
+        return state in self._queue
+
+    def IsIdle(self) -> bool:
+        """
+        Returns
+        -------
+        bool
+            Whether all queued messages are written
+        """
+        return not self._queue and not self._sending
+
+    def GetBacklog(self) -> int:
+        """
+        Returns
+        -------
+        int
+            The number of bytes waiting in the queue and the write buffer of the connection
+        """
+        transport = getattr(self.websocket, 'transport', None)
+        return self._queuedBytes + (transport.get_write_buffer_size() if transport is not None else 0)
+
+    def GetStatistics(self) -> ConnectionStatistics:
+        """
+        Returns
+        -------
+        ConnectionStatistics
+            The counters and the lag of the connection
+        """
+        now = time.perf_counter()
+        lag = max((now - enqueueTime for (_, enqueueTime) in self._queue.values()), default=0.0)
+        return ConnectionStatistics(self.identifier, self._sent, self._conflated, self._dropped, len(self._queue),
+                                    self.GetBacklog(), lag, self._maxLag)
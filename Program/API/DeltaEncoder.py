@@ -0,0 +1,137 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+"""
+Delta encoding of the position stream, only the objects that changed are sent between keyframes.
+"""
+
+import math
+import time
+from typing import Any, NamedTuple
+
+import numpy as np
+
+from API.FrameEncoder import Frame, FrameEncoder
+from FrameAnalyzer.DetectionBatch import DetectionBatch
+from Positioner.GeoDistance import GeoDistance
+
+
+class DeltaMessage(NamedTuple):
+    """An encoded message of a delta stream"""
+    message: Any
+    """The encoded frames"""
+    keyframe: bool
+    """Whether the first frame is a keyframe, a client that is not in sync can start with the message"""
+
+
+class DeltaEncoder:
+    """
+    Turns the frames of a stream into keyframes, which hold all objects, and deltas, which hold the objects that
+    appeared or moved more than epsilon meters and the ids of the objects that disappeared.
+    The positions are quantized to steps of epsilon meters, so a client that applies the deltas to the last
+    keyframe has the same positions as the server. Objects without id can't be followed and are in every delta.
+    A keyframe is made every keyframeFrames frames or keyframeSeconds seconds, or when it is requested because a
+    client joined the stream or lost track of it.
+    """
+    keyframeFrames: int = 30
+    """The maximum number of frames between keyframes"""
+    keyframeSeconds: float = 5.0
+    """The maximum number of seconds between keyframes"""
+    epsilon: float = 0.05
+    """The quantization step of the positions in meters"""
+    METERS_PER_DEGREE = math.radians(1) * GeoDistance.MEAN_RADIUS
+    """The meters per degree of latitude"""
+
+    def __init__(self, keyframeFrames: int = 30, keyframeSeconds: float = 5.0, epsilon: float = 0.05):
+        """
+        Constructor of the encoder of a stream.
+
+        Parameters
+        ----------
+        keyframeFrames : int
+            The maximum number of frames between keyframes
+        keyframeSeconds : float
+            The maximum number of seconds between keyframes
+        epsilon : float
+            The quantization step of the positions in meters
+        """
+        if keyframeFrames < 1 or keyframeSeconds <= 0 or epsilon <= 0:
+            raise ValueError("The keyframe interval and epsilon must be positive.")
+
+        self.keyframeFrames = keyframeFrames
+        self.keyframeSeconds = keyframeSeconds
+        self.epsilon = epsilon
+
+        self._steps = None
+        self._ids = np.empty(0, dtype=np.int64)
+        self._positions = np.empty((0, 3))
+        self._types = np.empty(0, dtype=object)
+        self._framesSinceKeyframe = 0
+        self._keyframeTime = -math.inf
+
+    def Encode(self, frame: Frame, keyframe: bool = False, now: float = None) -> Frame:
+        """
+        Encodes the next frame of the stream.
+
+        Parameters
+        ----------
+        frame : Frame
+            The frame with all objects
+        keyframe : bool
+            Whether a keyframe must be made
+        now : float
+            The time in seconds, time.monotonic() when None
+
+        Returns
+        -------
+        Frame
+            The keyframe or delta, with the quantized positions
+        """
+        now = time.monotonic() if now is None else now
+        batch = frame.detectedObjects
+        if not isinstance(batch, DetectionBatch):
+            batch = FrameEncoder.ToBatch(batch)
+        # The first frame is always a keyframe, as its time is infinitely far from the previous keyframe
+        keyframe = keyframe or self._framesSinceKeyframe + 1 >= self.keyframeFrames or \
+            now - self._keyframeTime >= self.keyframeSeconds
+        if self._steps is None:
+            # The longitude step is fixed at the first keyframe, a stream covers a small area
+            latitude = np.nanmean(batch.latitude) if np.isfinite(batch.latitude).any() else 0.0
+            self._steps = self.epsilon / np.array([self.METERS_PER_DEGREE,
+                                                   self.METERS_PER_DEGREE * math.cos(math.radians(latitude)), 1.0])
+
+        # The positions in steps, missing values stay NaN
+        steps = np.column_stack((batch.latitude, batch.longitude, batch.altitude)) / self._steps
+        quantized = np.round(steps)
+        types = np.array(batch.types + (None,), dtype=object)[batch.typeCode]
+        tracked = batch.id != DetectionBatch.NO_ID
+
+        # The last sent position and type of every object, for the objects the client knows
+        index = np.minimum(np.searchsorted(self._ids, batch.id), max(len(self._ids) - 1, 0))
+        known = tracked & (self._ids[index] == batch.id) if len(self._ids) > 0 else np.zeros(len(batch), bool)
+        previous = np.where(known[:, np.newaxis], self._positions[index] if len(self._ids) > 0 else np.nan, np.nan)
+
+        if keyframe:
+            send = np.ones(len(batch), dtype=bool)
+            removed = np.empty(0, dtype=np.int64)
+        else:
+            moved = (np.abs(steps - previous) >= 1) | (np.isnan(steps) != np.isnan(previous))
+            changedType = types != (self._types[index] if len(self._ids) > 0 else types)
+            send = ~known | moved.any(axis=1) | changedType
+            removed = self._ids[~np.isin(self._ids, batch.id[tracked])]
+
+        # The state of the client holds the last sent position of every tracked object
+        order = np.argsort(batch.id[tracked], kind='stable')
+        positions = np.where(send[:, np.newaxis], quantized, previous)
+        (self._ids, self._positions, self._types) = \
+            (batch.id[tracked][order], positions[tracked][order], types[tracked][order])
+        self._framesSinceKeyframe = 0 if keyframe else self._framesSinceKeyframe + 1
+        if keyframe:
+            self._keyframeTime = now
+
+        snapped = quantized[send] * self._steps
+        sent = batch.Select(send)
+        sent = sent.WithPositions(snapped[:, 0], snapped[:, 1], snapped[:, 2], sent.locationRadius,
+                                  sent.rijksdriehoekX, sent.rijksdriehoekY)
+        return frame._replace(detectedObjects=sent, keyframe=keyframe, removed=removed.tolist())
@@ -0,0 +1,294 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+"""
+Encodings of the frames of the position stream, the clients choose one with a format command.
+"""
+
+import json
+import struct
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from FrameAnalyzer.DetectionBatch import DetectionBatch
+from Positioner.DetectedObjectPosition import DetectedObjectPosition
+
+
+class Frame(NamedTuple):
+    """A frame of the position stream that is waiting to be encoded"""
+    detectedObjects: DetectionBatch or List[DetectedObjectPosition]
+    """The positions of the frame"""
+    frameIndex: int
+    """The index of the frame"""
+    frameTimeStamp: datetime or None
+    """The time at which the frame was received, including the current timezone"""
+    keyframe: Optional[bool] = None
+    """Whether the frame of a delta stream holds all objects, None when the frame is not part of a delta stream"""
+    removed: Sequence[int] = ()
+    """The ids of the objects of the previous frame of a delta stream that are gone"""
+
+
+class FrameEncoder:
+    """
+    Encodes frames as JSON, the default, or as binary.
+
+    A binary frame is a header, a string table and a packed record per object, all little-endian:
+    the header (see HEADER) holds the magic, the version, flags, the number of types, zones and records, the frame
+    index and the frame and sent times in nanoseconds since the epoch (0 when unknown). It is followed by the types
+    and the zone identifiers, each a byte with the length and the UTF-8 bytes, and the records (see RECORD_TYPE).
+    Missing values are NaN and objects without id have id -1, the zones of an object are a bit mask of the zone
+    table. A frame of a delta stream (see DeltaEncoder) has FLAG_DELTA, and FLAG_KEYFRAME when it is a keyframe,
+    and ends with the number of removed ids (uint32) and the ids (int64). Several frames are sent as consecutive
+    binary frames in one message.
+    A JSON message holds a single frame, version 2 clients also accept several frames as {"frames": [...]}.
+    """
+    FORMATS = {'json': (1, 2), 'binary': (1,)}
+    """The supported formats and their versions"""
+    DEFAULT_FORMAT = 'json'
+    DEFAULT_VERSION = 1
+    BINARY_VERSION = 1
+    MAGIC = b'CGPF'
+    HEADER = struct.Struct('<4sBBBBIqqq')
+    FLAG_ZONES = 1
+    """Flag of the header that is set when the zones of the objects are known"""
+    FLAG_DELTA = 2
+    """Flag of the header that is set when the frame is part of a delta stream"""
+    FLAG_KEYFRAME = 4
+    """Flag of the header that is set when a frame of a delta stream holds all objects"""
+    REMOVED = struct.Struct('<I')
+    RECORD_TYPE = np.dtype([('id', '<i8'), ('type', 'u1'), ('latitude', '<f8'), ('longitude', '<f8'),
+                            ('altitude', '<f4'), ('locationRadius', '<f4'), ('rijksdriehoekX', '<f8'),
+                            ('rijksdriehoekY', '<f8'), ('zones', '<u8')])
+    MAX_STRINGS = 255
+    MAX_ZONES = 64
+    MAX_STRING_BYTES = 255
+    """The maximum length of a type or zone identifier in UTF-8 bytes, longer strings are truncated"""
+
+    @staticmethod
+    def Coalesces(encoding: str, version: int) -> bool:
+        """
+        Whether the clients of a format and version accept several frames in a single message.
+
+        Parameters
+        ----------
+        encoding : str
+            One of the FORMATS
+        version : int
+            The version of the format
+
+        Returns
+        -------
+        bool
+            True for binary and JSON version 2, JSON version 1 clients only accept a single frame
+        """
+        return encoding == 'binary' or (encoding == 'json' and version >= 2)
+
+    @staticmethod
+    def Encode(frames: List[Frame], encoding: str) -> str or bytes:
+        """
+        Encodes the frames as a single message, only clients for which Coalesces is true accept several frames.
+
+        Parameters
+        ----------
+        frames : [Frame]
+            The frames
+        encoding : str
+            One of the FORMATS
+
+        Returns
+        -------
+        str|bytes
+            The JSON text of a frame or of {"frames": [frame, ...]} for several frames, or the binary frames
+        """
+        if encoding == 'binary':
+            return b''.join(FrameEncoder.EncodeBinary(frame) for frame in frames)
+        if encoding != 'json':
+            raise ValueError(f"Unknown format {encoding}.")
+        if len(frames) == 1:
+            return json.dumps(FrameEncoder.ToDictionary(frames[0]))
+        return json.dumps({"frames": [FrameEncoder.ToDictionary(frame) for frame in frames]})
+
+    @staticmethod
+    def ToDictionary(frame: Frame) -> Dict[str, Any]:
+        """
+        The JSON message of a frame, a frame of a delta stream also has "keyframe" and the "removed" ids.
+
+        Parameters
+        ----------
+        frame : Frame
+            The frame
+
+        Returns
+        -------
+        Dict[str, Any]
+            The message
+        """
+        message = {
+            "frameIndex": frame.frameIndex,
+            "frameTimeStamp":
+                frame.frameTimeStamp.astimezone().isoformat() if frame.frameTimeStamp is not None
+                else '0001-01-01T00:00:00',
+            "sentTimeStamp": datetime.now().astimezone().isoformat(),
+            "detectedObjects": FrameEncoder.ToDictionaries(frame.detectedObjects)
+        }
+        if frame.keyframe is not None:
+            message["keyframe"] = frame.keyframe
+            message["removed"] = [int(objectId) for objectId in frame.removed]
+        return message
+
+    @staticmethod
+    def ToDictionaries(detectedObjects: DetectionBatch or List[DetectedObjectPosition]) -> List[Dict[str, Any]]:
+        """
+        Converts the detected objects to dictionaries without the fields that have no value.
+
+        Parameters
+        ----------
+        detectedObjects : DetectionBatch or List[DetectedObjectPosition]
+            The detected objects, as a batch or as a list
+
+        Returns
+        -------
+        List[Dict[str, Any]]
+            A dictionary for every detected object
+        """
+        if isinstance(detectedObjects, DetectionBatch):
+            return detectedObjects.ToDictionaries()
+        return [{key: value for key, value in detectedObject._asdict().items() if value is not None}
+                for detectedObject in detectedObjects]
+
+    @staticmethod
+    def EncodeBinary(frame: Frame) -> bytes:
+        """
+        Packs a frame in the binary format, the records are filled from the columns of the batch at once.
+
+        Parameters
+        ----------
+        frame : Frame
+            The frame
+
+        Returns
+        -------
+        bytes
+            The binary frame
+        """
+        batch = frame.detectedObjects
+        if not isinstance(batch, DetectionBatch):
+            batch = FrameEncoder.ToBatch(batch)
+        if len(batch.types) > FrameEncoder.MAX_STRINGS or len(batch.zoneIds) > FrameEncoder.MAX_ZONES:
+            raise ValueError("Too many types or zones for the binary format.")
+
+        records = np.empty(len(batch), dtype=FrameEncoder.RECORD_TYPE)
+        records['id'] = batch.id
+        records['type'] = batch.typeCode
+        for field in ('latitude', 'longitude', 'altitude', 'locationRadius', 'rijksdriehoekX', 'rijksdriehoekY'):
+            records[field] = getattr(batch, field)
+        bits = np.left_shift(np.uint64(1), np.arange(len(batch.zoneIds), dtype=np.uint64))
+        records['zones'] = (batch.zoneMembership.astype(np.uint64) * bits).sum(axis=1, dtype=np.uint64)
+
+        flags = FrameEncoder.FLAG_ZONES if batch.zoneIds else 0
+        removed = b''
+        if frame.keyframe is not None:
+            flags |= FrameEncoder.FLAG_DELTA | (FrameEncoder.FLAG_KEYFRAME if frame.keyframe else 0)
+            removed = FrameEncoder.REMOVED.pack(len(frame.removed)) + \
+                np.asarray(frame.removed, dtype='<i8').reshape(-1).tobytes()
+
+        frameTime = 0 if frame.frameTimeStamp is None else FrameEncoder.ToNanoseconds(frame.frameTimeStamp)
+        header = FrameEncoder.HEADER.pack(
+            FrameEncoder.MAGIC, FrameEncoder.BINARY_VERSION, flags, len(batch.types), len(batch.zoneIds),
+            len(batch), frame.frameIndex, frameTime, FrameEncoder.ToNanoseconds(datetime.now())
+        )
+        strings = b''.join(bytes((len(encoded),)) + encoded for encoded in
+                           (FrameEncoder.EncodeString(string) for string in batch.types + batch.zoneIds))
+        return header + strings + records.tobytes() + removed
+
+    @staticmethod
+    def EncodeString(string: Any) -> bytes:
+        """
+        The UTF-8 bytes of a string of the string table, truncated to MAX_STRING_BYTES on a character boundary.
+
+        Parameters
+        ----------
+        string : Any
+            The string, other values are converted to a string
+
+        Returns
+        -------
+        bytes
+            The encoded string
+        """
+        encoded = str(string).encode('utf-8')
+        if len(encoded) <= FrameEncoder.MAX_STRING_BYTES:
+            return encoded
+        # The bytes of a character that is cut off are left out
+        return encoded[:FrameEncoder.MAX_STRING_BYTES].decode('utf-8', 'ignore').encode('utf-8')
+
+    @staticmethod
+    def ToBatch(detectedObjects: List[DetectedObjectPosition]) -> DetectionBatch:
+        """
+        Converts a list of positions to a batch, including the zones of the positions.
+        """
+        batch = DetectionBatch.FromDetectedObjectPositions(detectedObjects)
+        zones = [position.zones or () for position in detectedObjects]
+        zoneIds = tuple(dict.fromkeys(zoneId for objectZones in zones for zoneId in objectZones))
+        if not zoneIds:
+            return batch
+        membership = np.array([[zoneId in objectZones for zoneId in zoneIds] for objectZones in zones], dtype=bool)
+        return batch.WithZones(membership, zoneIds)
+
+    @staticmethod
+    def DecodeBinary(message: bytes) -> List[Dict[str, Any]]:
+        """
+        Unpacks the binary frames of a message, the way a client does.
+
+        Parameters
+        ----------
+        message : bytes
+            The message
+
+        Returns
+        -------
+        [Dict[str, Any]]
+            The frame index, frame and sent times in nanoseconds, types, zone identifiers and records of every frame,
+            and for a frame of a delta stream whether it is a keyframe and the removed ids
+        """
+        frames = []
+        offset = 0
+        while offset < len(message):
+            (magic, version, flags, typeCount, zoneCount, count, frameIndex, frameTime, sentTime) = \
+                FrameEncoder.HEADER.unpack_from(message, offset)
+            if magic != FrameEncoder.MAGIC or version != FrameEncoder.BINARY_VERSION:
+                raise ValueError("Not a binary frame of a known version.")
+            offset += FrameEncoder.HEADER.size
+
+            strings = []
+            for _ in range(typeCount + zoneCount):
+                length = message[offset]
+                strings.append(message[offset + 1:offset + 1 + length].decode('utf-8'))
+                offset += 1 + length
+
+            records = np.frombuffer(message, FrameEncoder.RECORD_TYPE, count, offset)
+            offset += records.nbytes
+            frame = {"frameIndex": frameIndex, "frameTime": frameTime, "sentTime": sentTime,
+                     "zonesKnown": bool(flags & FrameEncoder.FLAG_ZONES), "types": strings[:typeCount],
+                     "zoneIds": strings[typeCount:], "records": records, "keyframe": None, "removed": []}
+            if flags & FrameEncoder.FLAG_DELTA:
+                (removedCount,) = FrameEncoder.REMOVED.unpack_from(message, offset)
+                offset += FrameEncoder.REMOVED.size
+                frame["keyframe"] = bool(flags & FrameEncoder.FLAG_KEYFRAME)
+                frame["removed"] = np.frombuffer(message, '<i8', removedCount, offset).tolist()
+                offset += 8 * removedCount
+            frames.append(frame)
+        return frames
+
+    @staticmethod
+    def ToNanoseconds(timeStamp: datetime) -> int:
+        """
+        Returns
+        -------
+        int
+            The number of nanoseconds since the epoch of a time, a naive time is in the local timezone
+        """
+        return int(round(timeStamp.timestamp() * 1e6)) * 1000
@@ -0,0 +1,339 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+"""
+Hands the messages of the pipeline threads over to the event loop of the API server.
+"""
+
+import asyncio
+import collections
+import json
+import math
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, NamedTuple, Set
+
+
+class DispatchStatistics(NamedTuple):
+    """The state of a MessageDispatcher"""
+    enqueued: int
+    """The number of messages handed to the dispatcher"""
+    sent: int
+    """The number of messages broadcast, coalesced frames are a single message"""
+    coalesced: int
+    """The number of frames that were sent together with an earlier frame"""
+    dropped: int
+    """The number of messages dropped because the loop was closed or they could not be serialized"""
+    pending: int
+    """The number of messages waiting to be sent"""
+    averageLatency: float
+    """The average number of seconds from enqueueing a message until it is written to a client"""
+    maxLatency: float
+    """The largest number of seconds from enqueueing a message until it is written to a client"""
+
+
+class MessageDispatcher:
+    """
+    Any thread can enqueue messages, they are broadcast on the event loop that owns the connections.
+    A message is enqueued as a function that builds its data, the data is built and serialized to JSON on a
+    serializer thread, so neither the pipeline thread nor the loop spends time on it.
+    The frames of the position stream are enqueued as they are and encoded once for every stream, a format, a version
+    and a filter (see APIServer.GetStreams), the connected clients use, on the serializer thread as well. The clients
+    with equal streams share the message. A stream with a maximum rate skips the frames that were enqueued within
+    1 / maxRate seconds of the previous frame it received. The server can request a keyframe for a delta stream,
+    the request is passed to the encode function with the next frames of the stream.
+    While the loop is busy with the previous messages, new messages wait in the queue. Consecutive frames that
+    waited together are coalesced into a single message of at most maxFrames frames, the encode function decides
+    which of them a stream that does not accept several frames in a message receives.
+    The latency is measured for every client from enqueueing a message until the client's connection has written it,
+    so slow clients show up in it. A coalesced message is measured from its oldest frame.
+    """
+    maxFrames: int = 16
+    """The maximum number of frames that are coalesced into one message"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, server, encode: Callable[[List[Any], tuple, bool], Any],
+                 maxFrames: int = 16):
+        """
+        Constructor of the dispatcher.
+
+        Parameters
+        ----------
+        loop : asyncio.AbstractEventLoop
+            The loop of the server
+        server : APIServer
+            The server the messages are broadcast with
+        encode : Callable[[List[Any], tuple, bool], Any]
+            Encodes consecutive frames as a single message of a (format, version, filter, delta) stream, starting with a
+            keyframe when the last argument is True
+        maxFrames : int
+            The maximum number of frames that are coalesced into one message
+        """
+        if maxFrames < 1:
+            raise ValueError("At least one frame must fit in a message.")
+
+        self.maxFrames = maxFrames
+        self._loop = loop
+        self._server = server
+        self._server.onWritten = self._OnWritten
+        self._encode = encode
+        self._lastFrameTimes = {}
+        self._keyframeRequests = set()
+        self._serializer = None
+
+        self._queue = collections.deque()
+        self._lock = threading.Lock()
+        self._flushing = False
+        self._closed = False
+
+        self._enqueued = 0
+        self._sent = 0
+        self._coalesced = 0
+        self._dropped = 0
+        self._latencyCount = 0
+        self._latencyTotal = 0.0
+        self._maxLatency = 0.0
+
+    def Enqueue(self, build: Callable[[], Dict[str, Any]], channel: str = None) -> bool:
+        """
+        Queues a message and makes sure the loop flushes the queue. Can be called from any thread.
+
+        Parameters
+        ----------
+        build : Callable[[], Dict[str, Any]]
+            Builds the data of the message, it is called on the serializer thread
+        channel : str|None
+            The channel the message is sent on, None to send it to all clients
+
+        Returns
+        -------
+        bool
+            Whether the message was queued
+        """
+        return self._Enqueue((build, channel, False))
+
+    def EnqueueFrame(self, frame: Any) -> bool:
+        """
+        Queues a frame of the position stream, which is sent to all clients and can be coalesced.
+        Can be called from any thread.
+
+        Parameters
+        ----------
+        frame : Any
+            The frame, it is passed to the encode function of the dispatcher
+
+        Returns
+        -------
+        bool
+            Whether the frame was queued
+        """
+        return self._Enqueue((frame, None, True))
+
+    def _Enqueue(self, item: tuple) -> bool:
+        """
+        Queues the (data, channel, isFrame) of a message, see Enqueue.
+        """
+        with self._lock:
+            if self._closed:
+                self._dropped += 1
+                return False
+            self._queue.append(item + (time.perf_counter(),))
+            self._enqueued += 1
+            startFlush = not self._flushing
+            self._flushing = True
+
+        if startFlush:
+            try:
+                self._loop.call_soon_threadsafe(self._StartFlush)
+            except RuntimeError:
+                # The loop is closed, nothing will send the messages anymore
+                with self._lock:
+                    self._dropped += len(self._queue)
+                    self._queue.clear()
+                    self._flushing = False
+                return False
+        return True
+
+    async def Flush(self):
+        """
+        Waits until all queued messages are sent.
+        """
+        while True:
+            with self._lock:
+                if not self._flushing:
+                    return
+            await asyncio.sleep(0.001)
+
+    def GetStatistics(self) -> DispatchStatistics:
+        """
+        Returns
+        -------
+        DispatchStatistics
+            The counters and latencies of the dispatcher
+        """
+        with self._lock:
+            return DispatchStatistics(
+                self._enqueued, self._sent, self._coalesced, self._dropped, len(self._queue),
+                self._latencyTotal / self._latencyCount if self._latencyCount > 0 else 0.0, self._maxLatency
+            )
+
+    def Close(self):
+        """
+        Stops accepting messages, the messages that are already queued are still sent while the loop runs.
+        """
+        with self._lock:
+            self._closed = True
+        if self._serializer is not None:
+            self._serializer.shutdown(wait=False)
+
+    def _StartFlush(self):
+        """
+        Starts flushing the queue on the loop.
+        """
+        self._loop.create_task(self._Flush())
+
+    async def _Flush(self):
+        """
+        Sends the queued messages until the queue is empty, the messages that are queued while a group of messages
+        is serialized and sent are taken together in the next group.
+        """
+        while True:
+            with self._lock:
+                items = list(self._queue)
+                self._queue.clear()
+                if not items:
+                    self._flushing = False
+                    return
+
+            try:
+                if self._serializer is None:
+                    self._serializer = ThreadPoolExecutor(1, thread_name_prefix='APISerializer')
+                # The streams are read on the loop, which owns the connections
+                streams = self._server.GetStreams()
+                keyframeRequests = self._server.TakeKeyframeRequests()
+                messages = await self._loop.run_in_executor(self._serializer, self._Serialize, items, streams,
+                                                            keyframeRequests)
+            except Exception:
+                traceback.print_exc()
+                with self._lock:
+                    self._dropped += len(items)
+                continue
+
+            for (channel, message, enqueueTimes) in messages:
+                if isinstance(message, dict):
+                    self._server.BroadcastFrames(message, min(enqueueTimes))
+                elif channel is None:
+                    self._server.BroadcastData(message, min(enqueueTimes))
+                else:
+                    self._server.BroadcastChannel(channel, message, min(enqueueTimes))
+                with self._lock:
+                    self._sent += 1
+                    self._coalesced += len(enqueueTimes) - 1
+
+    def _OnWritten(self, latency: float):
+        """
+        Adds the latency of a message a client connection has written, runs on the loop.
+        """
+        with self._lock:
+            self._latencyCount += 1
+            self._latencyTotal += latency
+            self._maxLatency = max(self._maxLatency, latency)
+
+    def _Serialize(self, items: List[tuple], streams: Set[tuple], keyframeRequests: Set[tuple]) -> List[tuple]:
+        """
+        Builds the data of the messages and serializes them, runs on the serializer thread.
+        Consecutive frames are coalesced. A message that can't be built or serialized, or the frames of a stream that
+        can't be encoded, are dropped on their own.
+
+        Parameters
+        ----------
+        items : [tuple]
+            The (data, channel, isFrame, enqueueTime) of the messages, in the order they were queued
+        streams : {(str, int, StreamFilter, bool)}
+            The streams the frames are encoded for
+        keyframeRequests : {(str, int, StreamFilter, bool)}
+            The streams that need a keyframe, a request is kept until the stream receives a frame
+
+        Returns
+        -------
+        [tuple]
+            The (channel, message, enqueue times of the messages in it) of every message to send, the message of
+            frames is a dictionary with the encoded message of every stream that receives any of the frames
+        """
+        # Streams that are not used anymore start over when they come back
+        self._lastFrameTimes = {stream: frameTime for stream, frameTime in self._lastFrameTimes.items()
+                                if stream in streams}
+        self._keyframeRequests = (self._keyframeRequests | keyframeRequests) & streams
+        messages = []
+        frames = []
+        frameTimes = []
+
+        def SendFrames():
+            if frames:
+                streamMessages = {}
+                for stream in streams:
+                    streamFrames = self._Throttle(stream, frames, frameTimes)
+                    if not streamFrames:
+                        continue
+                    try:
+                        streamMessages[stream] = self._encode(streamFrames, stream, stream in self._keyframeRequests)
+                    except Exception:
+                        self._Drop()
+                        continue
+                    self._keyframeRequests.discard(stream)
+                messages.append((None, streamMessages, list(frameTimes)))
+            frames.clear()
+            frameTimes.clear()
+
+        for (data, channel, isFrame, enqueueTime) in items:
+            if isFrame:
+                frames.append(data)
+                frameTimes.append(enqueueTime)
+                if len(frames) == self.maxFrames:
+                    SendFrames()
+                continue
+            SendFrames()
+            try:
+                messages.append((channel, json.dumps(data()), [enqueueTime]))
+            except Exception:
+                self._Drop()
+        SendFrames()
+        return messages
+
+    def _Drop(self):
+        """
+        Prints the error of a message that could not be serialized and counts it as dropped.
+        """
+        traceback.print_exc()
+        with self._lock:
+            self._dropped += 1
+
+    def _Throttle(self, stream: tuple, frames: List[Any], frameTimes: List[float]) -> List[Any]:
+        """
+        Leaves out the frames a stream with a maximum rate skips.
+
+        Parameters
+        ----------
+        stream : (str, int, StreamFilter, bool)
+            The stream
+        frames : [Any]
+            Consecutive frames
+        frameTimes : [float]
+            The enqueue time of every frame
+
+        Returns
+        -------
+        [Any]
+            The frames the stream receives
+        """
+        maxRate = stream[2].maxRate
+        if maxRate is None:
+            return list(frames)
+        streamFrames = []
+        for frame, frameTime in zip(frames, frameTimes):
+            if frameTime - self._lastFrameTimes.get(stream, -math.inf) >= 1 / maxRate:
+                streamFrames.append(frame)
+                self._lastFrameTimes[stream] = frameTime
+        return streamFrames
@@ -0,0 +1,124 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+"""
+Filters of the position stream, the clients choose one with a filter command.
+"""
+
+from numbers import Real
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from API.FrameEncoder import Frame, FrameEncoder
+from FrameAnalyzer.DetectionBatch import DetectionBatch
+
+
+class StreamFilter(NamedTuple):
+    """
+    The objects and the rate of the position stream a client receives, the clients with equal filters (and formats)
+    share the encoded frames. The default filter passes everything.
+    """
+    bounds: Optional[Tuple[float, float, float, float]] = None
+    """The (minimum latitude, minimum longitude, maximum latitude, maximum longitude) of the objects"""
+    zone: Optional[str] = None
+    """The identifier of the zone the objects are inside"""
+    types: Optional[Tuple[str, ...]] = None
+    """The sorted types of the objects"""
+    maxRate: Optional[float] = None
+    """The maximum number of frames per second"""
+
+    @staticmethod
+    def FromCommand(command: dict) -> 'StreamFilter':
+        """
+        Reads the filter of a command {"type": "filter", "bounds": [minLatitude, minLongitude, maxLatitude,
+        maxLongitude], "zone": zone, "types": [types], "maxRate": maxRate}, where all fields are optional.
+
+        Parameters
+        ----------
+        command : dict
+            The command
+
+        Returns
+        -------
+        StreamFilter
+            The filter
+        """
+        (bounds, zone, types, maxRate) = (command.get(field) for field in StreamFilter._fields)
+        if bounds is not None:
+            if not isinstance(bounds, list) or len(bounds) != 4 or \
+                    not all(isinstance(value, Real) and not isinstance(value, bool) for value in bounds):
+                raise ValueError("The bounds must be [minLatitude, minLongitude, maxLatitude, maxLongitude].")
+            bounds = tuple(float(value) for value in bounds)
+        if zone is not None and not isinstance(zone, str):
+            raise ValueError("The zone must be an identifier.")
+        if types is not None:
+            if not isinstance(types, list) or not all(isinstance(objectType, str) for objectType in types):
+                raise ValueError("The types must be a list of names.")
+            types = tuple(sorted(set(types)))
+        if maxRate is not None:
+            if not isinstance(maxRate, Real) or isinstance(maxRate, bool) or maxRate <= 0:
+                raise ValueError("The maximum rate must be a positive number.")
+            maxRate = float(maxRate)
+        return StreamFilter(bounds, zone, types, maxRate)
+
+    def SelectsObjects(self) -> bool:
+        """
+        Returns
+        -------
+        bool
+            Whether the filter leaves out objects, otherwise only the rate can be limited
+        """
+        return self.bounds is not None or self.zone is not None or self.types is not None
+
+    def Apply(self, frame: Frame) -> Frame:
+        """
+        Leaves out the objects of a frame that don't pass the filter, the frame itself is kept when every object
+        passes.
+
+        Parameters
+        ----------
+        frame : Frame
+            The frame
+
+        Returns
+        -------
+        Frame
+            The frame with the objects that pass
+        """
+        if not self.SelectsObjects():
+            return frame
+        batch = frame.detectedObjects
+        if not isinstance(batch, DetectionBatch):
+            batch = FrameEncoder.ToBatch(batch)
+        return frame._replace(detectedObjects=batch.Select(self.GetMask(batch)))
+
+    def GetMask(self, batch: DetectionBatch) -> np.ndarray:
+        """
+        Tests the objects of a batch on their columns at once.
+
+        Parameters
+        ----------
+        batch : DetectionBatch
+            The objects
+
+        Returns
+        -------
+        np.ndarray
+            Boolean array, whether every object passes, objects without a position are outside the bounds
+        """
+        mask = np.ones(len(batch), dtype=bool)
+        if self.bounds is not None:
+            (minLatitude, minLongitude, maxLatitude, maxLongitude) = self.bounds
+            mask &= (batch.latitude >= minLatitude) & (batch.latitude <= maxLatitude) & \
+                    (batch.longitude >= minLongitude) & (batch.longitude <= maxLongitude)
+        if self.zone is not None:
+            if self.zone in batch.zoneIds:
+                mask &= batch.zoneMembership[:, batch.zoneIds.index(self.zone)]
+            else:
+                mask[:] = False
+        if self.types is not None:
+            mask &= np.isin(batch.typeCode, [code for code, objectType in enumerate(batch.types)
+                                             if objectType in self.types])
+        return mask
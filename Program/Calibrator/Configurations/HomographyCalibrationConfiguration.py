@@ -7,6 +7,11 @@ An implementation of the ICalibrationConfiguration, used by the homography conve
 """
 
 from collections import namedtuple
+import hashlib
+import json
+import pathlib
+from typing import List
+import cv2
 import numpy as np
 from Calibrator.Configurations.ICalibrationConfiguration import ICalibrationConfiguration
 from Calibrator.ImageReceiver.SmartImage import SmartImage
@@ -53,6 +58,54 @@ class HomographyGeoData:
         self.pixelScale = pixelScale
 
 
+class HomographyPlane:
+    """
+    An extra ground plane of a homography calibration, like a flight of stairs, a ramp or a second street level.
+    The plane has its own homography to the same top-down image, and is used within its polygon in the camera image.
+    """
+    name: str
+    homographyMatrix: np.ndarray
+    polygon: np.ndarray
+    altitude: float or None
+
+    def __init__(self, name, homographyMatrix, polygon, altitude=None):
+        """
+        Initializes the class with the given parameters.
+
+        Parameters
+        ----------
+        name : str
+            The name of the plane
+        homographyMatrix : np.ndarray
+            The 3x3 matrix from camera pixels to top-down pixels within the plane
+        polygon : np.ndarray
+            (N, 2) array of the camera pixel positions of the outline of the plane
+        altitude : float
+            The height of the plane in meters, None for the altitude of the anchor
+        """
+        self.name = name
+        self.homographyMatrix = np.array(homographyMatrix, dtype=np.float64)
+        self.polygon = np.array(polygon, dtype=np.float64).reshape(-1, 2)
+        self.altitude = altitude
+
+    @staticmethod
+    def FromDictionary(data: dict):
+        """
+        Creates a plane from its dictionary in the JSON file of the configuration.
+
+        Parameters
+        ----------
+        data : dict
+            The attributes of the plane
+
+        Returns
+        -------
+        HomographyPlane
+            The plane
+        """
+        return HomographyPlane(data["name"], data["homographyMatrix"], data["polygon"], data.get("altitude"))
+
+
 class HomographyCalibrationConfiguration(ICalibrationConfiguration):
     """
     This class is used to store the configuration for a homography calibration.
@@ -61,8 +114,13 @@ class HomographyCalibrationConfiguration(ICalibrationConfiguration):
     homographyGeoData: HomographyGeoData = None
     smartImage: SmartImage = None
     cameraResolution: (int, int) = None
+    analyzeResolution: (int, int) = None
+    cameraId: str = None
+    planes: List[HomographyPlane] = None
+    """The extra ground planes, the homography matrix is used outside of them"""
 
-    def __init__(self, homographyMatrix=None, cameraResolution=None, homographyGeoData=None, smartImage=None):
+    def __init__(self, homographyMatrix=None, cameraResolution=None, homographyGeoData=None, smartImage=None,
+                 planes=None):
         """ Initialize the homography calibration configuration
 
         Parameters
@@ -73,12 +131,19 @@ class HomographyCalibrationConfiguration(ICalibrationConfiguration):
             The homography geo data of the calibration
         smartImage : SmartImage
             The smart image of the calibration
+        planes : [HomographyPlane]
+            The extra ground planes, a later plane covers an earlier one where their polygons overlap
         """
 
         self.homographyMatrix = homographyMatrix
         self.homographyGeoData = homographyGeoData
         self.smartImage = smartImage
         self.cameraResolution = cameraResolution
+        self.planes = list(planes) if planes is not None else []
+
+        # The resolution of the frames the homography matrix maps from,
+        # a fresh calibration is done on frames at the camera resolution
+        self.analyzeResolution = cameraResolution
 
     def Save(self, cameraId: str):
         """ Save the homography calibration configuration
@@ -91,6 +156,9 @@ class HomographyCalibrationConfiguration(ICalibrationConfiguration):
 
         # Convert numpy array to list, as json can't handle numpy arrays
         self.homographyMatrix = self.homographyMatrix.tolist()
+        planes = self.planes
+        self.planes = [{"name": plane.name, "homographyMatrix": plane.homographyMatrix.tolist(),
+                        "polygon": plane.polygon.tolist(), "altitude": plane.altitude} for plane in planes]
 
         # Save smart image and set to none
         self.smartImage.Save(cameraId)
@@ -101,9 +169,11 @@ class HomographyCalibrationConfiguration(ICalibrationConfiguration):
 
         # Convert list back to numpy array
         self.homographyMatrix = np.array(self.homographyMatrix)
+        self.planes = planes
 
         # Restore smart image
         self.smartImage = SmartImage.FromIdentifier(cameraId)
+        self.cameraId = cameraId
 
     def Load(self, cameraId, arguments=None):
         """ Load the homography calibration configuration
@@ -119,8 +189,9 @@ class HomographyCalibrationConfiguration(ICalibrationConfiguration):
         # Call super
         super(HomographyCalibrationConfiguration, self).Load(cameraId)
 
-        # Convert list to numpy array
+        # Convert list to numpy array, configurations saved before the planes existed have none
         self.homographyMatrix = np.array(self.homographyMatrix)
+        self.planes = [HomographyPlane.FromDictionary(plane) for plane in (self.planes or [])]
 
         if arguments is not None:
             scaling = np.zeros((3, 3))
@@ -128,6 +199,12 @@ class HomographyCalibrationConfiguration(ICalibrationConfiguration):
             scaling[1][1] = self.cameraResolution[1] / arguments["analyzeHeight"]
             scaling[2][2] = 1
             self.homographyMatrix = np.matmul(self.homographyMatrix, scaling)
+            for plane in self.planes:
+                plane.homographyMatrix = np.matmul(plane.homographyMatrix, scaling)
+                plane.polygon = plane.polygon / (scaling[0][0], scaling[1][1])
+            self.analyzeResolution = (arguments["analyzeWidth"], arguments["analyzeHeight"])
+        else:
+            self.analyzeResolution = self.cameraResolution
 
         # Convert nested homography geo data dictionary
         # back to class object instance
@@ -144,3 +221,84 @@ class HomographyCalibrationConfiguration(ICalibrationConfiguration):
 
         # Restore smart image
         self.smartImage = SmartImage.FromIdentifier(cameraId)
+        self.cameraId = cameraId
+
+    def GetLookupTablePath(self, key: str) -> pathlib.Path or None:
+        """ Get the path of the pixel to world lookup table, next to the JSON file of this configuration
+
+        Parameters
+        ----------
+        key : str
+            The key of the lookup table, which changes with the homography, geo anchor and analyze resolution
+
+        Returns
+        -------
+        pathlib.Path or None
+            The path of the lookup table, or None if the configuration has not been saved or loaded
+        """
+
+        if self.cameraId is None:
+            return None
+
+        jsonPath = pathlib.Path(self._GetJSONPath(self.cameraId))
+        return jsonPath.with_name(f"{jsonPath.stem}_{key}.lut.npy")
+
+    def GetUncertaintyImagePath(self) -> pathlib.Path or None:
+        """ Get the path of the image of the location uncertainty, next to the JSON file of this configuration
+
+        Returns
+        -------
+        pathlib.Path or None
+            The path of the image, or None if the configuration has not been saved or loaded
+        """
+
+        if self.cameraId is None:
+            return None
+
+        jsonPath = pathlib.Path(self._GetJSONPath(self.cameraId))
+        return jsonPath.with_name(f"{jsonPath.stem}_uncertainty.png")
+
+    def GetPlanesKey(self) -> str or None:
+        """ Get the hash of the matrices, polygons and altitudes of the planes
+
+        Returns
+        -------
+        str or None
+            The key, or None if there are no planes
+        """
+
+        if not self.planes:
+            return None
+
+        key = hashlib.sha1()
+        for plane in self.planes:
+            key.update(np.asarray(plane.homographyMatrix, dtype=np.float64).tobytes())
+            key.update(np.asarray(plane.polygon, dtype=np.float64).tobytes())
+            key.update(json.dumps(plane.altitude).encode())
+        return key.hexdigest()[:16]
+
+    def GetPlaneLabels(self) -> np.ndarray or None:
+        """ Get the plane of every pixel of the analyze resolution, by filling the polygons of the planes in order
+
+        Returns
+        -------
+        np.ndarray or None
+            (height, width) array with 0 for the pixels of the homography matrix and i + 1 for the pixels of plane i,
+            or None if there are no planes. Without an analyze resolution the raster covers the polygons.
+        """
+
+        if not self.planes:
+            return None
+        if len(self.planes) > 255:
+            raise ValueError("There can be at most 255 planes.")
+
+        if self.analyzeResolution is not None:
+            (width, height) = self.analyzeResolution
+        else:
+            (width, height) = np.ceil(np.max([plane.polygon.max(axis=0, initial=0) for plane in self.planes],
+                                             axis=0)) + 1
+        labels = np.zeros((int(height), int(width)), dtype=np.uint8)
+        for number, plane in enumerate(self.planes):
+            if len(plane.polygon) >= 3:
+                cv2.fillPoly(labels, [np.round(plane.polygon).astype(np.int32)], number + 1)
+        return labels
@@ -17,9 +17,9 @@ import tkinter as tk
 from typing import Tuple
 from Calibrator.ImageReceiver.SmartImage import SmartImage
 from Calibrator.Configurations.HomographyCalibrationConfiguration import GeoPosition, HomographyGeoData
+from Positioner.RijksdriehoekConversion import RijksdriehoekConversion
 import cv2
 import os.path
-from rijksdriehoek import rijksdriehoek
 import pygame
 from Windowing.MasterWindow import MasterWindow, SubWindowPosition
 from Calibrator.Input.PrimitiveInput import PrimitiveInput, Primitives
@@ -68,11 +68,9 @@ class CycloMedia(IImageReceiver):
             return None
         (image, (x2, y2)) = result
 
-        # create rd converter
-        rd = rijksdriehoek.Rijksdriehoek(x2, y2)
-
         # convert rd to gps
-        (lat, lon) = rd.to_wgs()
+        (lat, lon) = RijksdriehoekConversion.ToWgs(x2, y2)
+        (lat, lon) = (float(lat), float(lon))
 
         return (
             SmartImage(image),
@@ -236,7 +236,7 @@ def Apply_trackmap(centroid_dict, trackmap, colorPool, decay):
 
 
 def Apply_crowdMap(centroid_dict, img, _crowdMap):
-    heat = np.zeros((img.shape[0], img.shape[1]), dtype=(np.int))
+    heat = np.zeros((img.shape[0], img.shape[1]), dtype=np.int32)
     for idx, box in centroid_dict.items():
         center_bird = (
          box[0], box[1])
@@ -0,0 +1,388 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+"""
+Columnar (struct of arrays) representation of all detections of a frame, used through the whole pipeline.
+"""
+
+import numpy as np
+
+from FrameAnalyzer.IDetector import DetectedObject
+from Positioner.DetectedObjectPosition import DetectedObjectPosition
+
+
+class DetectionBatch:
+    """
+    All detections of a frame, stored as one NumPy column per attribute instead of one tuple per detection.
+    The detectors fill the pixel positions, ids and types, the convertors fill the world positions.
+    Missing values are NaN, the way None is used for the optional fields of DetectedObjectPosition.
+    """
+
+    NO_ID = -1
+    """The id that is stored for detections without an id"""
+
+    x: np.ndarray = None
+    """The x pixel positions in the camera view"""
+    y: np.ndarray = None
+    """The y pixel positions in the camera view"""
+    id: np.ndarray = None
+    """The identifiers of the objects"""
+    typeCode: np.ndarray = None
+    """The index of the type of every object in types"""
+    types: tuple = ()
+    """The distinct types of the objects, for example 'human'"""
+    latitude: np.ndarray = None
+    """The latitudes in WGS-84 degrees"""
+    longitude: np.ndarray = None
+    """The longitudes in WGS-84 degrees"""
+    altitude: np.ndarray = None
+    """The heights in meters"""
+    locationRadius: np.ndarray = None
+    """The accuracy of the positions, given by a radius in meters"""
+    rijksdriehoekX: np.ndarray = None
+    """The x coordinates in Rijksdriehoek coordinates"""
+    rijksdriehoekY: np.ndarray = None
+    """The y coordinates in Rijksdriehoek coordinates"""
+    zoneMembership: np.ndarray = None
+    """(N, Z) boolean array, whether every object is inside each of the zones in zoneIds"""
+    zoneIds: tuple = ()
+    """The identifiers of the zones of zoneMembership, the zones are unknown when there are none"""
+
+    def __init__(self, x, y, id, typeCode, types, latitude=None, longitude=None, altitude=None,
+                 locationRadius=None, rijksdriehoekX=None, rijksdriehoekY=None, zoneMembership=None, zoneIds=()):
+        """
+        Constructor of the batch, columns that are None are filled with NaN.
+
+        Parameters
+        ----------
+        x : np.ndarray
+            The x pixel positions in the camera view
+        y : np.ndarray
+            The y pixel positions in the camera view
+        id : np.ndarray
+            The identifiers of the objects
+        typeCode : np.ndarray
+            The index of the type of every object in types
+        types : tuple
+            The distinct types of the objects
+        latitude, longitude, altitude, locationRadius, rijksdriehoekX, rijksdriehoekY : np.ndarray|None
+            The world positions, see DetectedObjectPosition
+        zoneMembership : np.ndarray|None
+            (N, Z) boolean array, whether every object is inside each of the zones
+        zoneIds : tuple
+            The identifiers of the Z zones
+        """
+        self.x = np.asarray(x, dtype=np.float64)
+        count = len(self.x)
+
+        def Column(values, dtype=np.float64):
+            if values is None:
+                return np.full(count, np.nan)
+            values = np.asarray(values, dtype=dtype).reshape(-1)
+            if len(values) != count:
+                raise ValueError(f"Column has {len(values)} values instead of {count}.")
+            return values
+
+        self.y = Column(y)
+        self.id = Column(id, np.int64)
+        self.typeCode = Column(typeCode, np.int32)
+        self.types = tuple(types)
+        self.latitude = Column(latitude)
+        self.longitude = Column(longitude)
+        self.altitude = Column(altitude)
+        self.locationRadius = Column(locationRadius)
+        self.rijksdriehoekX = Column(rijksdriehoekX)
+        self.rijksdriehoekY = Column(rijksdriehoekY)
+        self.zoneIds = tuple(zoneIds)
+        self.zoneMembership = np.zeros((count, len(self.zoneIds)), dtype=bool) if zoneMembership is None \
+            else np.asarray(zoneMembership, dtype=bool).reshape(count, len(self.zoneIds))
+
+    def __len__(self):
+        return len(self.x)
+
+    @staticmethod
+    def Empty():
+        """
+        Returns
+        -------
+        DetectionBatch
+            A batch without detections
+        """
+        return DetectionBatch(np.empty(0), np.empty(0), np.empty(0), np.empty(0), ())
+
+    @staticmethod
+    def FromDetections(detections):
+        """
+        Adapter for list based detectors, converts the detections to a batch if they are not one already.
+
+        Parameters
+        ----------
+        detections : DetectionBatch|[DetectedObject]|None
+            The detections
+
+        Returns
+        -------
+        DetectionBatch|None
+            The detections as a batch, or None if there are no detections
+        """
+        if detections is None or isinstance(detections, DetectionBatch):
+            return detections
+        return DetectionBatch.FromDetectedObjects(detections)
+
+    @staticmethod
+    def FromDetectedObjects(detectedObjects: [DetectedObject]):
+        """
+        Converts a list of detected objects to a batch.
+
+        Parameters
+        ----------
+        detectedObjects : [DetectedObject]
+            The detected objects
+
+        Returns
+        -------
+        DetectionBatch
+            The batch
+        """
+        (typeCodes, types) = DetectionBatch._EncodeTypes([detectedObject.type for detectedObject in detectedObjects])
+        return DetectionBatch(
+            [detectedObject.x for detectedObject in detectedObjects],
+            [detectedObject.y for detectedObject in detectedObjects],
+            [DetectionBatch.NO_ID if detectedObject.id is None else detectedObject.id
+             for detectedObject in detectedObjects],
+            typeCodes,
+            types
+        )
+
+    @staticmethod
+    def FromDetectedObjectPositions(detectedObjectPositions: [DetectedObjectPosition]):
+        """
+        Converts a list of detected object positions to a batch, the pixel positions are unknown (NaN).
+
+        Parameters
+        ----------
+        detectedObjectPositions : [DetectedObjectPosition]
+            The detected object positions
+
+        Returns
+        -------
+        DetectionBatch
+            The batch
+        """
+        count = len(detectedObjectPositions)
+        (typeCodes, types) = DetectionBatch._EncodeTypes([position.type for position in detectedObjectPositions])
+        return DetectionBatch(
+            np.full(count, np.nan),
+            np.full(count, np.nan),
+            [DetectionBatch.NO_ID if position.id is None else position.id for position in detectedObjectPositions],
+            typeCodes,
+            types
+        ).WithDetectedObjectPositions(detectedObjectPositions)
+
+    @staticmethod
+    def _EncodeTypes(objectTypes: list) -> (list, tuple):
+        """
+        Replaces every type with its index in the table of distinct types.
+        """
+        typeTable = {}
+        typeCodes = [typeTable.setdefault(objectType, len(typeTable)) for objectType in objectTypes]
+        return typeCodes, tuple(typeTable)
+
+    def WithPositions(self, latitude, longitude, altitude, locationRadius=None, rijksdriehoekX=None,
+                      rijksdriehoekY=None):
+        """
+        Creates a batch with the same detections and the given world positions, the detection columns are shared.
+
+        Parameters
+        ----------
+        latitude, longitude, altitude, locationRadius, rijksdriehoekX, rijksdriehoekY : np.ndarray|float|None
+            The world positions, single values are used for all detections and None is stored as NaN
+
+        Returns
+        -------
+        DetectionBatch
+            The batch with world positions
+        """
+        def Broadcast(values):
+            return None if values is None else np.broadcast_to(np.asarray(values, dtype=np.float64), len(self))
+
+        return DetectionBatch(self.x, self.y, self.id, self.typeCode, self.types,
+                              Broadcast(latitude), Broadcast(longitude), Broadcast(altitude),
+                              Broadcast(locationRadius), Broadcast(rijksdriehoekX), Broadcast(rijksdriehoekY),
+                              self.zoneMembership, self.zoneIds)
+
+    def WithIds(self, ids):
+        """
+        Creates a batch with the same detections and world positions and the given ids, the other columns are shared.
+
+        Parameters
+        ----------
+        ids : np.ndarray
+            The new identifier of every detection
+
+        Returns
+        -------
+        DetectionBatch
+            The batch with the new ids
+        """
+        return DetectionBatch(self.x, self.y, ids, self.typeCode, self.types, self.latitude, self.longitude,
+                              self.altitude, self.locationRadius, self.rijksdriehoekX, self.rijksdriehoekY,
+                              self.zoneMembership, self.zoneIds)
+
+    def WithZones(self, zoneMembership: np.ndarray, zoneIds: tuple):
+        """
+        Creates a batch with the same detections and world positions and the given zones, the other columns are shared.
+
+        Parameters
+        ----------
+        zoneMembership : np.ndarray
+            (N, Z) boolean array, whether every object is inside each of the zones
+        zoneIds : tuple
+            The identifiers of the Z zones
+
+        Returns
+        -------
+        DetectionBatch
+            The batch with the zones
+        """
+        return DetectionBatch(self.x, self.y, self.id, self.typeCode, self.types, self.latitude, self.longitude,
+                              self.altitude, self.locationRadius, self.rijksdriehoekX, self.rijksdriehoekY,
+                              zoneMembership, zoneIds)
+
+    def Select(self, mask: np.ndarray):
+        """
+        Creates a batch with a subset of the detections, the types and zone identifiers are kept.
+
+        Parameters
+        ----------
+        mask : np.ndarray
+            Boolean array, whether every detection is kept
+
+        Returns
+        -------
+        DetectionBatch
+            The batch with the selected detections
+        """
+        return DetectionBatch(self.x[mask], self.y[mask], self.id[mask], self.typeCode[mask], self.types,
+                              self.latitude[mask], self.longitude[mask], self.altitude[mask],
+                              self.locationRadius[mask], self.rijksdriehoekX[mask], self.rijksdriehoekY[mask],
+                              self.zoneMembership[mask], self.zoneIds)
+
+    def GetZones(self) -> list:
+        """
+        Returns
+        -------
+        list
+            The identifiers of the zones every detection is inside, or None for every detection if
+            the zones are unknown
+        """
+        if len(self.zoneIds) == 0:
+            return [None] * len(self)
+        return [tuple(zoneId for zoneId, inside in zip(self.zoneIds, row) if inside)
+                for row in self.zoneMembership.tolist()]
+
+    def WithDetectedObjectPositions(self, detectedObjectPositions: [DetectedObjectPosition]):
+        """
+        Adapter for list based convertors, creates a batch with the same detections and
+        the world positions of the given list, which has a position for every detection.
+
+        Parameters
+        ----------
+        detectedObjectPositions : [DetectedObjectPosition]
+            The world position of every detection, in the same order
+
+        Returns
+        -------
+        DetectionBatch
+            The batch with world positions
+        """
+        def Column(field):
+            return [np.nan if value is None else value
+                    for value in (getattr(position, field) for position in detectedObjectPositions)]
+
+        return self.WithPositions(
+            Column('latitude'), Column('longitude'), Column('altitude'),
+            Column('locationRadius'), Column('rijksdriehoekX'), Column('rijksdriehoekY')
+        )
+
+    def GetTypes(self) -> list:
+        """
+        Returns
+        -------
+        list
+            The type of every detection
+        """
+        return [self.types[typeCode] for typeCode in self.typeCode.tolist()]
+
+    def GetPixelPositions(self) -> np.ndarray:
+        """
+        Returns
+        -------
+        np.ndarray
+            (N, 2) array of x and y pixel positions in the camera view
+        """
+        return np.column_stack((self.x, self.y))
+
+    def ToDetectedObjects(self) -> [DetectedObject]:
+        """
+        Adapter for list based implementations, converts the batch to detected objects.
+
+        Returns
+        -------
+        [DetectedObject]
+            A detected object for every detection
+        """
+        return [DetectedObject(x, y, objectId, objectType) for x, y, objectId, objectType in
+                zip(self.x.tolist(), self.y.tolist(), self.id.tolist(), self.GetTypes())]
+
+    def ToDetectedObjectPositions(self) -> [DetectedObjectPosition]:
+        """
+        Adapter for list based implementations, converts the batch to detected object positions.
+
+        Returns
+        -------
+        [DetectedObjectPosition]
+            A detected object position for every detection, NaN values are None
+        """
+        return [DetectedObjectPosition(**row) for row in self._Rows(False)]
+
+    def ToDictionaries(self) -> [dict]:
+        """
+        Converts the batch to dictionaries with the fields of DetectedObjectPosition,
+        the fields without a value are left out.
+
+        Returns
+        -------
+        [dict]
+            A dictionary for every detection
+        """
+        return list(self._Rows(True))
+
+    def _Rows(self, skipMissing: bool):
+        """
+        Generates a dictionary with the DetectedObjectPosition fields of every detection.
+        Missing values are left out when skipMissing is set, otherwise they are None.
+        """
+        columns = []
+        for field in DetectedObjectPosition._fields:
+            if field == 'id':
+                missing = self.id == DetectionBatch.NO_ID
+                columns.append((field, self.id.tolist(), missing.tolist() if missing.any() else None))
+            elif field == 'type':
+                columns.append((field, self.GetTypes(), None))
+            elif field == 'zones':
+                columns.append((field, self.GetZones(), [True] * len(self) if len(self.zoneIds) == 0 else None))
+            else:
+                values = getattr(self, field)
+                missing = np.isnan(values)
+                columns.append((field, values.tolist(), missing.tolist() if missing.any() else None))
+
+        for i in range(len(self)):
+            row = {}
+            for field, values, missing in columns:
+                if missing is None or not missing[i]:
+                    row[field] = values[i]
+                elif not skipMissing:
+                    row[field] = None
+            yield row
@@ -7,6 +7,7 @@ Interface for the next step in the data pipeline after the FrameAnalyzer.
 """
 
 from datetime import datetime
+from FrameAnalyzer.DetectionBatch import DetectionBatch
 from FrameAnalyzer.IDetector import DetectedObject
 
 
@@ -15,16 +16,16 @@ class IDataWriteConnection:
     The interface for the DataWriteConnection objects that can be used in the MainFrameAnalyzer.
     """
 
-    def WriteData(self, detections: [DetectedObject], frameIndex: int, frameReadDatetime: datetime):
+    def WriteData(self, detections, frameIndex: int, frameReadDatetime: datetime):
         """
-        Write DetectionObject[] data together with the frameIndex to another (part of the) program.
+        Write the detections together with the frameIndex to another (part of the) program.
 
         Parameters
         ----------
-        detections : [DetectedObject]
-            The DetectedObject[] data to be written.
+        detections : DetectionBatch or [DetectedObject]
+            The detections to be written, list based detectors return a DetectedObject[].
         frameIndex : int
-            The frame index belonging to the DetectedObject[] data.
+            The frame index belonging to the detections.
         frameReadDatetime : datetime
             The time at which the frame was initially loaded into the system
         """
@@ -32,7 +33,8 @@ class IDataWriteConnection:
             return detections, frameIndex, frameReadDatetime
 
         print('Frame: {0}'.format(frameIndex))
-        for detection in detections:
+        detectedObjects = detections.ToDetectedObjects() if isinstance(detections, DetectionBatch) else detections
+        for detection in detectedObjects:
             print('({0}, {1}, {2}, {3})'.format(str(detection.x), str(detection.y), str(detection.id),
                                                 str(detection.type)))
 
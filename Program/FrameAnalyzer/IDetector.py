@@ -24,6 +24,7 @@ class IDetector:
     def GetHumanPositions(self, frame: numpy.ndarray, frameIndex: int):
         """
         Uses the given frame and frameIndex to detect objects and return them as DetectedObject[].
+        Detectors can return a DetectionBatch instead, which is passed through the pipeline without conversion.
 
         Parameters
         ----------
@@ -34,8 +35,8 @@ class IDetector:
 
         Returns
         -------
-        DetectedObject[]
-            An array of detected objects.
+        DetectedObject[] or DetectionBatch
+            The detected objects.
         """
         return [DetectedObject(1, 1, frameIndex, 0), DetectedObject(5, 5, frameIndex, 0)], frameIndex     # test output
 
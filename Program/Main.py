@@ -15,6 +15,7 @@ from typing import Any, Dict
 from datetime import datetime, time
 
 from API.APIController import APIController
+from API.ClientConnection import SlowClientPolicy
 from CameraReader.CameraController import CameraController
 from Positioner.Accuracy.StaticAccuracyDataset import StaticAccuracyDataset
 from Windowing.Sub.CameraSubWindow import CameraSubWindow
@@ -26,6 +27,15 @@ from Positioner.Convertors import Convertors
 from Positioner.DetectedObjectPosition import DetectedObjectPosition
 from Positioner.IConvertor import IConvertor
 from Positioner.MainPositioner import MainPositioner
+from Positioner.PositionerWorker import PositionerWorker, QueueOverflowPolicy
+from Positioner.PositionFusion import PositionFusion
+from Positioner.TrackStore import TrackStore
+from Positioner.PositionSmoother import PositionSmoother
+from Positioner.ZoneIndex import ZoneIndex
+from Positioner.Analytics.TrackCounters import TrackCounters
+from Positioner.Analytics.SocialDistance import SocialDistance
+from Positioner.Analytics.Heatmap import Heatmap
+from Positioner.Analytics.RollupStore import RollupStore
 from Calibrator.MainCalibrator import MainCalibrator
 from ArgsGUI import UserArgsInput
 
@@ -60,6 +70,8 @@ async def CommandInput(api: APIController):
 class Program:
     # objects
     api: APIController
+    fusion: PositionFusion
+    pipelines: [Any]
 
     # tasks
     inputTask: Any
@@ -69,6 +81,8 @@ class Program:
 
     def __init__(self):
         self.api = None
+        self.fusion = None
+        self.pipelines = []
         self.inputTask = None
         self.apiTask = None
         self.videoAnalyzerTask = None
@@ -93,6 +107,15 @@ class Program:
             APIController.ValidateApiArguments(arguments)
             CameraController.ValidateReaderArguments(arguments)
             MainFrameAnalyzer.ValidateFrameAnalyzerArguments(arguments)
+            PositionerWorker.ValidatePositionerWorkerArguments(arguments)
+            PositionFusion.ValidatePositionFusionArguments(arguments)
+            TrackStore.ValidateTrackStoreArguments(arguments)
+            PositionSmoother.ValidatePositionSmootherArguments(arguments)
+            ZoneIndex.ValidateZoneIndexArguments(arguments)
+            TrackCounters.ValidateTrackCountersArguments(arguments)
+            SocialDistance.ValidateSocialDistanceArguments(arguments)
+            Heatmap.ValidateHeatmapArguments(arguments)
+            RollupStore.ValidateRollupStoreArguments(arguments)
             MainCalibrator.ValidateCalibratorArguments(arguments)
             StaticAccuracyDataset.ValidateStaticAccuracyDatasetArguments(arguments)
         except (ValueError, TypeError) as e:
@@ -116,6 +139,15 @@ class Program:
         APIController.AddApiArguments(argumentParser)
         CameraController.AddVideoReaderArguments(argumentParser)
         MainFrameAnalyzer.AddFrameAnalyzerArguments(argumentParser)
+        PositionerWorker.AddPositionerWorkerArguments(argumentParser)
+        PositionFusion.AddPositionFusionArguments(argumentParser)
+        TrackStore.AddTrackStoreArguments(argumentParser)
+        PositionSmoother.AddPositionSmootherArguments(argumentParser)
+        ZoneIndex.AddZoneIndexArguments(argumentParser)
+        TrackCounters.AddTrackCountersArguments(argumentParser)
+        SocialDistance.AddSocialDistanceArguments(argumentParser)
+        Heatmap.AddHeatmapArguments(argumentParser)
+        RollupStore.AddRollupStoreArguments(argumentParser)
         MainCalibrator.AddCalibratorArguments(argumentParser)
         StaticAccuracyDataset.AddStaticAccuracyDatasetArguments(argumentParser)
         UserArgsInput.UserArgsInput().AddArgsGUIArguments(argumentParser)
@@ -154,20 +186,29 @@ class Program:
         """Creation of all the tasks for the program."""
 
         loop = asyncio.get_running_loop()
-        executor = ThreadPoolExecutor(1)
 
         if self.arguments is None:
             self.ParseArguments()
 
         # Setup API
-        self.api = APIController(loop, not self.arguments["noEncryption"])
+        self.api = APIController(loop, not self.arguments["noEncryption"], self.arguments["apiQueueBytes"],
+                                 SlowClientPolicy(self.arguments["apiSlowClientPolicy"]),
+                                 self.arguments["apiKeyframeFrames"], self.arguments["apiKeyframeSeconds"],
+                                 self.arguments["apiDeltaEpsilon"])
         self.apiTask = loop.create_task(self.api.Start(self.arguments["port"]))
         await self.api.UntilConnected()
 
-        # Setup positioner pipeline
-        pipeline = PositionerPipeline()
-        self.videoAnalyzerTask = loop.run_in_executor(
-            executor, pipeline.RunPipeline, self.api, self.arguments)
+        # Setup a positioner pipeline for the camera and for every fusion camera, they share the fusion so an object
+        # seen by several cameras gets the same id from all of them
+        self.fusion = PositionFusion.FromArguments(self.arguments)
+        locations = [self.arguments['fileOrStreamLocation']] + self.arguments['fusionCameras']
+        executor = ThreadPoolExecutor(len(locations))
+        self.pipelines = [PositionerPipeline(i == 0) for i in range(len(locations))]
+        self.videoAnalyzerTask = asyncio.gather(*[
+            loop.run_in_executor(executor, pipeline.RunPipeline, self.api,
+                                 {**self.arguments, 'fileOrStreamLocation': location}, self.fusion)
+            for (pipeline, location) in zip(self.pipelines, locations)
+        ])
 
         # Setup input loop
         self.inputTask = loop.create_task(CommandInput(self.api))
@@ -177,8 +218,15 @@ class Program:
 
         print("Stopping...")
 
-        # Cleanup, stop all other async functions
+        # Cleanup, stop all other async functions, the messages of the last frames are sent first
         self.inputTask.cancel()
+        try:
+            await asyncio.wait_for(self.api.Flush(), 5)
+        except asyncio.TimeoutError:
+            print("Not all API messages were sent.")
+        print("API messages:", self.api.GetStatistics())
+        for statistics in self.api.GetConnectionStatistics():
+            print("API client:", statistics)
         self.api.Stop()
         videoAnalyzerCancelEvent.set()
 
@@ -187,20 +235,33 @@ class Program:
 
 
 class PositionerPipeline:
-    """Separate Positioner Pipeline Object"""
+    """
+    Separate Positioner Pipeline Object.
+    The primary pipeline shows the window, can calibrate its camera and runs the track store and the analytics.
+    The other pipelines are the fusion cameras, they use their saved calibration and only position, fuse and send
+    the detections of their camera.
+    """
 
+    primary: bool = True
     cameraController: CameraController = None
     mainWindow: MasterWindow = None
     frameAnalyzer: MainFrameAnalyzer = None
+    positionerWorker: PositionerWorker = None
+    convertor: IConvertor = None
+    rollupStore: RollupStore = None
     detector: IDetector
 
-    def __init__(self):
+    def __init__(self, primary: bool = True):
+        self.primary = primary
         self.cameraController = None
         self.mainWindow = None
         self.frameAnalyzer = None
+        self.positionerWorker = None
+        self.convertor = None
+        self.rollupStore = None
         self.detector = None
 
-    def RunPipeline(self, api: APIController, arguments: Dict[str, Any]):
+    def RunPipeline(self, api: APIController, arguments: Dict[str, Any], fusion: PositionFusion = None):
         """
         Pipeline that builds all objects needed for the detection, tracking and positioning of object in a frame.
 
@@ -210,10 +271,12 @@ class PositionerPipeline:
             The API used in the pipeline.
         arguments : Dict[str, Any]
             The arguments used to run the pipeline
+        fusion : PositionFusion|None
+            The fusion shared by the pipelines of all cameras, None disables the fusion of positions
         """
 
         # Start positioner pipeline
-        self._Startup(api, arguments)
+        self._Startup(api, arguments, fusion)
 
         # Start FrameAnalyzer and Positioner
         if not videoAnalyzerCancelEvent.is_set():
@@ -223,7 +286,7 @@ class PositionerPipeline:
         # stop positioner pipeline
         self._Cleanup()
 
-    def _Startup(self, api: APIController, arguments: Dict[str, Any]):
+    def _Startup(self, api: APIController, arguments: Dict[str, Any], fusion: PositionFusion = None):
         """
         The startup for the positioner pipeline, builds and connects all pipeline objects.
 
@@ -233,7 +296,12 @@ class PositionerPipeline:
             The API used in the pipeline.
         arguments : Dict[str, Any]
             The arguments used to create the pipeline.
+        fusion : PositionFusion|None
+            The fusion shared by the pipelines of all cameras, None disables the fusion of positions
         """
+        if not self.primary:
+            self._StartupFusionCamera(api, arguments, fusion)
+            return
 
         # Setup master window
         self.mainWindow = MasterWindow(1080, 640, "CGP - Python Applicatie")
@@ -276,6 +344,7 @@ class PositionerPipeline:
             convertor = Convertors[type(calibrationConfiguration)](calibrationConfiguration, converterSubWindow)
         else:
             convertor = IConvertor(None)
+        self.convertor = convertor
         calibrationDoneEvent.set()
 
         # create sub window
@@ -283,11 +352,92 @@ class PositionerPipeline:
         self.mainWindow.leftSubWindow = detectionSubWindow
 
         # Setup Pipeline
-        positioner = MainPositioner(convertor, api, True)
-        dataWriteConnection = positioner
+        trackStore = TrackStore(arguments['trackLength'], arguments['trackTimeout'], arguments['maxTracks'])
+        print("Track store memory:", trackStore.GetMemoryUsage(), "bytes")
+        api.SetTrackStore(trackStore)
+        smoother = PositionSmoother(measurementNoise=arguments['measurementNoise'],
+                                    maxTracks=arguments['maxTracks']) if arguments['smoothing'] else None
+        zoneIndex = None
+        analytics = []
+        if arguments['zoneFile'] != "":
+            zoneIndex = ZoneIndex.FromFile(arguments['zoneFile'], arguments['zoneCellSize'])
+            analytics.append(TrackCounters(TrackCounters.LoadLines(arguments['zoneFile']),
+                                           arguments['counterInterval'], arguments['maxTracks']))
+        if arguments['socialDistance'] > 0:
+            analytics.append(SocialDistance(arguments['socialDistance'], arguments['socialDistanceInterval']))
+        bounds = None
+        if arguments['heatmap'] or arguments['rollupFile'] != "":
+            bounds = Heatmap.CalibratedBounds(convertor, arguments['analyzeWidth'], arguments['analyzeHeight'])
+        if arguments['heatmap']:
+            if bounds is None:
+                print("The heatmap is disabled, the calibrated area is unknown.")
+            else:
+                analytics.append(Heatmap.FromBounds(bounds, arguments['heatmapCellSize'],
+                                                    halfLife=arguments['heatmapHalfLife'],
+                                                    publishInterval=arguments['heatmapInterval']))
+        if arguments['rollupFile'] != "":
+            self.rollupStore = RollupStore(zoneIndex.zoneIds if zoneIndex is not None else (), bounds,
+                                           arguments['rollupCellSize'], arguments['rollupFile'])
+            print("Rollup store memory:", self.rollupStore.GetMemoryUsage(), "bytes")
+            api.SetRollupStore(self.rollupStore)
+            analytics.append(self.rollupStore)
+        for channel in {analytic.channel for analytic in analytics}:
+            api.AddChannel(channel)
+        positioner = MainPositioner(convertor, api, True, fusion,
+                                    self.cameraController.GetUniqueIdentifier(), trackStore,
+                                    smoother, arguments['extrapolate'], zoneIndex, analytics)
+        self.positionerWorker = PositionerWorker(positioner, arguments['positionerQueueSize'],
+                                                 QueueOverflowPolicy(arguments['positionerQueuePolicy']))
+        self.positionerWorker.Start()
+        dataWriteConnection = self.positionerWorker
         self.detector = DetectionFactory.CreateDetector(arguments, videoAnalyzerCancelEvent, detectionSubWindow)
         self.frameAnalyzer = MainFrameAnalyzer(self.detector, dataWriteConnection)
 
+    def _StartupFusionCamera(self, api: APIController, arguments: Dict[str, Any], fusion: PositionFusion):
+        """
+        The startup of the pipeline of a fusion camera, without a window, the track store and the analytics.
+
+        Parameters
+        ----------
+        api : APIController
+            The API used in the pipeline.
+        arguments : Dict[str, Any]
+            The arguments used to create the pipeline, with the location of the fusion camera.
+        fusion : PositionFusion|None
+            The fusion shared by the pipelines of all cameras
+        """
+
+        # Setup Camera
+        self.cameraController = CameraController()
+        connected = self.cameraController.StartVideoReader(arguments)
+        if not connected:
+            self._Cleanup()
+            return
+
+        # There is no window to calibrate in, the camera must have been calibrated before
+        cameraId = self.cameraController.GetUniqueIdentifier()
+        calibrationConfiguration = None if arguments['calibrator'] == 'None' else \
+            MainCalibrator.GetConfiguredCalibrationMethod(cameraId, arguments['calibrator'], arguments)
+        if calibrationConfiguration is None:
+            print('No saved calibration of fusion camera ' + arguments['fileOrStreamLocation'] +
+                  ', forcefully exiting...')
+            self._Cleanup()
+            return
+        self.convertor = Convertors[type(calibrationConfiguration)](calibrationConfiguration, None)
+
+        # Setup Pipeline
+        smoother = PositionSmoother(measurementNoise=arguments['measurementNoise'],
+                                    maxTracks=arguments['maxTracks']) if arguments['smoothing'] else None
+        zoneIndex = ZoneIndex.FromFile(arguments['zoneFile'], arguments['zoneCellSize']) \
+            if arguments['zoneFile'] != "" else None
+        positioner = MainPositioner(self.convertor, api, False, fusion, cameraId, None, smoother,
+                                    arguments['extrapolate'], zoneIndex)
+        self.positionerWorker = PositionerWorker(positioner, arguments['positionerQueueSize'],
+                                                 QueueOverflowPolicy(arguments['positionerQueuePolicy']))
+        self.positionerWorker.Start()
+        self.detector = DetectionFactory.CreateDetector(arguments, videoAnalyzerCancelEvent)
+        self.frameAnalyzer = MainFrameAnalyzer(self.detector, self.positionerWorker)
+
     def _Cleanup(self):
         """Cleans the pipeline when it is closed."""
 
@@ -305,6 +455,17 @@ class PositionerPipeline:
         if self.detector is not None:
             self.detector.Close()
 
+        # stop positioner, the queued frames are not sent anymore
+        if self.positionerWorker is not None:
+            self.positionerWorker.Stop(False)
+            print("Positioner queue:", self.positionerWorker.GetStatistics())
+
+        if self.convertor is not None:
+            self.convertor.Close()
+
+        if self.rollupStore is not None:
+            self.rollupStore.Close()
+
         self.cameraController.StopVideoReader()
 
 
@@ -0,0 +1,127 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+"""
+On disk cache of the static accuracy errors calculated by the convertors.
+"""
+
+import hashlib
+import json
+import os
+import pathlib
+
+from IO.Pathing import GetDataPath
+from Positioner.Accuracy.StaticAccuracyDataset import StaticAccuracyError
+
+
+class StaticAccuracyCache:
+    """
+    Stores the StaticAccuracyError of every key in a single JSON file,
+    so the static error is only calculated again when the datasets, the convertor or its parameters change.
+    """
+
+    FILE_NAME = "StaticAccuracyCache.json"
+    """The name of the cache file in the data directory"""
+    MAX_ENTRIES = 16
+    """The number of most recently stored keys that are kept"""
+    CACHE_VERSION = 1
+    """The version of the static error measurement, raise it when the way the error is calculated changes"""
+
+    path: pathlib.Path = None
+
+    def __init__(self, path: pathlib.Path = None):
+        """
+        Constructor of the cache.
+
+        Parameters
+        ----------
+        path : pathlib.Path|None
+            The path of the cache file, the data directory by default
+        """
+        self.path = GetDataPath() / StaticAccuracyCache.FILE_NAME if path is None else pathlib.Path(path)
+
+    @staticmethod
+    def GetKey(datasetPaths: [pathlib.Path], convertorClass: type, configurationClass: type,
+               parameters: dict = None) -> str:
+        """
+        Hash of everything the static error is calculated from.
+        The live configuration is not part of the key, the error is measured with the configurations of the datasets.
+
+        Parameters
+        ----------
+        datasetPaths : [pathlib.Path]
+            The paths of the static accuracy datasets
+        convertorClass : type
+            The class of the convertor that calculates the error
+        configurationClass : type
+            The class of the configuration of the convertor, which selects the configuration of every dataset
+        parameters : dict|None
+            The parameters of the convertor the measurement depends on, like the shift distance
+
+        Returns
+        -------
+        str
+            The key
+        """
+        key = hashlib.sha1(f"version {StaticAccuracyCache.CACHE_VERSION}".encode())
+        for datasetPath in sorted(pathlib.Path(path) for path in datasetPaths):
+            key.update(datasetPath.name.encode())
+            key.update(datasetPath.read_bytes())
+
+        key.update(f"{convertorClass.__module__}.{convertorClass.__qualname__}".encode())
+        key.update(configurationClass.__name__.encode())
+        key.update(json.dumps(parameters or {}, default=repr, sort_keys=True).encode())
+        return key.hexdigest()
+
+    def Get(self, key: str) -> StaticAccuracyError or None:
+        """
+        Gets the stored static error of the given key.
+
+        Parameters
+        ----------
+        key : str
+            The key, see GetKey
+
+        Returns
+        -------
+        StaticAccuracyError|None
+            The stored static error, or None when there is none for the key
+        """
+        entry = self._Read().get(key)
+        if entry is None:
+            return None
+        return StaticAccuracyError.FromDictionary(entry)
+
+    def Set(self, key: str, staticError: StaticAccuracyError):
+        """
+        Stores the static error of the given key, the oldest keys are removed when there are too many.
+
+        Parameters
+        ----------
+        key : str
+            The key, see GetKey
+        staticError : StaticAccuracyError
+            The calculated static error
+        """
+        entries = self._Read()
+        entries.pop(key, None)
+        entries[key] = staticError.ToDictionary()
+        entries = dict(list(entries.items())[-StaticAccuracyCache.MAX_ENTRIES:])
+
+        # Only replace the file once it is complete
+        temporaryPath = self.path.with_name(self.path.name + '.tmp')
+        with open(temporaryPath, 'w') as file:
+            json.dump(entries, file)
+        os.replace(temporaryPath, self.path)
+
+    def _Read(self) -> dict:
+        """
+        Reads all entries of the cache file, an unreadable file is treated as an empty cache.
+        """
+        try:
+            with open(self.path, 'r') as file:
+                entries = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
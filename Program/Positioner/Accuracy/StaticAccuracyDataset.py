@@ -7,6 +7,8 @@ import os
 from types import SimpleNamespace
 from typing import Dict
 
+import numpy as np
+
 from Calibrator.Configurations.HomographyCalibrationConfiguration import HomographyGeoData, GeoPosition
 from Calibrator.Configurations.ICalibrationConfiguration import ICalibrationConfiguration
 from Calibrator.ImageReceiver.MapBoxAPI import MapBoxAPI
@@ -236,6 +238,22 @@ class StaticAccuracyError:
         if nextError > self.maxError:
             self.maxError = nextError
 
+    def AddErrors(self, nextErrors):
+        """ Adds an array of errors at once, the same as calling AddError for every error.
+
+        Parameters
+        ----------
+        nextErrors : np.ndarray
+            new errors in meters
+        """
+
+        if len(nextErrors) <= 0:
+            return
+
+        self.numberOfErrors += len(nextErrors)
+        self.averageError += float(np.sum(nextErrors))
+        self.maxError = max(self.maxError, float(np.max(nextErrors)))
+
     def AverageErrors(self):
         """
         Turns the accumulated error into an average error
@@ -249,3 +267,35 @@ class StaticAccuracyError:
         the max error attribute
         """
         return self.maxError
+
+    def ToDictionary(self):
+        """
+        Returns
+        -------
+        the attributes of the error as a dictionary, to store it
+        """
+        return {
+            "maxError": self.maxError,
+            "averageError": self.averageError,
+            "numberOfErrors": self.numberOfErrors
+        }
+
+    @staticmethod
+    def FromDictionary(dictionary):
+        """ Creates a StaticAccuracyError from a dictionary made by ToDictionary.
+
+        Parameters
+        ----------
+        dictionary : dict
+            The stored attributes
+
+        Returns
+        -------
+        StaticAccuracyError
+            The restored error
+        """
+        staticError = StaticAccuracyError()
+        staticError.maxError = dictionary["maxError"]
+        staticError.averageError = dictionary["averageError"]
+        staticError.numberOfErrors = dictionary["numberOfErrors"]
+        return staticError
@@ -0,0 +1,276 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+"""
+Crowd density heatmap on a fixed grid in world coordinates, which decays over time.
+"""
+
+import argparse
+import base64
+import threading
+from typing import Any, Dict
+
+import cv2
+import numpy as np
+
+from FrameAnalyzer.DetectionBatch import DetectionBatch
+from Positioner.Analytics.IAnalytics import IAnalytics
+from Positioner.IConvertor import IConvertor
+from Positioner.RijksdriehoekConversion import RijksdriehoekConversion
+
+
+class Heatmap(IAnalytics):
+    """
+    Accumulates a Gaussian kernel at the position of every object on a grid of cellSize meters in
+    Rijksdriehoek coordinates. The heat decays exponentially with halfLife, but a cell is only decayed when
+    it is touched, using the time of its last update, so a frame only costs the cells around the objects.
+    The published snapshot is a PNG of the whole grid decayed to the latest time.
+    """
+    channel: str = 'heatmap'
+
+    minX: float = 0
+    """The Rijksdriehoek x coordinate of the left edge of the grid"""
+    minY: float = 0
+    """The Rijksdriehoek y coordinate of the bottom edge of the grid"""
+    cellSize: float = 0.5
+    """The size of the cells in meters"""
+    halfLife: float = 60.0
+    """The number of seconds after which the heat is halved"""
+
+    def __init__(self, minX: float, minY: float, width: int, height: int, cellSize: float = 0.5,
+                 halfLife: float = 60.0, kernelSigma: float = 1.0, publishInterval: float = 10.0):
+        """
+        Constructor of the heatmap, the grid is allocated here.
+
+        Parameters
+        ----------
+        minX, minY : float
+            The Rijksdriehoek coordinates of the bottom left corner of the grid
+        width, height : int
+            The number of cells of the grid
+        cellSize : float
+            The size of the cells in meters
+        halfLife : float
+            The number of seconds after which the heat is halved
+        kernelSigma : float
+            The standard deviation in meters of the kernel of an object
+        publishInterval : float
+            The number of seconds between the publications of the snapshots
+        """
+        super().__init__(publishInterval)
+        if width < 1 or height < 1 or cellSize <= 0 or halfLife <= 0 or kernelSigma <= 0:
+            raise ValueError("The heatmap needs a positive size, cell size, half life and kernel size.")
+
+        self.minX = minX
+        self.minY = minY
+        self.cellSize = cellSize
+        self.halfLife = halfLife
+        self._decayRate = np.log(2) / halfLife
+
+        self._heat = np.zeros((height, width), dtype=np.float32)
+        self._updateTimes = np.zeros((height, width))
+        self._latestTime = None
+
+        # The kernel covers three standard deviations, one offset and weight per cell
+        radius = int(np.ceil(3 * kernelSigma / cellSize))
+        (offsetY, offsetX) = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+        weights = np.exp(-(offsetX ** 2 + offsetY ** 2) * cellSize ** 2 / (2 * kernelSigma ** 2))
+        inside = weights >= np.exp(-4.5)
+        self._kernelOffsets = np.column_stack((offsetX[inside], offsetY[inside]))
+        self._kernelWeights = (weights[inside] / weights[inside].sum()).astype(np.float32)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def FromBounds(bounds: (float, float, float, float), cellSize: float = 0.5, **kwargs):
+        """
+        Creates a heatmap that covers the bounds.
+
+        Parameters
+        ----------
+        bounds : (float, float, float, float)
+            The minimum x, minimum y, maximum x and maximum y Rijksdriehoek coordinates
+        cellSize : float
+            The size of the cells in meters
+        kwargs
+            The other arguments of the constructor
+
+        Returns
+        -------
+        Heatmap
+            The heatmap
+        """
+        (minX, minY, maxX, maxY) = bounds
+        width = max(1, int(np.ceil((maxX - minX) / cellSize)))
+        height = max(1, int(np.ceil((maxY - minY) / cellSize)))
+        return Heatmap(minX, minY, width, height, cellSize, **kwargs)
+
+    @staticmethod
+    def CalibratedBounds(convertor: IConvertor, width: int, height: int, maxSize: float = 500.0,
+                         samples: int = 16) -> (float, float, float, float) or None:
+        """
+        Estimates the area the camera sees, from the conversions of a grid of pixels of the analyze resolution.
+        Pixels above the horizon can be converted to far away positions, so the area is limited to maxSize meters
+        around the median position.
+
+        Parameters
+        ----------
+        convertor : IConvertor
+            The calibrated convertor
+        width, height : int
+            The analyze resolution
+        maxSize : float
+            The maximum width and height of the area in meters
+        samples : int
+            The number of pixels that are converted along each side of the image
+
+        Returns
+        -------
+        (float, float, float, float)|None
+            The minimum x, minimum y, maximum x and maximum y Rijksdriehoek coordinates,
+            or None if no pixel could be converted
+        """
+        (pixelsY, pixelsX) = np.mgrid[0:height - 1:samples * 1j, 0:width - 1:samples * 1j]
+        count = pixelsX.size
+        batch = DetectionBatch(pixelsX.ravel(), pixelsY.ravel(), np.full(count, DetectionBatch.NO_ID),
+                               np.zeros(count), ('pixel',))
+        batch = convertor.ConvertBatch(batch, 0)
+
+        (x, y) = (batch.rijksdriehoekX.copy(), batch.rijksdriehoekY.copy())
+        missing = np.isnan(x) | np.isnan(y)
+        if missing.any():
+            (x[missing], y[missing]) = RijksdriehoekConversion.FromWgs(batch.latitude[missing],
+                                                                     batch.longitude[missing])
+        positions = np.column_stack((x, y))
+        positions = positions[np.isfinite(positions).all(axis=1)]
+        if len(positions) == 0:
+            return None
+
+        center = np.median(positions, axis=0)
+        (minimum, maximum) = (np.maximum(positions.min(axis=0), center - maxSize / 2),
+                              np.minimum(positions.max(axis=0), center + maxSize / 2))
+        return float(minimum[0]), float(minimum[1]), float(maximum[0]), float(maximum[1])
+
+    def Update(self, detectionBatch: DetectionBatch, timestamp: float):
+        """
+        Implementation of Update from IAnalytics.
+        Decays the cells around the objects to the timestamp and adds the kernels of the objects.
+        A frame without objects only advances the latest time, so the published heat keeps decaying.
+
+        Parameters
+        ----------
+        detectionBatch : DetectionBatch
+            The converted detections, with Rijksdriehoek coordinates
+        timestamp : float
+            The time in seconds at which the frame was read
+        """
+        if detectionBatch is None:
+            return
+        positions = np.column_stack((detectionBatch.rijksdriehoekX, detectionBatch.rijksdriehoekY))
+        positions = positions[np.isfinite(positions).all(axis=1)]
+        cells = np.floor((positions - (self.minX, self.minY)) / self.cellSize).astype(np.int64)
+
+        with self._lock:
+            self._latestTime = timestamp if self._latestTime is None else max(self._latestTime, timestamp)
+            (height, width) = self._heat.shape
+
+            # Every cell of every kernel, the cells outside the grid are left out
+            kernelCells = cells[:, np.newaxis, :] + self._kernelOffsets[np.newaxis]
+            weights = np.broadcast_to(self._kernelWeights, kernelCells.shape[:2])
+            inside = (kernelCells[..., 0] >= 0) & (kernelCells[..., 0] < width) & \
+                     (kernelCells[..., 1] >= 0) & (kernelCells[..., 1] < height)
+            indices = kernelCells[inside][:, 1] * width + kernelCells[inside][:, 0]
+            if len(indices) == 0:
+                return
+
+            # Decay the touched cells to the current time, the other cells keep their old time
+            touched = np.unique(indices)
+            heat = self._heat.reshape(-1)
+            updateTimes = self._updateTimes.reshape(-1)
+            heat[touched] *= np.exp(-self._decayRate * np.maximum(timestamp - updateTimes[touched], 0))
+            updateTimes[touched] = np.maximum(updateTimes[touched], timestamp)
+            np.add.at(heat, indices, weights[inside])
+
+    def GetHeat(self, timestamp: float = None) -> np.ndarray:
+        """
+        The heat of all cells decayed to a time, the grid itself is not changed.
+
+        Parameters
+        ----------
+        timestamp : float|None
+            The time in seconds, the latest update by default
+
+        Returns
+        -------
+        np.ndarray
+            (height, width) array with the heat of every cell, row 0 is the bottom (minimum y) of the grid
+        """
+        with self._lock:
+            if timestamp is None:
+                timestamp = self._latestTime if self._latestTime is not None else 0
+            return self._heat * np.exp(-self._decayRate * np.maximum(timestamp - self._updateTimes, 0))
+
+    def GetResults(self) -> Dict[str, Any]:
+        """
+        Implementation of GetResults from IAnalytics.
+
+        Returns
+        -------
+        Dict[str, Any]
+            The grid (bottom left corner, cell size and number of cells) and the heat as a base64 encoded
+            8 bit grayscale PNG with north up, scaled so the value 255 is the maximum heat
+        """
+        heat = self.GetHeat()
+        maximum = float(heat.max())
+        image = np.zeros(heat.shape, dtype=np.uint8) if maximum <= 0 else \
+            np.round(heat[::-1] * (255 / maximum)).astype(np.uint8)
+        (_, png) = cv2.imencode('.png', image)
+        return {
+            "minX": self.minX,
+            "minY": self.minY,
+            "cellSize": self.cellSize,
+            "width": heat.shape[1],
+            "height": heat.shape[0],
+            "maximum": maximum,
+            "png": base64.b64encode(png.tobytes()).decode('ascii')
+        }
+
+    @staticmethod
+    def AddHeatmapArguments(parser: argparse.ArgumentParser):  # pragma: no cover
+        """
+        Adds the arguments for the heatmap to the parser.
+
+        Parameters
+        ----------
+        parser : argparse.ArgumentParser
+            The parser that is used to add the arguments.
+        """
+
+        if parser is None:
+            raise TypeError("Parser is none.")
+
+        parser.add_argument("-hm", "--heatmap", action="store_true", default=False,
+                            help="Publish a crowd density heatmap of the calibrated area.")
+        parser.add_argument("-hmc", "--heatmapCellSize", type=float, default=0.5,
+                            help="The size in meters of the cells of the heatmap.")
+        parser.add_argument("-hmh", "--heatmapHalfLife", type=float, default=60.0,
+                            help="The number of seconds after which the heat of the heatmap is halved.")
+        parser.add_argument("-hmi", "--heatmapInterval", type=float, default=10.0,
+                            help="The number of seconds between the publications of the heatmap.")
+
+    @staticmethod
+    def ValidateHeatmapArguments(arguments: Dict[str, Any]):
+        """
+        Validate the parsed arguments.
+
+        Parameters
+        ----------
+        arguments : Dict[str, Any]
+            The arguments that are validated
+        """
+
+        if arguments is None or not arguments:
+            raise TypeError("Arguments are empty or None.")
+        for name in ["heatmapCellSize", "heatmapHalfLife", "heatmapInterval"]:
+            if not isinstance(arguments[name], (int, float)) or arguments[name] <= 0:
+                raise ValueError(f"{name} must be a positive number.")
@@ -0,0 +1,83 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+"""
+Interface for the analytics of the MainPositioner.
+"""
+
+from typing import Any, Dict
+
+from API.APIController import APIController
+from FrameAnalyzer.DetectionBatch import DetectionBatch
+
+
+class IAnalytics:
+    """
+    The interface for analytics that are updated with the converted positions of every frame
+    and whose results are published on their own API channel every publishInterval seconds.
+    """
+    channel: str = 'analytics'
+    """The API channel the results are published on"""
+    publishInterval: float = 1.0
+    """The number of seconds between the publications of the results"""
+
+    def __init__(self, publishInterval: float = 1.0):
+        """
+        Constructor of the analytics.
+
+        Parameters
+        ----------
+        publishInterval : float
+            The number of seconds between the publications of the results
+        """
+        if publishInterval <= 0:
+            raise ValueError("The publish interval must be positive.")
+        self.publishInterval = publishInterval
+        self._publishedTime = None
+
+    def Update(self, detectionBatch: DetectionBatch, timestamp: float):
+        """
+        Updates the analytics with the converted detections of a frame.
+
+        Parameters
+        ----------
+        detectionBatch : DetectionBatch
+            The converted detections, with Rijksdriehoek coordinates
+        timestamp : float
+            The time in seconds at which the frame was read
+        """
+        pass
+
+    def GetResults(self) -> Dict[str, Any]:
+        """
+        Returns
+        -------
+        Dict[str, Any]
+            The current results, they must be serializable to JSON
+        """
+        return {}
+
+    def Publish(self, api: APIController, timestamp: float) -> bool:
+        """
+        Sends the results on the channel of the analytics when publishInterval seconds have passed
+        since the previous publication.
+
+        Parameters
+        ----------
+        api : APIController
+            The API the results are sent through
+        timestamp : float
+            The time in seconds of the latest frame
+
+        Returns
+        -------
+        bool
+            Whether the results were sent
+        """
+        if self._publishedTime is not None and timestamp - self._publishedTime < self.publishInterval:
+            return False
+        self._publishedTime = timestamp
+        if api is not None:
+            api.SendChannel(self.channel, self.GetResults())
+        return True
@@ -0,0 +1,483 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+"""
+Long-term occupancy history of the total, the zones and the cells of a grid, rolled up into time buckets.
+"""
+
+import argparse
+import json
+import math
+import os
+import pathlib
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from FrameAnalyzer.DetectionBatch import DetectionBatch
+from Positioner.Analytics.IAnalytics import IAnalytics
+
+
+class RollupStore(IAnalytics):
+    """
+    Aggregates the number of objects of every frame into buckets of 1 second, 1 minute and 1 hour for a fixed set
+    of series: the total, every zone and every cell of a grid in Rijksdriehoek coordinates.
+    A bucket holds the number of frames, the summed counts and the peak counts, so the average occupancy of any
+    range is the summed counts divided by the frames. Every resolution is a ring of preallocated rows addressed by
+    bucket number, so the rows of old buckets are reused and the history of a resolution is its capacity times
+    its bucket size.
+
+    Only the positioner thread writes. Queries don't lock: a row is invalidated before it is reused and the rows
+    whose bucket changed while they were copied are left out, the open bucket can be a frame ahead.
+    Finished buckets are appended to a file, which is compacted to the buckets still in the rings every
+    compactInterval seconds and replayed when the store is created.
+    """
+    channel: str = 'occupancy'
+
+    RESOLUTIONS = (1, 60, 3600)
+    """The bucket sizes in seconds, from fine to coarse"""
+    MAX_CELLS = 1024
+    """The maximum number of grid cells, a larger area gets larger cells"""
+    FORMAT_VERSION = 1
+
+    series: tuple = ()
+    """The names of the series: 'total', 'zone:<id>' and 'cell:<x>,<y>' with the corner of the cell"""
+    capacities: tuple = ()
+    """The number of buckets every resolution keeps"""
+    cellSize: float = 10.0
+    """The size of the grid cells in meters"""
+    path: pathlib.Path = None
+    """The file the buckets are appended to, None to keep them in memory only"""
+    compactInterval: float = 3600.0
+    """The number of seconds between the compactions of the file"""
+
+    def __init__(self, zoneIds: Sequence[str] = (), bounds: (float, float, float, float) = None,
+                 cellSize: float = 10.0, path: pathlib.Path = None, capacities: Sequence[int] = (900, 1440, 1344),
+                 compactInterval: float = 3600.0, publishInterval: float = 60.0):
+        """
+        Constructor of the store, the rings are allocated and the file is replayed here.
+
+        Parameters
+        ----------
+        zoneIds : [str]
+            The zones that get a series, positions in other zones are only counted in the total
+        bounds : (float, float, float, float)|None
+            The minimum x, minimum y, maximum x and maximum y Rijksdriehoek coordinates of the grid, None for no grid
+        cellSize : float
+            The minimum size of the grid cells in meters
+        path : pathlib.Path|None
+            The file the buckets are appended to, None to keep them in memory only
+        capacities : [int]
+            The number of buckets of every resolution, by default 15 minutes, 1 day and 8 weeks
+        compactInterval : float
+            The number of seconds between the compactions of the file
+        publishInterval : float
+            The number of seconds between the publications of the occupancy
+        """
+        super().__init__(publishInterval)
+        if len(capacities) != len(RollupStore.RESOLUTIONS) or min(capacities) < 1:
+            raise ValueError("Every resolution needs a positive capacity.")
+        if cellSize <= 0 or compactInterval <= 0:
+            raise ValueError("The cell size and compact interval must be positive.")
+
+        self.zoneIds = tuple(dict.fromkeys(zoneIds))
+        self.capacities = tuple(int(capacity) for capacity in capacities)
+        self.compactInterval = compactInterval
+        self.path = None if path is None else pathlib.Path(path)
+
+        # The grid, cells are made larger when the bounds need more than MAX_CELLS cells
+        self.cellSize = cellSize
+        self._gridShape = (0, 0)
+        self._gridOrigin = (0.0, 0.0)
+        cellNames = []
+        if bounds is not None:
+            (minX, minY, maxX, maxY) = bounds
+            self.cellSize = max(cellSize, math.sqrt((maxX - minX) * (maxY - minY) / RollupStore.MAX_CELLS))
+            self._gridShape = (max(1, math.ceil((maxY - minY) / self.cellSize)),
+                               max(1, math.ceil((maxX - minX) / self.cellSize)))
+            self._gridOrigin = (minX, minY)
+            cellNames = [f"cell:{minX + column * self.cellSize:.2f},{minY + row * self.cellSize:.2f}"
+                         for row in range(self._gridShape[0]) for column in range(self._gridShape[1])]
+        self.series = ('total',) + tuple(f"zone:{zoneId}" for zoneId in self.zoneIds) + tuple(cellNames)
+        self._seriesNumbers = {name: number for number, name in enumerate(self.series)}
+        self._zoneColumns = {}
+
+        seriesCount = len(self.series)
+        self._buckets = [np.full(capacity, -1, dtype=np.int64) for capacity in self.capacities]
+        self._frames = [np.zeros(capacity, dtype=np.uint32) for capacity in self.capacities]
+        self._sums = [np.zeros((capacity, seriesCount), dtype=np.float32) for capacity in self.capacities]
+        self._peaks = [np.zeros((capacity, seriesCount), dtype=np.uint16) for capacity in self.capacities]
+        self._current = [-1] * len(self.capacities)
+        self._latestTime = None
+        self._compactedTime = None
+
+        self._recordType = np.dtype([('level', '<u1'), ('bucket', '<i8'), ('frames', '<u4'),
+                                     ('sums', '<f4', (seriesCount,)), ('peaks', '<u2', (seriesCount,))])
+        self._file = None
+        if self.path is not None:
+            self._Load()
+            self._Compact()
+
+    def Update(self, detectionBatch: DetectionBatch, timestamp: float):
+        """
+        Implementation of Update from IAnalytics.
+        Adds the counts of the frame to the open bucket of every resolution.
+
+        Parameters
+        ----------
+        detectionBatch : DetectionBatch
+            The converted detections, with Rijksdriehoek coordinates and zones
+        timestamp : float
+            The epoch time in seconds at which the frame was read
+        """
+        if detectionBatch is None:
+            return
+        counts = self.Count(detectionBatch)
+        self._latestTime = timestamp if self._latestTime is None else max(self._latestTime, timestamp)
+
+        for level, size in enumerate(RollupStore.RESOLUTIONS):
+            bucket = int(timestamp // size)
+            slot = bucket % self.capacities[level]
+            if bucket > self._current[level]:
+                self._Append(level, self._current[level])
+                self._current[level] = bucket
+                self._Reset(level, slot, bucket)
+            elif self._buckets[level][slot] != bucket:
+                # The bucket of a late frame has been reused already
+                continue
+            self._sums[level][slot] += counts
+            np.maximum(self._peaks[level][slot], counts, out=self._peaks[level][slot])
+            self._frames[level][slot] += 1
+
+        if self._compactedTime is None:
+            self._compactedTime = timestamp
+        elif self._file is not None and timestamp - self._compactedTime >= self.compactInterval:
+            self._Compact()
+            self._compactedTime = timestamp
+
+    def Count(self, detectionBatch: DetectionBatch) -> np.ndarray:
+        """
+        The number of objects of every series in a frame.
+
+        Parameters
+        ----------
+        detectionBatch : DetectionBatch
+            The converted detections, with Rijksdriehoek coordinates and zones
+
+        Returns
+        -------
+        np.ndarray
+            The count of every series
+        """
+        counts = np.zeros(len(self.series), dtype=np.uint16)
+        counts[0] = min(len(detectionBatch), np.iinfo(np.uint16).max)
+
+        if len(self.zoneIds) > 0 and len(detectionBatch.zoneIds) > 0:
+            if detectionBatch.zoneIds not in self._zoneColumns:
+                self._zoneColumns[detectionBatch.zoneIds] = [
+                    (number, self._seriesNumbers[f"zone:{zoneId}"]) for number, zoneId in
+                    enumerate(detectionBatch.zoneIds) if f"zone:{zoneId}" in self._seriesNumbers]
+            columns = self._zoneColumns[detectionBatch.zoneIds]
+            if columns:
+                (batchColumns, seriesColumns) = zip(*columns)
+                counts[list(seriesColumns)] = detectionBatch.zoneMembership[:, list(batchColumns)].sum(axis=0)
+
+        (rows, columns) = self._gridShape
+        if rows > 0:
+            cells = np.floor((np.column_stack((detectionBatch.rijksdriehoekX, detectionBatch.rijksdriehoekY)) -
+                              self._gridOrigin) / self.cellSize)
+            inside = np.isfinite(cells).all(axis=1)
+            cells = cells[inside].astype(np.int64)
+            inside = (cells[:, 0] >= 0) & (cells[:, 0] < columns) & (cells[:, 1] >= 0) & (cells[:, 1] < rows)
+            cells = cells[inside]
+            first = 1 + len(self.zoneIds)
+            counts[first:] = np.bincount(cells[:, 1] * columns + cells[:, 0], minlength=rows * columns)
+        return counts
+
+    def GetSeries(self, names: List[str], start: float, end: float, maxPoints: int = 500) -> Dict[str, Any]:
+        """
+        The buckets of some series in a time range, from the finest resolution that still keeps the start of the
+        range and needs at most maxPoints buckets, or else the coarsest resolution.
+
+        Parameters
+        ----------
+        names : [str]
+            The names of the series, unknown names are left out
+        start, end : float
+            The epoch times in seconds of the range
+        maxPoints : int
+            The maximum number of buckets
+
+        Returns
+        -------
+        Dict[str, Any]
+            The bucket size, the start time of every bucket with frames, and the average and peak count of
+            every series in those buckets
+        """
+        level = len(RollupStore.RESOLUTIONS) - 1
+        for candidate, size in enumerate(RollupStore.RESOLUTIONS):
+            if (end - start) / size <= maxPoints and self._Retains(candidate, start):
+                level = candidate
+                break
+        size = RollupStore.RESOLUTIONS[level]
+        columns = [self._seriesNumbers[name] for name in names if name in self._seriesNumbers]
+
+        (buckets, frames, sums, peaks) = self._Read(level, int(start // size), int(math.ceil(end / size)), columns)
+        order = np.argsort(buckets)
+        averages = sums[order] / np.maximum(frames[order], 1)[:, np.newaxis]
+        return {
+            "resolution": size,
+            "times": (buckets[order] * size).tolist(),
+            "average": {self.series[column]: averages[:, i].tolist() for i, column in enumerate(columns)},
+            "peak": {self.series[column]: peaks[order, i].tolist() for i, column in enumerate(columns)}
+        }
+
+    def Aggregate(self, names: List[str], start: float, end: float) -> Dict[str, Any]:
+        """
+        The average and peak count of some series over a time range. The range is split into the coarsest buckets
+        that fit in it, the remaining edges are answered by finer buckets, as long as those are still kept.
+
+        Parameters
+        ----------
+        names : [str]
+            The names of the series, unknown names are left out
+        start, end : float
+            The epoch times in seconds of the range
+
+        Returns
+        -------
+        Dict[str, Any]
+            The number of frames, and the average and peak count of every series
+        """
+        columns = [self._seriesNumbers[name] for name in names if name in self._seriesNumbers]
+        frames = 0
+        sums = np.zeros(len(columns))
+        peaks = np.zeros(len(columns), dtype=np.uint16)
+        for (level, first, last) in self._Pieces(start, end, len(RollupStore.RESOLUTIONS) - 1):
+            (_, pieceFrames, pieceSums, piecePeaks) = self._Read(level, first, last, columns)
+            frames += int(pieceFrames.sum())
+            sums += pieceSums.sum(axis=0)
+            peaks = np.maximum(peaks, piecePeaks.max(axis=0, initial=0))
+        return {
+            "frames": frames,
+            "average": {self.series[column]: float(sums[i] / frames) if frames > 0 else None
+                        for i, column in enumerate(columns)},
+            "peak": {self.series[column]: int(peaks[i]) for i, column in enumerate(columns)}
+        }
+
+    def GetResults(self) -> Dict[str, Any]:
+        """
+        Implementation of GetResults from IAnalytics.
+
+        Returns
+        -------
+        Dict[str, Any]
+            The average and peak count of the total and the zones since the previous publication
+        """
+        if self._latestTime is None:
+            return {"frames": 0, "average": {}, "peak": {}}
+        names = [name for name in self.series if not name.startswith('cell:')]
+        return self.Aggregate(names, self._latestTime - self.publishInterval, self._latestTime)
+
+    def GetMemoryUsage(self) -> int:
+        """
+        Returns
+        -------
+        int
+            The number of bytes of the rings
+        """
+        return sum(array.nbytes for arrays in (self._buckets, self._frames, self._sums, self._peaks)
+                   for array in arrays)
+
+    def Close(self):
+        """
+        Appends the open buckets and closes the file.
+        """
+        if self._file is None:
+            return
+        for level in range(len(RollupStore.RESOLUTIONS)):
+            self._Append(level, self._current[level])
+        self._file.close()
+        self._file = None
+
+    def _Reset(self, level: int, slot: int, bucket: int):
+        """
+        Reuses the row of a slot for a new bucket. The row is invalidated first, so readers skip it meanwhile.
+        """
+        self._buckets[level][slot] = -1
+        self._frames[level][slot] = 0
+        self._sums[level][slot] = 0
+        self._peaks[level][slot] = 0
+        self._buckets[level][slot] = bucket
+
+    def _Read(self, level: int, first: int, last: int, columns: List[int]) -> (np.ndarray, np.ndarray, np.ndarray,
+                                                                                np.ndarray):
+        """
+        Copies the kept buckets first up to last of a resolution, without the rows that were reused meanwhile.
+        """
+        capacity = self.capacities[level]
+        first = max(first, last - capacity)
+        wanted = np.arange(first, max(first, last), dtype=np.int64)
+        slots = wanted % capacity
+
+        buckets = self._buckets[level][slots]
+        frames = self._frames[level][slots]
+        sums = self._sums[level][slots][:, columns]
+        peaks = self._peaks[level][slots][:, columns]
+        valid = (buckets == wanted) & (self._buckets[level][slots] == wanted)
+        return buckets[valid], frames[valid], sums[valid].astype(np.float64), peaks[valid]
+
+    def _Retains(self, level: int, time: float) -> bool:
+        """
+        Whether a resolution still keeps the bucket of a time.
+        """
+        if self._current[level] < 0:
+            return True
+        return int(time // RollupStore.RESOLUTIONS[level]) > self._current[level] - self.capacities[level]
+
+    def _Pieces(self, start: float, end: float, level: int) -> List[tuple]:
+        """
+        Splits a range into the (level, first bucket, end bucket) of the coarsest full buckets and the finer pieces
+        of its edges. An edge the finer resolution doesn't keep anymore uses the partial coarse bucket.
+        """
+        if end <= start:
+            return []
+        size = RollupStore.RESOLUTIONS[level]
+        outer = (level, int(start // size), int(math.ceil(end / size)))
+        if level == 0:
+            return [outer]
+        (first, last) = (int(math.ceil(start / size)), int(end // size))
+        if first >= last:
+            return self._Pieces(start, end, level - 1) if self._Retains(level - 1, start) else [outer]
+
+        pieces = [(level, first, last)]
+        for (edgeStart, edgeEnd) in ((start, first * size), (last * size, end)):
+            if edgeEnd <= edgeStart:
+                continue
+            if self._Retains(level - 1, edgeStart):
+                pieces += self._Pieces(edgeStart, edgeEnd, level - 1)
+            else:
+                pieces.append((level, int(edgeStart // size), int(math.ceil(edgeEnd / size))))
+        return pieces
+
+    def _Append(self, level: int, bucket: int):
+        """
+        Appends a finished bucket to the file.
+        """
+        if self._file is None or bucket < 0:
+            return
+        slot = bucket % self.capacities[level]
+        if self._buckets[level][slot] != bucket:
+            return
+        record = np.zeros(1, dtype=self._recordType)
+        record[0] = (level, bucket, self._frames[level][slot], self._sums[level][slot], self._peaks[level][slot])
+        self._file.write(record.tobytes())
+        if level > 0:
+            self._file.flush()
+
+    def _Load(self):
+        """
+        Replays the buckets of the file into the rings, the series are matched by name.
+        A file with a different format, or a record that was cut off, is skipped.
+        """
+        if not self.path.is_file():
+            return
+        with open(self.path, 'rb') as file:
+            try:
+                header = json.loads(file.readline())
+            except ValueError:
+                return
+            if header.get('version') != RollupStore.FORMAT_VERSION or \
+                    header.get('resolutions') != list(RollupStore.RESOLUTIONS):
+                return
+            fileSeries = header['series']
+            recordType = np.dtype([('level', '<u1'), ('bucket', '<i8'), ('frames', '<u4'),
+                                   ('sums', '<f4', (len(fileSeries),)), ('peaks', '<u2', (len(fileSeries),))])
+            data = file.read()
+        records = np.frombuffer(data[:len(data) - len(data) % recordType.itemsize], dtype=recordType)
+
+        matches = [(number, self._seriesNumbers[name]) for number, name in enumerate(fileSeries)
+                   if name in self._seriesNumbers]
+        (fileColumns, columns) = (list(zip(*matches)) if matches else ([], []))
+        for level in range(len(RollupStore.RESOLUTIONS)):
+            levelRecords = records[records['level'] == level]
+            if len(levelRecords) == 0:
+                continue
+            # Only the newest buckets fit in the ring, a bucket that was appended twice keeps its latest record
+            latest = max(self._current[level], int(levelRecords['bucket'].max()))
+            levelRecords = levelRecords[levelRecords['bucket'] > latest - self.capacities[level]]
+            slots = levelRecords['bucket'] % self.capacities[level]
+            self._buckets[level][slots] = levelRecords['bucket']
+            self._frames[level][slots] = levelRecords['frames']
+            self._sums[level][slots] = 0
+            self._peaks[level][slots] = 0
+            self._sums[level][slots[:, np.newaxis], list(columns)] = levelRecords['sums'][:, list(fileColumns)]
+            self._peaks[level][slots[:, np.newaxis], list(columns)] = levelRecords['peaks'][:, list(fileColumns)]
+            self._current[level] = latest
+
+    def _Compact(self):
+        """
+        Rewrites the file with only the buckets that are still in the rings, the open buckets are appended again
+        when they are finished.
+        """
+        if self._file is not None:
+            self._file.close()
+        header = {"format": "rollup", "version": RollupStore.FORMAT_VERSION,
+                  "resolutions": list(RollupStore.RESOLUTIONS), "cellSize": self.cellSize, "series": self.series}
+
+        temporaryPath = self.path.with_name(self.path.name + '.tmp')
+        with open(temporaryPath, 'wb') as file:
+            file.write(json.dumps(header).encode('utf-8') + b'\n')
+            for level in range(len(RollupStore.RESOLUTIONS)):
+                kept = np.nonzero((self._buckets[level] >= 0) & (self._buckets[level] != self._current[level]))[0]
+                kept = kept[np.argsort(self._buckets[level][kept])]
+                records = np.zeros(len(kept), dtype=self._recordType)
+                records['level'] = level
+                records['bucket'] = self._buckets[level][kept]
+                records['frames'] = self._frames[level][kept]
+                records['sums'] = self._sums[level][kept]
+                records['peaks'] = self._peaks[level][kept]
+                file.write(records.tobytes())
+        os.replace(temporaryPath, self.path)
+        self._file = open(self.path, 'ab')
+
+    @staticmethod
+    def AddRollupStoreArguments(parser: argparse.ArgumentParser):  # pragma: no cover
+        """
+        Adds the arguments for the rollup store to the parser.
+
+        Parameters
+        ----------
+        parser : argparse.ArgumentParser
+            The parser that is used to add the arguments.
+        """
+
+        if parser is None:
+            raise TypeError("Parser is none.")
+
+        parser.add_argument("-rf", "--rollupFile", type=str, default="",
+                            help="The file the occupancy history of the total, the zones and a grid is kept in, "
+                                 "an empty string disables the history.")
+        parser.add_argument("-rc", "--rollupCellSize", type=float, default=10.0,
+                            help="The minimum size in meters of the grid cells of the occupancy history.")
+
+    @staticmethod
+    def ValidateRollupStoreArguments(arguments: Dict[str, Any]):
+        """
+        Validate the parsed arguments.
+
+        Parameters
+        ----------
+        arguments : Dict[str, Any]
+            The arguments that are validated
+        """
+
+        if arguments is None or not arguments:
+            raise TypeError("Arguments are empty or None.")
+        if not isinstance(arguments["rollupFile"], str):
+            raise ValueError("Rollup file must be a string.")
+        if arguments["rollupFile"] != "" and not pathlib.Path(arguments["rollupFile"]).parent.is_dir():
+            raise ValueError("The directory of the rollup file does not exist.")
+        if not isinstance(arguments["rollupCellSize"], (int, float)) or arguments["rollupCellSize"] <= 0:
+            raise ValueError("Rollup cell size must be a positive number.")
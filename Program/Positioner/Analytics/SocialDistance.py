@@ -0,0 +1,226 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+"""
+Social distance violations between the objects, found with a uniform grid in world meters.
+"""
+
+import argparse
+import threading
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+import numpy as np
+
+from FrameAnalyzer.DetectionBatch import DetectionBatch
+from Positioner.Analytics.IAnalytics import IAnalytics
+
+
+class SocialDistanceFrame(NamedTuple):
+    """The social distance results of a frame"""
+    objects: int
+    """The number of objects with a position"""
+    violations: List[list]
+    """The [id, id, distance] of every pair that is too close"""
+    couples: List[list]
+    """The [id, id] of every couple that is close"""
+
+
+class SocialDistance(IAnalytics):
+    """
+    Finds the pairs of objects that are closer than violationDistance meters to each other.
+    The positions are hashed into a grid with cells of violationDistance meters, so only the pairs in the same
+    or neighbouring cells are compared, which is O(n) for typical densities instead of comparing all pairs.
+    Pairs that stay close for coupleTime seconds are a couple (walking together) and no longer a violation.
+    The relation of a pair is forgotten when it is not close for relationTimeout seconds.
+    """
+    channel: str = 'socialDistance'
+
+    # Half of the 3x3 neighbourhood, every pair of neighbouring cells is visited once
+    _NEIGHBOUR_OFFSETS = [(0, 0), (1, -1), (1, 0), (1, 1), (0, 1)]
+
+    violationDistance: float = 1.5
+    """The minimum distance in meters between objects"""
+    coupleTime: float = 10.0
+    """The number of seconds after which a pair that stays close is a couple"""
+    relationTimeout: float = 2.0
+    """The number of seconds after which a pair that is not close anymore is forgotten"""
+
+    def __init__(self, violationDistance: float = 1.5, publishInterval: float = 1.0, coupleTime: float = 10.0,
+                 relationTimeout: float = 2.0):
+        """
+        Constructor of the social distance analytics.
+
+        Parameters
+        ----------
+        violationDistance : float
+            The minimum distance in meters between objects
+        publishInterval : float
+            The number of seconds between the publications of the violations
+        coupleTime : float
+            The number of seconds after which a pair that stays close is a couple
+        relationTimeout : float
+            The number of seconds after which a pair that is not close anymore is forgotten
+        """
+        super().__init__(publishInterval)
+        if violationDistance <= 0:
+            raise ValueError("The violation distance must be positive.")
+
+        self.violationDistance = violationDistance
+        self.coupleTime = coupleTime
+        self.relationTimeout = relationTimeout
+
+        self._relations: Dict[Tuple[int, int], Tuple[float, float]] = {}
+        """(id, id) -> (first time, last time) the pair was close"""
+        self._results = SocialDistanceFrame(0, [], [])
+        self._totalViolations = 0
+        self._lock = threading.Lock()
+
+    def Update(self, detectionBatch: DetectionBatch, timestamp: float):
+        """
+        Implementation of Update from IAnalytics.
+        Finds the close pairs of the frame and updates the relations of the pairs.
+
+        Parameters
+        ----------
+        detectionBatch : DetectionBatch
+            The converted detections, with Rijksdriehoek coordinates
+        timestamp : float
+            The time in seconds at which the frame was read
+        """
+        if detectionBatch is None:
+            return
+        positions = np.column_stack((detectionBatch.rijksdriehoekX, detectionBatch.rijksdriehoekY))
+        valid = np.isfinite(positions).all(axis=1)
+        (positions, ids) = (positions[valid], detectionBatch.id[valid])
+
+        (first, second, distances) = self.FindClosePairs(positions)
+        pairs = zip(np.minimum(ids[first], ids[second]).tolist(), np.maximum(ids[first], ids[second]).tolist(),
+                    distances.tolist())
+
+        with self._lock:
+            violations = []
+            couples = []
+            for (id1, id2, distance) in pairs:
+                # Objects without an id can't be followed, so they are never a couple
+                if id1 == DetectionBatch.NO_ID:
+                    violations.append([id1, id2, distance])
+                    continue
+                (firstTime, _) = self._relations.get((id1, id2), (timestamp, timestamp))
+                self._relations[(id1, id2)] = (firstTime, timestamp)
+                if timestamp - firstTime >= self.coupleTime:
+                    couples.append([id1, id2])
+                else:
+                    violations.append([id1, id2, distance])
+
+            endTime = timestamp - self.relationTimeout
+            self._relations = {pair: times for pair, times in self._relations.items() if times[1] >= endTime}
+            self._totalViolations += len(violations)
+            self._results = SocialDistanceFrame(len(positions), violations, couples)
+
+    def FindClosePairs(self, positions: np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray):
+        """
+        Finds all pairs of positions that are closer than violationDistance with the grid.
+
+        Parameters
+        ----------
+        positions : np.ndarray
+            (N, 2) array of positions in meters
+
+        Returns
+        -------
+        (np.ndarray, np.ndarray, np.ndarray)
+            The indices of the first and second position of every pair and their distance
+        """
+        if len(positions) < 2:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0)
+
+        cells = np.floor((positions - positions.min(axis=0)) / self.violationDistance).astype(np.int64)
+        rows = int(cells[:, 1].max()) + 3
+        keys = (cells[:, 0] + 1) * rows + cells[:, 1] + 1
+        order = np.argsort(keys, kind='stable')
+        sortedKeys = keys[order]
+
+        firsts = []
+        seconds = []
+        for (offsetX, offsetY) in SocialDistance._NEIGHBOUR_OFFSETS:
+            neighbourKeys = keys + offsetX * rows + offsetY
+            starts = np.searchsorted(sortedKeys, neighbourKeys, 'left')
+            counts = np.searchsorted(sortedKeys, neighbourKeys, 'right') - starts
+
+            # Every position paired with every position of the neighbouring cell
+            first = np.repeat(np.arange(len(positions)), counts)
+            within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            second = order[np.repeat(starts, counts) + within]
+            if offsetX == 0 and offsetY == 0:
+                keep = first < second
+                (first, second) = (first[keep], second[keep])
+            firsts.append(first)
+            seconds.append(second)
+
+        first = np.concatenate(firsts)
+        second = np.concatenate(seconds)
+        distances = np.linalg.norm(positions[first] - positions[second], axis=1)
+        close = distances < self.violationDistance
+        return first[close], second[close], distances[close]
+
+    def GetResults(self) -> Dict[str, Any]:
+        """
+        Implementation of GetResults from IAnalytics.
+
+        Returns
+        -------
+        Dict[str, Any]
+            The number of objects, the violating pairs with their distance and the couples of the latest frame,
+            and the total number of violations
+        """
+        with self._lock:
+            violators = {objectId for violation in self._results.violations for objectId in violation[:2]
+                         if objectId != DetectionBatch.NO_ID}
+            return {
+                "objects": self._results.objects,
+                "violations": self._results.violations,
+                "violators": len(violators),
+                "couples": self._results.couples,
+                "totalViolations": self._totalViolations,
+                "relations": len(self._relations)
+            }
+
+    @staticmethod
+    def AddSocialDistanceArguments(parser: argparse.ArgumentParser):  # pragma: no cover
+        """
+        Adds the arguments for the social distance analytics to the parser.
+
+        Parameters
+        ----------
+        parser : argparse.ArgumentParser
+            The parser that is used to add the arguments.
+        """
+
+        if parser is None:
+            raise TypeError("Parser is none.")
+
+        parser.add_argument("-sdm", "--socialDistance", type=float, default=0,
+                            help="The minimum distance in meters between people, "
+                                 "0 disables the social distance analytics.")
+        parser.add_argument("-sdi", "--socialDistanceInterval", type=float, default=1.0,
+                            help="The number of seconds between the publications of the social distance violations.")
+
+    @staticmethod
+    def ValidateSocialDistanceArguments(arguments: Dict[str, Any]):
+        """
+        Validate the parsed arguments.
+
+        Parameters
+        ----------
+        arguments : Dict[str, Any]
+            The arguments that are validated
+        """
+
+        if arguments is None or not arguments:
+            raise TypeError("Arguments are empty or None.")
+        if not isinstance(arguments["socialDistance"], (int, float)) or arguments["socialDistance"] < 0:
+            raise ValueError("Social distance must be a positive number or 0.")
+        if not isinstance(arguments["socialDistanceInterval"], (int, float)) or \
+                arguments["socialDistanceInterval"] <= 0:
+            raise ValueError("Social distance interval must be a positive number.")
@@ -0,0 +1,289 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+"""
+Line crossing and zone dwell counters over the tracked objects.
+"""
+
+import argparse
+import json
+import pathlib
+import threading
+from typing import Any, Dict, List, NamedTuple
+
+import numpy as np
+
+from FrameAnalyzer.DetectionBatch import DetectionBatch
+from Positioner.Analytics.IAnalytics import IAnalytics
+from Positioner.TrackSlots import TrackSlots
+from Positioner.ZoneIndex import ZoneIndex
+
+
+class CountLine(NamedTuple):
+    """A polyline the crossings of the objects are counted for"""
+    id: str
+    """The identifier of the line"""
+    points: np.ndarray
+    """(N, 2) array of the Rijksdriehoek coordinates of the line"""
+
+
+class TrackCounters(IAnalytics):
+    """
+    Counts the objects that cross each line, from the segment between the previous and the current position
+    of every track, and the occupancy and dwell time of each zone, from the zones the positions are tagged with.
+    A frame is evaluated for all tracks and line segments at once.
+    A crossing is forward when the object moves from the right to the left side of the line, seen along the line.
+    """
+    channel: str = 'counters'
+
+    lineIds: tuple = ()
+    """The distinct identifiers of the lines"""
+    zoneIds: tuple = ()
+    """The identifiers of the zones of the latest frame"""
+
+    def __init__(self, lines: List[CountLine], publishInterval: float = 5.0, maxTracks: int = 256,
+                 trackTimeout: float = 2.0):
+        """
+        Constructor of the counters.
+
+        Parameters
+        ----------
+        lines : [CountLine]
+            The lines the crossings are counted for
+        publishInterval : float
+            The number of seconds between the publications of the counters
+        maxTracks : int
+            The maximum number of tracks
+        trackTimeout : float
+            The number of seconds after which a track that is not seen anymore has left
+        """
+        super().__init__(publishInterval)
+
+        self.lineIds = tuple(dict.fromkeys(line.id for line in lines))
+        lineNumbers = {lineId: number for number, lineId in enumerate(self.lineIds)}
+        segments = [(points[:-1], points[1:], lineNumbers[line.id])
+                    for line in lines for points in [np.asarray(line.points, dtype=np.float64)] if len(points) > 1]
+        self._segmentStarts = np.concatenate([start for start, _, _ in segments]) if segments else np.empty((0, 2))
+        self._segmentEnds = np.concatenate([end for _, end, _ in segments]) if segments else np.empty((0, 2))
+        self._segmentLines = np.concatenate([np.full(len(start), number) for start, _, number in segments]) \
+            if segments else np.empty(0, dtype=int)
+        self._forward = np.zeros(len(self.lineIds), dtype=np.int64)
+        self._backward = np.zeros(len(self.lineIds), dtype=np.int64)
+
+        self._trackSlots = TrackSlots(maxTracks, trackTimeout)
+        self._positions = np.full((maxTracks, 2), np.nan)
+        self._lastSeen = np.zeros(maxTracks)
+        self._SetZones(())
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def LoadLines(path: pathlib.Path) -> List[CountLine]:
+        """
+        Loads the lines of a GeoJSON file with LineString or MultiLineString features, the other features are
+        skipped. The id and coordinates are read the way ZoneIndex.LoadZones does.
+
+        Parameters
+        ----------
+        path : pathlib.Path
+            The GeoJSON file
+
+        Returns
+        -------
+        [CountLine]
+            The lines, a MultiLineString is a line per part with the same id
+        """
+        with open(path, 'r') as file:
+            collection = json.load(file)
+
+        lines = []
+        for number, feature in enumerate(collection.get('features', [])):
+            properties = feature.get('properties') or {}
+            lineId = str(properties.get('id', feature.get('id', number)))
+            geometry = feature['geometry']
+            if geometry['type'] == 'LineString':
+                parts = [geometry['coordinates']]
+            elif geometry['type'] == 'MultiLineString':
+                parts = geometry['coordinates']
+            else:
+                continue
+            lines.extend(CountLine(lineId, ZoneIndex.ToRijksdriehoek(part, properties)) for part in parts)
+        return lines
+
+    def Update(self, detectionBatch: DetectionBatch, timestamp: float):
+        """
+        Implementation of Update from IAnalytics.
+        Counts the line crossings of the tracks that moved and the zones they entered or left.
+        Every frame, also one without tracks, finishes the visits of the tracks that are not seen anymore.
+
+        Parameters
+        ----------
+        detectionBatch : DetectionBatch
+            The converted detections, with Rijksdriehoek coordinates and zones
+        timestamp : float
+            The time in seconds at which the frame was read
+        """
+        if detectionBatch is None:
+            return
+
+        (ids, indices) = TrackSlots.UniqueIds(detectionBatch)
+        positions = np.column_stack((detectionBatch.rijksdriehoekX[indices],
+                                     detectionBatch.rijksdriehoekY[indices]))
+        valid = np.isfinite(positions).all(axis=1)
+        (ids, indices, positions) = (ids[valid][:self._trackSlots.maxTracks],
+                                     indices[valid][:self._trackSlots.maxTracks],
+                                     positions[valid][:self._trackSlots.maxTracks])
+
+        with self._lock:
+            # A batch without detections does not know the zones
+            if len(detectionBatch) > 0 and detectionBatch.zoneIds != self.zoneIds:
+                self._SetZones(detectionBatch.zoneIds)
+
+            # Tracks that are not seen anymore leave their zones at the time they were last seen
+            expired = self._trackSlots.Expire(timestamp)
+            self._CloseVisits(expired, self._lastSeen[expired])
+            if len(ids) == 0:
+                return
+
+            (slots, isNew) = self._trackSlots.Assign(ids)
+            newSlots = slots[isNew]
+            self._CloseVisits(newSlots, self._lastSeen[newSlots])
+            self._positions[newSlots] = np.nan
+
+            self._CountCrossings(self._positions[slots], positions)
+            self._UpdateZones(slots, detectionBatch.zoneMembership[indices], timestamp)
+
+            self._positions[slots] = positions
+            self._lastSeen[slots] = timestamp
+            self._trackSlots.lastTimes[slots] = timestamp
+
+    def GetResults(self) -> Dict[str, Any]:
+        """
+        Implementation of GetResults from IAnalytics.
+
+        Returns
+        -------
+        Dict[str, Any]
+            The forward and backward crossings of every line, and the occupancy, number of finished visits,
+            average dwell time of the finished visits and average dwell time of the current visitors of every zone
+        """
+        with self._lock:
+            live = self._trackSlots.ids != DetectionBatch.NO_ID
+            latestTime = self._trackSlots.latestTime
+            lines = {lineId: {"forward": int(forward), "backward": int(backward)}
+                     for lineId, forward, backward in zip(self.lineIds, self._forward, self._backward)}
+
+            zones = {}
+            for number, zoneId in enumerate(self.zoneIds):
+                inside = live & self._inside[:, number]
+                visits = int(self._visits[number])
+                zones[zoneId] = {
+                    "occupancy": int(inside.sum()),
+                    "visits": visits,
+                    "averageDwell": float(self._dwellTimes[number] / visits) if visits > 0 else None,
+                    "currentDwell": float(np.mean(latestTime - self._enterTimes[inside, number]))
+                    if inside.any() else None
+                }
+            return {"lines": lines, "zones": zones}
+
+    def _CountCrossings(self, previous: np.ndarray, current: np.ndarray):
+        """
+        Counts the line crossings of the segments from the previous to the current positions, the segments of
+        all tracks are intersected with all line segments at once. A track crosses a line at most once a frame.
+        """
+        moved = np.isfinite(previous).all(axis=1) & (previous != current).any(axis=1)
+        if len(self._segmentLines) == 0 or not moved.any():
+            return
+        (starts, movements) = (previous[moved, np.newaxis, :], (current - previous)[moved, np.newaxis, :])
+        directions = (self._segmentEnds - self._segmentStarts)[np.newaxis]
+
+        def Cross(a, b):
+            return a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+
+        # Solve start + t * movement = segmentStart + u * direction for every pair of track and line segment
+        denominators = Cross(movements, directions)
+        offsets = self._segmentStarts[np.newaxis] - starts
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = Cross(offsets, directions) / denominators
+            u = Cross(offsets, movements) / denominators
+        # A position exactly on the line belongs to the frame that reached it, so it is not counted twice
+        crossed = (denominators != 0) & (t > 0) & (t <= 1) & (u >= 0) & (u <= 1)
+
+        for number in range(len(self.lineIds)):
+            segments = self._segmentLines == number
+            lineCrossed = crossed[:, segments]
+            forward = (lineCrossed & (denominators[:, segments] < 0)).any(axis=1)
+            backward = (lineCrossed & (denominators[:, segments] > 0)).any(axis=1)
+            self._forward[number] += int(forward.sum())
+            self._backward[number] += int(backward.sum())
+
+    def _UpdateZones(self, slots: np.ndarray, inside: np.ndarray, timestamp: float):
+        """
+        Starts the visits of the zones the tracks entered and finishes the visits of the zones they left.
+        """
+        wasInside = self._inside[slots]
+        entered = inside & ~wasInside
+        left = wasInside & ~inside
+
+        enterTimes = self._enterTimes[slots]
+        self._visits += left.sum(axis=0)
+        self._dwellTimes += np.where(left, timestamp - enterTimes, 0).sum(axis=0)
+        enterTimes[entered] = timestamp
+        enterTimes[left] = np.nan
+        self._enterTimes[slots] = enterTimes
+        self._inside[slots] = inside
+
+    def _CloseVisits(self, slots: np.ndarray, endTimes: np.ndarray):
+        """
+        Finishes all visits of the tracks in the slots at the end times.
+        """
+        inside = self._inside[slots]
+        self._visits += inside.sum(axis=0)
+        self._dwellTimes += np.where(inside, endTimes[:, np.newaxis] - self._enterTimes[slots], 0).sum(axis=0)
+        self._inside[slots] = False
+        self._enterTimes[slots] = np.nan
+
+    def _SetZones(self, zoneIds: tuple):
+        """
+        Starts counting for other zones, the counters of the previous zones are dropped.
+        """
+        maxTracks = self._trackSlots.maxTracks
+        self.zoneIds = tuple(zoneIds)
+        self._inside = np.zeros((maxTracks, len(self.zoneIds)), dtype=bool)
+        self._enterTimes = np.full((maxTracks, len(self.zoneIds)), np.nan)
+        self._visits = np.zeros(len(self.zoneIds), dtype=np.int64)
+        self._dwellTimes = np.zeros(len(self.zoneIds))
+
+    @staticmethod
+    def AddTrackCountersArguments(parser: argparse.ArgumentParser):  # pragma: no cover
+        """
+        Adds the arguments for the counters to the parser.
+
+        Parameters
+        ----------
+        parser : argparse.ArgumentParser
+            The parser that is used to add the arguments.
+        """
+
+        if parser is None:
+            raise TypeError("Parser is none.")
+
+        parser.add_argument("-ci", "--counterInterval", type=float, default=5.0,
+                            help="The number of seconds between the publications of the line and zone counters, "
+                                 "the lines are the LineString features of the zone file.")
+
+    @staticmethod
+    def ValidateTrackCountersArguments(arguments: Dict[str, Any]):
+        """
+        Validate the parsed arguments.
+
+        Parameters
+        ----------
+        arguments : Dict[str, Any]
+            The arguments that are validated
+        """
+
+        if arguments is None or not arguments:
+            raise TypeError("Arguments are empty or None.")
+        if not isinstance(arguments["counterInterval"], (int, float)) or arguments["counterInterval"] <= 0:
+            raise ValueError("Counter interval must be a positive number.")
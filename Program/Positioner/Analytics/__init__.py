@@ -0,0 +1,7 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+"""
+Analytics that are calculated from the converted positions and published through the API on their own channel.
+"""
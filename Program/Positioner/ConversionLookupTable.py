@@ -0,0 +1,182 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+"""
+A precomputed pixel to world lookup table, used by convertors to convert positions with a few memory reads.
+"""
+
+import os
+import pathlib
+from typing import Callable, Optional
+
+import numpy as np
+
+
+class ConversionLookupTable:
+    """
+    Holds the world position and single pixel error of every pixel of the analyze resolution.
+    The table is stored as a .npy file, which is memory-mapped when it is loaded again.
+    """
+
+    LATITUDE = 0
+    """Column of the latitude in WGS-84 degrees"""
+    LONGITUDE = 1
+    """Column of the longitude in WGS-84 degrees"""
+    RIJKSDRIEHOEK_X = 2
+    """Column of the x coordinate in Rijksdriehoek coordinates"""
+    RIJKSDRIEHOEK_Y = 3
+    """Column of the y coordinate in Rijksdriehoek coordinates"""
+    SINGLE_PIXEL_ERROR = 4
+    """Column of the single pixel error in meters"""
+    COLUMNS = 5
+    """The number of columns per pixel"""
+
+    BUILD_ROWS = 64
+    """The number of pixel rows converted at once when building the table"""
+
+    table: np.ndarray = None
+    key: str = None
+
+    def __init__(self, table: np.ndarray, key: str):
+        """
+        Constructor of the lookup table.
+
+        Parameters
+        ----------
+        table : np.ndarray
+            (height, width, COLUMNS) array with the values of every pixel
+        key : str
+            The key of the configuration the table was built for
+        """
+        self.table = table
+        self.key = key
+
+    @staticmethod
+    def Load(path: Optional[pathlib.Path], key: str, resolution: (int, int),
+             build: Callable[[np.ndarray], np.ndarray]):
+        """
+        Loads the lookup table from the given path, or builds and stores it if there is no table for this key yet.
+        Tables of other keys next to the given path are removed, as their configuration has changed.
+
+        Parameters
+        ----------
+        path : pathlib.Path|None
+            The path of the table, when None the table is only kept in memory
+        key : str
+            The key of the configuration the table belongs to
+        resolution : (int, int)
+            The width and height of the analyze resolution
+        build : Callable[[np.ndarray], np.ndarray]
+            Converts an (N, 2) array of x and y pixel positions to an (N, COLUMNS) array of values
+
+        Returns
+        -------
+        ConversionLookupTable
+            The loaded or newly built lookup table
+        """
+        (width, height) = (int(resolution[0]), int(resolution[1]))
+        if width < 2 or height < 2:
+            raise ValueError(f"Resolution {width}x{height} is too small for a lookup table.")
+        shape = (height, width, ConversionLookupTable.COLUMNS)
+
+        # Use the stored table if it is still valid
+        if path is not None and path.exists():
+            table = np.load(path, mmap_mode='r')
+            if table.shape == shape and table.dtype == np.float64:
+                return ConversionLookupTable(table, key)
+
+        # Build the table, directly in the file if there is one
+        if path is None:
+            table = np.empty(shape, dtype=np.float64)
+        else:
+            ConversionLookupTable._RemoveStaleTables(path, key)
+            temporaryPath = path.with_name(path.name + '.tmp')
+            table = np.lib.format.open_memmap(temporaryPath, mode='w+', dtype=np.float64, shape=shape)
+
+        xs = np.arange(width, dtype=np.float64)
+        for row in range(0, height, ConversionLookupTable.BUILD_ROWS):
+            ys = np.arange(row, min(row + ConversionLookupTable.BUILD_ROWS, height), dtype=np.float64)
+            (gridX, gridY) = np.meshgrid(xs, ys)
+            pixelPositions = np.column_stack((gridX.ravel(), gridY.ravel()))
+            table[row:row + len(ys)] = build(pixelPositions).reshape(len(ys), width, ConversionLookupTable.COLUMNS)
+
+        if path is None:
+            return ConversionLookupTable(table, key)
+
+        # Only replace the file once it is complete, then memory-map it
+        table.flush()
+        del table
+        os.replace(temporaryPath, path)
+        return ConversionLookupTable(np.load(path, mmap_mode='r'), key)
+
+    @staticmethod
+    def _RemoveStaleTables(path: pathlib.Path, key: str):
+        """
+        Removes the tables of other keys that belong to the same configuration.
+
+        Parameters
+        ----------
+        path : pathlib.Path
+            The path of the table of the current key
+        key : str
+            The current key
+        """
+        prefix = path.name[:path.name.rindex(key)]
+        for stalePath in path.parent.glob(prefix + '*.lut.npy*'):
+            if stalePath.name[len(prefix):].startswith(key):
+                continue
+            try:
+                stalePath.unlink()
+            except OSError:  # pragma: no cover
+                pass
+
+    def Contains(self, pixelPositions: np.ndarray) -> np.ndarray:
+        """
+        Checks which pixel positions lie within the table.
+
+        Parameters
+        ----------
+        pixelPositions : np.ndarray
+            (N, 2) array of x and y pixel positions
+
+        Returns
+        -------
+        np.ndarray
+            Boolean mask of the positions that can be looked up
+        """
+        (height, width) = self.table.shape[:2]
+        x = pixelPositions[:, 0]
+        y = pixelPositions[:, 1]
+        return (x >= 0) & (x <= width - 1) & (y >= 0) & (y <= height - 1)
+
+    def Lookup(self, pixelPositions: np.ndarray, columns=slice(None)) -> np.ndarray:
+        """
+        Looks up the values of the given pixel positions, with bilinear interpolation between the pixels.
+        All positions should lie within the table, see Contains.
+
+        Parameters
+        ----------
+        pixelPositions : np.ndarray
+            (N, 2) array of x and y pixel positions
+        columns : slice|int
+            The columns to look up, all columns by default
+
+        Returns
+        -------
+        np.ndarray
+            (N, C) array with the looked up columns, or (N,) when a single column is given
+        """
+        (height, width) = self.table.shape[:2]
+        x = pixelPositions[:, 0]
+        y = pixelPositions[:, 1]
+
+        # top left pixel of the 2x2 neighbourhood and the weights within it
+        x0 = np.clip(np.floor(x).astype(np.intp), 0, width - 2)
+        y0 = np.clip(np.floor(y).astype(np.intp), 0, height - 2)
+        fx = (x - x0)[:, np.newaxis]
+        fy = (y - y0)[:, np.newaxis]
+
+        topRow = self.table[y0, x0] * (1 - fx) + self.table[y0, x0 + 1] * fx
+        bottomRow = self.table[y0 + 1, x0] * (1 - fx) + self.table[y0 + 1, x0 + 1] * fx
+        return (topRow * (1 - fy) + bottomRow * fy)[:, columns]
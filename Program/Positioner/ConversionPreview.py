@@ -0,0 +1,152 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+"""
+Preview of the converted positions on the top-down image, rendered on its own thread.
+"""
+
+import threading
+
+import cv2
+import numpy as np
+import pygame
+
+from Windowing.Sub.CameraSubWindow import CameraSubWindow
+
+
+class ConversionPreview:
+    """
+    Draws the latest converted positions on the top-down image and shows it in a CameraSubWindow,
+    at most maxRate times per second. The convertor only publishes the positions, all drawing and
+    the conversion to a pygame surface happen on the preview thread.
+    """
+    CIRCLE_RADIUS = 5
+    """The radius of the circle drawn at every position, in pixels"""
+    CIRCLE_COLOR = (255, 50, 50)
+    """The color of the circles, in RGB"""
+
+    cameraWindow: CameraSubWindow = None
+    maxRate: float = 10
+    renderedFrames: int = 0
+    """The number of previews that were shown"""
+    publishedFrames: int = 0
+    """The number of times positions were published"""
+
+    def __init__(self, cameraWindow: CameraSubWindow, baseImage: np.ndarray, maxRate: float = 10):
+        """
+        Constructor of the preview, the preview thread is started with Start.
+
+        Parameters
+        ----------
+        cameraWindow : CameraSubWindow
+            The window the preview is shown in
+        baseImage : np.ndarray
+            The top-down image in OpenCV (BGR) format, it is converted once and kept
+        maxRate : float
+            The maximum number of previews per second
+        """
+        if maxRate <= 0:
+            raise ValueError("The preview rate must be positive.")
+
+        self.cameraWindow = cameraWindow
+        self.maxRate = maxRate
+        self.renderedFrames = 0
+        self.publishedFrames = 0
+
+        # Keep the base image in the RGB order of pygame, so a preview is a plain copy of the canvas
+        if baseImage.ndim == 2:
+            self._baseImage = cv2.cvtColor(baseImage, cv2.COLOR_GRAY2RGB)
+        elif baseImage.shape[2] == 4:
+            self._baseImage = cv2.cvtColor(baseImage, cv2.COLOR_BGRA2RGB)
+        else:
+            self._baseImage = cv2.cvtColor(baseImage, cv2.COLOR_BGR2RGB)
+        self._canvas = self._baseImage.copy()
+        self._dirtyRectangles = []
+
+        # The latest published positions, replacing the reference is atomic so no lock is needed
+        self._latestPositions = np.empty((0, 2))
+        self._stopEvent = threading.Event()
+        self._thread = None
+
+    def Start(self):
+        """
+        Start the preview thread, it shows the base image right away.
+        """
+        if self._thread is not None:
+            return
+        self._stopEvent.clear()
+        self._thread = threading.Thread(target=self._Run, name="ConversionPreview")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def Stop(self, timeout: float = None):
+        """
+        Stop the preview thread.
+
+        Parameters
+        ----------
+        timeout : float
+            The maximum number of seconds to wait for the thread
+        """
+        self._stopEvent.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def Publish(self, topDownPositions: np.ndarray):
+        """
+        Publish the latest positions, older positions that were not shown yet are skipped.
+
+        Parameters
+        ----------
+        topDownPositions : np.ndarray
+            (N, 2) array of x and y pixel positions in the top-down image
+        """
+        self._latestPositions = np.array(topDownPositions, dtype=np.float64).reshape(-1, 2)
+        self.publishedFrames += 1
+
+    def _Run(self):
+        """
+        The preview thread, shows the latest positions when they have changed, at most maxRate times per second.
+        """
+        shownPositions = None
+        interval = 1 / self.maxRate
+        while True:
+            latestPositions = self._latestPositions
+            if latestPositions is not shownPositions:
+                shownPositions = latestPositions
+                self.cameraWindow.ShowFrame(self._Render(latestPositions))
+                self.renderedFrames += 1
+            if self._stopEvent.wait(interval):
+                return
+
+    def _Render(self, topDownPositions: np.ndarray) -> pygame.Surface:
+        """
+        Draws the positions on the canvas, only the areas of the previous circles are restored from the base image.
+
+        Parameters
+        ----------
+        topDownPositions : np.ndarray
+            (N, 2) array of x and y pixel positions in the top-down image
+
+        Returns
+        -------
+        pygame.Surface
+            The preview
+        """
+        (height, width) = self._canvas.shape[:2]
+        for (left, top, right, bottom) in self._dirtyRectangles:
+            self._canvas[top:bottom, left:right] = self._baseImage[top:bottom, left:right]
+        self._dirtyRectangles = []
+
+        radius = ConversionPreview.CIRCLE_RADIUS
+        for (x, y) in topDownPositions.astype(int).tolist():
+            left, top = max(x - radius, 0), max(y - radius, 0)
+            right, bottom = min(x + radius + 1, width), min(y + radius + 1, height)
+            if left >= right or top >= bottom:
+                continue
+            cv2.circle(self._canvas, (x, y), radius, ConversionPreview.CIRCLE_COLOR, -1)
+            self._dirtyRectangles.append((left, top, right, bottom))
+
+        return pygame.image.frombuffer(self._canvas.tobytes(), (width, height), 'RGB')
@@ -6,7 +6,7 @@
 The actual object created by the convertors and that is sent through the API.
 """
 
-from typing import NamedTuple, Optional
+from typing import NamedTuple, Optional, Tuple
 
 
 class DetectedObjectPosition(NamedTuple):
@@ -27,3 +27,5 @@ class DetectedObjectPosition(NamedTuple):
     """The x coordinate of the object in Rijksdriehoek coordinates"""
     rijksdriehoekY: Optional[float] = None
     """The y coordinate of the object in Rijksdriehoek coordinates"""
+    zones: Optional[Tuple[str, ...]] = None
+    """The identifiers of the zones the object is inside"""
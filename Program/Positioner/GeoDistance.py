@@ -0,0 +1,163 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+"""
+Array based distances between geo positions, with a selectable accuracy.
+"""
+
+from enum import Enum
+
+import numpy as np
+
+
+class DistanceMode(Enum):
+    """The accuracy of the distance calculation"""
+    Flat = 'flat'
+    """Local flat earth, using the radii of curvature of the WGS-84 ellipsoid at the mean latitude"""
+    Haversine = 'haversine'
+    """Great circle distance on a sphere with the mean earth radius"""
+    Vincenty = 'vincenty'
+    """Geodesic distance on the WGS-84 ellipsoid, with the iterative formula of Vincenty"""
+
+
+class GeoDistance:
+    """
+    Calculates the distances between arrays of geo positions, all pairs at once.
+    """
+
+    SEMI_MAJOR_AXIS = 6378137.0
+    """The semi-major axis of the WGS-84 ellipsoid in meters"""
+    FLATTENING = 1 / 298.257223563
+    """The flattening of the WGS-84 ellipsoid"""
+    MEAN_RADIUS = 6371008.8
+    """The mean radius of the earth in meters"""
+
+    VINCENTY_TOLERANCE = 1e-12
+    """The change in longitude (in radians) at which the Vincenty iteration has converged"""
+    VINCENTY_ITERATIONS = 200
+    """The maximum number of Vincenty iterations, nearly antipodal points may not converge"""
+
+    @staticmethod
+    def Meters(positions1, positions2, mode: DistanceMode = DistanceMode.Vincenty) -> np.ndarray:
+        """
+        Calculates the distance in meters between every pair of positions.
+
+        Parameters
+        ----------
+        positions1 : np.ndarray
+            (N, 2) array of positions in (latitude, longitude) format, in degrees
+        positions2 : np.ndarray
+            (N, 2) array of positions in (latitude, longitude) format, in degrees
+        mode : DistanceMode
+            The accuracy of the calculation
+
+        Returns
+        -------
+        np.ndarray
+            (N,) array of distances in meters
+        """
+        positions1 = np.asarray(positions1, dtype=np.float64).reshape(-1, 2)
+        positions2 = np.asarray(positions2, dtype=np.float64).reshape(-1, 2)
+
+        if positions1.shape != positions2.shape:
+            raise RuntimeError("Position arrays don't have the same amount of positions")
+        if np.any(np.abs(positions1[:, 0]) > 90) or np.any(np.abs(positions2[:, 0]) > 90):
+            raise RuntimeError("latitude must be in [-90, 90] range")
+
+        latitudes1 = np.radians(positions1[:, 0])
+        latitudes2 = np.radians(positions2[:, 0])
+        deltaLongitudes = np.radians(positions2[:, 1] - positions1[:, 1])
+
+        if mode == DistanceMode.Flat:
+            return GeoDistance._Flat(latitudes1, latitudes2, deltaLongitudes)
+        if mode == DistanceMode.Haversine:
+            return GeoDistance._Haversine(latitudes1, latitudes2, deltaLongitudes)
+        if mode == DistanceMode.Vincenty:
+            return GeoDistance._Vincenty(latitudes1, latitudes2, deltaLongitudes)
+        raise ValueError(f"Unknown distance mode {mode}")
+
+    @staticmethod
+    def _Flat(latitudes1, latitudes2, deltaLongitudes) -> np.ndarray:
+        """
+        Local flat earth distance, accurate for the (sub-)meter distances used for the errors.
+        """
+        # wrap the longitude difference to [-pi, pi]
+        deltaLongitudes = np.remainder(deltaLongitudes + np.pi, 2 * np.pi) - np.pi
+        meanLatitudes = (latitudes1 + latitudes2) / 2
+
+        # meridional and prime vertical radius of curvature of the ellipsoid
+        eccentricitySquared = GeoDistance.FLATTENING * (2 - GeoDistance.FLATTENING)
+        denominator = 1 - eccentricitySquared * np.sin(meanLatitudes) ** 2
+        meridionalRadius = GeoDistance.SEMI_MAJOR_AXIS * (1 - eccentricitySquared) / denominator ** 1.5
+        primeVerticalRadius = GeoDistance.SEMI_MAJOR_AXIS / np.sqrt(denominator)
+
+        north = (latitudes2 - latitudes1) * meridionalRadius
+        east = deltaLongitudes * primeVerticalRadius * np.cos(meanLatitudes)
+        return np.sqrt(north * north + east * east)
+
+    @staticmethod
+    def _Haversine(latitudes1, latitudes2, deltaLongitudes) -> np.ndarray:
+        """
+        Great circle distance on a sphere.
+        """
+        h = np.sin((latitudes2 - latitudes1) / 2) ** 2 + \
+            np.cos(latitudes1) * np.cos(latitudes2) * np.sin(deltaLongitudes / 2) ** 2
+        return 2 * GeoDistance.MEAN_RADIUS * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
+
+    @staticmethod
+    def _Vincenty(latitudes1, latitudes2, deltaLongitudes) -> np.ndarray:
+        """
+        Inverse formula of Vincenty on the ellipsoid, iterated for all pairs at once
+        until every pair has converged.
+        """
+        a = GeoDistance.SEMI_MAJOR_AXIS
+        f = GeoDistance.FLATTENING
+        b = (1 - f) * a
+
+        # reduced latitudes
+        U1 = np.arctan((1 - f) * np.tan(latitudes1))
+        U2 = np.arctan((1 - f) * np.tan(latitudes2))
+        sinU1, cosU1 = np.sin(U1), np.cos(U1)
+        sinU2, cosU2 = np.sin(U2), np.cos(U2)
+
+        def Terms(lambdas):
+            sinLambda, cosLambda = np.sin(lambdas), np.cos(lambdas)
+            sinSigma = np.sqrt((cosU2 * sinLambda) ** 2 + (cosU1 * sinU2 - sinU1 * cosU2 * cosLambda) ** 2)
+            cosSigma = sinU1 * sinU2 + cosU1 * cosU2 * cosLambda
+            sigma = np.arctan2(sinSigma, cosSigma)
+
+            # coincident points have no azimuth
+            sinAlpha = np.divide(cosU1 * cosU2 * sinLambda, sinSigma, out=np.zeros_like(sinSigma),
+                                 where=sinSigma != 0)
+            cosSquaredAlpha = 1 - sinAlpha * sinAlpha
+
+            # equatorial lines have no midpoint
+            cos2SigmaM = cosSigma - np.divide(2 * sinU1 * sinU2, cosSquaredAlpha, out=np.zeros_like(cosSigma),
+                                              where=cosSquaredAlpha != 0)
+            return sinSigma, cosSigma, sigma, sinAlpha, cosSquaredAlpha, cos2SigmaM
+
+        L = deltaLongitudes
+        lambdas = L.copy()
+        active = np.ones(len(L), dtype=bool)
+        for _ in range(GeoDistance.VINCENTY_ITERATIONS):
+            (sinSigma, cosSigma, sigma, sinAlpha, cosSquaredAlpha, cos2SigmaM) = Terms(lambdas)
+            C = f / 16 * cosSquaredAlpha * (4 + f * (4 - 3 * cosSquaredAlpha))
+            newLambdas = L + (1 - C) * f * sinAlpha * (
+                sigma + C * sinSigma * (cos2SigmaM + C * cosSigma * (-1 + 2 * cos2SigmaM * cos2SigmaM)))
+
+            converged = np.abs(newLambdas - lambdas) <= GeoDistance.VINCENTY_TOLERANCE
+            lambdas = np.where(active, newLambdas, lambdas)
+            active &= ~converged
+            if not active.any():
+                break
+
+        (sinSigma, cosSigma, sigma, sinAlpha, cosSquaredAlpha, cos2SigmaM) = Terms(lambdas)
+        uSquared = cosSquaredAlpha * (a * a - b * b) / (b * b)
+        A = 1 + uSquared / 16384 * (4096 + uSquared * (-768 + uSquared * (320 - 175 * uSquared)))
+        B = uSquared / 1024 * (256 + uSquared * (-128 + uSquared * (74 - 47 * uSquared)))
+        deltaSigma = B * sinSigma * (cos2SigmaM + B / 4 * (
+            cosSigma * (-1 + 2 * cos2SigmaM * cos2SigmaM) -
+            B / 6 * cos2SigmaM * (-3 + 4 * sinSigma * sinSigma) * (-3 + 4 * cos2SigmaM * cos2SigmaM)))
+
+        return b * A * (sigma - deltaSigma)
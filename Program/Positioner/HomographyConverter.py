@@ -9,9 +9,12 @@ Uses the HomographyCalibrationConfiguration to convert the 2D positions to 3D po
 
 import math
 import numpy as np
-from rijksdriehoek import rijksdriehoek
 
 from Positioner.IConvertor import *
+from Positioner.ConversionLookupTable import ConversionLookupTable
+from Positioner.ConversionPreview import ConversionPreview
+from Positioner.ProjectionModel import ProjectionModel
+from Positioner.UncertaintyRaster import UncertaintyRaster
 from FrameAnalyzer.IDetector import DetectedObject
 from Calibrator.Configurations.HomographyCalibrationConfiguration import GeoPosition, HomographyCalibrationConfiguration
 from Windowing.Sub.CameraSubWindow import *
@@ -22,6 +25,19 @@ import cv2
 class HomographyConverter(IConvertor):
     configuration: HomographyCalibrationConfiguration = None
     cameraWindow: CameraSubWindow = None
+    projectionModel: ProjectionModel = None
+    planeModels: [ProjectionModel] = None
+    """The projection model of the homography matrix followed by those of the planes of the configuration"""
+    planeLabels: np.ndarray = None
+    """The plane of every pixel of the analyze resolution, see HomographyCalibrationConfiguration.GetPlaneLabels"""
+    _planeModelsKey: str = None
+    _planeLabelsKey: str = None
+    lookupTable: ConversionLookupTable = None
+    useLookupTable: bool = True
+    uncertaintyRaster: UncertaintyRaster = None
+    conversionPreview: ConversionPreview = None
+    previewRate: float = 10
+    """The maximum number of conversion previews per second"""
 
     def __init__(self, homographyCalibrationConfiguration: HomographyCalibrationConfiguration,
                  cameraWindow: CameraSubWindow):
@@ -39,9 +55,24 @@ class HomographyConverter(IConvertor):
 
         super().__init__(homographyCalibrationConfiguration)
 
-        # show first image
-        if self.configuration.smartImage is not None:
-            self._ShowConversions([], self.configuration.smartImage.GetImage())
+        # Compile the projection model and the pixel to world lookup table for the analyze resolution
+        if self.configuration.homographyMatrix is not None and self.configuration.analyzeResolution is not None:
+            print("Projection model max approximation error:",
+                  self._GetProjectionModel().MaxApproximationError(self.configuration.analyzeResolution))
+        self._GetLookupTable()
+
+        # Precompute the location radius of every pixel, and export it so operators can see the accuracy
+        uncertaintyRaster = self.GetUncertaintyRaster()
+        if uncertaintyRaster is not None:
+            uncertaintyImagePath = self.configuration.GetUncertaintyImagePath()
+            if uncertaintyImagePath is not None and uncertaintyRaster.Export(uncertaintyImagePath):
+                print("Location uncertainty exported to:", uncertaintyImagePath)
+
+        # show the conversions on the top-down image, on a separate thread
+        if self.cameraWindow is not None and self.configuration.smartImage is not None:
+            self.conversionPreview = ConversionPreview(self.cameraWindow, self.configuration.smartImage.GetImage(),
+                                                       self.previewRate)
+            self.conversionPreview.Start()
 
     def Convert2DTo3D(self, detectedObjects: [DetectedObject], frameIndex: int, showConversions=False) \
             -> [DetectedObjectPosition]:
@@ -67,52 +98,387 @@ class HomographyConverter(IConvertor):
             A list of DetectedObjectPositions, which contain the geo coordinates of the detected object
         """
 
-        detectedObjectGeoPositions = []
-        detectedObjectPixelPositions = []
-        M = self.configuration.homographyMatrix
-        smartImage = self.configuration.smartImage
+        # Gather all foot points in a single (N, 2) array, so the whole frame
+        # is converted with a handful of array operations instead of per object
+        pixelPositions = np.array([[detectedObject.x, detectedObject.y] for detectedObject in detectedObjects],
+                                  dtype=np.float64).reshape(-1, 2)
+
+        # convert to geo-positions and Rd positions
+        worldPositions = self._ConvertPixelsToWorld(pixelPositions)
+        latitudes = worldPositions[:, ConversionLookupTable.LATITUDE]
+        longitudes = worldPositions[:, ConversionLookupTable.LONGITUDE]
+        rdXs = worldPositions[:, ConversionLookupTable.RIJKSDRIEHOEK_X]
+        rdYs = worldPositions[:, ConversionLookupTable.RIJKSDRIEHOEK_Y]
+        altitudes = np.broadcast_to(self.GetAltitudes(pixelPositions), len(pixelPositions))
+
+        detectedObjectGeoPositions = [
+            DetectedObjectPosition(
+                latitude, longitude, altitude,
+                detectedObject.id, detectedObject.type,
+                0,
+                rdX, rdY
+            )
+            for detectedObject, latitude, longitude, altitude, rdX, rdY in
+            zip(detectedObjects, latitudes.tolist(), longitudes.tolist(), altitudes.tolist(), rdXs.tolist(),
+                rdYs.tolist())
+        ]
+
+        if showConversions:
+            self._ShowPixelConversions(pixelPositions)
+
+        return detectedObjectGeoPositions
+
+    def ConvertBatch(self, detectionBatch: DetectionBatch, frameIndex: int, referenceMode=False) -> DetectionBatch:
+        """
+        Converts the pixel position columns of the batch to geo positions, Rd positions and location radii
+        without creating an object per detection, see IConvertor.ConvertBatch.
+        The detections can be on different planes, every plane converts its own detections.
+        """
+        if referenceMode or len(detectionBatch) == 0:
+            return super().ConvertBatch(detectionBatch, frameIndex, referenceMode)
+
+        pixelPositions = detectionBatch.GetPixelPositions()
+        worldPositions = self._ConvertPixelsToWorld(pixelPositions)
+        self._ShowPixelConversions(pixelPositions)
+
+        return detectionBatch.WithPositions(
+            worldPositions[:, ConversionLookupTable.LATITUDE],
+            worldPositions[:, ConversionLookupTable.LONGITUDE],
+            self.GetAltitudes(pixelPositions),
+            self.LocationRadii(pixelPositions),
+            worldPositions[:, ConversionLookupTable.RIJKSDRIEHOEK_X],
+            worldPositions[:, ConversionLookupTable.RIJKSDRIEHOEK_Y]
+        )
 
-        for detectedObject in detectedObjects:
-            x = detectedObject.x
-            y = detectedObject.y
-            objectID = detectedObject.id
-            objectType = detectedObject.type
+    def _ShowPixelConversions(self, pixelPositions: np.ndarray):
+        """
+        Publishes the top-down positions of the given camera pixel positions to the conversion preview, if there is one.
+        Drawing them happens on the thread of the preview.
 
-            # transform point to topdown pixel coordinates
-            homo_pos = np.dot(M, np.array([[x], [y], [1]]))
-            homo_pos = homo_pos.flatten()
-            [[[x2, y2]]] = cv2.convertPointsFromHomogeneous(np.array([homo_pos]))
+        Parameters
+        ----------
+        pixelPositions : np.ndarray
+            (N, 2) array of x and y pixel positions in the camera view
+        """
+        if self.conversionPreview is None:
+            return
+        self.conversionPreview.Publish(self._ForEachPlane(pixelPositions, ProjectionModel.ToTopDown))
 
-            # convert to geo-position
-            geoPos = self._Convert2DTopDownToGeo(round(x2), round(y2))
+    def Close(self):
+        """
+        Stops the conversion preview.
+        """
+        if self.conversionPreview is not None:
+            self.conversionPreview.Stop()
+            self.conversionPreview = None
 
-            # convert to Rd position
-            (rdX, rdY) = self._Convert2DTopDownToRd(round(x2), round(y2))
+    def _GetProjectionModel(self) -> ProjectionModel:
+        """
+        Get the projection model of the current configuration, it is compiled again
+        when the homography or the geo data of the configuration has changed.
 
-            detectedObjectGeoPositions.append(
-                DetectedObjectPosition(
-                    geoPos.latitude, geoPos.longitude, geoPos.altitude,
-                    objectID, objectType,
-                    0,
-                    rdX, rdY
-                )
+        Returns
+        -------
+        ProjectionModel
+            The projection model
+        """
+        key = ProjectionModel.GetKey(self.configuration.homographyMatrix, self.configuration.homographyGeoData)
+        if self.projectionModel is None or self.projectionModel.key != key:
+            self.projectionModel = ProjectionModel.FromConfiguration(self.configuration)
+        return self.projectionModel
+
+    def _GetPlanesKey(self) -> str or None:
+        """
+        Get the key of the planes of the configuration. Configurations without planes, like the configurations
+        of the static accuracy datasets, only have the plane of the homography matrix.
+
+        Returns
+        -------
+        str or None
+            The key, or None if there are no planes
+        """
+        getPlanesKey = getattr(self.configuration, 'GetPlanesKey', None)
+        return getPlanesKey() if getPlanesKey is not None else None
+
+    def _GetProjectionModels(self) -> [ProjectionModel]:
+        """
+        Get the projection model of the homography matrix followed by those of the planes of the configuration,
+        they are compiled again when the configuration has changed.
+
+        Returns
+        -------
+        [ProjectionModel]
+            The projection models, the index of a model is the label of its plane
+        """
+        projectionModel = self._GetProjectionModel()
+        planesKey = self._GetPlanesKey()
+        if planesKey is None:
+            return [projectionModel]
+
+        key = f"{projectionModel.key}_{planesKey}"
+        if self.planeModels is None or self._planeModelsKey != key:
+            self.planeModels = [projectionModel] + [
+                ProjectionModel.FromConfiguration(self.configuration, plane.homographyMatrix, plane.altitude)
+                for plane in self.configuration.planes
+            ]
+            self._planeModelsKey = key
+        return self.planeModels
+
+    def GetPlanes(self, pixelPositions: np.ndarray) -> np.ndarray:
+        """
+        The plane of every pixel position, a single index into the plane label raster of the configuration.
+        Positions outside the raster get the plane of the nearest pixel on its border.
+
+        Parameters
+        ----------
+        pixelPositions : np.ndarray
+            (N, 2) array of x and y pixel positions in the camera view
+
+        Returns
+        -------
+        np.ndarray
+            The label of the plane of every position, 0 for the homography matrix and i + 1 for plane i
+        """
+        planesKey = self._GetPlanesKey()
+        if planesKey is None:
+            return np.zeros(len(pixelPositions), dtype=np.uint8)
+
+        key = f"{planesKey}_{self.configuration.analyzeResolution}"
+        if self.planeLabels is None or self._planeLabelsKey != key:
+            self.planeLabels = self.configuration.GetPlaneLabels()
+            self._planeLabelsKey = key
+
+        (height, width) = self.planeLabels.shape
+        pixels = np.nan_to_num(np.round(pixelPositions))
+        columns = np.clip(pixels[:, 0], 0, width - 1).astype(np.intp)
+        rows = np.clip(pixels[:, 1], 0, height - 1).astype(np.intp)
+        return self.planeLabels[rows, columns]
+
+    def GetAltitudes(self, pixelPositions: np.ndarray) -> np.ndarray or float:
+        """
+        The altitude of the plane of every pixel position.
+
+        Parameters
+        ----------
+        pixelPositions : np.ndarray
+            (N, 2) array of x and y pixel positions in the camera view
+
+        Returns
+        -------
+        np.ndarray or float
+            The altitude of every position, or the altitude of the anchor if there are no planes
+        """
+        projectionModels = self._GetProjectionModels()
+        if len(projectionModels) == 1:
+            return self.configuration.homographyGeoData.anchorGeoPosition.altitude
+        altitudes = np.array([projectionModel.altitude for projectionModel in projectionModels])
+        return altitudes[self.GetPlanes(pixelPositions)]
+
+    def _ForEachPlane(self, pixelPositions: np.ndarray, function) -> np.ndarray:
+        """
+        Applies a function of a projection model and pixel positions to the positions of every plane with the
+        model of that plane, so a frame with detections on several planes is converted in a single call.
+
+        Parameters
+        ----------
+        pixelPositions : np.ndarray
+            (N, 2) array of x and y pixel positions in the camera view
+        function : Callable[[ProjectionModel, np.ndarray], np.ndarray]
+            The function, which returns a row for every pixel position
+
+        Returns
+        -------
+        np.ndarray
+            The rows of the function for all pixel positions, in the same order
+        """
+        projectionModels = self._GetProjectionModels()
+        if len(projectionModels) == 1 or len(pixelPositions) == 0:
+            return function(projectionModels[0], pixelPositions)
+
+        planes = self.GetPlanes(pixelPositions)
+        results = None
+        for plane in np.unique(planes).tolist():
+            inside = planes == plane
+            values = function(projectionModels[plane], pixelPositions[inside])
+            if results is None:
+                results = np.empty((len(pixelPositions),) + values.shape[1:], dtype=values.dtype)
+            results[inside] = values
+        return results
+
+    def _GetLookupTable(self) -> ConversionLookupTable or None:
+        """
+        Get the pixel to world lookup table of the current configuration. The table is (re)built
+        when the homography, the geo anchor or the analyze resolution of the configuration has changed.
+
+        Returns
+        -------
+        ConversionLookupTable or None
+            The lookup table, or None if it is disabled or the configuration does not describe one
+        """
+        if not self.useLookupTable or not isinstance(self.configuration, HomographyCalibrationConfiguration):
+            return None
+        if self.configuration.homographyMatrix is None or self.configuration.homographyGeoData is None or \
+                self.configuration.analyzeResolution is None:
+            return None
+
+        # The values of the table are converted on the plane of every pixel
+        (width, height) = self.configuration.analyzeResolution
+        planesKey = self._GetPlanesKey()
+        key = f"{self._GetProjectionModel().key}_{int(width)}x{int(height)}" if planesKey is None else \
+            f"{self._GetProjectionModel().key}_{planesKey}_{int(width)}x{int(height)}"
+
+        if self.lookupTable is None or self.lookupTable.key != key:
+            self.lookupTable = ConversionLookupTable.Load(
+                self.configuration.GetLookupTablePath(key),
+                key,
+                self.configuration.analyzeResolution,
+                self._BuildLookupTableValues
             )
-            detectedObjectPixelPositions.append(
-                DetectedObjectPosition(
-                    int(y2), int(x2), 0,
-                    objectID, objectType
-                )
+        return self.lookupTable
+
+    def GetUncertaintyRaster(self) -> UncertaintyRaster or None:
+        """
+        Get the location radius of every pixel of the analyze resolution, built from the single pixel errors
+        in the lookup table and the static max error. The raster is rebuilt when either of them changes.
+
+        Returns
+        -------
+        UncertaintyRaster or None
+            The raster, or None if there is no lookup table or static error
+        """
+        lookupTable = self._GetLookupTable()
+        if lookupTable is None or self.staticError is None:
+            return None
+
+        staticMaxError = float(self.staticError.GetMaxError())
+        key = f"{lookupTable.key}_{staticMaxError!r}"
+        if self.uncertaintyRaster is None or self.uncertaintyRaster.key != key:
+            self.uncertaintyRaster = UncertaintyRaster.FromSinglePixelErrors(
+                lookupTable.table[:, :, ConversionLookupTable.SINGLE_PIXEL_ERROR],
+                staticMaxError,
+                key
             )
+        return self.uncertaintyRaster
 
-        if smartImage is not None and showConversions:
-            self._ShowConversions(detectedObjectPixelPositions, smartImage.GetImage())
+    def _BuildLookupTableValues(self, pixelPositions: np.ndarray) -> np.ndarray:
+        """
+        Calculates the lookup table values of the given pixels, used when building the lookup table.
 
-        return detectedObjectGeoPositions
+        Parameters
+        ----------
+        pixelPositions : np.ndarray
+            (N, 2) array of x and y pixel positions in the camera view
+
+        Returns
+        -------
+        np.ndarray
+            (N, ConversionLookupTable.COLUMNS) array with the values of every pixel
+        """
+        return np.column_stack((
+            self._ConvertPixelsToWorldDirect(pixelPositions),
+            self._AnalyticSinglePixelErrors(pixelPositions)
+        ))
+
+    def _ConvertPixelsToWorld(self, pixelPositions: np.ndarray) -> np.ndarray:
+        """
+        Converts camera pixel positions to world positions, using the lookup table for the positions within it.
+        The top-down positions are not rounded, so the table can be interpolated smoothly and a position gives the
+        same result inside and outside the table.
+
+        Parameters
+        ----------
+        pixelPositions : np.ndarray
+            (N, 2) array of x and y pixel positions in the camera view
+
+        Returns
+        -------
+        np.ndarray
+            (N, 4) array with the latitude, longitude, Rd x and Rd y of every position
+        """
+        lookupTable = self._GetLookupTable()
+        if lookupTable is None:
+            return self._ConvertPixelsToWorldDirect(pixelPositions)
+
+        inside = lookupTable.Contains(pixelPositions)
+        worldPositions = np.empty((len(pixelPositions), 4))
+        worldPositions[inside] = lookupTable.Lookup(pixelPositions[inside], slice(0, 4))
+        if not inside.all():
+            worldPositions[~inside] = self._ConvertPixelsToWorldDirect(pixelPositions[~inside])
+        return worldPositions
+
+    def _ConvertPixelsToWorldDirect(self, pixelPositions: np.ndarray) -> np.ndarray:
+        """
+        Converts camera pixel positions to world positions with the projection model of their plane.
+
+        Parameters
+        ----------
+        pixelPositions : np.ndarray
+            (N, 2) array of x and y pixel positions in the camera view
+
+        Returns
+        -------
+        np.ndarray
+            (N, 4) array with the latitude, longitude, Rd x and Rd y of every position
+        """
+        return self._ForEachPlane(
+            pixelPositions, lambda projectionModel, positions: projectionModel.PixelsToWorld(positions)
+        )
+
+    def SinglePixelErrors(self, pixelPositions: np.ndarray) -> np.ndarray:
+        """
+        Analytic single pixel error, looked up in the lookup table when possible,
+        see _AnalyticSinglePixelErrors for the calculation.
+
+        Parameters
+        ----------
+        pixelPositions : np.ndarray
+            (N, 2) array of x and y pixel positions in the camera view
+
+        Returns
+        -------
+        np.ndarray
+            The single pixel error in meters for every pixel position
+        """
+        lookupTable = self._GetLookupTable()
+        if lookupTable is None:
+            return self._AnalyticSinglePixelErrors(pixelPositions)
+
+        inside = lookupTable.Contains(pixelPositions)
+        pixelErrors = np.empty(len(pixelPositions))
+        pixelErrors[inside] = lookupTable.Lookup(pixelPositions[inside], ConversionLookupTable.SINGLE_PIXEL_ERROR)
+        if not inside.all():
+            pixelErrors[~inside] = self._AnalyticSinglePixelErrors(pixelPositions[~inside])
+        return pixelErrors
+
+    def _AnalyticSinglePixelErrors(self, pixelPositions: np.ndarray) -> np.ndarray:
+        """
+        Analytic single pixel error, derived from the Jacobian of the homography at every pixel position.
+        A shift of shiftDistance pixels along x or y moves the top-down position by (approximately) shiftDistance
+        times the matching column of the Jacobian, the largest of the two is scaled to meters.
+
+        Parameters
+        ----------
+        pixelPositions : np.ndarray
+            (N, 2) array of x and y pixel positions in the camera view
+
+        Returns
+        -------
+        np.ndarray
+            The single pixel error in meters for every pixel position
+        """
+        projectionModel = self._GetProjectionModel()
+        jacobians = self._ForEachPlane(pixelPositions, ProjectionModel.TopDownJacobians)
+
+        # length of the top-down displacement per camera pixel, for the x and y direction
+        columnLengths = np.sqrt(np.sum(jacobians * jacobians, axis=1))
+
+        return self.shiftDistance * np.max(columnLengths, axis=1) * projectionModel.pixelScale
 
     def _Convert2DTopDownToRd(self, x, y) -> (float, float):
         """
         This function converts the top-down view pixel position to rijksdriehoek coordinates. It uses the
-        anchor rijksdriehoek position from the configuration. If that's 0, it calculates it from the gps -> rd.
+        anchor rijksdriehoek position of the projection model, which is calculated from the gps -> rd
+        if the configuration has none.
 
         Parameters
         ----------
@@ -126,18 +492,13 @@ class HomographyConverter(IConvertor):
         (float, float)
             The Rd coordinate
         """
-        # if no Rd coord is set, we convert it from gps (wgs84)
-        if self.configuration.homographyGeoData.anchorRdPosition is None:
-            rd = rijksdriehoek.Rijksdriehoek()
-            rd.from_wgs(self.configuration.homographyGeoData.anchorGeoPosition.latitude,
-                        self.configuration.homographyGeoData.anchorGeoPosition.longitude)
-            self.configuration.homographyGeoData.anchorRdPosition = (rd.rd_x, rd.rd_y)
-
         # for better readability
-        (anchorX, anchorY) = self.configuration.homographyGeoData.anchorRdPosition
-        scale = self.configuration.homographyGeoData.pixelScale
+        projectionModel = self._GetProjectionModel()
+        (anchorX, anchorY) = projectionModel.anchorRdPosition
+        (anchorPixelX, anchorPixelY) = projectionModel.anchorPixelPosition
+        scale = projectionModel.pixelScale
 
-        return anchorX + (x * scale), anchorY - (y * scale)
+        return anchorX + ((x - anchorPixelX) * scale), anchorY - ((y - anchorPixelY) * scale)
 
     def _Convert2DTopDownToGeo(self, x, y):
         """
@@ -195,22 +556,3 @@ class HomographyConverter(IConvertor):
         return \
             np.sqrt(deltaX * deltaX + deltaY * deltaY) * \
             self.configuration.homographyGeoData.pixelScale
-
-    def _ShowConversions(self, detectedObjectPixelPositions, image):  # pragma: no cover
-        """
-        A quick function for demoing to show the converted pixel point in the topdown view
-        Parameters
-        ----------
-        detectedObjectPixelPositions : a list of pixel coordinates (of the topdown image) representing detected objects
-        image: the topdown image
-
-        """
-        if self.cameraWindow is None:
-            return
-
-        copyImage = image.copy()
-
-        # draw circles for each object
-        for detectedObject in detectedObjectPixelPositions:
-            cv2.circle(copyImage, (detectedObject.longitude, detectedObject.latitude), 5, (50, 50, 255), -1)
-        self.cameraWindow.ShowFrame(copyImage)
@@ -7,15 +7,17 @@ Interface for the different conversion methods.
 """
 
 import os
-import geopy.distance
 import math
 import numpy as np
 
 from Calibrator.Configurations.ICalibrationConfiguration import ICalibrationConfiguration
+from FrameAnalyzer.DetectionBatch import DetectionBatch
 from FrameAnalyzer.IDetector import DetectedObject
 from IO import Pathing
+from Positioner.Accuracy.StaticAccuracyCache import StaticAccuracyCache
 from Positioner.Accuracy.StaticAccuracyDataset import StaticAccuracyDataset, StaticAccuracyError
 from Positioner.DetectedObjectPosition import DetectedObjectPosition
+from Positioner.GeoDistance import GeoDistance, DistanceMode
 
 
 class IConvertor:
@@ -24,6 +26,8 @@ class IConvertor:
     """
     configuration: ICalibrationConfiguration = None
     staticError: StaticAccuracyError = None
+    shiftDistance: int = 5
+    """The amount of pixels a position is shifted by to determine the single pixel error"""
 
     def __init__(self, configuration: ICalibrationConfiguration):
         """
@@ -75,61 +79,111 @@ class IConvertor:
 
         return detectedObjectPositions
 
+    def Close(self):
+        """
+        Close any running processes of the convertor.
+        """
+        pass
+
     def _CalculateStaticError(self):  # pragma: no cover
         """
         Calculates the static error for the given configuration based
-        on all available static error datasets.
+        on all available static error datasets. The result is cached on disk,
+        and only calculated again when the datasets, the convertor or its parameters change.
         """
 
-        # Read all static error datasets
+        # Find all static error datasets
         folder = Pathing.AssureAbsolutePath("Testing/Assets/Datasets")
-        staticErrorDatasets = []
-        for file in os.listdir(folder):
-            if file.endswith(".json"):
-                staticErrorDatasets.append(StaticAccuracyDataset.Load(folder / file))
+        datasetPaths = sorted(folder / file for file in os.listdir(folder) if file.endswith(".json"))
+
+        cache = StaticAccuracyCache()
+        key = StaticAccuracyCache.GetKey(datasetPaths, self.__class__, self.configuration.__class__,
+                                         {'shiftDistance': self.shiftDistance})
+        self.staticError = cache.Get(key)
+        if self.staticError is None:
+            self.staticError = self._MeasureStaticError(
+                [StaticAccuracyDataset.Load(datasetPath) for datasetPath in datasetPaths]
+            )
+            cache.Set(key, self.staticError)
+
+        # Print the static error
+        print("Method static max error:", self.staticError.GetMaxError())
+        print("Method static average error:", self.staticError.averageError)
+
+    def _MeasureStaticError(self, staticErrorDatasets: [StaticAccuracyDataset]) -> StaticAccuracyError:
+        """
+        Measures the static error over the given datasets, all entries of a dataset are converted at once.
+
+        Parameters
+        ----------
+        staticErrorDatasets : [StaticAccuracyDataset]
+            The datasets to measure the error on
+
+        Returns
+        -------
+        StaticAccuracyError
+            The averaged static error
+        """
+        staticError = StaticAccuracyError()
 
         # Save configuration for now
         savedConfiguration = self.configuration
 
-        # Calculate the static error for all datasets
-        for staticErrorDataset in staticErrorDatasets:
-            # Get the configuration for the dataset, and
-            # use it temporarily
-            self.configuration = staticErrorDataset.GetCalibrationConfiguration(
-                savedConfiguration.__class__.__name__
-            )
+        try:
+            for staticErrorDataset in staticErrorDatasets:
+                if len(staticErrorDataset.entries) <= 0:
+                    continue
+
+                # Get the configuration for the dataset, and
+                # use it temporarily
+                self.configuration = staticErrorDataset.GetCalibrationConfiguration(
+                    savedConfiguration.__class__.__name__
+                )
 
-            # Calculate the static error for the dataset
-            for e in range(len(staticErrorDataset.entries)):
-                entry = staticErrorDataset.entries[e]
-                validationWorldPosition = self.Convert2DTo3D(
+                validationWorldPositions = self.Convert2DTo3D(
                     [DetectedObject(
                         float(entry['screenPosition'][0]),
                         float(entry['screenPosition'][1]),
                         -1, None
-                    )],
+                    ) for entry in staticErrorDataset.entries],
                     -1
-                )[0]
-                validationLongitude = validationWorldPosition.longitude
-                validationLatitude = validationWorldPosition.latitude
+                )
+                validationPositions = [(position.latitude, position.longitude) for position in validationWorldPositions]
 
-                # Calculate the error
-                if self.staticError is None:
-                    self.staticError = StaticAccuracyError()
+                actualPositions = IConvertor._WorldPositionsToGeoPositions(
+                    np.array([entry['worldPosition'] for entry in staticErrorDataset.entries], dtype=np.float64)
+                )
+                staticError.AddErrors(GeoDistance.Meters(actualPositions, validationPositions, DistanceMode.Vincenty))
+        finally:
+            # Restore the configuration
+            self.configuration = savedConfiguration
 
-                actualPos = IConvertor._WorldPosToGeoPos(entry['worldPosition'])
-                validationPos = (validationLatitude, validationLongitude)
-                newError = IConvertor.MetersBetweenGeoPositions(actualPos, validationPos)
-                self.staticError.AddError(newError)
+        if staticError.numberOfErrors > 0:
+            staticError.AverageErrors()
+        return staticError
 
-        self.staticError.AverageErrors()
+    @staticmethod
+    def _WorldPositionsToGeoPositions(worldPositions: np.ndarray) -> np.ndarray:
+        """
+        Array version of _WorldPosToGeoPos.
 
-        # Print the static error
-        print("Method static max error:", self.staticError.GetMaxError())
-        print("Method static average error:", self.staticError.averageError)
+        Parameters
+        ----------
+        worldPositions: np.ndarray
+            (N, 3) array of [x, y, z] positions in meters
 
-        # Restore the configuration
-        self.configuration = savedConfiguration
+        Returns
+        -------
+        np.ndarray
+            (N, 2) array of geo positions in (latitude, longitude) format
+        """
+        worldPositions = worldPositions.reshape(-1, 3)
+        x = worldPositions[:, 0]
+        z = worldPositions[:, 2]
+        angles = IConvertor.GetAnglesToNorthFromVectors(x, z)
+        meters = np.sqrt(x * x + z * z)
+        [latitudes, longitudes] = IConvertor.MoveGeoByBearing(0, 0, np.rad2deg(angles), meters)
+        return np.column_stack((latitudes, longitudes))
 
     @staticmethod
     def _WorldPosToGeoPos(worldPos):  # pragma: no cover
@@ -150,12 +204,16 @@ class IConvertor:
         [lat, lon] = IConvertor.MoveGeoByBearing(0, 0, np.rad2deg(angle), meters)
         return lat, lon
 
-    def ConversionSinglePixelError(self, detectedObjects: [DetectedObject], frameIndex: int):
+    def ConversionSinglePixelError(self, detectedObjects: [DetectedObject], frameIndex: int, referenceMode=False):
         """
         This function does the same as Convert2DTo3D but also checks how much the position would change for each point,
         if it was shifted by a single pixel
         (it picks the largest error per point of all four cardinal directions and passes that)
 
+        By default the error comes from the analytic model of the convertor (see SinglePixelErrors), which handles
+        all points at once. Convertors without such a model, or calls in reference mode, convert four shifted copies of
+        every point instead. Convertors with an uncertainty raster (see GetUncertaintyRaster) read the radius from it.
+
         Parameters
         ----------
         detectedObjects : [DetectedObject]
@@ -164,42 +222,172 @@ class IConvertor:
         frameIndex : int
                 the index of the frame in the video on which this list of objects, and these positions, were detected
 
+        referenceMode : bool
+                Whether to use the (slow) reference calculation with shifted conversions, used for validation
+
         Returns
         -------
         [DetectedObjectPosition]
                 A list containing for each entry the result of that entry in Convert2DTo3D and its metadata (e.g. error)
         """
-        detectedObjectPositionsWithError = []
-
-        if detectedObjects == []:
+        if len(detectedObjects) == 0:
             return []
 
         mainResults = self.Convert2DTo3D(detectedObjects, frameIndex, True)
+        pixelPositions = np.array([[detectedObject.x, detectedObject.y] for detectedObject in detectedObjects],
+                                  dtype=np.float64)
+
+        locationRadii = None if referenceMode else self.LocationRadii(pixelPositions)
+        if locationRadii is None:
+            pixelErrors = self._ReferenceSinglePixelErrors(detectedObjects, mainResults, frameIndex)
+            locationRadii = self._AddStaticError(pixelErrors)
 
-        for i in range(len(mainResults)):
-            mainResult = mainResults[i]
-            mainPosition = (mainResult.latitude, mainResult.longitude)
-            shiftedObjects = self.PrepareShiftedPositionList(detectedObjects[i])
-            shiftedObjectResults = self.Convert2DTo3D(shiftedObjects, frameIndex)
-            errorDistance = []
-            for obj in shiftedObjectResults:
-                errorDistance.append(self.MetersBetweenGeoPositions((obj.latitude, obj.longitude), mainPosition))
-
-            objectLat = mainResult.latitude
-            objectLon = mainResult.longitude
-            objectAlt = mainResult.altitude
-            objectID = mainResult.id
-            objectType = mainResult.type
-            objectEr = 0
-            if self.staticError is not None:
-                objectEr = max(errorDistance) + self.staticError.GetMaxError()
-            objectRdX = mainResult.rijksdriehoekX
-            objectRdY = mainResult.rijksdriehoekY
-            final = DetectedObjectPosition(objectLat, objectLon, objectAlt, objectID,
-                                           objectType, objectEr, objectRdX, objectRdY)
-            detectedObjectPositionsWithError.append(final)
-
-        return detectedObjectPositionsWithError
+        return [
+            mainResult._replace(locationRadius=locationRadius)
+            for mainResult, locationRadius in zip(mainResults, locationRadii.tolist())
+        ]
+
+    def ConvertBatch(self, detectionBatch: DetectionBatch, frameIndex: int, referenceMode=False) -> DetectionBatch:
+        """
+        Columnar version of ConversionSinglePixelError, fills in the world positions and location radii of a batch.
+
+        This function is meant to be overridden by convertors that convert the columns directly,
+        the default is an adapter for list based convertors and uses ConversionSinglePixelError.
+
+        Parameters
+        ----------
+        detectionBatch : DetectionBatch
+                The detections to be transformed from 2D to 3D
+
+        frameIndex : int
+                the index of the frame in the video on which the detections were detected
+
+        referenceMode : bool
+                Whether to use the (slow) reference calculation with shifted conversions, used for validation
+
+        Returns
+        -------
+        DetectionBatch
+                The detections with their world positions
+        """
+        if len(detectionBatch) == 0:
+            return detectionBatch
+
+        detectedObjectPositions = self.ConversionSinglePixelError(
+            detectionBatch.ToDetectedObjects(), frameIndex, referenceMode
+        )
+
+        # Convertors that drop detections can't be matched with the batch anymore
+        if len(detectedObjectPositions) != len(detectionBatch):
+            return DetectionBatch.FromDetectedObjectPositions(detectedObjectPositions)
+        return detectionBatch.WithDetectedObjectPositions(detectedObjectPositions)
+
+    def LocationRadii(self, pixelPositions: np.ndarray) -> np.ndarray or None:
+        """
+        The location radius (single pixel error plus static max error) of all given pixel positions at once,
+        read from the uncertainty raster within it and calculated with SinglePixelErrors outside it.
+
+        Parameters
+        ----------
+        pixelPositions : np.ndarray
+            (N, 2) array of x and y pixel positions in the camera view
+
+        Returns
+        -------
+        np.ndarray or None
+            The location radius in meters for every pixel position,
+            or None if the convertor has no analytic single pixel error
+        """
+        # The location radius of positions within the uncertainty raster is a single read
+        uncertaintyRaster = self.GetUncertaintyRaster()
+        if uncertaintyRaster is not None:
+            inside = uncertaintyRaster.Contains(pixelPositions)
+            if inside.all():
+                return uncertaintyRaster.Lookup(pixelPositions)
+
+        pixelErrors = self.SinglePixelErrors(pixelPositions)
+        if pixelErrors is None:
+            return None
+
+        locationRadii = self._AddStaticError(pixelErrors)
+        if uncertaintyRaster is not None:
+            locationRadii[inside] = uncertaintyRaster.Lookup(pixelPositions[inside])
+        return locationRadii
+
+    def _AddStaticError(self, pixelErrors) -> np.ndarray:
+        """
+        Adds the static max error to the single pixel errors, without a static error the radius is 0.
+        """
+        if self.staticError is None:
+            return np.zeros(len(pixelErrors))
+        return np.asarray(pixelErrors, dtype=np.float64) + self.staticError.GetMaxError()
+
+    def GetUncertaintyRaster(self):
+        """
+        The precomputed location radius of every pixel of the analyze resolution, used by ConversionSinglePixelError
+        instead of calculating the radius of every position again.
+
+        This function is meant to be overridden by convertors that can precompute the radii,
+        the default returns None, in which case the radius is calculated per position.
+
+        Returns
+        -------
+        UncertaintyRaster|None
+            The raster, or None if there is none
+        """
+        return None
+
+    def SinglePixelErrors(self, pixelPositions: np.ndarray):
+        """
+        Analytic version of the single pixel error, for all given pixel positions at once.
+        Returns the largest distance in meters that a position moves when the pixel is shifted by shiftDistance
+        pixels in one of the four cardinal directions.
+
+        This function is meant to be overridden by convertors that can derive the error from their model,
+        the default has no model and returns None, in which case the reference calculation is used.
+
+        Parameters
+        ----------
+        pixelPositions : np.ndarray
+            (N, 2) array of x and y pixel positions in the camera view
+
+        Returns
+        -------
+        np.ndarray|None
+            The single pixel error in meters for every pixel position, or None if there is no analytic model
+        """
+        return None
+
+    def _ReferenceSinglePixelErrors(self, detectedObjects: [DetectedObject], mainResults: [DetectedObjectPosition],
+                                    frameIndex: int):
+        """
+        Reference calculation of the single pixel error, converts four shifted copies of every object
+        and measures how far they moved from the unshifted conversion.
+
+        Parameters
+        ----------
+        detectedObjects : [DetectedObject]
+            The detected objects
+        mainResults : [DetectedObjectPosition]
+            The conversions of the unshifted detected objects
+        frameIndex : int
+            the index of the frame in the video on which the objects were detected
+
+        Returns
+        -------
+        [float]
+            The single pixel error in meters for every object
+        """
+        # Convert the shifted copies of all objects at once
+        shiftedObjects = [shiftedObject for detectedObject in detectedObjects
+                          for shiftedObject in self.PrepareShiftedPositionList(detectedObject)]
+        shiftedObjectResults = self.Convert2DTo3D(shiftedObjects, frameIndex)
+
+        mainPositions = np.repeat([(result.latitude, result.longitude) for result in mainResults], 4, axis=0)
+        shiftedPositions = [(result.latitude, result.longitude) for result in shiftedObjectResults]
+        errorDistance = GeoDistance.Meters(shiftedPositions, mainPositions, DistanceMode.Vincenty)
+
+        return np.max(errorDistance.reshape(-1, 4), axis=1).tolist()
 
     @staticmethod
     def PrepareShiftedPositionList(object: DetectedObject):
@@ -224,16 +412,18 @@ class IConvertor:
         objectType = object.type
         objectXPosition = object.x
         objectYPosition = object.y
-        singlePixelShiftList.append(DetectedObject(objectXPosition + 5, objectYPosition, objectID, objectType))
-        singlePixelShiftList.append(DetectedObject(objectXPosition - 5, objectYPosition, objectID, objectType))
-        singlePixelShiftList.append(DetectedObject(objectXPosition, objectYPosition + 5, objectID, objectType))
-        singlePixelShiftList.append(DetectedObject(objectXPosition, objectYPosition - 5, objectID, objectType))
+        shift = IConvertor.shiftDistance
+        singlePixelShiftList.append(DetectedObject(objectXPosition + shift, objectYPosition, objectID, objectType))
+        singlePixelShiftList.append(DetectedObject(objectXPosition - shift, objectYPosition, objectID, objectType))
+        singlePixelShiftList.append(DetectedObject(objectXPosition, objectYPosition + shift, objectID, objectType))
+        singlePixelShiftList.append(DetectedObject(objectXPosition, objectYPosition - shift, objectID, objectType))
         return singlePixelShiftList
 
     @staticmethod
     def MetersBetweenGeoPositions(position1: (float, float), position2: (float, float)):
         """"
-        This is a very simple function that returns the distance between to coordinates in meters
+        This is a very simple function that returns the distance between to coordinates in meters,
+        for arrays of coordinates use GeoDistance.Meters
 
         Parameters
         ----------
@@ -256,7 +446,7 @@ class IConvertor:
             lat1 = str(position1[0])
             lat2 = str(position2[0])
             raise RuntimeError("latitude must be in [-90, 90] range, instead they are 1: " + lat1 + " and 2: " + lat2)
-        return geopy.distance.distance(position1, position2).meters
+        return float(GeoDistance.Meters(position1, position2, DistanceMode.Vincenty)[0])
 
     @staticmethod
     def MoveGeoByBearing(startLatDegrees, startLonDegrees, angleToNorth, metersToMove, earthRadius=6378.1):
@@ -269,28 +459,28 @@ class IConvertor:
             a known latitude
         startLonDegrees : double
             a known longitude
-        angleToNorth : double
+        angleToNorth : double or np.ndarray
             angle to go in (since pixels either 0 or 90 degrees)
-        metersToMove : double
+        metersToMove : double or np.ndarray
             use the scale to get convert the scale to degrees per pixel
         earthRadius : double
             the radius of the earth
 
         Returns
         -------
-        the new gps position, given the input
+        the new gps position, given the input. When arrays are given, the latitudes and longitudes are arrays as well.
 
         """
-        startLat = math.radians(startLatDegrees)
-        startLon = math.radians(startLonDegrees)
+        startLat = np.radians(startLatDegrees)
+        startLon = np.radians(startLonDegrees)
         distance = metersToMove / 1000
-        bearing = math.radians(angleToNorth)
+        bearing = np.radians(angleToNorth)
         lengthRatio = distance / earthRadius
-        newLat = math.asin(
-            math.sin(startLat) * math.cos(lengthRatio) + math.cos(startLat) * math.sin(lengthRatio) * math.cos(bearing))
-        newLon = startLon + math.atan2(math.sin(bearing) * math.sin(lengthRatio) * math.cos(startLat),
-                                       math.cos(lengthRatio) - math.sin(startLat) * math.sin(newLat))
-        return [math.degrees(newLat), math.degrees(newLon)]
+        newLat = np.arcsin(
+            np.sin(startLat) * np.cos(lengthRatio) + np.cos(startLat) * np.sin(lengthRatio) * np.cos(bearing))
+        newLon = startLon + np.arctan2(np.sin(bearing) * np.sin(lengthRatio) * np.cos(startLat),
+                                       np.cos(lengthRatio) - np.sin(startLat) * np.sin(newLat))
+        return [np.degrees(newLat), np.degrees(newLon)]
 
     @staticmethod
     def GetAngleToNorthFromVector(deltaLon, deltaLat):
@@ -326,3 +516,30 @@ class IConvertor:
             angle = 2 * math.pi - angle
 
         return angle
+
+    @staticmethod
+    def GetAnglesToNorthFromVectors(deltaLon: np.ndarray, deltaLat: np.ndarray) -> np.ndarray:
+        """
+        Array version of GetAngleToNorthFromVector, converts all vectors to angles compared to north at once.
+
+        Parameters
+        ----------
+        deltaLon: np.ndarray
+            differences in longitude
+        deltaLat: np.ndarray
+            differences in latitude
+
+        Returns
+        -------
+        np.ndarray
+            Angles to north in radians, 0 for zero length vectors
+        """
+        deltaLon = np.asarray(deltaLon, dtype=np.float64)
+        deltaLat = np.asarray(deltaLat, dtype=np.float64)
+
+        # cos(theta) of the unit vector with north, zero length vectors point north
+        length = np.sqrt(deltaLon * deltaLon + deltaLat * deltaLat)
+        dotProduct = np.divide(deltaLat, length, out=np.ones_like(length), where=length != 0)
+        angles = np.arccos(np.clip(dotProduct, -1, 1))
+
+        return np.where(deltaLon < 0, 2 * math.pi - angles, angles)
@@ -6,9 +6,18 @@
 Pipeline object that handles the conversion of the 2D objects to 3D objects and sending it to the API.
 """
 
+import numpy as np
+
 from FrameAnalyzer.IDataWriteConnection import *
 from Positioner.IConvertor import *
 from API.APIController import *
+from Positioner.RijksdriehoekConversion import RijksdriehoekConversion
+from FrameAnalyzer.DetectionBatch import DetectionBatch
+from Positioner.PositionFusion import PositionFusion
+from Positioner.PositionSmoother import PositionSmoother
+from Positioner.TrackStore import TrackStore
+from Positioner.ZoneIndex import ZoneIndex
+from Positioner.Analytics.IAnalytics import IAnalytics
 
 
 # The Positioner takes 2D object data and transforms it into 3D object data to send to the visualizer
@@ -21,47 +30,124 @@ class MainPositioner(IDataWriteConnection):
     convertor: IConvertor = None
     api: APIController = None
     writeToConsole: bool = False
+    fusion: PositionFusion = None
+    cameraId: str = None
+    trackStore: TrackStore = None
+    smoother: PositionSmoother = None
+    extrapolate: bool = False
+    zoneIndex: ZoneIndex = None
+    analytics: [IAnalytics] = None
 
-    def __init__(self, convertor: IConvertor, api: APIController, writeToConsole: bool = False):
+    def __init__(self, convertor: IConvertor, api: APIController, writeToConsole: bool = False,
+                 fusion: PositionFusion = None, cameraId: str = None, trackStore: TrackStore = None,
+                 smoother: PositionSmoother = None, extrapolate: bool = False, zoneIndex: ZoneIndex = None,
+                 analytics: [IAnalytics] = None):
         self.convertor = convertor
         self.api = api
         self.writeToConsole = writeToConsole
+        self.fusion = fusion
+        self.cameraId = cameraId
+        self.trackStore = trackStore
+        self.smoother = smoother
+        self.extrapolate = extrapolate
+        self.zoneIndex = zoneIndex
+        self.analytics = analytics if analytics is not None else []
 
-    def WriteData(self, detections: [DetectedObject], frameIndex: int, frameReadDatetime: datetime):
+    def WriteData(self, detections: DetectionBatch or [DetectedObject], frameIndex: int,
+                  frameReadDatetime: datetime):
         """
         Implementation of WriteData from the IDataWriteConnection.
-        Converts the DetectedObject[] data using the given IConvertor and sends it through the API.
+        Converts the detections using the given IConvertor and sends them through the API as a DetectionBatch.
+        A frame without detections is not converted, but it still updates the analytics and is sent,
+        so the averages count the empty frames and the clients see that the objects left.
 
         Parameters
         ----------
-        detections : [DetectedObject]
-            The DetectedObject[] data.
+        detections : DetectionBatch or [DetectedObject]
+            The detections, list based detectors are converted to a DetectionBatch.
         frameIndex : int
-            The index of the frame belonging to the DetectedObject[] data.
+            The index of the frame belonging to the detections.
         frameReadDatetime : datetime
             The time at which the frame was initially loaded into the system
         """
         # No detections
         if detections is None:
             return
-        if len(detections) <= 0:
-            return
+        detectionBatch = DetectionBatch.FromDetections(detections)
 
         if self.writeToConsole:
             print('Frame: {0}'.format(frameIndex))
-            # for detection in detections:
-            #     print(detection)
 
-        # Convert the data to 3D
+        # Convert the data to 3D, a frame without detections has nothing to convert
         if self.convertor is None:
             return
-        detectedObjectPositions = self.convertor.ConversionSinglePixelError(detections, frameIndex)
+        if len(detectionBatch) > 0:
+            detectionBatch = self.convertor.ConvertBatch(detectionBatch, frameIndex)
+            detectionBatch = MainPositioner._AddRijksdriehoekPositions(detectionBatch)
+
+        # Give objects that are also seen by other cameras the same id
+        if self.fusion is not None:
+            detectionBatch = self.fusion.Fuse(detectionBatch, self.cameraId, frameReadDatetime.timestamp())
+
+        # Smooth the positions of every track
+        if self.smoother is not None:
+            detectionBatch = self.smoother.Smooth(detectionBatch, frameReadDatetime.timestamp())
+
+        # Remember the positions of every track
+        if self.trackStore is not None:
+            self.trackStore.Update(detectionBatch, frameReadDatetime.timestamp())
+
+        # Tag the positions with the zones they are inside
+        if self.zoneIndex is not None:
+            self.zoneIndex.Refresh()
+            detectionBatch = self.zoneIndex.Tag(detectionBatch)
+
+        # Update the analytics, they publish their results on their own channels
+        for analytics in self.analytics:
+            analytics.Update(detectionBatch, frameReadDatetime.timestamp())
+            analytics.Publish(self.api, frameReadDatetime.timestamp())
 
         if self.writeToConsole:
-            for detection in detectedObjectPositions:
+            for detection in detectionBatch.ToDetectedObjectPositions():
                 print(detection)
 
         # Send data through the API
         if self.api is None:
             return
-        self.api.Send(detectedObjectPositions, frameIndex, frameReadDatetime)
+        # Move the smoothed positions to the time they are published, compensating for the time spent in the queue
+        # of the positioner and in the stages above. The time the API takes to write them is not compensated
+        if self.smoother is not None and self.extrapolate:
+            detectionBatch = self.smoother.Extrapolate(detectionBatch, frameReadDatetime.timestamp(),
+                                                       datetime.now().timestamp())
+        self.api.Send(detectionBatch, frameIndex, frameReadDatetime)
+
+    @staticmethod
+    def _AddRijksdriehoekPositions(detectionBatch: DetectionBatch) -> DetectionBatch:
+        """
+        Fills in the Rijksdriehoek coordinates of the detections the convertor did not provide them for,
+        all detections are converted at once.
+
+        Parameters
+        ----------
+        detectionBatch : DetectionBatch
+            The converted detections
+
+        Returns
+        -------
+        DetectionBatch
+            The detections, all with Rijksdriehoek coordinates
+        """
+        if detectionBatch is None:
+            return None
+        missing = np.isnan(detectionBatch.rijksdriehoekX) | np.isnan(detectionBatch.rijksdriehoekY)
+        if not missing.any():
+            return detectionBatch
+
+        (rdX, rdY) = RijksdriehoekConversion.FromWgs(detectionBatch.latitude[missing],
+                                                     detectionBatch.longitude[missing])
+        rijksdriehoekX = detectionBatch.rijksdriehoekX.copy()
+        rijksdriehoekY = detectionBatch.rijksdriehoekY.copy()
+        rijksdriehoekX[missing] = rdX
+        rijksdriehoekY[missing] = rdY
+        return detectionBatch.WithPositions(detectionBatch.latitude, detectionBatch.longitude, detectionBatch.altitude,
+                                            detectionBatch.locationRadius, rijksdriehoekX, rijksdriehoekY)
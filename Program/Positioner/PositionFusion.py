@@ -0,0 +1,300 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+"""
+Fusion of the world positions of cameras with overlapping views, so an object seen by several cameras gets one id.
+"""
+
+import argparse
+import threading
+from typing import Any, Dict, NamedTuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from FrameAnalyzer.DetectionBatch import DetectionBatch
+from Positioner.RijksdriehoekConversion import RijksdriehoekConversion
+
+
+class FusionStatistics(NamedTuple):
+    """The state of a PositionFusion"""
+    objects: int
+    """The number of fused objects that are kept"""
+    created: int
+    """The number of global ids that were handed out"""
+    merged: int
+    """The number of detections that were merged with an object of another camera"""
+
+
+class PositionFusion:
+    """
+    Gives every converted detection a global id that is stable over the frames and shared between cameras.
+    A detection keeps the global id of its (camera, id) pair, a new pair is merged with the nearest object that
+    another camera saw within mergeDistance meters and timeWindow seconds, otherwise it gets a new global id.
+    The recent objects are searched with a KD-tree, so a batch costs O((N + M) log M) instead of O(N * M).
+    Only the positioners that share an instance are fused, the program runs a pipeline for its camera and for every
+    fusion camera (see AddPositionFusionArguments) and shares one instance between them.
+    """
+    MAX_CANDIDATES = 4
+    """The number of nearest objects that are considered for every detection"""
+
+    mergeDistance: float = 1.0
+    """The maximum distance in meters between positions of the same object"""
+    timeWindow: float = 1.0
+    """The maximum time in seconds between positions of the same object seen by different cameras"""
+    idTimeout: float = 10.0
+    """The time in seconds after which an object that is not seen anymore is forgotten"""
+
+    def __init__(self, mergeDistance: float = 1.0, timeWindow: float = 1.0, idTimeout: float = 10.0):
+        """
+        Constructor of the fusion, one instance is shared by the positioners of the cameras that are fused.
+
+        Parameters
+        ----------
+        mergeDistance : float
+            The maximum distance in meters between positions of the same object
+        timeWindow : float
+            The maximum time in seconds between positions of the same object seen by different cameras
+        idTimeout : float
+            The time in seconds after which an object that is not seen anymore is forgotten
+        """
+        if mergeDistance <= 0:
+            raise ValueError("The merge distance must be positive.")
+        if timeWindow < 0 or idTimeout < timeWindow:
+            raise ValueError("The time window must be positive and not longer than the id timeout.")
+
+        self.mergeDistance = mergeDistance
+        self.timeWindow = timeWindow
+        self.idTimeout = idTimeout
+
+        self._lock = threading.Lock()
+        self._nextId = 1
+        self._merged = 0
+        # Global id -> last Rijksdriehoek position and time of the object
+        self._positions: Dict[int, tuple] = {}
+        self._times: Dict[int, float] = {}
+        # Global id -> camera -> (local id, time), the cameras that saw the object
+        self._sources: Dict[int, Dict[str, tuple]] = {}
+        # (camera, local id) -> global id
+        self._globalIds: Dict[tuple, int] = {}
+
+    def Fuse(self, detectionBatch: DetectionBatch, cameraId: str, timestamp: float) -> DetectionBatch:
+        """
+        Replaces the ids of the converted detections of a camera with global ids.
+
+        Parameters
+        ----------
+        detectionBatch : DetectionBatch
+            The converted detections of a frame, with world positions
+        cameraId : str
+            The unique identifier of the camera that saw the detections
+        timestamp : float
+            The time in seconds at which the frame was read
+
+        Returns
+        -------
+        DetectionBatch
+            The detections with global ids
+        """
+        if detectionBatch is None or len(detectionBatch) == 0:
+            return detectionBatch
+
+        positions = PositionFusion._MetricPositions(detectionBatch)
+        localIds = detectionBatch.id.tolist()
+        count = len(localIds)
+
+        with self._lock:
+            self._Expire(timestamp)
+
+            # Detections whose (camera, id) pair is known keep their global id
+            globalIds = [None] * count
+            for i, localId in enumerate(localIds):
+                if localId != DetectionBatch.NO_ID:
+                    globalIds[i] = self._globalIds.get((cameraId, localId))
+            unmatched = [i for i in range(count) if globalIds[i] is None]
+
+            if len(unmatched) > 0:
+                claimed = set(globalIds)
+                for i, globalId in self._MatchNearby(positions[unmatched], unmatched, cameraId, timestamp, claimed):
+                    globalIds[i] = globalId
+                    self._merged += 1
+
+            for i in range(count):
+                if globalIds[i] is None:
+                    globalIds[i] = self._nextId
+                    self._nextId += 1
+                self._Update(globalIds[i], cameraId, localIds[i], positions[i], timestamp)
+
+        return detectionBatch.WithIds(globalIds)
+
+    def GetStatistics(self) -> FusionStatistics:
+        """
+        Get the current state of the fusion.
+
+        Returns
+        -------
+        FusionStatistics
+            The number of kept objects and the id counters
+        """
+        with self._lock:
+            return FusionStatistics(len(self._times), self._nextId - 1, self._merged)
+
+    def _MatchNearby(self, positions: np.ndarray, indices: list, cameraId: str, timestamp: float, claimed: set):
+        """
+        Matches detections to the nearest recent object another camera saw, every object is matched at most once.
+
+        Parameters
+        ----------
+        positions : np.ndarray
+            (N, 2) array of the Rijksdriehoek positions of the detections
+        indices : list
+            The index in the batch of every detection
+        cameraId : str
+            The camera that saw the detections
+        timestamp : float
+            The time at which the detections were seen
+        claimed : set
+            The global ids that are already used by this batch
+
+        Returns
+        -------
+        [(int, int)]
+            The batch index and global id of the matched detections
+        """
+        # An object that this camera saw recently is another object, even if it is close
+        startTime = timestamp - self.timeWindow
+        candidates = [globalId for globalId, time in self._times.items()
+                      if time >= startTime and globalId not in claimed
+                      and self._sources[globalId].get(cameraId, (None, -np.inf))[1] < startTime]
+        if len(candidates) == 0:
+            return []
+
+        tree = cKDTree(np.array([self._positions[globalId] for globalId in candidates]))
+        (distances, neighbours) = tree.query(positions, k=min(PositionFusion.MAX_CANDIDATES, len(candidates)),
+                                             distance_upper_bound=self.mergeDistance)
+        distances = distances.reshape(len(positions), -1)
+        neighbours = neighbours.reshape(len(positions), -1)
+
+        # Greedily match the closest pairs first
+        (rows, columns) = np.nonzero(np.isfinite(distances))
+        order = np.argsort(distances[rows, columns], kind='stable')
+        matches = []
+        matchedRows = set()
+        matchedObjects = set()
+        for row, neighbour in zip(rows[order].tolist(), neighbours[rows[order], columns[order]].tolist()):
+            if row in matchedRows or neighbour in matchedObjects:
+                continue
+            matchedRows.add(row)
+            matchedObjects.add(neighbour)
+            matches.append((indices[row], candidates[neighbour]))
+        return matches
+
+    def _Update(self, globalId: int, cameraId: str, localId: int, position: np.ndarray, timestamp: float):
+        """
+        Stores the latest position of an object and the (camera, id) pair it was seen as.
+        """
+        self._positions[globalId] = (float(position[0]), float(position[1]))
+        self._times[globalId] = max(timestamp, self._times.get(globalId, timestamp))
+        sources = self._sources.setdefault(globalId, {})
+
+        # The detections without an id can't be recognised in the next frame
+        if localId == DetectionBatch.NO_ID:
+            return
+        previous = sources.get(cameraId)
+        if previous is not None and previous[0] != localId:
+            self._globalIds.pop((cameraId, previous[0]), None)
+        sources[cameraId] = (localId, timestamp)
+        self._globalIds[(cameraId, localId)] = globalId
+
+    def _Expire(self, timestamp: float):
+        """
+        Forgets the objects that were not seen for idTimeout seconds.
+        """
+        endTime = timestamp - self.idTimeout
+        for globalId in [globalId for globalId, time in self._times.items() if time < endTime]:
+            del self._positions[globalId]
+            del self._times[globalId]
+            for cameraId, (localId, _) in self._sources.pop(globalId).items():
+                self._globalIds.pop((cameraId, localId), None)
+
+    @staticmethod
+    def _MetricPositions(detectionBatch: DetectionBatch) -> np.ndarray:
+        """
+        The Rijksdriehoek positions of the detections in meters, converted from WGS-84 where they are missing.
+        """
+        rdX = detectionBatch.rijksdriehoekX.copy()
+        rdY = detectionBatch.rijksdriehoekY.copy()
+        missing = np.isnan(rdX) | np.isnan(rdY)
+        if missing.any():
+            (rdX[missing], rdY[missing]) = RijksdriehoekConversion.FromWgs(detectionBatch.latitude[missing],
+                                                                          detectionBatch.longitude[missing])
+        return np.column_stack((rdX, rdY))
+
+    @staticmethod
+    def AddPositionFusionArguments(parser: argparse.ArgumentParser):  # pragma: no cover
+        """
+        Adds the arguments for the position fusion to the parser.
+
+        Parameters
+        ----------
+        parser : argparse.ArgumentParser
+            The parser that is used to add the arguments.
+        """
+
+        if parser is None:
+            raise TypeError("Parser is none.")
+
+        parser.add_argument("-fd", "--fusionDistance", type=float, default=0,
+                            help="The maximum distance in meters between positions of the same object seen by "
+                                 "different cameras, 0 disables the fusion of positions.")
+        parser.add_argument("-fw", "--fusionWindow", type=float, default=1.0,
+                            help="The maximum time in seconds between positions of the same object seen by "
+                                 "different cameras.")
+        parser.add_argument("-fc", "--fusionCameras", nargs="*", default=[],
+                            help="The video files or streams of more cameras with views that overlap the main camera. "
+                                 "Each runs its own pipeline with its saved calibration and without a window, its "
+                                 "positions are fused with those of the other cameras and sent through the API.")
+
+    @staticmethod
+    def ValidatePositionFusionArguments(arguments: Dict[str, Any]):
+        """
+        Validate the parsed arguments.
+
+        Parameters
+        ----------
+        arguments : Dict[str, Any]
+            The arguments that are validated
+        """
+
+        if arguments is None or not arguments:
+            raise TypeError("Arguments are empty or None.")
+        if not isinstance(arguments["fusionDistance"], (int, float)) or arguments["fusionDistance"] < 0:
+            raise ValueError("Fusion distance must be a positive number or 0.")
+        if not isinstance(arguments["fusionWindow"], (int, float)) or arguments["fusionWindow"] < 0:
+            raise ValueError("Fusion window must be a positive number.")
+        if not isinstance(arguments["fusionCameras"], list) or \
+                not all(isinstance(location, str) and location != "" for location in arguments["fusionCameras"]):
+            raise TypeError("Fusion cameras must be a list of video files or streams.")
+        if arguments["fusionCameras"] and arguments["fusionDistance"] <= 0:
+            raise ValueError("Fusion cameras require a fusion distance.")
+
+    @staticmethod
+    def FromArguments(arguments: Dict[str, Any]):
+        """
+        Creates the fusion given by the arguments.
+
+        Parameters
+        ----------
+        arguments : Dict[str, Any]
+            The validated arguments
+
+        Returns
+        -------
+        PositionFusion|None
+            The fusion, or None if it is disabled
+        """
+        if arguments["fusionDistance"] <= 0:
+            return None
+        return PositionFusion(arguments["fusionDistance"], arguments["fusionWindow"],
+                              max(PositionFusion.idTimeout, arguments["fusionWindow"]))
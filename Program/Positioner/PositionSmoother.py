@@ -0,0 +1,255 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+"""
+Kalman smoothing of the world positions of all tracks at once.
+"""
+
+import argparse
+import threading
+from typing import Any, Dict
+
+import numpy as np
+
+from FrameAnalyzer.DetectionBatch import DetectionBatch
+from Positioner.RijksdriehoekConversion import RijksdriehoekConversion
+from Positioner.TrackSlots import TrackSlots
+
+
+class PositionSmoother:
+    """
+    Keeps a constant velocity Kalman filter in Rijksdriehoek coordinates for every live track.
+    The states (x, y, vx, vy) and covariances of all tracks are stacked in arrays, so the predict and update
+    steps of a frame are a few batched matrix operations, whatever the number of tracks.
+    """
+
+    processNoise: float = 1.0
+    """The spectral density of the random acceleration of the objects, in m^2/s^3"""
+    measurementNoise: float = 0.5
+    """The standard deviation of a converted position in meters"""
+    initialSpeed: float = 2.0
+    """The standard deviation of the speed of a new track in meters per second"""
+
+    def __init__(self, processNoise: float = 1.0, measurementNoise: float = 0.5, maxTracks: int = 256,
+                 trackTimeout: float = 2.0, initialSpeed: float = 2.0):
+        """
+        Constructor of the smoother, the state of all tracks is allocated here.
+
+        Parameters
+        ----------
+        processNoise : float
+            The spectral density of the random acceleration of the objects, in m^2/s^3
+        measurementNoise : float
+            The standard deviation of a converted position in meters
+        maxTracks : int
+            The maximum number of tracks
+        trackTimeout : float
+            The number of seconds after which the filter of a track that is not seen anymore is removed
+        initialSpeed : float
+            The standard deviation of the speed of a new track in meters per second
+        """
+        if processNoise <= 0 or measurementNoise <= 0 or initialSpeed <= 0:
+            raise ValueError("The noise of the smoother must be positive.")
+
+        self.processNoise = processNoise
+        self.measurementNoise = measurementNoise
+        self.initialSpeed = initialSpeed
+
+        self._trackSlots = TrackSlots(maxTracks, trackTimeout)
+        self._states = np.zeros((maxTracks, 4))
+        self._covariances = np.zeros((maxTracks, 4, 4))
+        self._lock = threading.Lock()
+
+    def Smooth(self, detectionBatch: DetectionBatch, timestamp: float) -> DetectionBatch:
+        """
+        Updates the filters with the detections and replaces their positions with the filtered positions.
+        Detections without an id or without a position are left as they are.
+
+        Parameters
+        ----------
+        detectionBatch : DetectionBatch
+            The converted detections of a frame, with Rijksdriehoek coordinates
+        timestamp : float
+            The time in seconds at which the frame was read
+
+        Returns
+        -------
+        DetectionBatch
+            The detections with filtered positions at the time of the frame, see Extrapolate
+        """
+        if detectionBatch is None or len(detectionBatch) == 0:
+            return detectionBatch
+
+        (ids, indices) = TrackSlots.UniqueIds(detectionBatch)
+        measurements = np.column_stack((detectionBatch.rijksdriehoekX[indices],
+                                        detectionBatch.rijksdriehoekY[indices]))
+        valid = np.isfinite(measurements).all(axis=1)
+        (ids, indices, measurements) = (ids[valid][:self._trackSlots.maxTracks],
+                                        indices[valid][:self._trackSlots.maxTracks],
+                                        measurements[valid][:self._trackSlots.maxTracks])
+        if len(ids) == 0:
+            return detectionBatch
+
+        with self._lock:
+            self._trackSlots.Expire(timestamp)
+            (slots, isNew) = self._trackSlots.Assign(ids)
+
+            # New tracks start at their measurement without speed
+            newSlots = slots[isNew]
+            self._states[newSlots, :2] = measurements[isNew]
+            self._states[newSlots, 2:] = 0
+            self._covariances[newSlots] = np.diag([self.measurementNoise ** 2] * 2 + [self.initialSpeed ** 2] * 2)
+
+            updateSlots = slots[~isNew]
+            if len(updateSlots) > 0:
+                elapsed = np.maximum(timestamp - self._trackSlots.lastTimes[updateSlots], 0)
+                self._Predict(updateSlots, elapsed)
+                self._Update(updateSlots, measurements[~isNew])
+            self._trackSlots.lastTimes[slots] = timestamp
+
+            positions = self._states[slots, :2].copy()
+
+        return PositionSmoother._WithPositions(detectionBatch, indices, measurements, positions)
+
+    def Extrapolate(self, detectionBatch: DetectionBatch, timestamp: float, outputTime: float) -> DetectionBatch:
+        """
+        Moves the detection of every track with the filtered velocity of the track, from the time of the frame to the
+        output time. Call it just before the positions are published, so the time the frame spent in
+        the pipeline is compensated. Detections without a track or without a position are left as they are.
+
+        Parameters
+        ----------
+        detectionBatch : DetectionBatch
+            The smoothed detections, see Smooth
+        timestamp : float
+            The time in seconds at which the frame was read
+        outputTime : float
+            The time in seconds the positions are extrapolated to
+
+        Returns
+        -------
+        DetectionBatch
+            The detections with extrapolated positions
+        """
+        if detectionBatch is None or len(detectionBatch) == 0:
+            return detectionBatch
+
+        (ids, indices) = TrackSlots.UniqueIds(detectionBatch)
+        with self._lock:
+            slots = [self._trackSlots.Get(objectId) for objectId in ids.tolist()]
+            tracked = np.array([slot is not None for slot in slots], dtype=bool)
+            slots = np.array([slot for slot in slots if slot is not None], dtype=np.int64)
+            offsets = self._states[slots, 2:] * (outputTime - timestamp)
+
+        indices = indices[tracked]
+        positions = np.column_stack((detectionBatch.rijksdriehoekX[indices], detectionBatch.rijksdriehoekY[indices]))
+        valid = np.isfinite(positions).all(axis=1)
+        if not valid.any():
+            return detectionBatch
+        return PositionSmoother._WithPositions(detectionBatch, indices[valid], positions[valid],
+                                               positions[valid] + offsets[valid])
+
+    def GetTrackCount(self) -> int:
+        """
+        Returns
+        -------
+        int
+            The number of tracks with a filter
+        """
+        with self._lock:
+            return len(self._trackSlots)
+
+    def _Predict(self, slots: np.ndarray, elapsed: np.ndarray):
+        """
+        Moves the states of the tracks elapsed seconds forward with their velocity.
+        """
+        count = len(slots)
+        transitions = np.tile(np.eye(4), (count, 1, 1))
+        transitions[:, 0, 2] = elapsed
+        transitions[:, 1, 3] = elapsed
+
+        # Random acceleration with the process noise, for both axes
+        noise = np.zeros((count, 4, 4))
+        (dt2, dt3) = (elapsed ** 2 * self.processNoise, elapsed ** 3 * self.processNoise)
+        noise[:, [0, 1], [0, 1]] = (dt3 / 3)[:, np.newaxis]
+        noise[:, [0, 1, 2, 3], [2, 3, 0, 1]] = (dt2 / 2)[:, np.newaxis]
+        noise[:, [2, 3], [2, 3]] = (elapsed * self.processNoise)[:, np.newaxis]
+
+        self._states[slots] = np.einsum('nij,nj->ni', transitions, self._states[slots])
+        self._covariances[slots] = transitions @ self._covariances[slots] @ transitions.transpose(0, 2, 1) + noise
+
+    def _Update(self, slots: np.ndarray, measurements: np.ndarray):
+        """
+        Corrects the states of the tracks with the measured positions.
+        """
+        states = self._states[slots]
+        covariances = self._covariances[slots]
+
+        residuals = measurements - states[:, :2]
+        innovations = covariances[:, :2, :2] + np.eye(2) * self.measurementNoise ** 2
+        gains = covariances[:, :, :2] @ np.linalg.inv(innovations)
+
+        self._states[slots] = states + np.einsum('nij,nj->ni', gains, residuals)
+        self._covariances[slots] = covariances - gains @ covariances[:, :2, :]
+
+    @staticmethod
+    def _WithPositions(detectionBatch: DetectionBatch, indices: np.ndarray, measurements: np.ndarray,
+                       positions: np.ndarray) -> DetectionBatch:
+        """
+        Replaces the measured Rijksdriehoek positions of the detections at the indices with the filtered positions.
+        The WGS-84 positions are moved by the same offset, so they keep their accuracy.
+        """
+        rijksdriehoekX = detectionBatch.rijksdriehoekX.copy()
+        rijksdriehoekY = detectionBatch.rijksdriehoekY.copy()
+        rijksdriehoekX[indices] = positions[:, 0]
+        rijksdriehoekY[indices] = positions[:, 1]
+
+        (measuredLatitudes, measuredLongitudes) = RijksdriehoekConversion.ToWgs(measurements[:, 0], measurements[:, 1])
+        (filteredLatitudes, filteredLongitudes) = RijksdriehoekConversion.ToWgs(positions[:, 0], positions[:, 1])
+        latitude = detectionBatch.latitude.copy()
+        longitude = detectionBatch.longitude.copy()
+        latitude[indices] += filteredLatitudes - measuredLatitudes
+        longitude[indices] += filteredLongitudes - measuredLongitudes
+
+        return detectionBatch.WithPositions(latitude, longitude, detectionBatch.altitude,
+                                            detectionBatch.locationRadius, rijksdriehoekX, rijksdriehoekY)
+
+    @staticmethod
+    def AddPositionSmootherArguments(parser: argparse.ArgumentParser):  # pragma: no cover
+        """
+        Adds the arguments for the position smoother to the parser.
+
+        Parameters
+        ----------
+        parser : argparse.ArgumentParser
+            The parser that is used to add the arguments.
+        """
+
+        if parser is None:
+            raise TypeError("Parser is none.")
+
+        parser.add_argument("-sm", "--smoothing", action="store_true", default=False,
+                            help="Smooth the positions of every track with a Kalman filter.")
+        parser.add_argument("-mn", "--measurementNoise", type=float, default=0.5,
+                            help="The expected error of a converted position in meters, used by the smoothing.")
+        parser.add_argument("-ex", "--extrapolate", action="store_true", default=False,
+                            help="Extrapolate the smoothed positions to the time they are published.")
+
+    @staticmethod
+    def ValidatePositionSmootherArguments(arguments: Dict[str, Any]):
+        """
+        Validate the parsed arguments.
+
+        Parameters
+        ----------
+        arguments : Dict[str, Any]
+            The arguments that are validated
+        """
+
+        if arguments is None or not arguments:
+            raise TypeError("Arguments are empty or None.")
+        if not isinstance(arguments["measurementNoise"], (int, float)) or arguments["measurementNoise"] <= 0:
+            raise ValueError("Measurement noise must be a positive number.")
+        if arguments["extrapolate"] and not arguments["smoothing"]:
+            raise ValueError("Extrapolating the positions requires smoothing.")
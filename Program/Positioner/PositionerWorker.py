@@ -0,0 +1,244 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+"""
+Runs the positioner on its own thread, fed by a bounded queue, so the detection loop never waits for it.
+"""
+
+import argparse
+import collections
+import threading
+import traceback
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, NamedTuple
+
+from FrameAnalyzer.IDataWriteConnection import IDataWriteConnection
+
+
+class QueueOverflowPolicy(Enum):
+    """What happens when a frame is written while the queue is full"""
+    DropOldest = 'dropOldest'
+    """The oldest queued frame is dropped to make room for the new frame"""
+    KeepLatest = 'keepLatest'
+    """All queued frames are dropped, only the new frame is kept"""
+    Block = 'block'
+    """The writer waits until there is room, this throttles the detector to the speed of the positioner"""
+
+
+class QueueStatistics(NamedTuple):
+    """The state of the queue of a PositionerWorker"""
+    depth: int
+    """The number of frames waiting in the queue"""
+    capacity: int
+    """The maximum number of frames in the queue"""
+    written: int
+    """The number of frames written to the worker"""
+    processed: int
+    """The number of frames handed to the positioner"""
+    dropped: int
+    """The number of frames dropped because the queue was full"""
+
+
+class PositionerWorker(IDataWriteConnection):
+    """
+    An IDataWriteConnection that queues the frames and writes them to another IDataWriteConnection
+    (the MainPositioner) on a separate thread.
+    """
+    dataWriteConnection: IDataWriteConnection = None
+    capacity: int = 8
+    policy: QueueOverflowPolicy = QueueOverflowPolicy.DropOldest
+
+    def __init__(self, dataWriteConnection: IDataWriteConnection, capacity: int = 8,
+                 policy: QueueOverflowPolicy = QueueOverflowPolicy.DropOldest):
+        """
+        Constructor of the PositionerWorker, the worker thread is started with Start.
+
+        Parameters
+        ----------
+        dataWriteConnection : IDataWriteConnection
+            The connection the frames are written to on the worker thread
+        capacity : int
+            The maximum number of queued frames
+        policy : QueueOverflowPolicy
+            What happens when a frame is written while the queue is full
+        """
+        if capacity < 1:
+            raise ValueError("The queue capacity must be at least 1.")
+
+        self.dataWriteConnection = dataWriteConnection
+        self.capacity = capacity
+        self.policy = policy
+
+        self._queue = collections.deque()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+        self._busy = False
+        self._written = 0
+        self._processed = 0
+        self._dropped = 0
+
+    def Start(self):
+        """
+        Start the worker thread.
+        """
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+
+        self._thread = threading.Thread(target=self._Run, name="PositionerWorker")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def Stop(self, drain: bool = True, timeout: float = None):
+        """
+        Stop the worker thread.
+
+        Parameters
+        ----------
+        drain : bool
+            Whether the queued frames are still written before stopping, otherwise they are dropped
+        timeout : float
+            The maximum number of seconds to wait for the thread
+        """
+        with self._condition:
+            if not drain:
+                self._dropped += len(self._queue)
+                self._queue.clear()
+            self._running = False
+            self._condition.notify_all()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def WriteData(self, detections, frameIndex: int, frameReadDatetime: datetime):
+        """
+        Implementation of WriteData from the IDataWriteConnection.
+        Queues the detections for the worker thread and returns directly, unless the policy is Block and
+        the queue is full.
+
+        Parameters
+        ----------
+        detections : DetectionBatch or [DetectedObject]
+            The detections of the frame.
+        frameIndex : int
+            The frame index belonging to the detections.
+        frameReadDatetime : datetime
+            The time at which the frame was initially loaded into the system
+        """
+        with self._condition:
+            self._written += 1
+
+            if self.policy == QueueOverflowPolicy.Block:
+                while self._running and len(self._queue) >= self.capacity:
+                    self._condition.wait()
+
+            # A stopped worker can't make room, so a blocking writer drops the oldest frame as well
+            if len(self._queue) >= self.capacity:
+                if self.policy == QueueOverflowPolicy.KeepLatest:
+                    self._dropped += len(self._queue)
+                    self._queue.clear()
+                else:
+                    self._dropped += 1
+                    self._queue.popleft()
+
+            self._queue.append((detections, frameIndex, frameReadDatetime))
+            self._condition.notify_all()
+
+    def GetStatistics(self) -> QueueStatistics:
+        """
+        Get the current state of the queue.
+
+        Returns
+        -------
+        QueueStatistics
+            The queue depth and the frame counters
+        """
+        with self._condition:
+            return QueueStatistics(len(self._queue), self.capacity, self._written, self._processed, self._dropped)
+
+    def WaitUntilIdle(self, timeout: float = None) -> bool:
+        """
+        Wait until all queued frames have been written by the worker thread.
+
+        Parameters
+        ----------
+        timeout : float
+            The maximum number of seconds to wait
+
+        Returns
+        -------
+        bool
+            Whether the worker is idle
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: len(self._queue) == 0 and not self._busy, timeout)
+
+    def _Run(self):
+        """
+        The worker thread, writes the queued frames until it is stopped.
+        """
+        while True:
+            with self._condition:
+                while self._running and len(self._queue) == 0:
+                    self._condition.wait()
+                if len(self._queue) == 0:
+                    return
+                (detections, frameIndex, frameReadDatetime) = self._queue.popleft()
+                self._busy = True
+                self._condition.notify_all()
+
+            # An error in a single frame should not stop the positioner
+            try:
+                if self.dataWriteConnection is not None:
+                    self.dataWriteConnection.WriteData(detections, frameIndex, frameReadDatetime)
+            except Exception:
+                traceback.print_exc()
+
+            with self._condition:
+                self._busy = False
+                self._processed += 1
+                self._condition.notify_all()
+
+    @staticmethod
+    def AddPositionerWorkerArguments(parser: argparse.ArgumentParser):  # pragma: no cover
+        """
+        Adds the arguments for the positioner worker to the parser.
+
+        Parameters
+        ----------
+        parser : argparse.ArgumentParser
+            The parser that is used to add the arguments.
+        """
+
+        if parser is None:
+            raise TypeError("Parser is none.")
+
+        parser.add_argument("-pqs", "--positionerQueueSize", type=int, default=8,
+                            help="The maximum number of frames waiting for the positioner.")
+        parser.add_argument("-pqp", "--positionerQueuePolicy", type=str, default=QueueOverflowPolicy.DropOldest.value,
+                            help="What happens when the positioner queue is full: " +
+                                 ", ".join(policy.value for policy in QueueOverflowPolicy) + ".")
+
+    @staticmethod
+    def ValidatePositionerWorkerArguments(arguments: Dict[str, Any]):
+        """
+        Validate the parsed arguments.
+
+        Parameters
+        ----------
+        arguments : Dict[str, Any]
+            The arguments that are validated
+        """
+
+        if arguments is None or not arguments:
+            raise TypeError("Arguments are empty or None.")
+        if not isinstance(arguments["positionerQueueSize"], int) or arguments["positionerQueueSize"] < 1:
+            raise ValueError("Positioner queue size must be a positive number.")
+        if arguments["positionerQueuePolicy"] not in [policy.value for policy in QueueOverflowPolicy]:
+            raise ValueError("Positioner queue policy must be one of " +
+                             ", ".join(policy.value for policy in QueueOverflowPolicy) + ".")
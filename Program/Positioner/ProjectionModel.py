@@ -0,0 +1,285 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+"""
+Immutable projection from camera pixels to world positions, compiled from a homography calibration.
+"""
+
+import hashlib
+import json
+from typing import NamedTuple
+
+import numpy as np
+from Positioner.IConvertor import IConvertor
+from Positioner.RijksdriehoekConversion import RijksdriehoekConversion
+
+
+class ProjectionModel(NamedTuple):
+    """
+    The homography and the geo anchor of a calibration, compiled into a local east/north tangent frame.
+    Converting pixels only takes a matrix multiplication and a few element-wise array operations.
+    """
+    key: str
+    """Hash of the homography and geo data the model was compiled from, see GetKey"""
+    homographyMatrix: np.ndarray
+    """The (read-only) 3x3 matrix from camera pixels to top-down pixels"""
+    anchorPixelPosition: np.ndarray
+    """The top-down pixel position of the anchor"""
+    anchorGeoPosition: np.ndarray
+    """The latitude and longitude of the anchor in WGS-84 degrees"""
+    altitude: float
+    """The height of the scene in meters"""
+    anchorRdPosition: np.ndarray
+    """The position of the anchor in Rijksdriehoek coordinates"""
+    pixelScale: float
+    """The size of a top-down pixel in meters"""
+    degreesPerMeter: np.ndarray
+    """Degrees of latitude and longitude per meter north and east in the tangent frame at the anchor"""
+
+    EARTH_RADIUS = 6378100
+    """The radius of the earth in meters, the same as used by IConvertor.MoveGeoByBearing"""
+
+    @staticmethod
+    def GetKey(homographyMatrix, homographyGeoData, altitude=None) -> str:
+        """
+        Hash of everything a projection model is compiled from.
+
+        Parameters
+        ----------
+        homographyMatrix : np.ndarray
+            The homography matrix of the calibration
+        homographyGeoData : HomographyGeoData
+            The geo data of the calibration
+        altitude : float
+            The altitude of the plane, None for the altitude of the anchor
+
+        Returns
+        -------
+        str
+            The key
+        """
+        anchorRdPosition = getattr(homographyGeoData, 'anchorRdPosition', None)
+        description = json.dumps([
+            np.asarray(homographyGeoData.anchorPixelPosition, dtype=np.float64).tolist(),
+            [homographyGeoData.anchorGeoPosition.latitude, homographyGeoData.anchorGeoPosition.longitude,
+             homographyGeoData.anchorGeoPosition.altitude],
+            None if anchorRdPosition is None else np.asarray(anchorRdPosition, dtype=np.float64).tolist(),
+            homographyGeoData.pixelScale
+        ] + ([] if altitude is None else [altitude])).encode()
+
+        key = hashlib.sha1(np.asarray(homographyMatrix, dtype=np.float64).tobytes())
+        key.update(description)
+        return key.hexdigest()[:16]
+
+    @staticmethod
+    def FromConfiguration(configuration, homographyMatrix=None, altitude=None):
+        """
+        Compiles the projection model of a homography calibration configuration, or of one of its planes.
+
+        Parameters
+        ----------
+        configuration : HomographyCalibrationConfiguration
+            The configuration, only the homography matrix and geo data are used
+        homographyMatrix : np.ndarray
+            The homography matrix of a plane, None for the homography matrix of the configuration
+        altitude : float
+            The altitude of a plane, None for the altitude of the anchor
+
+        Returns
+        -------
+        ProjectionModel
+            The compiled model
+        """
+        geoData = configuration.homographyGeoData
+        if homographyMatrix is None:
+            homographyMatrix = configuration.homographyMatrix
+        anchorLatitude = float(geoData.anchorGeoPosition.latitude)
+        anchorLongitude = float(geoData.anchorGeoPosition.longitude)
+
+        # Resolve the anchor Rd position once, without writing it back into the configuration
+        anchorRdPosition = getattr(geoData, 'anchorRdPosition', None)
+        if anchorRdPosition is None:
+            (rdX, rdY) = RijksdriehoekConversion.FromWgs(anchorLatitude, anchorLongitude)
+            anchorRdPosition = (float(rdX), float(rdY))
+
+        # Tangent frame: a meter north is a fixed angle of latitude,
+        # a meter east shrinks with the cosine of the latitude
+        degreesPerMeterNorth = np.degrees(1 / ProjectionModel.EARTH_RADIUS)
+        degreesPerMeterEast = degreesPerMeterNorth / np.cos(np.radians(anchorLatitude))
+
+        def ReadOnly(values):
+            array = np.array(values, dtype=np.float64)
+            array.flags.writeable = False
+            return array
+
+        return ProjectionModel(
+            ProjectionModel.GetKey(homographyMatrix, geoData, altitude),
+            ReadOnly(homographyMatrix),
+            ReadOnly(geoData.anchorPixelPosition),
+            ReadOnly((anchorLatitude, anchorLongitude)),
+            float(geoData.anchorGeoPosition.altitude if altitude is None else altitude),
+            ReadOnly(anchorRdPosition),
+            float(geoData.pixelScale),
+            ReadOnly((degreesPerMeterNorth, degreesPerMeterEast))
+        )
+
+    def ToTopDown(self, pixelPositions: np.ndarray) -> np.ndarray:
+        """
+        Transforms camera pixel positions to top-down pixel positions.
+
+        Parameters
+        ----------
+        pixelPositions : np.ndarray
+            (N, 2) array of x and y pixel positions in the camera view
+
+        Returns
+        -------
+        np.ndarray
+            (N, 2) array of x and y pixel positions in the top-down view (not rounded)
+        """
+        pixelPositions = np.asarray(pixelPositions, dtype=np.float64).reshape(-1, 2)
+        homogeneousPositions = pixelPositions @ self.homographyMatrix[:, :2].T + self.homographyMatrix[:, 2]
+
+        # same as cv2.convertPointsFromHomogeneous: points at infinity keep a scale of 1
+        w = homogeneousPositions[:, 2:3]
+        scale = np.divide(1.0, w, out=np.ones_like(w), where=w != 0)
+        return homogeneousPositions[:, :2] * scale
+
+    def TopDownToOffsets(self, topDownPositions: np.ndarray) -> np.ndarray:
+        """
+        Converts top-down pixel positions to meters east and north of the anchor.
+
+        Parameters
+        ----------
+        topDownPositions : np.ndarray
+            (N, 2) array of x and y pixel positions in the top-down view
+
+        Returns
+        -------
+        np.ndarray
+            (N, 2) array of meters east and north of the anchor
+        """
+        return (topDownPositions - self.anchorPixelPosition) * (self.pixelScale, -self.pixelScale)
+
+    def TopDownToWorld(self, topDownPositions: np.ndarray) -> np.ndarray:
+        """
+        Converts top-down pixel positions to world positions in the tangent frame of the anchor.
+
+        Parameters
+        ----------
+        topDownPositions : np.ndarray
+            (N, 2) array of x and y pixel positions in the top-down view
+
+        Returns
+        -------
+        np.ndarray
+            (N, 4) array with the latitude, longitude, Rd x and Rd y of every position
+        """
+        offsets = self.TopDownToOffsets(topDownPositions)
+        return np.hstack((
+            self.anchorGeoPosition + offsets[:, ::-1] * self.degreesPerMeter,
+            self.anchorRdPosition + offsets
+        ))
+
+    def PixelsToWorld(self, pixelPositions: np.ndarray) -> np.ndarray:
+        """
+        Converts camera pixel positions to world positions.
+
+        Parameters
+        ----------
+        pixelPositions : np.ndarray
+            (N, 2) array of x and y pixel positions in the camera view
+
+        Returns
+        -------
+        np.ndarray
+            (N, 4) array with the latitude, longitude, Rd x and Rd y of every position
+        """
+        return self.TopDownToWorld(self.ToTopDown(pixelPositions))
+
+    def TopDownToGeoExact(self, topDownPositions: np.ndarray) -> np.ndarray:
+        """
+        Converts top-down pixel positions to geo positions with the exact spherical formula,
+        by moving from the anchor along the bearing of every position.
+
+        Parameters
+        ----------
+        topDownPositions : np.ndarray
+            (N, 2) array of x and y pixel positions in the top-down view
+
+        Returns
+        -------
+        np.ndarray
+            (N, 2) array with the latitude and longitude of every position
+        """
+        offsets = self.TopDownToOffsets(topDownPositions)
+        angles = IConvertor.GetAnglesToNorthFromVectors(offsets[:, 0], offsets[:, 1])
+        meters = np.sqrt(np.sum(offsets * offsets, axis=1))
+        [latitudes, longitudes] = IConvertor.MoveGeoByBearing(
+            self.anchorGeoPosition[0], self.anchorGeoPosition[1], np.rad2deg(angles), meters
+        )
+        return np.column_stack((latitudes, longitudes))
+
+    def ApproximationErrors(self, pixelPositions: np.ndarray) -> np.ndarray:
+        """
+        The distance between the tangent frame conversion and the exact spherical conversion.
+
+        Parameters
+        ----------
+        pixelPositions : np.ndarray
+            (N, 2) array of x and y pixel positions in the camera view
+
+        Returns
+        -------
+        np.ndarray
+            The error in meters for every pixel position
+        """
+        topDownPositions = self.ToTopDown(pixelPositions)
+        difference = self.TopDownToWorld(topDownPositions)[:, :2] - self.TopDownToGeoExact(topDownPositions)
+        return np.sqrt(np.sum((difference / self.degreesPerMeter) ** 2, axis=1))
+
+    def MaxApproximationError(self, resolution: (int, int), samples=32) -> float:
+        """
+        The largest distance between the tangent frame conversion and the exact spherical conversion
+        over a grid of samples covering the given resolution.
+
+        Parameters
+        ----------
+        resolution : (int, int)
+            The width and height of the camera frames
+        samples : int
+            The number of samples along each axis
+
+        Returns
+        -------
+        float
+            The largest error in meters
+        """
+        (gridX, gridY) = np.meshgrid(np.linspace(0, resolution[0] - 1, samples),
+                                     np.linspace(0, resolution[1] - 1, samples))
+        return float(np.max(self.ApproximationErrors(np.column_stack((gridX.ravel(), gridY.ravel())))))
+
+    def TopDownJacobians(self, pixelPositions: np.ndarray) -> np.ndarray:
+        """
+        Calculates the Jacobian of the camera to top-down transformation at every pixel position.
+
+        Parameters
+        ----------
+        pixelPositions : np.ndarray
+            (N, 2) array of x and y pixel positions in the camera view
+
+        Returns
+        -------
+        np.ndarray
+            (N, 2, 2) array, where [i, j, k] is the derivative of top-down coordinate j to camera coordinate k
+        """
+        M = self.homographyMatrix
+        pixelPositions = np.asarray(pixelPositions, dtype=np.float64).reshape(-1, 2)
+
+        w = pixelPositions @ M[2, :2] + M[2, 2]
+        topDownPositions = self.ToTopDown(pixelPositions)
+
+        # quotient rule: d(u_j / w) / dx_k = (M[j, k] - (u_j / w) * M[2, k]) / w
+        return (M[np.newaxis, :2, :2] - topDownPositions[:, :, np.newaxis] * M[np.newaxis, 2:3, :2]) \
+            / w[:, np.newaxis, np.newaxis]
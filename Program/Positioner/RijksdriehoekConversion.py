@@ -0,0 +1,109 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+"""
+Conversion between Rijksdriehoek coordinates and WGS-84 positions, for whole arrays of points.
+"""
+
+import numpy as np
+
+
+class RijksdriehoekConversion:
+    """
+    The polynomial approximations of the Rijksdriehoek to WGS-84 transformation and its inverse
+    (the same coefficients as the rijksdriehoek package), evaluated on arrays.
+    """
+
+    X0 = 155000
+    """The Rijksdriehoek x coordinate of the reference point (Amersfoort)"""
+    Y0 = 463000
+    """The Rijksdriehoek y coordinate of the reference point (Amersfoort)"""
+    PHI0 = 52.15517440
+    """The latitude of the reference point in degrees"""
+    LAM0 = 5.38720621
+    """The longitude of the reference point in degrees"""
+
+    # (p, q, coefficient) terms of the polynomials, in powers of the latitude and longitude offsets
+    _RD_X_TERMS = [(0, 1, 190094.945), (1, 1, -11832.228), (2, 1, -114.221), (0, 3, -32.391), (1, 0, -0.705),
+                   (3, 1, -2.34), (1, 3, -0.608), (0, 2, -0.008), (2, 3, 0.148)]
+    _RD_Y_TERMS = [(1, 0, 309056.544), (0, 2, 3638.893), (2, 0, 73.077), (1, 2, -157.984), (3, 0, 59.788),
+                   (0, 1, 0.433), (2, 2, -6.439), (1, 1, -0.032), (0, 4, 0.092), (1, 4, -0.054)]
+
+    # (p, q, coefficient) terms of the polynomials, in powers of the x and y offsets
+    _LATITUDE_TERMS = [(0, 1, 3235.65389), (2, 0, -32.58297), (0, 2, -0.24750), (2, 1, -0.84978),
+                       (0, 3, -0.06550), (2, 2, -0.01709), (1, 0, -0.00738), (4, 0, 0.00530), (2, 3, -0.00039),
+                       (4, 1, 0.00033), (1, 1, -0.00012)]
+    _LONGITUDE_TERMS = [(1, 0, 5260.52916), (1, 1, 105.94684), (1, 2, 2.45656), (3, 0, -0.81885),
+                        (1, 3, 0.05594), (3, 1, -0.05607), (0, 1, 0.01199), (3, 2, -0.00256), (1, 4, 0.00128),
+                        (0, 2, 0.00022), (2, 0, -0.00022), (5, 0, 0.00026)]
+
+    @staticmethod
+    def FromWgs(latitudes, longitudes) -> (np.ndarray, np.ndarray):
+        """
+        Converts WGS-84 positions to Rijksdriehoek coordinates.
+
+        Parameters
+        ----------
+        latitudes : np.ndarray|float
+            The latitudes in degrees
+        longitudes : np.ndarray|float
+            The longitudes in degrees
+
+        Returns
+        -------
+        (np.ndarray, np.ndarray)
+            The Rijksdriehoek x and y coordinates
+        """
+        dPhi = 0.36 * (np.asarray(latitudes, dtype=np.float64) - RijksdriehoekConversion.PHI0)
+        dLam = 0.36 * (np.asarray(longitudes, dtype=np.float64) - RijksdriehoekConversion.LAM0)
+
+        x = RijksdriehoekConversion.X0 + RijksdriehoekConversion._Polynomial(
+            RijksdriehoekConversion._RD_X_TERMS, dPhi, dLam)
+        y = RijksdriehoekConversion.Y0 + RijksdriehoekConversion._Polynomial(
+            RijksdriehoekConversion._RD_Y_TERMS, dPhi, dLam)
+        return x, y
+
+    @staticmethod
+    def ToWgs(x, y) -> (np.ndarray, np.ndarray):
+        """
+        Converts Rijksdriehoek coordinates to WGS-84 positions.
+
+        Parameters
+        ----------
+        x : np.ndarray|float
+            The Rijksdriehoek x coordinates
+        y : np.ndarray|float
+            The Rijksdriehoek y coordinates
+
+        Returns
+        -------
+        (np.ndarray, np.ndarray)
+            The latitudes and longitudes in degrees
+        """
+        dX = 1E-5 * (np.asarray(x, dtype=np.float64) - RijksdriehoekConversion.X0)
+        dY = 1E-5 * (np.asarray(y, dtype=np.float64) - RijksdriehoekConversion.Y0)
+
+        latitudes = RijksdriehoekConversion.PHI0 + RijksdriehoekConversion._Polynomial(
+            RijksdriehoekConversion._LATITUDE_TERMS, dX, dY) / 3600
+        longitudes = RijksdriehoekConversion.LAM0 + RijksdriehoekConversion._Polynomial(
+            RijksdriehoekConversion._LONGITUDE_TERMS, dX, dY) / 3600
+        return latitudes, longitudes
+
+    @staticmethod
+    def _Polynomial(terms, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+        """
+        Evaluates the sum of coefficient * u^p * v^q over all (p, q, coefficient) terms.
+        The powers are calculated once and shared between the terms.
+        """
+        maxPower = max(max(p, q) for p, q, _ in terms)
+        uPowers = [np.ones_like(u)]
+        vPowers = [np.ones_like(v)]
+        for _ in range(maxPower):
+            uPowers.append(uPowers[-1] * u)
+            vPowers.append(vPowers[-1] * v)
+
+        result = np.zeros(np.broadcast(u, v).shape)
+        for p, q, coefficient in terms:
+            result = result + coefficient * uPowers[p] * vPowers[q]
+        return result
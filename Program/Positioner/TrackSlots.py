@@ -0,0 +1,158 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+"""
+Assignment of object ids to the rows of preallocated per-track arrays.
+"""
+
+from typing import Dict, List
+
+import numpy as np
+
+from FrameAnalyzer.DetectionBatch import DetectionBatch
+
+
+class TrackSlots:
+    """
+    Maps the id of every live track to a slot, the row of the track in the arrays of its owner.
+    Tracks that are not updated for timeout seconds are removed, when all slots are taken a new track
+    takes the slot of the track that was updated longest ago. The owner is responsible for locking.
+    """
+
+    maxTracks: int = 256
+    timeout: float = 10.0
+    evicted: int = 0
+    """The number of tracks that were removed because they timed out or all slots were taken"""
+
+    def __init__(self, maxTracks: int, timeout: float):
+        """
+        Constructor of the slots.
+
+        Parameters
+        ----------
+        maxTracks : int
+            The number of slots
+        timeout : float
+            The number of seconds after which a track that is not updated is removed
+        """
+        if maxTracks < 1:
+            raise ValueError("There must be at least one slot.")
+        if timeout <= 0:
+            raise ValueError("The track timeout must be positive.")
+
+        self.maxTracks = maxTracks
+        self.timeout = timeout
+        self.evicted = 0
+
+        self.ids = np.full(maxTracks, DetectionBatch.NO_ID, dtype=np.int64)
+        """The id of the track in every slot"""
+        self.lastTimes = np.full(maxTracks, -np.inf)
+        """The time of the latest update of every slot"""
+        self.latestTime = -np.inf
+        """The time of the latest update of any slot"""
+
+        self._slots: Dict[int, int] = {}
+        self._freeSlots = list(range(maxTracks - 1, -1, -1))
+
+    def __len__(self):
+        return len(self._slots)
+
+    @staticmethod
+    def UniqueIds(detectionBatch: DetectionBatch) -> (np.ndarray, np.ndarray):
+        """
+        The ids of the detections that have one, the last detection of every id wins.
+
+        Parameters
+        ----------
+        detectionBatch : DetectionBatch
+            The detections
+
+        Returns
+        -------
+        (np.ndarray, np.ndarray)
+            The distinct ids and the index of their detection in the batch
+        """
+        (ids, indices) = np.unique(detectionBatch.id[::-1], return_index=True)
+        indices = len(detectionBatch) - 1 - indices
+        known = ids != DetectionBatch.NO_ID
+        return ids[known], indices[known]
+
+    def Get(self, objectId: int) -> int or None:
+        """
+        Returns
+        -------
+        int|None
+            The slot of a track, or None if the track is unknown
+        """
+        return self._slots.get(objectId)
+
+    def GetIds(self) -> List[int]:
+        """
+        Returns
+        -------
+        [int]
+            The ids of all live tracks
+        """
+        return list(self._slots)
+
+    def Expire(self, timestamp: float) -> np.ndarray:
+        """
+        Removes the tracks that were not updated for timeout seconds before the latest time.
+
+        Parameters
+        ----------
+        timestamp : float
+            The current time in seconds
+
+        Returns
+        -------
+        np.ndarray
+            The slots of the removed tracks
+        """
+        self.latestTime = max(self.latestTime, timestamp)
+        expired = np.nonzero((self.lastTimes < self.latestTime - self.timeout) &
+                             (self.ids != DetectionBatch.NO_ID))[0]
+        for slot in expired.tolist():
+            del self._slots[int(self.ids[slot])]
+            self.ids[slot] = DetectionBatch.NO_ID
+            self.lastTimes[slot] = -np.inf
+            self._freeSlots.append(slot)
+        self.evicted += len(expired)
+        return expired
+
+    def Assign(self, ids: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        The slot of every track, a new track takes a free slot or the slot of the track that was updated longest ago.
+        The slots of the given tracks are never taken by another of them, so at most maxTracks ids can be given.
+
+        Parameters
+        ----------
+        ids : np.ndarray
+            The distinct ids of the tracks
+
+        Returns
+        -------
+        (np.ndarray, np.ndarray)
+            The slot of every track and whether it is a new track
+        """
+        slots = [self._slots.get(objectId) for objectId in ids.tolist()]
+        isNew = np.array([slot is None for slot in slots], dtype=bool)
+        lastTimes = self.lastTimes.copy()
+        lastTimes[[slot for slot in slots if slot is not None]] = np.inf
+
+        for i, objectId in enumerate(ids.tolist()):
+            if slots[i] is not None:
+                continue
+            if len(self._freeSlots) > 0:
+                slot = self._freeSlots.pop()
+            else:
+                slot = int(np.argmin(lastTimes))
+                del self._slots[int(self.ids[slot])]
+                self.evicted += 1
+
+            self._slots[objectId] = slot
+            self.ids[slot] = objectId
+            lastTimes[slot] = np.inf
+            slots[i] = slot
+        return np.array(slots, dtype=np.int64), isNew
@@ -0,0 +1,296 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+"""
+In-memory history of the world positions of every tracked object, with a fixed memory footprint.
+"""
+
+import argparse
+import math
+import threading
+from typing import Any, Dict, List, NamedTuple
+
+import numpy as np
+
+from FrameAnalyzer.DetectionBatch import DetectionBatch
+from Positioner.TrackSlots import TrackSlots
+
+
+class TrackStatistics(NamedTuple):
+    """The state of a TrackStore"""
+    tracks: int
+    """The number of tracks that are kept"""
+    maxTracks: int
+    """The maximum number of tracks"""
+    trackLength: int
+    """The maximum number of samples per track"""
+    evicted: int
+    """The number of tracks that were removed because they timed out or the store was full"""
+    memoryBytes: int
+    """The size of the buffers of the store in bytes"""
+
+
+class TrackState(NamedTuple):
+    """The latest state of a track"""
+    id: int
+    """The identifier of the object"""
+    time: float
+    """The time of the latest sample in seconds"""
+    latitude: float
+    """The latest latitude in WGS-84 degrees"""
+    longitude: float
+    """The latest longitude in WGS-84 degrees"""
+    speed: float
+    """The speed in meters per second"""
+    heading: float
+    """The direction of movement in degrees clockwise from the north"""
+
+
+class TrackStore:
+    """
+    Keeps the last trackLength samples (t, lat, lon, rdX, rdY) of every object id in a ring buffer.
+    All ring buffers are rows of one preallocated array, so the memory is fixed by maxTracks and trackLength.
+    Tracks that are not updated for trackTimeout seconds are removed, when the store is full the oldest track is.
+    The velocity is updated with every sample, smoothed with VELOCITY_SMOOTHING.
+    """
+    FIELDS = ('time', 'latitude', 'longitude', 'rijksdriehoekX', 'rijksdriehoekY')
+    """The fields of a sample, in the order of the buffer"""
+    VELOCITY_SMOOTHING = 0.5
+    """The weight of the newest sample in the velocity"""
+
+    trackLength: int = 128
+    trackTimeout: float = 10.0
+    maxTracks: int = 256
+
+    def __init__(self, trackLength: int = 128, trackTimeout: float = 10.0, maxTracks: int = 256):
+        """
+        Constructor of the track store, all memory is allocated here.
+
+        Parameters
+        ----------
+        trackLength : int
+            The maximum number of samples per track
+        trackTimeout : float
+            The number of seconds after which a track that is not updated is removed
+        maxTracks : int
+            The maximum number of tracks
+        """
+        if trackLength < 2:
+            raise ValueError("A track needs at least two samples.")
+
+        self.trackLength = trackLength
+        self.trackTimeout = trackTimeout
+        self.maxTracks = maxTracks
+
+        self._trackSlots = TrackSlots(maxTracks, trackTimeout)
+        self._samples = np.full((maxTracks, trackLength, len(TrackStore.FIELDS)), np.nan)
+        self._heads = np.zeros(maxTracks, dtype=np.int64)
+        """The index of the next sample of every slot"""
+        self._counts = np.zeros(maxTracks, dtype=np.int64)
+        self._velocities = np.zeros((maxTracks, 2))
+        """The smoothed velocity of every slot in Rijksdriehoek meters per second"""
+        self._lock = threading.Lock()
+
+    def Update(self, detectionBatch: DetectionBatch, timestamp: float):
+        """
+        Adds a sample to the track of every detection with an id, all tracks are written at once.
+
+        Parameters
+        ----------
+        detectionBatch : DetectionBatch
+            The converted detections of a frame, with Rijksdriehoek coordinates
+        timestamp : float
+            The time in seconds at which the frame was read
+        """
+        if detectionBatch is None:
+            return
+
+        # One sample per id, the last detection wins
+        (ids, indices) = TrackSlots.UniqueIds(detectionBatch)
+        # More objects than tracks can't be stored, the rest is left out
+        (ids, indices) = (ids[:self.maxTracks], indices[:self.maxTracks])
+
+        with self._lock:
+            # Tracks also expire while the scene is empty
+            self._trackSlots.Expire(timestamp)
+            if len(ids) == 0:
+                return
+
+            (slots, isNew) = self._trackSlots.Assign(ids)
+            newSlots = slots[isNew]
+            self._heads[newSlots] = 0
+            self._counts[newSlots] = 0
+            self._velocities[newSlots] = 0
+
+            positions = np.column_stack((detectionBatch.rijksdriehoekX[indices],
+                                         detectionBatch.rijksdriehoekY[indices]))
+            previous = self._samples[slots, (self._heads[slots] - 1) % self.trackLength, 3:5]
+            elapsed = timestamp - self._trackSlots.lastTimes[slots]
+
+            # Velocity from the previous sample, tracks without one or without movement in time keep their velocity
+            moving = (self._counts[slots] > 0) & (elapsed > 0) & np.isfinite(positions).all(axis=1) & \
+                np.isfinite(previous).all(axis=1)
+            if moving.any():
+                velocities = (positions[moving] - previous[moving]) / elapsed[moving, np.newaxis]
+                movingSlots = slots[moving]
+                self._velocities[movingSlots] += TrackStore.VELOCITY_SMOOTHING * \
+                    (velocities - self._velocities[movingSlots])
+
+            sample = np.column_stack((np.full(len(slots), timestamp), detectionBatch.latitude[indices],
+                                      detectionBatch.longitude[indices], positions))
+            self._samples[slots, self._heads[slots]] = sample
+            self._heads[slots] = (self._heads[slots] + 1) % self.trackLength
+            self._counts[slots] = np.minimum(self._counts[slots] + 1, self.trackLength)
+            self._trackSlots.lastTimes[slots] = timestamp
+
+    def GetTrack(self, objectId: int, seconds: float = None) -> np.ndarray or None:
+        """
+        Get the samples of a track, oldest first.
+
+        Parameters
+        ----------
+        objectId : int
+            The identifier of the object
+        seconds : float|None
+            Only the samples of the last seconds before the latest update of the store, all samples by default
+
+        Returns
+        -------
+        np.ndarray|None
+            (N, 5) array with a sample per row, see FIELDS, or None if the track is unknown
+        """
+        with self._lock:
+            slot = self._trackSlots.Get(objectId)
+            if slot is None:
+                return None
+            count = self._counts[slot]
+            order = (self._heads[slot] - count + np.arange(count)) % self.trackLength
+            samples = self._samples[slot, order]
+            if seconds is not None:
+                samples = samples[samples[:, 0] >= self._trackSlots.latestTime - seconds]
+            return samples
+
+    def GetState(self, objectId: int) -> TrackState or None:
+        """
+        Get the latest position and the velocity of a track.
+
+        Parameters
+        ----------
+        objectId : int
+            The identifier of the object
+
+        Returns
+        -------
+        TrackState|None
+            The state of the track, or None if the track is unknown
+        """
+        with self._lock:
+            slot = self._trackSlots.Get(objectId)
+            if slot is None:
+                return None
+            latest = self._samples[slot, (self._heads[slot] - 1) % self.trackLength]
+            (velocityX, velocityY) = self._velocities[slot]
+            return TrackState(objectId, float(latest[0]), float(latest[1]), float(latest[2]),
+                              float(np.hypot(velocityX, velocityY)),
+                              float(np.degrees(np.arctan2(velocityX, velocityY)) % 360))
+
+    def GetTrackIds(self) -> List[int]:
+        """
+        Returns
+        -------
+        [int]
+            The identifiers of all kept tracks
+        """
+        with self._lock:
+            return self._trackSlots.GetIds()
+
+    def GetMemoryUsage(self) -> int:
+        """
+        Returns
+        -------
+        int
+            The size of the buffers of the store in bytes, this does not change after construction
+        """
+        return int(self._samples.nbytes + self._heads.nbytes + self._counts.nbytes + self._velocities.nbytes +
+                   self._trackSlots.lastTimes.nbytes + self._trackSlots.ids.nbytes)
+
+    def GetStatistics(self) -> TrackStatistics:
+        """
+        Get the current state of the store.
+
+        Returns
+        -------
+        TrackStatistics
+            The number of tracks, the limits and the memory footprint
+        """
+        with self._lock:
+            return TrackStatistics(len(self._trackSlots), self.maxTracks, self.trackLength, self._trackSlots.evicted,
+                                   self.GetMemoryUsage())
+
+    def ToDictionary(self, objectId: int, seconds: float = None) -> Dict[str, Any] or None:
+        """
+        Converts a track to a dictionary that can be sent through the API.
+
+        Parameters
+        ----------
+        objectId : int
+            The identifier of the object
+        seconds : float|None
+            Only the samples of the last seconds, all samples by default
+
+        Returns
+        -------
+        Dict[str, Any]|None
+            The state of the track with its samples, or None if the track is unknown
+        """
+        state = self.GetState(objectId)
+        samples = self.GetTrack(objectId, seconds)
+        if state is None or samples is None:
+            return None
+        return {
+            **state._asdict(),
+            "samples": [{field: value for field, value in zip(TrackStore.FIELDS, sample) if not math.isnan(value)}
+                        for sample in samples.tolist()]
+        }
+
+    @staticmethod
+    def AddTrackStoreArguments(parser: argparse.ArgumentParser):  # pragma: no cover
+        """
+        Adds the arguments for the track store to the parser.
+
+        Parameters
+        ----------
+        parser : argparse.ArgumentParser
+            The parser that is used to add the arguments.
+        """
+
+        if parser is None:
+            raise TypeError("Parser is none.")
+
+        parser.add_argument("-tl", "--trackLength", type=int, default=128,
+                            help="The maximum number of positions that are kept per track.")
+        parser.add_argument("-tt", "--trackTimeout", type=float, default=10.0,
+                            help="The number of seconds after which a track that is not seen anymore is removed.")
+        parser.add_argument("-mt", "--maxTracks", type=int, default=256,
+                            help="The maximum number of tracks that are kept.")
+
+    @staticmethod
+    def ValidateTrackStoreArguments(arguments: Dict[str, Any]):
+        """
+        Validate the parsed arguments.
+
+        Parameters
+        ----------
+        arguments : Dict[str, Any]
+            The arguments that are validated
+        """
+
+        if arguments is None or not arguments:
+            raise TypeError("Arguments are empty or None.")
+        if not isinstance(arguments["trackLength"], int) or arguments["trackLength"] < 2:
+            raise ValueError("Track length must be at least 2.")
+        if not isinstance(arguments["trackTimeout"], (int, float)) or arguments["trackTimeout"] <= 0:
+            raise ValueError("Track timeout must be a positive number.")
+        if not isinstance(arguments["maxTracks"], int) or arguments["maxTracks"] < 1:
+            raise ValueError("Maximum number of tracks must be a positive number.")
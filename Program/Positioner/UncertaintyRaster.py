@@ -0,0 +1,144 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+"""
+Dense raster with the location uncertainty of every pixel of the analyze resolution.
+"""
+
+import pathlib
+
+import cv2
+import numpy as np
+
+
+class UncertaintyRaster:
+    """
+    Holds the location radius (single pixel error plus static max error) of every pixel,
+    so the radius of a detection is a single array read.
+    """
+
+    radii: np.ndarray = None
+    key: str = None
+    CLIP_PERCENTILE = 95
+    """The percentile of the finite radii shown as fully red by default, so huge radii don't wash out the image"""
+
+    def __init__(self, radii: np.ndarray, key: str):
+        """
+        Constructor of the uncertainty raster.
+
+        Parameters
+        ----------
+        radii : np.ndarray
+            (height, width) array with the location radius of every pixel in meters
+        key : str
+            The key of the values the raster was built from
+        """
+        self.radii = np.array(radii, dtype=np.float64)
+        self.radii.flags.writeable = False
+        self.key = key
+
+    @staticmethod
+    def FromSinglePixelErrors(singlePixelErrors: np.ndarray, staticMaxError: float, key: str):
+        """
+        Builds the raster from the single pixel error of every pixel.
+
+        Parameters
+        ----------
+        singlePixelErrors : np.ndarray
+            (height, width) array with the single pixel error of every pixel in meters
+        staticMaxError : float
+            The static max error of the convertor in meters
+        key : str
+            The key of the values the raster is built from
+
+        Returns
+        -------
+        UncertaintyRaster
+            The raster
+        """
+        return UncertaintyRaster(np.asarray(singlePixelErrors, dtype=np.float64) + staticMaxError, key)
+
+    def Contains(self, pixelPositions: np.ndarray) -> np.ndarray:
+        """
+        Checks which pixel positions lie within the raster.
+
+        Parameters
+        ----------
+        pixelPositions : np.ndarray
+            (N, 2) array of x and y pixel positions
+
+        Returns
+        -------
+        np.ndarray
+            Boolean mask of the positions that can be looked up
+        """
+        (height, width) = self.radii.shape
+        x = pixelPositions[:, 0]
+        y = pixelPositions[:, 1]
+        return (x >= 0) & (x <= width - 1) & (y >= 0) & (y <= height - 1)
+
+    def Lookup(self, pixelPositions: np.ndarray) -> np.ndarray:
+        """
+        Looks up the location radius of the nearest pixel of every position.
+        All positions should lie within the raster, see Contains.
+
+        Parameters
+        ----------
+        pixelPositions : np.ndarray
+            (N, 2) array of x and y pixel positions
+
+        Returns
+        -------
+        np.ndarray
+            The location radius in meters of every position
+        """
+        x = np.rint(pixelPositions[:, 0]).astype(np.intp)
+        y = np.rint(pixelPositions[:, 1]).astype(np.intp)
+        return self.radii[y, x]
+
+    def ToImage(self, maxRadius: float = None) -> np.ndarray:
+        """
+        Renders the raster as a color image, from blue (accurate) to red (inaccurate).
+        Pixels without a finite radius, like the horizon of a homography, are shown fully red.
+
+        Parameters
+        ----------
+        maxRadius : float|None
+            The radius in meters that is shown as fully red, the CLIP_PERCENTILE percentile of the finite radii
+            by default
+
+        Returns
+        -------
+        np.ndarray
+            BGR image with the size of the raster
+        """
+        finite = np.isfinite(self.radii)
+        finiteRadii = self.radii[finite]
+        minRadius = float(np.min(finiteRadii)) if finiteRadii.size > 0 else 0.0
+        if maxRadius is None:
+            maxRadius = float(np.percentile(finiteRadii, self.CLIP_PERCENTILE)) if finiteRadii.size > 0 else 0.0
+
+        # constant rasters are shown fully blue
+        scale = 255 / (maxRadius - minRadius) if maxRadius > minRadius else 0
+        intensities = np.full(self.radii.shape, 255, dtype=np.uint8)
+        intensities[finite] = np.clip((finiteRadii - minRadius) * scale, 0, 255).astype(np.uint8)
+        return cv2.applyColorMap(intensities, cv2.COLORMAP_JET)
+
+    def Export(self, path: pathlib.Path, maxRadius: float = None) -> bool:
+        """
+        Saves the image of the raster, see ToImage.
+
+        Parameters
+        ----------
+        path : pathlib.Path
+            The path of the image, the extension determines the image format
+        maxRadius : float|None
+            The radius in meters that is shown as fully red, see ToImage
+
+        Returns
+        -------
+        bool
+            Whether the image was written
+        """
+        return cv2.imwrite(str(path), self.ToImage(maxRadius))
@@ -0,0 +1,354 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+"""
+Rasterized index of the zones (geofences), to tag positions with the zones they are inside.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pathlib
+import time
+from typing import Any, Dict, List, NamedTuple
+
+import cv2
+import numpy as np
+
+from FrameAnalyzer.DetectionBatch import DetectionBatch
+from Positioner.RijksdriehoekConversion import RijksdriehoekConversion
+
+
+class Zone(NamedTuple):
+    """A polygon with an identifier"""
+    id: str
+    """The identifier of the zone"""
+    rings: List[np.ndarray]
+    """The outer ring and the holes of the polygon, (N, 2) arrays of Rijksdriehoek coordinates"""
+
+
+class ZoneIndex:
+    """
+    Holds a label map over the bounding box of the zones in Rijksdriehoek coordinates.
+    Every cell stores the zones it is inside as a bit mask, so tagging a position is one array read
+    instead of a point in polygon test per zone. The membership is exact up to the cell size.
+    The label map is only rebuilt when the zones change.
+    """
+    MAX_CELLS = 4_000_000
+    """The maximum number of cells of the label map, the cell size is increased for larger areas"""
+    REFRESH_INTERVAL = 1.0
+    """The minimum number of seconds between checks of the zone file"""
+    _SHIFT = 4
+    """The number of fractional bits of the polygon points, for sub cell accuracy"""
+
+    requestedCellSize: float = 0.25
+    """The size of the cells of the label map in meters that was asked for"""
+    cellSize: float = 0.25
+    """The size of the cells of the label map in meters"""
+    zones: List[Zone] = None
+    zoneIds: tuple = ()
+    """The distinct identifiers of the zones, in the order of the zone membership"""
+    path: pathlib.Path = None
+    """The file the zones were loaded from, if any"""
+    key: str = None
+    """The hash of the zones the label map was built from"""
+    builds: int = 0
+    """The number of times the label map was built"""
+
+    def __init__(self, zones: List[Zone], cellSize: float = 0.25, path: pathlib.Path = None):
+        """
+        Constructor of the zone index, builds the label map.
+
+        Parameters
+        ----------
+        zones : [Zone]
+            The zones
+        cellSize : float
+            The size of the cells of the label map in meters
+        path : pathlib.Path|None
+            The file the zones were loaded from, it is checked for changes by Refresh
+        """
+        if cellSize <= 0:
+            raise ValueError("The cell size must be positive.")
+
+        self.requestedCellSize = cellSize
+        self.path = path
+        self.builds = 0
+        self._modifiedTime = os.stat(path).st_mtime if path is not None else None
+        self._checkedTime = time.monotonic()
+        self.SetZones(zones)
+
+    @staticmethod
+    def FromFile(path: pathlib.Path, cellSize: float = 0.25):
+        """
+        Creates the zone index of a zone file, see LoadZones.
+
+        Parameters
+        ----------
+        path : pathlib.Path
+            The zone file
+        cellSize : float
+            The size of the cells of the label map in meters
+
+        Returns
+        -------
+        ZoneIndex
+            The zone index
+        """
+        path = pathlib.Path(path)
+        return ZoneIndex(ZoneIndex.LoadZones(path), cellSize, path)
+
+    @staticmethod
+    def LoadZones(path: pathlib.Path) -> List[Zone]:
+        """
+        Loads the zones of a GeoJSON file with Polygon or MultiPolygon features, the id of a zone is the
+        'id' property of its feature. The coordinates are WGS-84 (longitude, latitude) pairs, unless the
+        'rijksdriehoek' property of the feature is true, then they are Rijksdriehoek (x, y) pairs.
+        LineString features are lines for counting, they are skipped.
+
+        Parameters
+        ----------
+        path : pathlib.Path
+            The GeoJSON file
+
+        Returns
+        -------
+        [Zone]
+            The zones, a MultiPolygon is a zone per polygon with the same id
+        """
+        with open(path, 'r') as file:
+            collection = json.load(file)
+
+        zones = []
+        for number, feature in enumerate(collection.get('features', [])):
+            properties = feature.get('properties') or {}
+            zoneId = str(properties.get('id', feature.get('id', number)))
+            geometry = feature['geometry']
+            if geometry['type'] == 'Polygon':
+                polygons = [geometry['coordinates']]
+            elif geometry['type'] == 'MultiPolygon':
+                polygons = geometry['coordinates']
+            elif geometry['type'] in ('LineString', 'MultiLineString'):
+                continue
+            else:
+                raise ValueError(f"Zone {zoneId} is a {geometry['type']}, not a Polygon or MultiPolygon.")
+
+            for polygon in polygons:
+                zones.append(Zone(zoneId, [ZoneIndex.ToRijksdriehoek(ring, properties) for ring in polygon]))
+        return zones
+
+    @staticmethod
+    def ToRijksdriehoek(coordinates: list, properties: dict) -> np.ndarray:
+        """
+        Converts the coordinates of a GeoJSON feature to Rijksdriehoek coordinates.
+
+        Parameters
+        ----------
+        coordinates : list
+            The (longitude, latitude) or, when the 'rijksdriehoek' property is true, (x, y) pairs
+        properties : dict
+            The properties of the feature
+
+        Returns
+        -------
+        np.ndarray
+            (N, 2) array of Rijksdriehoek coordinates
+        """
+        points = np.array(coordinates, dtype=np.float64)[:, :2]
+        if properties.get('rijksdriehoek', False):
+            return points
+        return np.column_stack(RijksdriehoekConversion.FromWgs(points[:, 1], points[:, 0]))
+
+    @staticmethod
+    def GetKey(zones: List[Zone]) -> str:
+        """
+        Returns
+        -------
+        str
+            A hash of the identifiers and coordinates of the zones
+        """
+        sha = hashlib.sha1()
+        for zone in zones:
+            sha.update(zone.id.encode('utf-8'))
+            for ring in zone.rings:
+                sha.update(np.ascontiguousarray(ring, dtype=np.float64).tobytes())
+                sha.update(b'|')
+        return sha.hexdigest()
+
+    def SetZones(self, zones: List[Zone]) -> bool:
+        """
+        Replaces the zones, the label map is only rebuilt when they are different.
+
+        Parameters
+        ----------
+        zones : [Zone]
+            The zones
+
+        Returns
+        -------
+        bool
+            Whether the label map was rebuilt
+        """
+        key = ZoneIndex.GetKey(zones)
+        if key == self.key:
+            return False
+
+        self.zones = zones
+        self.zoneIds = tuple(dict.fromkeys(zone.id for zone in zones))
+        self._Build()
+        self.key = key
+        self.builds += 1
+        return True
+
+    def Refresh(self) -> bool:
+        """
+        Reloads the zone file when it was modified, at most once every REFRESH_INTERVAL seconds.
+        An unreadable file keeps the current zones.
+
+        Returns
+        -------
+        bool
+            Whether the label map was rebuilt
+        """
+        now = time.monotonic()
+        if self.path is None or now - self._checkedTime < ZoneIndex.REFRESH_INTERVAL:
+            return False
+        self._checkedTime = now
+
+        try:
+            modifiedTime = os.stat(self.path).st_mtime
+            if modifiedTime == self._modifiedTime:
+                return False
+            zones = ZoneIndex.LoadZones(self.path)
+        except (OSError, ValueError, KeyError, TypeError, IndexError) as e:
+            print(f"Zones of {self.path} not reloaded: {e}")
+            return False
+        self._modifiedTime = modifiedTime
+        return self.SetZones(zones)
+
+    def Lookup(self, rijksdriehoekX: np.ndarray, rijksdriehoekY: np.ndarray) -> np.ndarray:
+        """
+        Looks up the zones of positions in the label map.
+
+        Parameters
+        ----------
+        rijksdriehoekX : np.ndarray
+            The Rijksdriehoek x coordinates
+        rijksdriehoekY : np.ndarray
+            The Rijksdriehoek y coordinates
+
+        Returns
+        -------
+        np.ndarray
+            (N, Z) boolean array, whether every position is inside each of the zones of zoneIds
+        """
+        (height, width) = self._labels.shape[:2]
+        columns = np.floor((np.asarray(rijksdriehoekX, dtype=np.float64) - self._minX) / self.cellSize)
+        rows = np.floor((np.asarray(rijksdriehoekY, dtype=np.float64) - self._minY) / self.cellSize)
+        inside = (columns >= 0) & (columns < width) & (rows >= 0) & (rows < height)
+
+        words = np.zeros((len(inside), self._labels.shape[2]), dtype=np.uint64)
+        words[inside] = self._labels[rows[inside].astype(np.intp), columns[inside].astype(np.intp)]
+        bits = (words[:, self._zoneWords] >> self._zoneShifts) & np.uint64(1)
+        return bits.astype(bool)
+
+    def Tag(self, detectionBatch: DetectionBatch) -> DetectionBatch:
+        """
+        Adds the zones every detection is inside to the batch, detections without a position are in no zone.
+
+        Parameters
+        ----------
+        detectionBatch : DetectionBatch
+            The converted detections, with Rijksdriehoek coordinates
+
+        Returns
+        -------
+        DetectionBatch
+            The detections with their zones
+        """
+        if detectionBatch is None or len(detectionBatch) == 0:
+            return detectionBatch
+        return detectionBatch.WithZones(self.Lookup(detectionBatch.rijksdriehoekX, detectionBatch.rijksdriehoekY),
+                                        self.zoneIds)
+
+    def _Build(self):
+        """
+        Rasterizes the zones into the label map, bit i of a cell is set when the cell center is inside zone i.
+        """
+        zoneCount = len(self.zoneIds)
+        zoneNumbers = {zoneId: number for number, zoneId in enumerate(self.zoneIds)}
+        self._zoneWords = np.arange(zoneCount) // 64
+        self._zoneShifts = (np.arange(zoneCount) % 64).astype(np.uint64)
+
+        points = [ring for zone in self.zones for ring in zone.rings]
+        if len(points) == 0:
+            (self._minX, self._minY, self.cellSize) = (0.0, 0.0, self.requestedCellSize)
+            self._labels = np.zeros((0, 0, 1), dtype=np.uint64)
+            return
+        points = np.concatenate(points)
+        (self._minX, self._minY) = points.min(axis=0)
+        (sizeX, sizeY) = points.max(axis=0) - (self._minX, self._minY)
+
+        # Larger areas get larger cells, so the memory of the label map stays bounded
+        self.cellSize = max(self.requestedCellSize, float(np.sqrt(sizeX * sizeY / ZoneIndex.MAX_CELLS)))
+        width = int(np.ceil(sizeX / self.cellSize)) + 1
+        height = int(np.ceil(sizeY / self.cellSize)) + 1
+        self._labels = np.zeros((height, width, max(1, (zoneCount + 63) // 64)), dtype=np.uint64)
+
+        for zone in self.zones:
+            # Cell (column, row) has its center at (column + 0.5, row + 0.5) cells from the minimum
+            rings = [np.round(((ring - (self._minX, self._minY)) / self.cellSize - 0.5) * (1 << ZoneIndex._SHIFT))
+                     .astype(np.int32) for ring in zone.rings]
+            (left, top) = np.maximum(np.floor(rings[0].min(axis=0) / (1 << ZoneIndex._SHIFT)).astype(int), 0)
+            (right, bottom) = np.minimum(np.ceil(rings[0].max(axis=0) / (1 << ZoneIndex._SHIFT)).astype(int) + 1,
+                                         (width, height))
+
+            mask = np.zeros((bottom - top, right - left), dtype=np.uint8)
+            offset = np.array([left, top]) << ZoneIndex._SHIFT
+            cv2.fillPoly(mask, [rings[0] - offset], 1, cv2.LINE_8, ZoneIndex._SHIFT)
+            if len(rings) > 1:
+                cv2.fillPoly(mask, [ring - offset for ring in rings[1:]], 0, cv2.LINE_8, ZoneIndex._SHIFT)
+
+            number = zoneNumbers[zone.id]
+            bit = np.uint64(1) << np.uint64(number % 64)
+            region = self._labels[top:bottom, left:right, number // 64]
+            region[mask.astype(bool)] |= bit
+
+    @staticmethod
+    def AddZoneIndexArguments(parser: argparse.ArgumentParser):  # pragma: no cover
+        """
+        Adds the arguments for the zones to the parser.
+
+        Parameters
+        ----------
+        parser : argparse.ArgumentParser
+            The parser that is used to add the arguments.
+        """
+
+        if parser is None:
+            raise TypeError("Parser is none.")
+
+        parser.add_argument("-zf", "--zoneFile", type=str, default="",
+                            help="GeoJSON file with the zones the positions are tagged with.")
+        parser.add_argument("-zc", "--zoneCellSize", type=float, default=0.25,
+                            help="The size in meters of the cells of the zone label map.")
+
+    @staticmethod
+    def ValidateZoneIndexArguments(arguments: Dict[str, Any]):
+        """
+        Validate the parsed arguments.
+
+        Parameters
+        ----------
+        arguments : Dict[str, Any]
+            The arguments that are validated
+        """
+
+        if arguments is None or not arguments:
+            raise TypeError("Arguments are empty or None.")
+        if arguments["zoneFile"] != "" and not os.path.isfile(arguments["zoneFile"]):
+            raise ValueError(f"Zone file {arguments['zoneFile']} does not exist.")
+        if not isinstance(arguments["zoneCellSize"], (int, float)) or arguments["zoneCellSize"] <= 0:
+            raise ValueError("Zone cell size must be a positive number.")
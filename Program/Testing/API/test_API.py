@@ -4,7 +4,15 @@
 
 from API.APIController import *
 from API.APIServer import *
+from API.DeltaEncoder import DeltaMessage
+from API.FrameEncoder import FrameEncoder
+from API.StreamFilter import StreamFilter
+from FrameAnalyzer.DetectionBatch import DetectionBatch
 from Positioner.DetectedObjectPosition import DetectedObjectPosition
+from Positioner.Analytics.RollupStore import RollupStore
+from Positioner.MainPositioner import MainPositioner
+from FrameAnalyzer.IDetector import DetectedObject
+from unittest.mock import Mock
 import asyncio
 from pytest import raises
 import random
@@ -61,6 +69,274 @@ def test_NoClients():
     asyncio.run(RunServer([objects], [], port + 2))
 
 
+# Check if a batch is sent the same way as a list
+def test_BatchDictionaries():
+    batch = DetectionBatch.FromDetectedObjectPositions(objects)
+    assert FrameEncoder.ToDictionaries(batch) == data["detectedObjects"]
+    assert FrameEncoder.ToDictionaries(objects) == data["detectedObjects"]
+
+
+# Check if the clients can query the track store
+def test_TrackCommands():
+    api = APIController(asyncio.new_event_loop(), False)
+    assert api.server.HandleCommand({"type": "track", "id": 1}) is None
+
+    trackStore = TrackStore(4, 10.0, 2)
+    trackStore.Update(DetectionBatch.FromDetectedObjectPositions(objects), 1.0)
+    api.SetTrackStore(trackStore)
+
+    tracks = api.server.HandleCommand({"type": "tracks"})
+    assert sorted(tracks["ids"]) == [1, 3]
+    assert tracks["statistics"]["memoryBytes"] == trackStore.GetMemoryUsage()
+
+    track = api.server.HandleCommand({"type": "track", "id": 3, "seconds": 5})["track"]
+    assert track["id"] == 3
+    assert track["samples"] == [{"time": 1.0, "latitude": 5, "longitude": 0.274}]
+    json.dumps(track)
+
+    assert api.server.HandleCommand({"type": "track", "id": 2})["track"] is None
+    assert api.server.HandleCommand({"type": "track", "id": "3"})["track"] is None
+
+
+# Check if the history command queries the rollup store
+def test_HistoryCommand():
+    api = APIController(asyncio.new_event_loop(), False)
+    rollupStore = RollupStore()
+    rollupStore.Update(DetectionBatch.FromDetectedObjectPositions(objects), 100.0)
+    api.SetRollupStore(rollupStore)
+
+    history = api.server.HandleCommand({"type": "history", "start": 0, "end": 200})["history"]
+    assert history["average"] == {"total": [len(objects)]}
+    aggregate = api.server.HandleCommand({"type": "history", "start": 0, "end": 200, "aggregate": True})
+    assert aggregate["history"]["frames"] == 1
+    json.dumps(aggregate)
+
+    assert api.server.HandleCommand({"type": "history", "start": "0", "end": 200})["history"] is None
+    assert api.server.HandleCommand({"type": "history", "start": 0, "end": 200, "series": "total"})["history"] \
+        is None
+
+
+# Check if only the subscribers of a channel receive its messages
+def test_Channels():
+    loop = asyncio.new_event_loop()
+    api = APIController(loop, False)
+    client = FakeWebsocket()
+    other = FakeWebsocket()
+    assert not api.server.Subscribe(client, 'counters')
+    api.server.AddClient(client, 'client')
+    api.server.AddClient(other, 'other')
+
+    api.AddChannel('counters')
+    assert api.server.Subscribe(client, 'counters')
+    api.SendChannel('counters', {"lines": {}})
+    api.SendChannel('heatmap', {})
+    loop.run_until_complete(api.Flush())
+    assert [json.loads(message)["data"] for message in client.messages] == [{"lines": {}}]
+    assert other.messages == []
+
+    api.server.Unsubscribe(client)
+    assert api.server.subscriptions['counters'] == set()
+    api.Stop()
+    loop.run_until_complete(asyncio.sleep(0))
+    loop.close()
+
+
+# Check if every client receives the frames in the format it chose
+def test_Formats():
+    loop = asyncio.new_event_loop()
+    api = APIController(loop, False)
+    (jsonClient, binaryClient) = (FakeWebsocket(), FakeWebsocket())
+    api.server.AddClient(jsonClient, 'json')
+    api.server.AddClient(binaryClient, 'binary')
+    assert api.server.GetStreams() == {('json', 1, StreamFilter(), False)}
+
+    assert api.server.SetFormat(binaryClient, 'binary', 1)
+    assert not api.server.SetFormat(jsonClient, 'binary', 2)
+    assert not api.server.SetFormat(jsonClient, 'xml')
+    assert {stream[0] for stream in api.server.GetStreams()} == {'json', 'binary'}
+    api.Send(objects, 1, date)
+    loop.run_until_complete(api.Flush())
+    assert json.loads(jsonClient.messages[0])["detectedObjects"] == data["detectedObjects"]
+    assert FrameEncoder.DecodeBinary(binaryClient.messages[0])[0]["records"]["id"].tolist() == [1, 3]
+
+    assert api.server.SetFormat(binaryClient, 'json')
+    assert api.server.clientFormats == {}
+    api.Stop()
+    loop.run_until_complete(asyncio.sleep(0))
+    loop.close()
+
+
+# Check if only the clients that chose a version that accepts several frames receive coalesced frames
+def test_Coalesced():
+    loop = asyncio.new_event_loop()
+    api = APIController(loop, False)
+    (legacyClient, coalescingClient, binaryClient) = (FakeWebsocket(), FakeWebsocket(), FakeWebsocket())
+    api.server.AddClient(legacyClient, 'legacy')
+    api.server.AddClient(coalescingClient, 'coalescing')
+    api.server.AddClient(binaryClient, 'binary')
+    assert api.server.SetFormat(coalescingClient, 'json', 2)
+    assert api.server.SetFormat(binaryClient, 'binary')
+    api.Send(objects, 1, date)
+    api.Send(objects, 2, date)
+    loop.run_until_complete(api.Flush())
+
+    assert [json.loads(message)["frameIndex"] for message in legacyClient.messages] == [2]
+    (message,) = coalescingClient.messages
+    assert [frame["frameIndex"] for frame in json.loads(message)["frames"]] == [1, 2]
+    assert [frame["frameIndex"] for frame in FrameEncoder.DecodeBinary(binaryClient.messages[0])] == [1, 2]
+    api.Stop()
+    loop.run_until_complete(asyncio.sleep(0))
+    loop.close()
+
+
+# Check if the clients receive the objects of their filter, and clients with the same filter share a message
+def test_Filters():
+    loop = asyncio.new_event_loop()
+    api = APIController(loop, False)
+    clients = [FakeWebsocket() for _ in range(3)]
+    for i, client in enumerate(clients):
+        api.server.AddClient(client, str(i))
+    assert api.server.SetFilter(clients[0], {"type": "filter", "types": ["human"], "bounds": [0, 0, 10, 1]})
+    assert api.server.SetFilter(clients[1], {"type": "filter", "bounds": [0, 0, 10, 1.0], "types": ["human"]})
+    assert not api.server.SetFilter(clients[2], {"type": "filter", "maxRate": 0})
+    assert len(api.server.GetStreams()) == 2
+
+    api.Send(objects, 1, date)
+    loop.run_until_complete(api.Flush())
+    assert clients[0].messages[0] is clients[1].messages[0]
+    assert json.loads(clients[0].messages[0])["detectedObjects"] == data["detectedObjects"][1:]
+    assert json.loads(clients[2].messages[0])["detectedObjects"] == data["detectedObjects"]
+
+    assert api.server.SetFilter(clients[0], {"type": "filter"})
+    assert list(api.server.clientFilters) == [clients[1]]
+    api.Stop()
+    loop.run_until_complete(asyncio.sleep(0))
+    loop.close()
+
+
+# Check if the clients and their send queues are removed, and their statistics are queried
+def test_Connections():
+    loop = asyncio.new_event_loop()
+    api = APIController(loop, False)
+    client = FakeWebsocket()
+    api.server.AddClient(client, 'client')
+    api.server.SetFormat(client, 'binary')
+    api.Send(objects, 1, date)
+    loop.run_until_complete(api.Flush())
+
+    (statistics,) = api.server.HandleCommand({"type": "connections"})["connections"]
+    assert (statistics["identifier"], statistics["sent"], statistics["dropped"]) == ('client', 1, 0)
+    json.dumps(statistics)
+
+    # The latency of a slow client covers the write to its connection
+    async def SlowSend(message):
+        await asyncio.sleep(0.1)
+    client.send = SlowSend
+    api.Send(objects, 2, date)
+    loop.run_until_complete(api.Flush())
+    assert api.GetStatistics().maxLatency >= 0.1
+
+    api.server.RemoveClient(client)
+    assert api.GetConnectionStatistics() == [] and api.server.clientFormats == {}
+    api.Stop()
+    loop.run_until_complete(asyncio.sleep(0))
+    loop.close()
+
+
+# Check if delta clients start with a keyframe, also when they join mid-stream, and receive deltas after it
+def test_Delta():
+    loop = asyncio.new_event_loop()
+    api = APIController(loop, False)
+    (first, second) = (FakeWebsocket(), FakeWebsocket())
+    api.server.AddClient(first, 'first')
+    assert api.server.SetFormat(first, 'json', 1, True)
+    for frameIndex in range(3):
+        if frameIndex == 2:
+            api.server.AddClient(second, 'second')
+            api.server.SetFormat(second, 'json', 1, True)
+        api.Send(objects, frameIndex, date)
+        loop.run_until_complete(api.Flush())
+
+    assert [json.loads(message)["keyframe"] for message in first.messages] == [True, False, True]
+    assert [json.loads(message)["keyframe"] for message in second.messages] == [True]
+    assert json.loads(first.messages[1])["detectedObjects"] == []
+    assert api.server.syncedClients == {first, second}
+    api.Stop()
+    loop.run_until_complete(asyncio.sleep(0))
+    loop.close()
+
+
+# Check if a delta client learns that all objects left from the empty frame the positioner sends
+def test_DeltaEmptyFrame():
+    loop = asyncio.new_event_loop()
+    api = APIController(loop, False)
+    (jsonClient, binaryClient) = (FakeWebsocket(), FakeWebsocket())
+    api.server.AddClient(jsonClient, 'json')
+    api.server.AddClient(binaryClient, 'binary')
+    api.server.SetFormat(jsonClient, 'json', 1, True)
+    api.server.SetFormat(binaryClient, 'binary', 1, True)
+    convertor = Mock()
+    convertor.ConvertBatch.return_value = DetectionBatch.FromDetectedObjectPositions(objects)
+    positioner = MainPositioner(convertor, api)
+    for (frameIndex, detections) in enumerate([[DetectedObject(1, 1, 10, 'human'), DetectedObject(5, 5, 3, 'human')],
+                                               []]):
+        positioner.WriteData(detections, frameIndex, date)
+        loop.run_until_complete(api.Flush())
+
+    (keyframe, delta) = [json.loads(message) for message in jsonClient.messages]
+    assert (keyframe["keyframe"], delta["keyframe"]) == (True, False)
+    assert (delta["detectedObjects"], sorted(delta["removed"])) == ([], [1, 3])
+    (delta,) = FrameEncoder.DecodeBinary(binaryClient.messages[1])
+    assert (len(delta["records"]), sorted(delta["removed"])) == (0, [1, 3])
+    api.Stop()
+    loop.run_until_complete(asyncio.sleep(0))
+    loop.close()
+
+
+# Check if a delta client that would miss a delta waits for a keyframe
+def test_Resync():
+    loop = asyncio.new_event_loop()
+    api = APIController(loop, False)
+    client = FakeWebsocket()
+    connection = api.server.AddClient(client, 'client')
+    api.server.SetFormat(client, 'json', 1, True)
+    stream = api.server.GetStream(client)
+    assert api.server.TakeKeyframeRequests() == {stream}
+
+    api.server.BroadcastFrames({stream: DeltaMessage('delta', False)})
+    assert connection.GetStatistics().queued == 0 and api.server.keyframeRequests == {stream}
+    api.server.BroadcastFrames({stream: DeltaMessage('keyframe', True)})
+    api.server.BroadcastFrames({stream: DeltaMessage('delta', False)})
+    assert client not in api.server.syncedClients and api.server.TakeKeyframeRequests() == {stream}
+    loop.run_until_complete(api.Flush())
+    assert client.messages == ['keyframe']
+    api.Stop()
+    loop.run_until_complete(asyncio.sleep(0))
+    loop.close()
+
+
+# Check if commands with wrong values and failing handlers are answered with an error, the connection stays open
+def test_CommandErrors():
+    loop = asyncio.new_event_loop()
+    api = APIController(loop, False)
+    client = FakeWebsocket()
+    api.server.AddClient(client, 'client')
+    api.server.commandHandlers['fail'] = lambda command: 1 / 0
+    commands = [{"type": "format", "format": ["json"]}, {"type": "format", "format": "json", "version": "2"},
+                {"type": "subscribe", "channel": ["counters"]}, {"type": "fail"}, {"type": ["exit"]}, "exit", None]
+    assert all(loop.run_until_complete(api.server._OnClientCommand(client, command)) for command in commands)
+
+    responses = [json.loads(message) for message in client.messages]
+    assert [response["success"] for response in responses] == [False] * 4
+    assert "error" not in responses[0] and "error" not in responses[1]
+    assert (responses[2]["type"], responses[3]["type"]) == ("subscribe", "fail")
+    assert responses[3]["error"] == "division by zero"
+    assert api.server.GetStream(client)[:2] == ('json', 1)
+    api.Stop()
+    loop.run_until_complete(asyncio.sleep(0))
+    loop.close()
+
+
 # Check if the argument parser handles None
 def test_add_api_arguments_none():
     pytest.raises(TypeError, APIController.AddApiArguments, None)
@@ -110,6 +386,7 @@ async def RunServer(messages: [[DetectedObjectPosition]], clients, port):
 
     for message in messages:
         api.Send(message, 1, date)
+    await api.Flush()
 
     # Stop the server
     api.Stop()
@@ -120,6 +397,15 @@ async def RunServer(messages: [[DetectedObjectPosition]], clients, port):
         await asyncio.wait(clientTasks, timeout=3)
 
 
+# A websocket that records the messages that are sent to it
+class FakeWebsocket:
+    def __init__(self):
+        self.messages = []
+
+    async def send(self, message):
+        self.messages.append(message)
+
+
 # get a loop
 async def GetLoop():
     return asyncio.get_running_loop()
@@ -0,0 +1,135 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+import asyncio
+import time
+
+import pytest
+from websockets.exceptions import ConnectionClosedError
+
+from API.ClientConnection import ClientConnection, SlowClientPolicy
+
+
+# A websocket that only writes a message when it is released
+class SlowWebsocket:
+    def __init__(self):
+        self.messages = []
+        self.released = asyncio.Event()
+        self.closeCode = None
+
+    async def send(self, message):
+        await self.released.wait()
+        self.messages.append(message)
+
+    async def close(self, code, reason):
+        self.closeCode = code
+
+
+# Run the coroutine of a test on a new loop
+def Run(test):
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(test())
+    loop.close()
+
+
+# Test if a newer message replaces the unsent message of the same state, in its place
+def test_Conflate():
+    async def Test():
+        websocket = SlowWebsocket()
+        connection = ClientConnection(websocket, 'client')
+        task = asyncio.ensure_future(connection.Run())
+        connection.Send('frames', 'a')
+        await asyncio.sleep(0)
+        for message in ['b', 'c', 'd']:
+            connection.Send('frames', message)
+        connection.Send('channel', 'x')
+        connection.Send('frames', 'e')
+        assert connection.GetStatistics().queued == 2 and connection.GetStatistics().lag > 0
+
+        websocket.released.set()
+        while not connection.IsIdle():
+            await asyncio.sleep(0)
+        assert websocket.messages == ['a', 'e', 'x']
+        statistics = connection.GetStatistics()
+        assert (statistics.sent, statistics.conflated, statistics.dropped, statistics.queued) == (3, 3, 0, 0)
+        assert statistics.backlogBytes == 0 and statistics.maxLag > 0
+        connection.Close()
+        await task
+    Run(Test)
+
+
+# Test if the latency is measured from the given enqueue time until the message is written
+def test_Latency():
+    async def Test():
+        websocket = SlowWebsocket()
+        latencies = []
+        connection = ClientConnection(websocket, 'client', onWritten=latencies.append)
+        task = asyncio.ensure_future(connection.Run())
+        connection.Send('frames', 'a', time.perf_counter() - 10)
+        await asyncio.sleep(0.05)
+        assert latencies == [], "The latency was reported before the message was written"
+
+        websocket.released.set()
+        while not connection.IsIdle():
+            await asyncio.sleep(0)
+        assert len(latencies) == 1 and latencies[0] >= 10.05
+        assert connection.GetStatistics().maxLag == latencies[0]
+        connection.Close()
+        await task
+    Run(Test)
+
+
+# Test if the messages of new states are dropped above the high-water mark
+def test_Drop():
+    async def Test():
+        websocket = SlowWebsocket()
+        connection = ClientConnection(websocket, 'client', 10, SlowClientPolicy.Drop)
+        task = asyncio.ensure_future(connection.Run())
+        assert connection.Send('frames', '12345678')
+        assert connection.Send('frames', '123456')
+        assert not connection.Send('channel', '12345')
+        assert connection.GetStatistics().dropped == 1
+
+        # The writer took the frame, so the channel fits
+        await asyncio.sleep(0)
+        assert connection.Send('channel', '1234')
+        websocket.released.set()
+        while not connection.IsIdle():
+            await asyncio.sleep(0)
+        assert websocket.messages == ['123456', '1234'] and websocket.closeCode is None
+        connection.Close()
+        await task
+    Run(Test)
+    pytest.raises(ValueError, ClientConnection, SlowWebsocket(), 'client', 0)
+
+
+# Test if a client is disconnected above the high-water mark, with its queued messages dropped
+def test_Disconnect():
+    async def Test():
+        websocket = SlowWebsocket()
+        connection = ClientConnection(websocket, 'client', 10, SlowClientPolicy.Disconnect)
+        task = asyncio.ensure_future(connection.Run())
+        assert connection.Send('frames', '12345678')
+        assert not connection.Send('channel', '12345')
+        await asyncio.wait_for(task, 1)
+        assert websocket.closeCode == ClientConnection.CLOSE_CODE
+        assert not connection.Send('channel', '1')
+        assert connection.GetStatistics().dropped == 3
+    Run(Test)
+
+
+# Test if the writer stops when the connection is closed
+def test_Closed():
+    async def Test():
+        websocket = SlowWebsocket()
+
+        async def Send(message):
+            raise ConnectionClosedError(None, None)
+        websocket.send = Send
+        connection = ClientConnection(websocket, 'client')
+        connection.Send('frames', 'a')
+        await asyncio.wait_for(connection.Run(), 1)
+        assert not connection.Send('frames', 'b')
+        assert connection.GetStatistics().dropped == 1
+    Run(Test)
@@ -0,0 +1,90 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+import numpy as np
+import pytest
+
+from API.DeltaEncoder import DeltaEncoder
+from API.FrameEncoder import Frame
+from FrameAnalyzer.DetectionBatch import DetectionBatch
+
+# Roughly 1 meter in degrees of latitude, and a latitude on the quantization grid of 0.5 meters
+METER = 1 / DeltaEncoder.METERS_PER_DEGREE
+BASE = np.round(52 / (0.5 * METER)) * 0.5 * METER
+
+
+# Create a frame with the objects at the given latitudes, all at longitude 5 and altitude 0
+def CreateFrame(ids, latitudes, types=None, frameIndex=0) -> Frame:
+    count = len(ids)
+    types = types or ['human'] * count
+    typeTable = tuple(dict.fromkeys(types))
+    batch = DetectionBatch(np.zeros(count), np.zeros(count), ids, [typeTable.index(t) for t in types], typeTable) \
+        .WithPositions(latitudes, 5.0, 0.0)
+    return Frame(batch, frameIndex, None)
+
+
+# Apply a keyframe or delta to the positions a client knows
+def Apply(positions, frame):
+    if frame.keyframe:
+        positions = {}
+    for objectId in frame.removed:
+        positions.pop(objectId)
+    batch = frame.detectedObjects
+    for objectId, latitude in zip(batch.id.tolist(), batch.latitude.tolist()):
+        if objectId != DetectionBatch.NO_ID:
+            positions[objectId] = latitude
+    return positions
+
+
+# Test if a delta only holds the new, moved and untracked objects, and the removed ids
+def test_Delta():
+    encoder = DeltaEncoder(keyframeFrames=100, keyframeSeconds=100, epsilon=0.5)
+    keyframe = encoder.Encode(CreateFrame([1, 2, 3, -1], [BASE] * 4), now=0)
+    assert keyframe.keyframe and keyframe.removed == [] and len(keyframe.detectedObjects) == 4
+
+    delta = encoder.Encode(CreateFrame([3, 1, 4, -1], [BASE + 0.2 * METER, BASE + 0.6 * METER, BASE, BASE]), now=1)
+    assert not delta.keyframe
+    assert delta.detectedObjects.id.tolist() == [1, 4, -1]
+    assert delta.removed == [2]
+
+    # A slow drift is sent once it adds up to epsilon from the last sent position
+    delta = encoder.Encode(CreateFrame([3, 1, 4], [BASE + 0.45 * METER, BASE + 0.6 * METER, BASE]), now=2)
+    assert delta.detectedObjects.id.tolist() == []
+    delta = encoder.Encode(CreateFrame([3, 1, 4], [BASE + 0.55 * METER, BASE + 0.6 * METER, BASE],
+                                       ['human', 'car', 'human']), now=3)
+    assert delta.detectedObjects.id.tolist() == [3, 1]
+    assert delta.detectedObjects.GetTypes() == ['human', 'car']
+    assert delta.detectedObjects.latitude[0] == pytest.approx(BASE + 0.5 * METER, abs=1e-12)
+
+
+# Test if a client that applies the deltas to the keyframe has the positions of the server, within epsilon
+def test_Reconstruct():
+    encoder = DeltaEncoder(keyframeFrames=1000, keyframeSeconds=1000, epsilon=0.05)
+    random = np.random.default_rng(1)
+    (ids, latitudes) = (np.arange(20), np.full(20, 52.0))
+    positions = {}
+    for frameIndex in range(50):
+        latitudes = latitudes + random.normal(0, 0.03 * METER, len(ids))
+        visible = random.random(len(ids)) > 0.1
+        frame = encoder.Encode(CreateFrame(ids[visible], latitudes[visible]), now=frameIndex)
+        positions = Apply(positions, frame)
+
+        assert sorted(positions) == ids[visible].tolist()
+        known = np.array([positions[i] for i in ids[visible]])
+        assert np.allclose(known, encoder._positions[:, 0] * encoder._steps[0], rtol=0, atol=1e-12)
+        assert np.all(np.abs(known - latitudes[visible]) < 0.05 * METER)
+
+
+# Test if keyframes are made every keyframeFrames frames or keyframeSeconds seconds, or when requested
+def test_Keyframes():
+    encoder = DeltaEncoder(keyframeFrames=3, keyframeSeconds=10)
+    frame = CreateFrame([1], [52])
+    assert [encoder.Encode(frame, now=second).keyframe for second in range(7)] == \
+        [True, False, False, True, False, False, True]
+    assert encoder.Encode(frame, now=16.5).keyframe
+    assert encoder.Encode(frame, True, now=16.6).keyframe
+    assert not encoder.Encode(frame, now=16.7).keyframe
+
+    pytest.raises(ValueError, DeltaEncoder, 0)
+    pytest.raises(ValueError, DeltaEncoder, 1, 1, 0)
@@ -0,0 +1,85 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from API.FrameEncoder import Frame, FrameEncoder
+from FrameAnalyzer.DetectionBatch import DetectionBatch
+from Positioner.DetectedObjectPosition import DetectedObjectPosition
+
+objects = [DetectedObjectPosition(52.1, 5.2, 3.5, 4, 'human', 1.5, 136000.0, 455000.0, ['b']),
+           DetectedObjectPosition(52.2, 5.3, None, None, 'car')]
+date = datetime(2022, 5, 3, 14, 15, 46, 663021, timezone.utc)
+
+
+# Test if a frame is packed in a single buffer that decodes to the same values
+def test_Binary():
+    message = FrameEncoder.Encode([Frame(objects, 7, date)], 'binary')
+    assert isinstance(message, bytes)
+
+    (frame,) = FrameEncoder.DecodeBinary(message)
+    assert frame["frameIndex"] == 7
+    assert frame["frameTime"] == 1651587346663021000
+    assert frame["types"] == ['human', 'car']
+    assert frame["zoneIds"] == ['b'] and frame["zonesKnown"]
+
+    records = frame["records"]
+    assert records["id"].tolist() == [4, DetectionBatch.NO_ID]
+    assert [frame["types"][code] for code in records["type"]] == ['human', 'car']
+    assert records["latitude"].tolist() == [52.1, 52.2]
+    assert records["altitude"][0] == 3.5 and np.isnan(records["altitude"][1])
+    assert records["rijksdriehoekX"][0] == 136000.0 and np.isnan(records["rijksdriehoekY"][1])
+    assert records["zones"].tolist() == [1, 0]
+    assert len(message) == FrameEncoder.HEADER.size + len(b'.human.car.b') + 2 * FrameEncoder.RECORD_TYPE.itemsize
+
+
+# Test if coalesced frames are consecutive binary frames, and a frame without objects or time is valid
+def test_Coalesced():
+    batch = DetectionBatch.FromDetectedObjectPositions(objects)
+    message = FrameEncoder.Encode([Frame(batch, 1, date), Frame([], 2, None)], 'binary')
+
+    frames = FrameEncoder.DecodeBinary(message)
+    assert [frame["frameIndex"] for frame in frames] == [1, 2]
+    assert len(frames[0]["records"]) == 2 and len(frames[1]["records"]) == 0
+    assert frames[1]["frameTime"] == 0 and not frames[1]["zonesKnown"]
+    pytest.raises(ValueError, FrameEncoder.DecodeBinary, b'XXXX' + message[4:])
+
+
+# Test if JSON stays the format of a frame, or of a list of frames when they are coalesced
+def test_Json():
+    frame = json.loads(FrameEncoder.Encode([Frame(objects, 1, date)], 'json'))
+    assert frame["frameTimeStamp"] == date.astimezone().isoformat()
+    assert frame["detectedObjects"][1] == {"latitude": 52.2, "longitude": 5.3, "type": 'car'}
+
+    frames = json.loads(FrameEncoder.Encode([Frame(objects, 1, None), Frame(objects, 2, None)], 'json'))
+    assert [frame["frameIndex"] for frame in frames["frames"]] == [1, 2]
+    assert frames["frames"][0]["frameTimeStamp"] == '0001-01-01T00:00:00'
+    pytest.raises(ValueError, FrameEncoder.Encode, [Frame(objects, 1, None)], 'xml')
+
+
+# Test if a frame of a delta stream has its keyframe flag and removed ids in both formats
+def test_Delta():
+    frame = Frame(objects[:1], 3, None, False, [5, 9])
+    (decoded,) = FrameEncoder.DecodeBinary(FrameEncoder.Encode([frame], 'binary'))
+    assert (decoded["keyframe"], decoded["removed"], len(decoded["records"])) == (False, [5, 9], 1)
+    (decoded,) = FrameEncoder.DecodeBinary(FrameEncoder.Encode([frame._replace(keyframe=True, removed=[])], 'binary'))
+    assert (decoded["keyframe"], decoded["removed"]) == (True, [])
+    assert FrameEncoder.DecodeBinary(FrameEncoder.Encode([Frame(objects, 3, None)], 'binary'))[0]["keyframe"] is None
+
+    message = json.loads(FrameEncoder.Encode([frame], 'json'))
+    assert (message["keyframe"], message["removed"]) == (False, [5, 9])
+    assert "keyframe" not in json.loads(FrameEncoder.Encode([Frame(objects, 3, None)], 'json'))
+
+
+# Test if long strings are truncated on a character boundary, so they still decode
+def test_LongStrings():
+    batch = DetectionBatch.FromDetectedObjectPositions([DetectedObjectPosition(52.1, 5.2, None, None, 'é' * 200)])
+    (frame,) = FrameEncoder.DecodeBinary(FrameEncoder.Encode([Frame(batch, 1, None)], 'binary'))
+    assert frame["types"] == ['é' * 127]
+    assert FrameEncoder.EncodeString('é' * 10) == ('é' * 10).encode('utf-8')
+    assert len(FrameEncoder.EncodeString('€' * 100)) == 255
@@ -0,0 +1,160 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+import asyncio
+import json
+import threading
+from unittest.mock import Mock
+
+import pytest
+
+from API.MessageDispatcher import MessageDispatcher
+from API.StreamFilter import StreamFilter
+
+
+# Create a dispatcher on a new loop, with a server that records the broadcast messages
+def CreateDispatcher(maxFrames=16):
+    loop = asyncio.new_event_loop()
+    server = Mock()
+    server.GetStreams.return_value = {('json', 2, StreamFilter(), False), ('count', 1, StreamFilter(), False)}
+    server.TakeKeyframeRequests.return_value = set()
+    return loop, server, MessageDispatcher(loop, server, Encode, maxFrames)
+
+
+# Encode frames as JSON or as their number
+def Encode(frames, stream, keyframe):
+    if stream[0] == 'count':
+        return len(frames)
+    return json.dumps(frames[0] if len(frames) == 1 else {"frames": frames})
+
+
+# Check if messages from another thread are only broadcast on the loop, in order
+def test_Handoff():
+    (loop, server, dispatcher) = CreateDispatcher()
+    threads = {}
+
+    def Build(number):
+        threads[number] = threading.current_thread()
+        return {"number": number}
+
+    thread = threading.Thread(target=lambda: [dispatcher.Enqueue(lambda i=i: Build(i), 'channel')
+                                              for i in range(3)])
+    thread.start()
+    thread.join()
+    assert server.BroadcastChannel.call_count == 0
+
+    loop.run_until_complete(dispatcher.Flush())
+    assert [json.loads(call[0][1])["number"] for call in server.BroadcastChannel.call_args_list] == [0, 1, 2]
+    assert all(call[0][0] == 'channel' for call in server.BroadcastChannel.call_args_list)
+    assert threading.main_thread() not in threads.values() and thread not in threads.values()
+
+    statistics = dispatcher.GetStatistics()
+    assert (statistics.enqueued, statistics.sent, statistics.coalesced, statistics.pending) == (3, 3, 0, 0)
+    assert statistics.maxLatency == 0, "The latency was measured before the messages were written"
+
+    # The latency is reported by the connections of the server once they wrote a message
+    assert all(call[0][2] > 0 for call in server.BroadcastChannel.call_args_list)
+    server.onWritten(0.5)
+    server.onWritten(1.5)
+    statistics = dispatcher.GetStatistics()
+    assert (statistics.averageLatency, statistics.maxLatency) == (1.0, 1.5)
+    dispatcher.Close()
+    loop.close()
+
+
+# Check if frames that waited together are coalesced, and other messages keep their place
+def test_Coalesce():
+    (loop, server, dispatcher) = CreateDispatcher(maxFrames=2)
+    for i in range(3):
+        dispatcher.EnqueueFrame({"frameIndex": i})
+    dispatcher.Enqueue(lambda: {"data": 1}, 'channel')
+    dispatcher.EnqueueFrame({"frameIndex": 3})
+    loop.run_until_complete(dispatcher.Flush())
+
+    messages = [call[0][0] for call in server.BroadcastFrames.call_args_list]
+    frames = [json.loads(message[('json', 2, StreamFilter(), False)]) for message in messages]
+    assert frames == [{"frames": [{"frameIndex": 0}, {"frameIndex": 1}]}, {"frameIndex": 2}, {"frameIndex": 3}]
+    assert [message[('count', 1, StreamFilter(), False)] for message in messages] == [2, 1, 1]
+    assert server.BroadcastChannel.call_count == 1
+    assert dispatcher.GetStatistics().coalesced == 1
+    assert dispatcher.GetStatistics().sent == 4
+    dispatcher.Close()
+    loop.close()
+
+
+# Check if a stream with a maximum rate skips the frames that follow too soon, and other streams receive all frames
+def test_Throttle():
+    (loop, server, dispatcher) = CreateDispatcher()
+    slow = ('count', 1, StreamFilter(maxRate=0.01), False)
+    server.GetStreams.return_value = {('json', 2, StreamFilter(), False), slow}
+    for i in range(3):
+        dispatcher.EnqueueFrame({"frameIndex": i})
+    loop.run_until_complete(dispatcher.Flush())
+    dispatcher.EnqueueFrame({"frameIndex": 3})
+    loop.run_until_complete(dispatcher.Flush())
+
+    messages = [call[0][0] for call in server.BroadcastFrames.call_args_list]
+    assert [message.get(slow) for message in messages] == [1, None]
+    assert json.loads(messages[1][('json', 2, StreamFilter(), False)]) == {"frameIndex": 3}
+    dispatcher.Close()
+    loop.close()
+
+
+# Check if a keyframe request is passed with the next frames of the stream, also when the stream skipped frames
+def test_KeyframeRequests():
+    (loop, server, dispatcher) = CreateDispatcher()
+    slow = ('count', 1, StreamFilter(maxRate=0.01), True)
+    keyframes = []
+    dispatcher._encode = lambda frames, stream, keyframe: keyframes.append((stream, keyframe))
+    server.GetStreams.return_value = {slow}
+    dispatcher.EnqueueFrame({"frameIndex": 0})
+    loop.run_until_complete(dispatcher.Flush())
+
+    server.TakeKeyframeRequests.return_value = {slow}
+    dispatcher.EnqueueFrame({"frameIndex": 1})
+    loop.run_until_complete(dispatcher.Flush())
+    dispatcher._lastFrameTimes.clear()
+    server.TakeKeyframeRequests.return_value = set()
+    dispatcher.EnqueueFrame({"frameIndex": 2})
+    dispatcher.EnqueueFrame({"frameIndex": 3})
+    loop.run_until_complete(dispatcher.Flush())
+    assert keyframes == [(slow, False), (slow, True)]
+    dispatcher.Close()
+    loop.close()
+
+
+# Check if the frames are not encoded when no client receives them
+def test_NoFormats():
+    (loop, server, dispatcher) = CreateDispatcher()
+    server.GetStreams.return_value = set()
+    dispatcher.EnqueueFrame(object())
+    loop.run_until_complete(dispatcher.Flush())
+    assert server.BroadcastFrames.call_args_list[0][0][0] == {}
+    assert dispatcher.GetStatistics().dropped == 0
+    dispatcher.Close()
+    loop.close()
+
+
+# Check if messages are dropped when they can't be sent or serialized, without dropping the other messages
+def test_Dropped():
+    (loop, server, dispatcher) = CreateDispatcher()
+    dispatcher.Enqueue(lambda: {"data": object()}, 'channel')
+    dispatcher.Enqueue(lambda: 1 / 0, 'channel')
+    dispatcher.Enqueue(lambda: {"data": 1}, 'channel')
+    dispatcher.EnqueueFrame({"frameIndex": object()})
+    loop.run_until_complete(dispatcher.Flush())
+    assert dispatcher.GetStatistics().dropped == 3
+    assert [json.loads(call[0][1]) for call in server.BroadcastChannel.call_args_list] == [{"data": 1}]
+    assert list(server.BroadcastFrames.call_args[0][0].values()) == [1]
+
+    dispatcher.Close()
+    assert not dispatcher.Enqueue(lambda: {}, 'channel')
+    loop.close()
+
+    (loop, server, dispatcher) = CreateDispatcher()
+    loop.close()
+    assert not dispatcher.Enqueue(lambda: {}, 'channel')
+    assert dispatcher.GetStatistics().dropped == 1
+    assert dispatcher.GetStatistics().pending == 0
+    pytest.raises(ValueError, MessageDispatcher, loop, server, Encode, 0)
@@ -0,0 +1,47 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+import numpy as np
+import pytest
+
+from API.FrameEncoder import Frame
+from API.StreamFilter import StreamFilter
+from FrameAnalyzer.DetectionBatch import DetectionBatch
+
+batch = DetectionBatch(np.zeros(4), np.zeros(4), [1, 2, 3, 4], [0, 1, 0, 0], ('human', 'car')) \
+    .WithPositions([52.0, 52.1, 52.2, np.nan], [5.0, 5.1, 5.2, np.nan], 0) \
+    .WithZones([[True], [True], [False], [False]], ('street',))
+
+
+# Test if equal filters are read from commands in any order, and invalid filters are refused
+def test_FromCommand():
+    streamFilter = StreamFilter.FromCommand({"type": "filter", "types": ["car", "human", "car"], "maxRate": 2})
+    assert streamFilter == StreamFilter(types=('car', 'human'), maxRate=2.0)
+    assert StreamFilter.FromCommand({"type": "filter"}) == StreamFilter()
+    assert not StreamFilter().SelectsObjects() and not StreamFilter(maxRate=1).SelectsObjects()
+
+    for command in [{"bounds": [0, 0, 1]}, {"bounds": [0, 0, 1, "1"]}, {"zone": 1}, {"types": "human"},
+                    {"maxRate": -1}, {"maxRate": True}]:
+        pytest.raises(ValueError, StreamFilter.FromCommand, command)
+
+
+# Test if the bounds, zone and types select the objects on their columns
+def test_Mask():
+    assert StreamFilter(bounds=(52.05, 5.0, 53, 6)).GetMask(batch).tolist() == [False, True, True, False]
+    assert StreamFilter(zone='street').GetMask(batch).tolist() == [True, True, False, False]
+    assert not StreamFilter(zone='square').GetMask(batch).any()
+    assert StreamFilter(types=('human',), zone='street').GetMask(batch).tolist() == [True, False, False, False]
+    assert not StreamFilter(types=('bicycle',)).GetMask(batch).any()
+
+
+# Test if a frame keeps the objects that pass, and is kept as it is when the filter passes every object
+def test_Apply():
+    frame = Frame(batch, 1, None)
+    assert StreamFilter(maxRate=1).Apply(frame) is frame
+
+    filtered = StreamFilter(types=('car',)).Apply(frame)
+    assert filtered.frameIndex == 1
+    assert filtered.detectedObjects.id.tolist() == [2]
+    assert filtered.detectedObjects.GetTypes() == ['car']
+    assert len(StreamFilter(types=('car',)).Apply(Frame([], 2, None)).detectedObjects) == 0
@@ -6,7 +6,7 @@ import numpy as np
 from unittest.mock import Mock
 from Calibrator.ImageReceiver.SmartImage import SmartImage
 from Calibrator.Configurations.HomographyCalibrationConfiguration import HomographyCalibrationConfiguration, \
-    GeoPosition, HomographyGeoData
+    GeoPosition, HomographyGeoData, HomographyPlane
 
 
 class TestHomographyCalibrationConfiguration:
@@ -85,3 +85,61 @@ class TestHomographyCalibrationConfiguration:
             homographyGeoData.anchorGeoPosition.altitude and \
             homographyCalibrationConfiguration.homographyGeoData.pixelScale == homographyGeoData.pixelScale, \
             "Homography configuration has been modified wrongly!"
+
+    def test_LookupTablePath(self):
+        configuration = HomographyCalibrationConfiguration(np.identity(3), (960, 540))
+        assert configuration.analyzeResolution == (960, 540)
+
+        # Without a camera id there is no place to store the table
+        assert configuration.GetLookupTablePath("key") is None
+        configuration.cameraId = 3
+        assert configuration.GetLookupTablePath("key").name == "HomographyCalibrationConfiguration_3_key.lut.npy"
+
+    def test_UncertaintyImagePath(self):
+        configuration = HomographyCalibrationConfiguration(np.identity(3), (960, 540))
+        assert configuration.GetUncertaintyImagePath() is None
+        configuration.cameraId = 3
+        assert configuration.GetUncertaintyImagePath().name == "HomographyCalibrationConfiguration_3_uncertainty.png"
+
+    def test_Planes(self):
+        configuration = HomographyCalibrationConfiguration(np.identity(3), (8, 6), planes=[
+            HomographyPlane("ramp", np.identity(3) * 2, [[0, 0], [3, 0], [3, 5], [0, 5]], 1.5),
+            HomographyPlane("stairs", np.identity(3) * 3, [[2, 2], [7, 2], [7, 5], [2, 5]])
+        ])
+        labels = configuration.GetPlaneLabels()
+        assert labels.shape == (6, 8)
+        assert labels[0].tolist() == [1, 1, 1, 1, 0, 0, 0, 0]
+        assert labels[3].tolist() == [1, 1, 2, 2, 2, 2, 2, 2]
+        assert labels[5, 7] == 2 and labels[1, 7] == 0
+
+        key = configuration.GetPlanesKey()
+        configuration.planes[1].altitude = 2
+        assert configuration.GetPlanesKey() != key
+        assert HomographyCalibrationConfiguration(np.identity(3), (8, 6)).GetPlanesKey() is None
+        assert HomographyCalibrationConfiguration(np.identity(3), (8, 6)).GetPlaneLabels() is None
+
+    def test_LoadPlanes(self):
+        configuration = HomographyCalibrationConfiguration(None, None)
+
+        def setData(_):
+            configuration.homographyMatrix = np.identity(3).tolist()
+            configuration.homographyGeoData = {
+                "anchorPixelPosition": (100, 100),
+                "anchorGeoPosition": {"longitude": 5, "latitude": 50, "altitude": 0},
+                "anchorRdPosition": None,
+                "pixelScale": 1
+            }
+            configuration.cameraResolution = (1920, 1080)
+            configuration.planes = [{"name": "ramp", "homographyMatrix": np.identity(3).tolist(),
+                                     "polygon": [[0, 0], [1920, 0], [1920, 540]], "altitude": None}]
+
+        configuration.FromJSON = Mock(side_effect=setData)
+        SmartImage.FromIdentifier = Mock(return_value=None)
+        configuration.Load(1, {'analyzeWidth': 960, 'analyzeHeight': 540})
+
+        # The planes are scaled to the analyze resolution like the homography matrix
+        plane = configuration.planes[0]
+        assert plane.name == "ramp" and plane.altitude is None
+        assert plane.polygon.tolist() == [[0, 0], [960, 0], [960, 270]]
+        assert np.array_equal(plane.homographyMatrix, configuration.homographyMatrix)
+        assert configuration.GetPlaneLabels().shape == (540, 960)
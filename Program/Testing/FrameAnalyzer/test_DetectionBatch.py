@@ -0,0 +1,76 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+import numpy as np
+import pytest
+
+from FrameAnalyzer.DetectionBatch import DetectionBatch
+from FrameAnalyzer.IDetector import DetectedObject
+from Positioner.DetectedObjectPosition import DetectedObjectPosition
+
+detections = [DetectedObject(1.5, 2, 0, 'human'), DetectedObject(5, 6, 1, 'bicycle'),
+              DetectedObject(7, 8, None, 'human')]
+
+
+# Test if detected objects survive the conversion to columns and back
+def test_DetectedObjects():
+    batch = DetectionBatch.FromDetectedObjects(detections)
+    assert len(batch) == 3
+    assert batch.types == ('human', 'bicycle')
+    assert batch.typeCode.tolist() == [0, 1, 0]
+    assert batch.GetPixelPositions().tolist() == [[1.5, 2], [5, 6], [7, 8]]
+    assert batch.ToDetectedObjects() == [DetectedObject(1.5, 2, 0, 'human'), DetectedObject(5, 6, 1, 'bicycle'),
+                                         DetectedObject(7, 8, DetectionBatch.NO_ID, 'human')]
+    assert np.isnan(batch.latitude).all()
+
+
+# Test if the adapters pass batches through and convert lists
+def test_FromDetections():
+    batch = DetectionBatch.FromDetectedObjects(detections)
+    assert DetectionBatch.FromDetections(batch) is batch
+    assert DetectionBatch.FromDetections(None) is None
+    assert DetectionBatch.FromDetections(detections).ToDetectedObjects() == batch.ToDetectedObjects()
+    assert len(DetectionBatch.FromDetections([])) == 0
+
+
+# Test if positions are added to the detections, and missing values are None or left out
+def test_Positions():
+    batch = DetectionBatch.FromDetectedObjects(detections[:2])
+    positionBatch = batch.WithPositions([52.0, 52.1], [5.0, 5.1], 0, None, [1.0, 2.0], [3.0, 4.0])
+    assert positionBatch.x is batch.x
+
+    assert positionBatch.ToDetectedObjectPositions() == [
+        DetectedObjectPosition(52.0, 5.0, 0.0, 0, 'human', None, 1.0, 3.0),
+        DetectedObjectPosition(52.1, 5.1, 0.0, 1, 'bicycle', None, 2.0, 4.0)
+    ]
+    assert positionBatch.ToDictionaries()[0] == {'latitude': 52.0, 'longitude': 5.0, 'altitude': 0.0, 'id': 0,
+                                                 'type': 'human', 'rijksdriehoekX': 1.0, 'rijksdriehoekY': 3.0}
+
+
+# Test if list based convertor results are turned into a batch
+def test_DetectedObjectPositions():
+    positions = [DetectedObjectPosition(52.0, 5.0, 0, 0, 'human', 1.5), DetectedObjectPosition(52.1, 5.1, 0, 1, 0)]
+    batch = DetectionBatch.FromDetectedObjectPositions(positions)
+    assert batch.ToDetectedObjectPositions() == positions
+    assert np.isnan(batch.x).all()
+    assert list(batch.ToDictionaries()[1].keys()) == ['latitude', 'longitude', 'altitude', 'id', 'type']
+
+    # Detections without an id leave it out
+    withoutId = [DetectedObjectPosition(52.0, 5.0, 0, None, 'human')]
+    assert DetectionBatch.FromDetectedObjectPositions(withoutId).ToDetectedObjectPositions() == withoutId
+    assert 'id' not in DetectionBatch.FromDetectedObjectPositions(withoutId).ToDictionaries()[0]
+
+    with pytest.raises(ValueError):
+        DetectionBatch.FromDetectedObjects(detections).WithDetectedObjectPositions(positions)
+
+
+# Test if a subset of the detections keeps its positions, zones and the type table
+def test_Select():
+    batch = DetectionBatch.FromDetectedObjects(detections).WithPositions([52.0, 52.1, 52.2], 5.0, 0) \
+        .WithZones([[True], [False], [True]], ('a',))
+    selected = batch.Select(np.array([False, True, True]))
+    assert selected.types == batch.types
+    assert selected.ToDetectedObjects() == batch.ToDetectedObjects()[1:]
+    assert selected.latitude.tolist() == [52.1, 52.2]
+    assert selected.GetZones() == [(), ('a',)]
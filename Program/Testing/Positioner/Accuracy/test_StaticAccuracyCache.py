@@ -0,0 +1,60 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+from types import SimpleNamespace
+
+import numpy as np
+
+from Positioner.Accuracy.StaticAccuracyCache import StaticAccuracyCache
+from Positioner.Accuracy.StaticAccuracyDataset import StaticAccuracyError
+from Positioner.IConvertor import IConvertor
+from Positioner.HomographyConverter import HomographyConverter
+
+
+class TestStaticAccuracyCache:
+    def test_Key(self, tmp_path, monkeypatch):
+        datasetPath = tmp_path / "dataset.json"
+        datasetPath.write_text('{"entries": []}')
+        key = StaticAccuracyCache.GetKey([datasetPath], IConvertor, SimpleNamespace, {'shiftDistance': 5})
+
+        assert key == StaticAccuracyCache.GetKey([datasetPath], IConvertor, SimpleNamespace, {'shiftDistance': 5}), \
+            "The key is not stable"
+        assert key != StaticAccuracyCache.GetKey([datasetPath], HomographyConverter, SimpleNamespace,
+                                                 {'shiftDistance': 5}), \
+            "The key does not depend on the convertor"
+        assert key != StaticAccuracyCache.GetKey([datasetPath], IConvertor, dict, {'shiftDistance': 5}), \
+            "The key does not depend on the configuration class"
+        assert key != StaticAccuracyCache.GetKey([datasetPath], IConvertor, SimpleNamespace, {'shiftDistance': 1}), \
+            "The key does not depend on the parameters"
+        monkeypatch.setattr(StaticAccuracyCache, 'CACHE_VERSION', StaticAccuracyCache.CACHE_VERSION + 1)
+        assert key != StaticAccuracyCache.GetKey([datasetPath], IConvertor, SimpleNamespace, {'shiftDistance': 5}), \
+            "The key does not depend on the version of the measurement"
+        monkeypatch.undo()
+        datasetPath.write_text('{"entries": [1]}')
+        assert key != StaticAccuracyCache.GetKey([datasetPath], IConvertor, SimpleNamespace, {'shiftDistance': 5}), \
+            "The key does not depend on the dataset contents"
+
+    def test_GetSet(self, tmp_path):
+        cache = StaticAccuracyCache(tmp_path / "cache.json")
+        assert cache.Get("key") is None, "An empty cache returned an error"
+
+        staticError = StaticAccuracyError()
+        staticError.AddErrors(np.array([1.0, 3.0]))
+        staticError.AverageErrors()
+        cache.Set("key", staticError)
+
+        storedError = StaticAccuracyCache(tmp_path / "cache.json").Get("key")
+        assert storedError.GetMaxError() == 3.0 and storedError.averageError == 2.0 \
+            and storedError.numberOfErrors == 2, "The stored error was not restored"
+
+    def test_MaxEntries(self, tmp_path):
+        cache = StaticAccuracyCache(tmp_path / "cache.json")
+        for i in range(StaticAccuracyCache.MAX_ENTRIES + 1):
+            cache.Set(str(i), StaticAccuracyError())
+        assert cache.Get("0") is None, "The oldest entry was not removed"
+        assert cache.Get(str(StaticAccuracyCache.MAX_ENTRIES)) is not None, "The newest entry was removed"
+
+    def test_Corrupt(self, tmp_path):
+        (tmp_path / "cache.json").write_text("not json")
+        assert StaticAccuracyCache(tmp_path / "cache.json").Get("key") is None, "A corrupt cache returned an error"
@@ -0,0 +1,91 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+import base64
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+from FrameAnalyzer.DetectionBatch import DetectionBatch
+from Positioner.Analytics.Heatmap import Heatmap
+from Testing.Positioner.BatchFactory import CreateBatch
+
+
+# A convertor that places pixels on the ground one centimeter per pixel from a corner
+class GroundConvertor:
+    def ConvertBatch(self, detectionBatch: DetectionBatch, frameIndex: int) -> DetectionBatch:
+        return detectionBatch.WithPositions(0, 0, 0, None, 1000 + detectionBatch.x / 100,
+                                            2000 - detectionBatch.y / 100)
+
+
+# Test if the kernel of an object adds one unit of heat around its cell
+def test_Update():
+    heatmap = Heatmap(0, 0, 40, 20, cellSize=0.5, kernelSigma=1.0)
+    heatmap.Update(CreateBatch(None, [(10.2, 5.2), (np.nan, 0), (100, 100)]), 0)
+
+    heat = heatmap.GetHeat()
+    assert heat.sum() == pytest.approx(1, rel=1e-5)
+    assert np.unravel_index(np.argmax(heat), heat.shape) == (10, 20)
+    assert heat[10, 20] > heat[10, 22] > heat[10, 25]
+
+
+# Test if the heat halves every half life, also for cells that are not touched again
+def test_Decay():
+    heatmap = Heatmap(0, 0, 40, 20, halfLife=10)
+    heatmap.Update(CreateBatch(None, [(5, 5)]), 0)
+    heatmap.Update(CreateBatch(None, [(16, 5)]), 10)
+
+    heat = heatmap.GetHeat()
+    assert heat[:, :20].sum() == pytest.approx(0.5, rel=1e-5)
+    assert heat[:, 20:].sum() == pytest.approx(1, rel=1e-5)
+    assert heatmap.GetHeat(20).sum() == pytest.approx(0.75, rel=1e-5)
+
+    heatmap.Update(CreateBatch(None, [(5, 5)]), 20)
+    assert heatmap.GetHeat()[:, :20].sum() == pytest.approx(1.25, rel=1e-5)
+
+    # A frame without objects advances the time of the heat
+    heatmap.Update(DetectionBatch.Empty(), 30)
+    assert heatmap.GetHeat().sum() == pytest.approx(0.875, rel=1e-5)
+
+
+# Test if the snapshot is a north up png of the heat scaled to its maximum
+def test_GetResults():
+    heatmap = Heatmap.FromBounds((0, 0, 10, 5), cellSize=0.5, kernelSigma=0.5)
+    assert heatmap.GetResults()["maximum"] == 0
+    heatmap.Update(CreateBatch(None, [(1, 4)]), 0)
+
+    results = heatmap.GetResults()
+    json.dumps(results)
+    assert (results["width"], results["height"]) == (20, 10)
+    image = cv2.imdecode(np.frombuffer(base64.b64decode(results["png"]), np.uint8), cv2.IMREAD_UNCHANGED)
+    assert image.shape == (10, 20)
+    assert np.unravel_index(np.argmax(image), image.shape) == (1, 2)
+    assert image.max() == 255
+    assert results["maximum"] == pytest.approx(heatmap.GetHeat().max())
+
+
+# Test if the calibrated bounds cover the converted image, limited to the maximum size
+def test_CalibratedBounds():
+    bounds = Heatmap.CalibratedBounds(GroundConvertor(), 1000, 500)
+    assert bounds == pytest.approx((1000, 1995.01, 1009.99, 2000))
+
+    bounds = Heatmap.CalibratedBounds(GroundConvertor(), 1000, 500, maxSize=4)
+    assert bounds[2] - bounds[0] == pytest.approx(4)
+    assert bounds[3] - bounds[1] == pytest.approx(4)
+
+
+# Test if the arguments are validated
+def test_ValidateHeatmapArguments():
+    arguments = {'heatmap': True, 'heatmapCellSize': 0.5, 'heatmapHalfLife': 60.0, 'heatmapInterval': 10.0}
+    Heatmap.ValidateHeatmapArguments(arguments)
+    with pytest.raises(TypeError):
+        Heatmap.ValidateHeatmapArguments(None)
+    with pytest.raises(ValueError):
+        Heatmap.ValidateHeatmapArguments(dict(arguments, heatmapCellSize=0))
+    with pytest.raises(ValueError):
+        Heatmap.ValidateHeatmapArguments(dict(arguments, heatmapHalfLife=-1))
+    with pytest.raises(ValueError):
+        Heatmap.ValidateHeatmapArguments(dict(arguments, heatmapInterval="a"))
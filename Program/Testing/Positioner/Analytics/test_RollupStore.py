@@ -0,0 +1,112 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+import json
+
+import numpy as np
+import pytest
+
+from FrameAnalyzer.DetectionBatch import DetectionBatch
+from Positioner.Analytics.RollupStore import RollupStore
+from Testing.Positioner.BatchFactory import CreateBatch
+
+
+# Create a converted batch with the given Rijksdriehoek positions, the first zone contains the positions with x < 5
+def CreateZonedBatch(positions) -> DetectionBatch:
+    positions = np.array(positions, dtype=np.float64).reshape(-1, 2)
+    return CreateBatch(None, positions, np.column_stack((positions[:, 0] < 5, np.zeros(len(positions), dtype=bool))),
+                       ('a', 'other'))
+
+
+# Test if the counts of the total, the zones and the grid cells are found
+def test_Count():
+    store = RollupStore(['a', 'b'], (0, 0, 20, 10), cellSize=10)
+    assert store.series == ('total', 'zone:a', 'zone:b', 'cell:0.00,0.00', 'cell:10.00,0.00')
+
+    counts = store.Count(CreateZonedBatch([(1, 1), (2, 2), (12, 5), (30, 5), (np.nan, 1)]))
+    assert counts.tolist() == [5, 2, 0, 2, 1]
+
+
+# Test if a frame is added to the buckets of every resolution and an old bucket row is reused
+def test_Update():
+    store = RollupStore(['a'], capacities=(10, 10, 10))
+    for second in range(25):
+        store.Update(CreateZonedBatch([(1, 1)] * (second % 3)), 3600 + second)
+        store.Update(CreateZonedBatch([(1, 1)] * 3), 3600 + second + 0.5)
+
+    series = store.GetSeries(['total', 'zone:a', 'unknown'], 3615, 3625, maxPoints=100)
+    assert series["resolution"] == 1
+    assert series["times"] == list(range(3615, 3625))
+    assert series["average"]["total"] == [(second % 3 + 3) / 2 for second in range(15, 25)]
+    assert series["peak"]["zone:a"] == [3] * 10
+    assert "unknown" not in series["average"]
+
+    series = store.GetSeries(['total'], 0, 7200, maxPoints=100)
+    assert series["resolution"] == 3600
+    assert series["times"] == [3600]
+    assert series["average"]["total"] == [pytest.approx((24 + 75) / 50)]
+    json.dumps(series)
+
+
+# Test if a range is answered by the coarsest buckets, with the finer buckets at its edges
+def test_Aggregate():
+    store = RollupStore(capacities=(7200, 120, 10))
+    for second in range(0, 7200, 10):
+        store.Update(CreateZonedBatch([(1, 1)] * (1 + second // 3600)), second)
+
+    assert store._Pieces(1790, 7200, 2) == [(2, 1, 2), (1, 30, 60), (0, 1790, 1800)]
+    aggregate = store.Aggregate(['total'], 1790, 7200)
+    assert aggregate["frames"] == 541
+    assert aggregate["average"]["total"] == pytest.approx((181 + 2 * 360) / 541)
+    assert aggregate["peak"]["total"] == 2
+
+    # The fine buckets of the start of the range are not kept anymore, so the partial coarse bucket is used
+    store.Update(CreateZonedBatch([]), 10000)
+    assert store._Pieces(5, 3605, 2) == [(2, 0, 2)]
+    assert store.Aggregate(['total'], 5, 10005)["frames"] == 721
+    assert store.Aggregate(['total', 'zone:a'], 20000, 30000) == {"frames": 0, "average": {"total": None},
+                                                                   "peak": {"total": 0}}
+
+
+# Test if the buckets are kept in the file, and a compacted file is replayed into a new store
+def test_File(tmp_path):
+    path = tmp_path / "rollup.bin"
+    store = RollupStore(['a'], (0, 0, 10, 10), cellSize=10, path=path, capacities=(5, 5, 5), compactInterval=30)
+    for second in range(40):
+        store.Update(CreateZonedBatch([(1, 1)] * (second % 4)), second)
+    appendedSize = path.stat().st_size
+    store.Close()
+    assert path.stat().st_size > appendedSize
+
+    with open(path, 'rb') as file:
+        header = json.loads(file.readline())
+    assert header["series"] == list(store.series)
+
+    loaded = RollupStore(['a', 'b'], path=path, capacities=(5, 5, 5))
+    expected = store.GetSeries(['total', 'zone:a'], 35, 40, 100)
+    assert loaded.GetSeries(['total', 'zone:a'], 35, 40, 100) == expected
+    assert expected["times"] == [35, 36, 37, 38, 39]
+    assert loaded.Aggregate(['total'], 0, 60) == store.Aggregate(['total'], 0, 60)
+    loaded.Update(CreateZonedBatch([(1, 1)]), 40)
+    assert loaded.GetSeries(['zone:b'], 0, 60, 1)["average"]["zone:b"] == [0]
+    loaded.Close()
+
+    # The compacted file only holds the finished buckets that fit in the rings
+    compacted = RollupStore(['a'], path=path, capacities=(5, 5, 5))
+    headerSize = len(path.read_bytes().split(b'\n', 1)[0]) + 1
+    assert path.stat().st_size - headerSize == (5 - 1) * compacted._recordType.itemsize
+    compacted.Close()
+
+
+# Test if the arguments are validated
+def test_ValidateRollupStoreArguments(tmp_path):
+    arguments = {'rollupFile': "", 'rollupCellSize': 10.0}
+    RollupStore.ValidateRollupStoreArguments(arguments)
+    RollupStore.ValidateRollupStoreArguments(dict(arguments, rollupFile=str(tmp_path / "rollup.bin")))
+    with pytest.raises(TypeError):
+        RollupStore.ValidateRollupStoreArguments(None)
+    with pytest.raises(ValueError):
+        RollupStore.ValidateRollupStoreArguments(dict(arguments, rollupFile=str(tmp_path / "missing" / "a.bin")))
+    with pytest.raises(ValueError):
+        RollupStore.ValidateRollupStoreArguments(dict(arguments, rollupCellSize=0))
@@ -0,0 +1,76 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+import argparse
+import itertools
+import json
+
+import numpy as np
+import pytest
+
+from FrameAnalyzer.DetectionBatch import DetectionBatch
+from Positioner.Analytics.SocialDistance import SocialDistance
+from Testing.Positioner.BatchFactory import CreateBatch
+
+
+# Test if the grid finds the same pairs as comparing all pairs
+def test_FindClosePairs():
+    socialDistance = SocialDistance(1.5)
+    positions = np.random.default_rng(1).uniform(0, 30, (400, 2))
+    (first, second, distances) = socialDistance.FindClosePairs(positions)
+
+    expected = {(i, j) for i, j in itertools.combinations(range(len(positions)), 2)
+                if np.linalg.norm(positions[i] - positions[j]) < 1.5}
+    assert {(min(i, j), max(i, j)) for i, j in zip(first.tolist(), second.tolist())} == expected
+    assert len(first) == len(expected)
+    assert distances == pytest.approx(np.linalg.norm(positions[first] - positions[second], axis=1))
+    assert len(socialDistance.FindClosePairs(positions[:1])[0]) == 0
+
+
+# Test if close pairs are violations until they stay together long enough to be a couple
+def test_Couples():
+    socialDistance = SocialDistance(1.5, coupleTime=10, relationTimeout=2)
+    socialDistance.Update(CreateBatch([1, 2, 3, DetectionBatch.NO_ID], [(0, 0), (1, 0), (10, 0), (10, 1)]), 0)
+
+    results = socialDistance.GetResults()
+    assert results["violations"] == [[-1, 3, 1.0], [1, 2, 1.0]] or \
+        results["violations"] == [[1, 2, 1.0], [-1, 3, 1.0]]
+    assert results["violators"] == 3
+    assert results["objects"] == 4
+
+    socialDistance.Update(CreateBatch([1, 2], [(0, 0), (1, 0)]), 10)
+    results = socialDistance.GetResults()
+    assert results["violations"] == []
+    assert results["couples"] == [[1, 2]]
+    assert results["totalViolations"] == 2
+    json.dumps(results)
+
+
+# Test if the relations of pairs that are not close anymore expire
+def test_Expire():
+    socialDistance = SocialDistance(1.5, coupleTime=10, relationTimeout=2)
+    socialDistance.Update(CreateBatch([1, 2], [(0, 0), (1, 0)]), 0)
+    socialDistance.Update(CreateBatch([1, 2], [(0, 0), (5, 0)]), 5)
+    assert socialDistance.GetResults()["relations"] == 0
+
+    socialDistance.Update(CreateBatch([1, 2], [(0, 0), (1, 0)]), 12)
+    assert socialDistance.GetResults()["couples"] == []
+
+    with pytest.raises(ValueError):
+        SocialDistance(0)
+
+
+# Test if the arguments are added and validated
+def test_Arguments():
+    parser = argparse.ArgumentParser()
+    SocialDistance.AddSocialDistanceArguments(parser)
+    arguments = vars(parser.parse_args([]))
+    SocialDistance.ValidateSocialDistanceArguments(arguments)
+
+    with pytest.raises(ValueError):
+        SocialDistance.ValidateSocialDistanceArguments({**arguments, "socialDistance": -1})
+    with pytest.raises(ValueError):
+        SocialDistance.ValidateSocialDistanceArguments({**arguments, "socialDistanceInterval": 0})
+    with pytest.raises(TypeError):
+        SocialDistance.ValidateSocialDistanceArguments(None)
@@ -0,0 +1,119 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+import argparse
+import json
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+
+from FrameAnalyzer.DetectionBatch import DetectionBatch
+from Positioner.Analytics.TrackCounters import TrackCounters, CountLine
+from Positioner.ZoneIndex import ZoneIndex
+from Testing.Positioner.BatchFactory import CreateBatch
+
+
+# Test if the crossings of a line are counted per direction, once per track and frame
+def test_LineCrossings():
+    # A line to the east along y = 0, with a bend at x = 5
+    counters = TrackCounters([CountLine('street', np.array([(0, 0), (5, 0), (10, 0)]))])
+    # Track 4 reaches the line in the second frame and leaves it in the third, it crosses once
+    counters.Update(CreateBatch([1, 2, 3, 4], [(5, -1), (2, 1), (20, -1), (1, -1)]), 0)
+    counters.Update(CreateBatch([1, 2, 3, 4], [(5, 1), (2, -1), (20, 1), (1, 0)]), 1)
+    counters.Update(CreateBatch([4], [(1, 1)]), 2)
+
+    assert counters.GetResults()["lines"] == {"street": {"forward": 2, "backward": 1}}
+
+
+# Test if many tracks are counted at once
+def test_ManyTracks():
+    lines = [CountLine('a', np.array([(0, 0), (100, 0)])), CountLine('b', np.array([(0, 5), (100, 5)]))]
+    counters = TrackCounters(lines, maxTracks=200)
+    x = np.linspace(1, 99, 200)
+    counters.Update(CreateBatch(np.arange(200), np.column_stack((x, np.full(200, -1)))), 0)
+    counters.Update(CreateBatch(np.arange(200), np.column_stack((x, np.where(np.arange(200) < 50, 10, 1)))), 1)
+
+    assert counters.GetResults()["lines"] == {"a": {"forward": 200, "backward": 0},
+                                              "b": {"forward": 50, "backward": 0}}
+
+
+# Test if the occupancy and dwell time of the zones follow the tracks
+def test_Zones():
+    counters = TrackCounters([], trackTimeout=5.0)
+    zoneIds = ('square', 'park')
+    counters.Update(CreateBatch([1, 2], [(0, 0), (1, 1)], [[True, False], [True, True]], zoneIds), 0)
+    counters.Update(CreateBatch([1, 2], [(0, 0), (1, 1)], [[False, False], [True, True]], zoneIds), 4)
+
+    zones = counters.GetResults()["zones"]
+    assert zones["square"] == {"occupancy": 1, "visits": 1, "averageDwell": 4.0, "currentDwell": 4.0}
+    assert zones["park"]["occupancy"] == 1
+
+    # Track 2 is not seen anymore and leaves its zones at the time it was last seen
+    counters.Update(CreateBatch([1], [(0, 0)], [[False, False]], zoneIds), 10)
+    zones = counters.GetResults()["zones"]
+    assert zones["square"] == {"occupancy": 0, "visits": 2, "averageDwell": 4.0, "currentDwell": None}
+    assert zones["park"] == {"occupancy": 0, "visits": 1, "averageDwell": 4.0, "currentDwell": None}
+
+
+# Test if the visits of tracks that are not seen anymore are finished by empty frames and frames without valid tracks
+def test_EmptyFrames():
+    counters = TrackCounters([], trackTimeout=2.0)
+    zoneIds = ('square',)
+    counters.Update(CreateBatch([1], [(0, 0)], [[True]], zoneIds), 0)
+    counters.Update(DetectionBatch.Empty(), 1)
+    assert counters.GetResults()["zones"]["square"]["occupancy"] == 1
+
+    counters.Update(DetectionBatch.Empty(), 3)
+    assert counters.GetResults()["zones"]["square"] == \
+        {"occupancy": 0, "visits": 1, "averageDwell": 0.0, "currentDwell": None}
+
+    counters.Update(CreateBatch([2], [(0, 0)], [[True]], zoneIds), 4)
+    counters.Update(CreateBatch([DetectionBatch.NO_ID, 3], [(0, 0), (np.nan, 0)], [[True], [True]], zoneIds), 7)
+    assert counters.GetResults()["zones"]["square"]["visits"] == 2
+
+
+# Test if the counters are published at the publish interval
+def test_Publish():
+    counters = TrackCounters([CountLine('a', np.array([(0, 0), (1, 0)]))], publishInterval=5)
+    api = MagicMock()
+    assert counters.Publish(api, 0)
+    assert not counters.Publish(api, 4)
+    assert counters.Publish(api, 5)
+    assert api.SendChannel.call_count == 2
+    assert api.SendChannel.call_args[0][0] == 'counters'
+    json.dumps(api.SendChannel.call_args[0][1])
+
+    with pytest.raises(ValueError):
+        TrackCounters([], publishInterval=0)
+
+
+# Test if the lines are loaded from the features of the zone file
+def test_LoadLines(tmp_path):
+    path = tmp_path / "zones.json"
+    with open(path, 'w') as file:
+        json.dump({"type": "FeatureCollection", "features": [
+            {"type": "Feature", "properties": {"id": "gate", "rijksdriehoek": True},
+             "geometry": {"type": "LineString", "coordinates": [[0, 0], [10, 0]]}},
+            {"type": "Feature", "properties": {"id": "zone", "rijksdriehoek": True},
+             "geometry": {"type": "Polygon", "coordinates": [[[0, 0], [1, 0], [1, 1]]]}}
+        ]}, file)
+
+    lines = TrackCounters.LoadLines(path)
+    assert [line.id for line in lines] == ['gate']
+    assert lines[0].points.tolist() == [[0, 0], [10, 0]]
+    assert [zone.id for zone in ZoneIndex.LoadZones(path)] == ['zone']
+
+
+# Test if the arguments are added and validated
+def test_Arguments():
+    parser = argparse.ArgumentParser()
+    TrackCounters.AddTrackCountersArguments(parser)
+    arguments = vars(parser.parse_args([]))
+    TrackCounters.ValidateTrackCountersArguments(arguments)
+
+    with pytest.raises(ValueError):
+        TrackCounters.ValidateTrackCountersArguments({**arguments, "counterInterval": 0})
+    with pytest.raises(TypeError):
+        TrackCounters.ValidateTrackCountersArguments(None)
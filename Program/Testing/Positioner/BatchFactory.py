@@ -0,0 +1,24 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+"""
+Creation of converted batches for the tests of the positioner and the analytics.
+"""
+
+import numpy as np
+
+from FrameAnalyzer.DetectionBatch import DetectionBatch
+from Positioner.RijksdriehoekConversion import RijksdriehoekConversion
+
+
+# Create a converted batch of humans with the given ids and Rijksdriehoek positions relative to the origin,
+# the ids count from 0 when they are None and the WGS-84 positions are 0 unless they are converted
+def CreateBatch(ids, positions, zoneMembership=None, zoneIds=(), origin=(0, 0), toWgs=False) -> DetectionBatch:
+    positions = np.array(positions, dtype=np.float64).reshape(-1, 2) + origin
+    count = len(positions)
+    ids = np.arange(count) if ids is None else ids
+    (latitudes, longitudes) = RijksdriehoekConversion.ToWgs(positions[:, 0], positions[:, 1]) if toWgs else (0, 0)
+    batch = DetectionBatch(np.zeros(count), np.zeros(count), ids, np.zeros(count), ('human',)).WithPositions(
+        latitudes, longitudes, 0, None, positions[:, 0], positions[:, 1])
+    return batch if zoneMembership is None else batch.WithZones(zoneMembership, zoneIds)
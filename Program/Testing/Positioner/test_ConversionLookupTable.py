@@ -0,0 +1,54 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+import numpy as np
+import pytest
+from Positioner.ConversionLookupTable import ConversionLookupTable
+
+
+# A linear function of the pixel position, which bilinear interpolation reproduces exactly
+def LinearBuild(pixelPositions):
+    x = pixelPositions[:, 0]
+    y = pixelPositions[:, 1]
+    return np.column_stack((x, y, 2 * x + 3 * y, x - y, np.full(len(x), 0.5)))
+
+
+def test_InMemory():
+    table = ConversionLookupTable.Load(None, "key", (20, 10), LinearBuild)
+    assert table.table.shape == (10, 20, ConversionLookupTable.COLUMNS)
+    assert table.key == "key"
+
+    pixelPositions = np.array([[0, 0], [19, 9], [3.25, 7.5], [18.9, 0.1]])
+    assert table.Contains(pixelPositions).all()
+    assert np.allclose(table.Lookup(pixelPositions), LinearBuild(pixelPositions))
+    assert np.allclose(table.Lookup(pixelPositions, ConversionLookupTable.RIJKSDRIEHOEK_X),
+                       LinearBuild(pixelPositions)[:, ConversionLookupTable.RIJKSDRIEHOEK_X])
+
+
+def test_Contains():
+    table = ConversionLookupTable.Load(None, "key", (20, 10), LinearBuild)
+    contains = table.Contains(np.array([[-1, 0], [0, -0.5], [19.5, 0], [0, 9.5], [10, 5]]))
+    assert contains.tolist() == [False, False, False, False, True]
+
+
+def test_MemoryMapped(tmp_path):
+    path = tmp_path / "Configuration_0_first.lut.npy"
+    table = ConversionLookupTable.Load(path, "first", (20, 10), LinearBuild)
+    assert path.exists()
+    assert isinstance(table.table, np.memmap)
+
+    # Loading again reads the stored table instead of building it
+    def FailingBuild(_):
+        raise AssertionError("The table should not be built again")
+    loaded = ConversionLookupTable.Load(path, "first", (20, 10), FailingBuild)
+    assert np.array_equal(loaded.table, table.table)
+
+    # A new key removes the table of the old key
+    newPath = tmp_path / "Configuration_0_second.lut.npy"
+    ConversionLookupTable.Load(newPath, "second", (20, 10), LinearBuild)
+    assert newPath.exists() and not path.exists()
+
+
+def test_TooSmall():
+    pytest.raises(ValueError, ConversionLookupTable.Load, None, "key", (1, 10), LinearBuild)
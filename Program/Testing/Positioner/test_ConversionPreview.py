@@ -0,0 +1,53 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+import time
+from unittest.mock import Mock
+
+import numpy as np
+import pygame
+import pytest
+
+from Positioner.ConversionPreview import ConversionPreview
+
+baseImage = np.zeros((40, 60, 3), dtype=np.uint8)
+baseImage[:, :, 0] = 200  # blue in OpenCV order
+
+
+# Convert a shown surface back to an RGB array
+def SurfaceToArray(surface):
+    return np.frombuffer(pygame.image.tobytes(surface, 'RGB'), dtype=np.uint8).reshape(40, 60, 3)
+
+
+# Test if the overlay is drawn on the base image and removed again
+def test_Render():
+    preview = ConversionPreview(Mock(), baseImage)
+
+    image = SurfaceToArray(preview._Render(np.array([[10, 10], [-20, 5], [59, 39]])))
+    assert image[10, 10].tolist() == list(ConversionPreview.CIRCLE_COLOR)
+    assert image[39, 59].tolist() == list(ConversionPreview.CIRCLE_COLOR)
+    assert image[30, 30].tolist() == [0, 0, 200], "The base image was not converted to RGB"
+    assert len(preview._dirtyRectangles) == 2, "A position outside the image was drawn"
+
+    image = SurfaceToArray(preview._Render(np.empty((0, 2))))
+    assert (image == [0, 0, 200]).all(), "The previous overlay was not removed"
+
+
+# Test if the thread shows the latest positions at a capped rate
+def test_Thread():
+    window = Mock()
+    preview = ConversionPreview(window, baseImage, 50)
+    preview.Start()
+    for i in range(100):
+        preview.Publish(np.array([[i % 60, 20]]))
+    time.sleep(0.1)
+    preview.Stop()
+
+    assert preview.publishedFrames == 100
+    assert 1 <= preview.renderedFrames < 100, "Every published frame was rendered"
+    assert window.ShowFrame.call_count == preview.renderedFrames
+    assert preview._dirtyRectangles[0][0] == 99 % 60 - ConversionPreview.CIRCLE_RADIUS, "The latest was not shown"
+
+    with pytest.raises(ValueError):
+        ConversionPreview(window, baseImage, 0)
@@ -0,0 +1,50 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+import geopy.distance
+import numpy as np
+import pytest
+from Positioner.GeoDistance import GeoDistance, DistanceMode
+
+randomGenerator = np.random.default_rng(0)
+positions = np.column_stack((randomGenerator.uniform(-80, 80, 200), randomGenerator.uniform(-180, 180, 200)))
+nearbyPositions = positions + randomGenerator.normal(0, 1e-5, positions.shape)
+distantPositions = np.column_stack((randomGenerator.uniform(-80, 80, 200), randomGenerator.uniform(-180, 180, 200)))
+
+
+def GeopyMeters(positions1, positions2):
+    return np.array([geopy.distance.distance(tuple(p1), tuple(p2)).meters for p1, p2 in zip(positions1, positions2)])
+
+
+# Maximum allowed absolute error in meters, for nearby positions and for positions anywhere on earth
+@pytest.mark.parametrize("mode, nearbyError, distantError", [
+    (DistanceMode.Flat, 1e-6, None),
+    (DistanceMode.Haversine, 0.05, 0.01),
+    (DistanceMode.Vincenty, 1e-6, 1e-3)
+])
+def test_Modes(mode, nearbyError, distantError):
+    meters = GeoDistance.Meters(positions, nearbyPositions, mode)
+    assert meters.shape == (len(positions),)
+    assert np.max(np.abs(meters - GeopyMeters(positions, nearbyPositions))) < nearbyError
+
+    if distantError is not None:
+        reference = GeopyMeters(positions, distantPositions)
+        relativeError = np.abs(GeoDistance.Meters(positions, distantPositions, mode) - reference) / reference
+        assert np.max(relativeError) < distantError
+
+
+@pytest.mark.parametrize("mode", list(DistanceMode))
+def test_SamePosition(mode):
+    assert np.all(GeoDistance.Meters(positions, positions, mode) == 0)
+
+
+def test_SinglePair():
+    meters = GeoDistance.Meters((52.0885, 5.1657), (52.0886, 5.1658))
+    assert meters.shape == (1,)
+    assert np.abs(meters[0] - geopy.distance.distance((52.0885, 5.1657), (52.0886, 5.1658)).meters) < 1e-6
+
+
+def test_InvalidInput():
+    pytest.raises(RuntimeError, GeoDistance.Meters, [(0, 0), (1, 1)], [(0, 0)])
+    pytest.raises(RuntimeError, GeoDistance.Meters, [(91, 0)], [(0, 0)])
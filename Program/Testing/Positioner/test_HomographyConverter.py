@@ -6,8 +6,9 @@ import pytest
 from unittest.mock import Mock, patch, MagicMock
 from Positioner.HomographyConverter import *
 from Calibrator.Configurations.HomographyCalibrationConfiguration import HomographyCalibrationConfiguration, \
-    HomographyGeoData
+    HomographyGeoData, HomographyPlane
 from IO import Pathing
+from Positioner.Accuracy.StaticAccuracyDataset import StaticAccuracyDataset, StaticAccuracyError
 
 detections = [DetectedObject(1, 1, 0, 0), DetectedObject(5, 5, 1, 0)]
 
@@ -119,3 +120,246 @@ def test_GeoConversionGPS():
     expectedGPS = GeoPosition(50, 4.999406049979839, 0)
     assert np.abs(gps.longitude - expectedGPS.longitude) < 0.000001  # difference of 0.7 cm with accurate calcs
     assert np.abs(gps.latitude - expectedGPS.latitude) < 0.000001  # difference of 0.7 cm with accurate calcs
+
+
+@patch('Positioner.IConvertor.IConvertor._CalculateStaticError', Mock())
+def test_BatchEqualsScalar():
+    configuration = HomographyCalibrationConfiguration(
+        np.array([[0.8, 0.1, 12], [-0.05, 1.2, 7], [0.0001, 0.0002, 1.0]]),
+        None,
+        HomographyGeoData((500, 500), GeoPosition(52.08850112867399, 5.165728014316017, 0), 0.1, (136000, 455000)),
+        None
+    )
+    convertor = HomographyConverter(configuration, None)
+
+    objects = [DetectedObject(x, y, i, 'human') for i, (x, y) in
+               enumerate([(0, 0), (1, 1), (520.3, 480.9), (960, 540), (10, 530), (812.5, 3.5)])]
+    results = convertor.Convert2DTo3D(objects, 0)
+
+    assert len(results) == len(objects)
+    for detectedObject, result in zip(objects, results):
+        # the scalar conversion, one object at a time
+        homoPos = np.dot(configuration.homographyMatrix, np.array([[detectedObject.x], [detectedObject.y], [1]]))
+        [[[x2, y2]]] = cv2.convertPointsFromHomogeneous(np.array([homoPos.flatten()]))
+        geoPos = convertor._Convert2DTopDownToGeo(x2, y2)
+        (rdX, rdY) = convertor._Convert2DTopDownToRd(x2, y2)
+
+        # the tangent frame of the projection model is within millimeters of the exact spherical formula here
+        assert result.id == detectedObject.id and result.type == detectedObject.type
+        assert IConvertor.MetersBetweenGeoPositions((result.latitude, result.longitude),
+                                                    (geoPos.latitude, geoPos.longitude)) < 0.005
+        assert result.rijksdriehoekX == pytest.approx(rdX) and result.rijksdriehoekY == pytest.approx(rdY)
+
+
+@patch('Positioner.IConvertor.IConvertor._CalculateStaticError', Mock())
+def test_BatchEmpty():
+    configuration = HomographyCalibrationConfiguration(
+        np.identity(3), None, HomographyGeoData((0, 0), GeoPosition(50, 5, 0), 0.1, (0, 0)), None
+    )
+    assert HomographyConverter(configuration, None).Convert2DTo3D([], 0) == []
+
+
+@patch('Positioner.IConvertor.IConvertor._CalculateStaticError', Mock())
+def test_AnalyticSinglePixelError():
+    configuration = HomographyCalibrationConfiguration(
+        np.array([[2.5, 0.3, 12], [-0.05, 3.1, 7], [0.0001, 0.0015, 1.0]]),
+        None,
+        HomographyGeoData((500, 500), GeoPosition(52.08850112867399, 5.165728014316017, 0), 0.1, (136000, 455000)),
+        None
+    )
+    convertor = HomographyConverter(configuration, None)
+    convertor.staticError = StaticAccuracyError()
+    convertor.staticError.AddError(0.5)
+
+    objects = [DetectedObject(x, y, i, 'human') for i, (x, y) in
+               enumerate([(10, 10), (100, 300), (480, 270), (900, 500), (20, 520)])]
+    analytic = convertor.ConversionSinglePixelError(objects, 0)
+    reference = convertor.ConversionSinglePixelError(objects, 0, referenceMode=True)
+
+    assert len(analytic) == len(reference) == len(objects)
+    for analyticResult, referenceResult in zip(analytic, reference):
+        assert analyticResult.latitude == referenceResult.latitude
+        assert analyticResult.longitude == referenceResult.longitude
+        assert analyticResult.locationRadius > 0.5
+        # the reference is rounded to whole top-down pixels, the analytic model is not
+        difference = np.abs(analyticResult.locationRadius - referenceResult.locationRadius)
+        assert difference < 0.05 * referenceResult.locationRadius + 2 * configuration.homographyGeoData.pixelScale
+
+
+@patch('Positioner.IConvertor.IConvertor._CalculateStaticError', Mock())
+def test_LookupTable(tmp_path):
+    configuration = HomographyCalibrationConfiguration(
+        np.array([[2.5, 0.3, 12], [-0.05, 3.1, 7], [0.0001, 0.0015, 1.0]]),
+        (96, 54),
+        HomographyGeoData((500, 500), GeoPosition(52.08850112867399, 5.165728014316017, 0), 0.1, (136000, 455000)),
+        None
+    )
+    configuration.cameraId = 0
+    configuration._GetJSONPath = Mock(return_value=tmp_path / 'HomographyCalibrationConfiguration_0.json')
+    convertor = HomographyConverter(configuration, None)
+    firstKey = convertor.lookupTable.key
+    assert configuration.GetLookupTablePath(firstKey).exists()
+
+    objects = [DetectedObject(x, y, i, 'human') for i, (x, y) in
+               enumerate([(0, 0), (10.5, 20.25), (95, 53), (48, 27), (200, 20)])]
+    results = convertor.Convert2DTo3D(objects, 0)
+    convertor.useLookupTable = False
+    directResults = convertor.Convert2DTo3D(objects, 0)
+    errors = convertor.SinglePixelErrors(np.array([[o.x, o.y] for o in objects]))
+    convertor.useLookupTable = True
+    lookupErrors = convertor.SinglePixelErrors(np.array([[o.x, o.y] for o in objects]))
+
+    # the lookup table only adds the error of interpolating between the pixels
+    for result, directResult in zip(results, directResults):
+        assert np.abs(result.rijksdriehoekX - directResult.rijksdriehoekX) <= 0.01
+        assert np.abs(result.rijksdriehoekY - directResult.rijksdriehoekY) <= 0.01
+        assert IConvertor.MetersBetweenGeoPositions((result.latitude, result.longitude),
+                                                    (directResult.latitude, directResult.longitude)) < 0.01
+    assert np.allclose(errors, lookupErrors, rtol=1e-3)
+
+    # a detection that leaves the table is converted directly, without jumping at the edge of the table
+    edge = np.array([[95 - 1e-9, 20.5], [95 + 1e-9, 20.5], [40.5, 53 - 1e-9], [40.5, 53 + 1e-9]])
+    assert convertor.lookupTable.Contains(edge).tolist() == [True, False, True, False]
+    edgePositions = convertor._ConvertPixelsToWorld(edge)
+    assert np.abs(edgePositions[0::2, 2:] - edgePositions[1::2, 2:]).max() < 0.001
+
+    # Changing the homography invalidates the table
+    configuration.homographyMatrix = configuration.homographyMatrix * 1.01
+    convertor.Convert2DTo3D(objects, 0)
+    assert convertor.lookupTable.key != firstKey
+    assert configuration.GetLookupTablePath(convertor.lookupTable.key).exists()
+    assert not configuration.GetLookupTablePath(firstKey).exists()
+
+
+@patch('Positioner.IConvertor.IConvertor._CalculateStaticError', Mock())
+def test_UncertaintyRaster(tmp_path):
+    configuration = HomographyCalibrationConfiguration(
+        np.array([[2.5, 0.3, 12], [-0.05, 3.1, 7], [0.0001, 0.0015, 1.0]]),
+        (96, 54),
+        HomographyGeoData((500, 500), GeoPosition(52.08850112867399, 5.165728014316017, 0), 0.1, (136000, 455000)),
+        None
+    )
+    convertor = HomographyConverter(configuration, None)
+    assert convertor.GetUncertaintyRaster() is None, "There is a raster without a static error"
+
+    convertor.staticError = StaticAccuracyError()
+    convertor.staticError.AddError(0.5)
+    raster = convertor.GetUncertaintyRaster()
+    assert raster.radii.shape == (54, 96)
+    assert convertor.GetUncertaintyRaster() is raster, "The raster was rebuilt without changes"
+
+    # the raster is used within the analyze resolution, the single pixel errors outside it
+    objects = [DetectedObject(x, y, i, 'human') for i, (x, y) in enumerate([(10, 20), (95, 53), (200, 20)])]
+    results = convertor.ConversionSinglePixelError(objects, 0)
+    pixelErrors = convertor.SinglePixelErrors(np.array([[o.x, o.y] for o in objects], dtype=np.float64))
+    assert results[0].locationRadius == raster.radii[20, 10]
+    assert results[1].locationRadius == raster.radii[53, 95]
+    assert np.isclose(results[2].locationRadius, pixelErrors[2] + 0.5)
+    assert np.allclose([result.locationRadius for result in results], pixelErrors + 0.5)
+
+    # a new static error rebuilds the raster
+    convertor.staticError.AddError(1.0)
+    assert convertor.GetUncertaintyRaster().key != raster.key
+    assert np.allclose(convertor.GetUncertaintyRaster().radii, raster.radii + 0.5)
+
+
+@patch('Positioner.IConvertor.IConvertor._CalculateStaticError', Mock())
+def test_ConvertBatch():
+    configuration = HomographyCalibrationConfiguration(
+        np.array([[2.5, 0.3, 12], [-0.05, 3.1, 7], [0.0001, 0.0015, 1.0]]),
+        (96, 54),
+        HomographyGeoData((500, 500), GeoPosition(52.08850112867399, 5.165728014316017, 3), 0.1, (136000, 455000)),
+        None
+    )
+    convertor = HomographyConverter(configuration, None)
+    convertor.staticError = StaticAccuracyError()
+    convertor.staticError.AddError(0.5)
+
+    objects = [DetectedObject(x, y, i, 'human') for i, (x, y) in enumerate([(10, 20), (95, 53), (200, 20)])]
+    batch = convertor.ConvertBatch(DetectionBatch.FromDetectedObjects(objects), 0)
+    assert batch.ToDetectedObjectPositions() == convertor.ConversionSinglePixelError(objects, 0)
+
+    referenceBatch = convertor.ConvertBatch(DetectionBatch.FromDetectedObjects(objects), 0, referenceMode=True)
+    assert referenceBatch.ToDetectedObjectPositions() == \
+        convertor.ConversionSinglePixelError(objects, 0, referenceMode=True)
+    assert len(convertor.ConvertBatch(DetectionBatch.Empty(), 0)) == 0
+
+
+@patch('Positioner.IConvertor.IConvertor._CalculateStaticError', Mock())
+def test_ConversionPreview():
+    smartImage = Mock()
+    smartImage.GetImage = Mock(return_value=np.zeros((100, 100, 3), dtype=np.uint8))
+    configuration = HomographyCalibrationConfiguration(
+        np.identity(3), None, HomographyGeoData((0, 0), GeoPosition(50, 5, 0), 0.1, (0, 0)), smartImage
+    )
+    convertor = HomographyConverter(configuration, Mock())
+    convertor.conversionPreview.Publish = Mock()
+
+    convertor.ConvertBatch(DetectionBatch.FromDetectedObjects(detections), 0)
+    convertor.Convert2DTo3D(detections, 0, True)
+    assert convertor.conversionPreview.Publish.call_count == 2
+    assert convertor.conversionPreview.Publish.call_args[0][0].tolist() == [[1, 1], [5, 5]]
+
+    convertor.Close()
+    assert convertor.conversionPreview is None
+    assert HomographyConverter(configuration, None).conversionPreview is None
+
+
+@patch('Positioner.IConvertor.IConvertor._CalculateStaticError', Mock())
+def test_Planes():
+    matrix = np.array([[2.5, 0.3, 12], [-0.05, 3.1, 7], [0.0001, 0.0015, 1.0]])
+    planeMatrix = np.array([[2.0, 0.2, 40], [0.1, 2.5, -20], [0.0002, 0.001, 1.0]])
+    geoData = HomographyGeoData((500, 500), GeoPosition(52.08850112867399, 5.165728014316017, 0), 0.1,
+                                (136000, 455000))
+    plane = HomographyPlane("stairs", planeMatrix, [[48, 0], [96, 0], [96, 54], [48, 54]], 2.5)
+    configuration = HomographyCalibrationConfiguration(matrix, (96, 54), geoData, None, [plane])
+    convertor = HomographyConverter(configuration, None)
+
+    pixelPositions = np.array([[10, 20], [70, 30], [200, 30], [-5, 5], [60.4, 2]])
+    assert convertor.GetPlanes(pixelPositions).tolist() == [0, 1, 1, 0, 1]
+    assert convertor.GetAltitudes(pixelPositions).tolist() == [0, 2.5, 2.5, 0, 2.5]
+
+    # Every detection of a mixed batch is converted by the matrix of its own plane
+    objects = [DetectedObject(x, y, i, 'human') for i, (x, y) in enumerate(pixelPositions.tolist())]
+    batch = convertor.ConvertBatch(DetectionBatch.FromDetectedObjects(objects), 0)
+    single = HomographyConverter(HomographyCalibrationConfiguration(matrix, (96, 54), geoData, None), None)
+    plane = HomographyConverter(HomographyCalibrationConfiguration(planeMatrix, (96, 54), geoData, None), None)
+    for i, expected in enumerate([single, plane, plane, single, plane]):
+        expectedBatch = expected.ConvertBatch(DetectionBatch.FromDetectedObjects(objects), 0)
+        assert batch.rijksdriehoekX[i] == pytest.approx(expectedBatch.rijksdriehoekX[i])
+        assert batch.rijksdriehoekY[i] == pytest.approx(expectedBatch.rijksdriehoekY[i])
+    assert batch.altitude.tolist() == [0, 2.5, 2.5, 0, 2.5]
+    assert [position.altitude for position in convertor.Convert2DTo3D(objects, 0)] == [0, 2.5, 2.5, 0, 2.5]
+
+    # The lookup table is built on the planes and rebuilt when a plane changes
+    assert configuration.GetPlanesKey() in convertor.lookupTable.key
+    firstKey = convertor.lookupTable.key
+    configuration.planes[0].altitude = 3
+    assert convertor.GetAltitudes(pixelPositions[1:2]).tolist() == [3]
+    convertor.ConvertBatch(DetectionBatch.FromDetectedObjects(objects), 0)
+    assert convertor.lookupTable.key != firstKey
+
+
+# Test if the static error is measured with the configuration of a dataset, which has no planes
+@patch('Positioner.IConvertor.IConvertor._CalculateStaticError', Mock())
+def test_MeasureStaticError():
+    matrix = np.array([[0.8, 0.1, 12], [-0.05, 1.2, 7], [0.0001, 0.0002, 1.0]])
+    geoData = HomographyGeoData((500, 500), GeoPosition(52.08850112867399, 5.165728014316017, 0), 0.1,
+                                (136000, 455000))
+    plane = HomographyPlane("stairs", np.eye(3), [[0, 0], [10, 0], [10, 10]], 2.5)
+    configuration = HomographyCalibrationConfiguration(matrix, (96, 54), geoData, None, [plane])
+    convertor = HomographyConverter(configuration, None)
+
+    dataset = StaticAccuracyDataset()
+    dataset.entries = [{"screenPosition": [500, 500], "worldPosition": [0, 0, 0]},
+                       {"screenPosition": [520, 480], "worldPosition": [1, 0, 2]}]
+    dataset.calibrationConfigurations = {"HomographyCalibrationConfiguration": {
+        "homographyMatrix": np.eye(3).tolist(),
+        "homographyGeoData": {"anchorPixelPosition": [500, 500], "pixelScale": 0.1,
+                              "anchorGeoPosition": {"latitude": 0, "longitude": 0, "altitude": 0}}
+    }}
+    staticError = convertor._MeasureStaticError([dataset])
+
+    assert staticError.numberOfErrors == 2
+    assert np.isfinite(staticError.GetMaxError())
+    assert convertor.configuration is configuration
@@ -37,3 +37,36 @@ def test_conservation(metersToMove):
     [lat, lon] = IConvertor.MoveGeoByBearing(50, 5, 45, metersToMove)
     metersMoved = IConvertor.MetersBetweenGeoPositions((lat, lon), (50, 5))
     assert np.abs(metersToMove - metersMoved) < 0.03, 'difference was more than 3 cm'
+
+
+def test_GetAnglesToNorthFromVectors():
+    deltaLon = np.array([0, 1, -1, 0, 3, -2.5, 0])
+    deltaLat = np.array([1, 0, 0, -1, 4, -7, 0])
+    angles = IConvertor.GetAnglesToNorthFromVectors(deltaLon, deltaLat)
+    for i in range(len(deltaLon)):
+        assert np.abs(angles[i] - IConvertor.GetAngleToNorthFromVector(deltaLon[i], deltaLat[i])) < 1e-12
+
+
+# Test if the batch static error measurement equals converting every entry on its own
+def test_MeasureStaticError():
+    convertor = IConvertor(None)
+    dataset = MagicMock()
+    dataset.entries = [{'screenPosition': [540 + 40 * i, 250 - 30 * i], 'worldPosition': [i * 100, 0, i * 90]}
+                       for i in range(-3, 4)]
+    dataset.GetCalibrationConfiguration = MagicMock(return_value=None)
+    emptyDataset = MagicMock()
+    emptyDataset.entries = []
+
+    staticError = convertor._MeasureStaticError([dataset, emptyDataset])
+
+    expected = []
+    for entry in dataset.entries:
+        position = convertor.Convert2DTo3D([DetectedObject(*entry['screenPosition'], -1, None)], -1)[0]
+        expected.append(IConvertor.MetersBetweenGeoPositions(
+            IConvertor._WorldPosToGeoPos(entry['worldPosition']), (position.latitude, position.longitude)))
+
+    assert staticError.numberOfErrors == len(expected)
+    assert np.isclose(staticError.GetMaxError(), max(expected))
+    assert np.isclose(staticError.averageError, np.mean(expected))
+    assert convertor.configuration is None
+    assert IConvertor(None)._MeasureStaticError([]).numberOfErrors == 0
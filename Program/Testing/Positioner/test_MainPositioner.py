@@ -5,9 +5,13 @@
 
 from Positioner.MainPositioner import *
 from Positioner.IConvertor import *
+from FrameAnalyzer.DetectionBatch import DetectionBatch
+from Positioner.ZoneIndex import Zone
+from Positioner.Analytics.RollupStore import RollupStore
 from unittest.mock import patch, MagicMock
 
 from datetime import datetime
+import pytest
 import asyncio
 
 convertor = IConvertor(None)
@@ -66,9 +70,10 @@ async def GetLoop():
 class TestAPI(APIController):
 
     # Test implementation, write to the console
-    def Send(self, detectedObjects: List[DetectedObjectPosition], frameIndex=1, frameTimeStamp=datetime.now()):
+    def Send(self, detectedObjects: DetectionBatch, frameIndex=1, frameTimeStamp=datetime.now()):
         if len(detectedObjects) <= 0:
             return
+        detectedObjects = detectedObjects.ToDetectedObjectPositions()
 
         print('Frame: {0}'.format(frameIndex))
         for detection in detectedObjects:
@@ -85,3 +90,103 @@ class EmptyConvertor(IConvertor):
     # Test implementation that returns an empty list
     def Convert2DTo3D(self, detectedObjects: [DetectedObject], frameIndex: int, showConversions=False):
         return []       # test output
+
+
+# Test if missing Rijksdriehoek coordinates are filled in, and given ones are kept
+def test_AddRijksdriehoekPositions():
+    positions = DetectionBatch.FromDetectedObjectPositions([
+        DetectedObjectPosition(52.0907, 5.1214, 0, 0, 'person'),
+        DetectedObjectPosition(52.0907, 5.1214, 0, 1, 'person', 0, 1.0, 2.0)
+    ])
+    result = MainPositioner._AddRijksdriehoekPositions(positions).ToDetectedObjectPositions()
+
+    assert abs(result[0].rijksdriehoekX - 136783.54) < 0.01
+    assert abs(result[0].rijksdriehoekY - 455859.91) < 0.01
+    assert (result[1].rijksdriehoekX, result[1].rijksdriehoekY) == (1.0, 2.0)
+    assert len(MainPositioner._AddRijksdriehoekPositions(DetectionBatch.Empty())) == 0
+    assert MainPositioner._AddRijksdriehoekPositions(None) is None
+
+
+# Test if the positioner sends a batch with a position for every detection, also when given a batch
+def test_Batch():
+    api = MagicMock()
+    positioner = MainPositioner(convertor, api)
+    positioner.WriteData(DetectionBatch.FromDetectedObjects(detections), 0, datetime.now())
+
+    sent = api.Send.call_args[0][0]
+    assert isinstance(sent, DetectionBatch)
+    assert sent.ToDetectedObjectPositions() == \
+        MainPositioner._AddRijksdriehoekPositions(
+            DetectionBatch.FromDetectedObjectPositions(convertor.ConversionSinglePixelError(detections, 0))
+        ).ToDetectedObjectPositions()
+
+
+# Test if the positioner gives the detections global ids when a fusion is used
+def test_Fusion():
+    api = MagicMock()
+    fusion = PositionFusion(1.0, 1.0)
+    MainPositioner(convertor, api, fusion=fusion, cameraId='a').WriteData(detections, 0, datetime.now())
+
+    assert api.Send.call_args[0][0].id.tolist() == [1, 2]
+    assert fusion.GetStatistics().objects == 2
+
+
+# Test if the positioner adds the converted positions to the track store
+def test_TrackStore():
+    trackStore = TrackStore(4, 10.0, 4)
+    MainPositioner(convertor, MagicMock(), trackStore=trackStore).WriteData(detections, 0, datetime.now())
+
+    assert sorted(trackStore.GetTrackIds()) == [0, 1]
+
+
+# Test if the positioner smooths the positions when a smoother is used, and only extrapolates the sent positions
+def test_Smoother():
+    (api, trackStore) = (MagicMock(), TrackStore(4, 10.0, 4))
+    smoother = PositionSmoother()
+    smoother.Extrapolate = MagicMock(return_value=DetectionBatch.Empty())
+    frameTime = datetime.now()
+    MainPositioner(convertor, api, trackStore=trackStore, smoother=smoother, extrapolate=True).WriteData(
+        detections, 0, frameTime)
+
+    assert smoother.GetTrackCount() == 2
+    assert sorted(trackStore.GetTrackIds()) == [0, 1], "The track store received the extrapolated positions"
+    assert api.Send.call_args[0][0] is smoother.Extrapolate.return_value
+    (_, timestamp, outputTime) = smoother.Extrapolate.call_args[0]
+    assert timestamp == frameTime.timestamp() and outputTime >= timestamp
+
+
+# Test if the positioner tags the positions with their zones when a zone index is used
+def test_ZoneIndex():
+    api = MagicMock()
+    zone = Zone('all', [np.array([(-3e6, -5e6), (-2e6, -5e6), (-2e6, -4e6), (-3e6, -4e6)], dtype=float)])
+    MainPositioner(convertor, api, zoneIndex=ZoneIndex([zone], 100)).WriteData(detections, 0, datetime.now())
+
+    assert api.Send.call_args[0][0].GetZones() == [('all',), ('all',)]
+
+
+# Test if the positioner updates and publishes the analytics
+def test_Analytics():
+    api = MagicMock()
+    analytics = MagicMock()
+    MainPositioner(convertor, api, analytics=[analytics]).WriteData(detections, 0, datetime.now())
+
+    assert len(analytics.Update.call_args[0][0]) == 2
+    assert analytics.Publish.call_args[0][0] is api
+
+
+# Test if frames without detections reach the analytics and the API, so the averages count them
+def test_EmptyFrames():
+    api = MagicMock()
+    rollupStore = RollupStore([], None)
+    positioner = MainPositioner(convertor, api, analytics=[rollupStore])
+    frameTime = datetime(2022, 5, 3, 14, 15, 46)
+    positioner.WriteData(detections[:1], 0, frameTime)
+    for frameIndex in range(1, 10):
+        positioner.WriteData([] if frameIndex % 2 else DetectionBatch.Empty(), frameIndex,
+                             frameTime.replace(microsecond=frameIndex * 10000))
+
+    aggregate = rollupStore.Aggregate(['total'], frameTime.timestamp(), frameTime.timestamp() + 1)
+    assert aggregate["frames"] == 10
+    assert aggregate["average"]["total"] == pytest.approx(0.1)
+    assert api.Send.call_count == 10
+    assert len(api.Send.call_args[0][0]) == 0
@@ -0,0 +1,108 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+import argparse
+import functools
+
+import numpy as np
+import pytest
+
+from FrameAnalyzer.DetectionBatch import DetectionBatch
+from Positioner.PositionFusion import PositionFusion
+from Positioner.RijksdriehoekConversion import RijksdriehoekConversion
+from Testing.Positioner import BatchFactory
+
+
+# Create a converted batch with the given ids and Rijksdriehoek positions in a Dutch area
+CreateBatch = functools.partial(BatchFactory.CreateBatch, origin=(155000, 463000))
+
+
+# Test if the ids of a camera are replaced by global ids that stay the same over the frames
+def test_StableIds():
+    fusion = PositionFusion(1.0, 1.0)
+    first = fusion.Fuse(CreateBatch([7, 8], [(0, 0), (10, 0)]), 'a', 0)
+    second = fusion.Fuse(CreateBatch([8, 7], [(11, 0), (1, 0)]), 'a', 0.1)
+
+    assert first.id.tolist() == [1, 2]
+    assert second.id.tolist() == [2, 1]
+    assert fusion.GetStatistics() == (2, 2, 0)
+
+
+# Test if positions of different cameras close in time and space get the same global id
+def test_MergeCameras():
+    fusion = PositionFusion(1.0, 1.0)
+    fusion.Fuse(CreateBatch([1, 2], [(0, 0), (10, 0)]), 'a', 0)
+    other = fusion.Fuse(CreateBatch([5, 6, 7], [(10.5, 0), (0.2, 0), (50, 0)]), 'b', 0.5)
+
+    assert other.id.tolist() == [2, 1, 3]
+    assert fusion.GetStatistics().merged == 2
+
+    # The merged ids stay with the camera, also when the object moves away
+    assert fusion.Fuse(CreateBatch([6], [(5, 5)]), 'b', 0.6).id.tolist() == [1]
+
+
+# Test if positions are not merged with objects of the same camera, outside the window or matched twice
+def test_NoMerge():
+    fusion = PositionFusion(1.0, 1.0)
+    fusion.Fuse(CreateBatch([1], [(0, 0)]), 'a', 0)
+
+    assert fusion.Fuse(CreateBatch([2], [(0.1, 0)]), 'a', 0.1).id.tolist() == [2]
+    assert sorted(fusion.Fuse(CreateBatch([3, 4, 5], [(0.1, 0.1), (0, 0.1), (0, 0)]), 'b', 0.2).id) == [1, 2, 3]
+    assert fusion.Fuse(CreateBatch([6], [(0, 0)]), 'c', 5).id.tolist() == [4]
+
+
+# Test if objects that are not seen anymore are forgotten
+def test_Expire():
+    fusion = PositionFusion(1.0, 1.0, 2.0)
+    fusion.Fuse(CreateBatch([1], [(0, 0)]), 'a', 0)
+    fusion.Fuse(CreateBatch([2], [(0, 0)]), 'b', 1.5)
+    assert fusion.GetStatistics().objects == 2
+
+    assert fusion.Fuse(CreateBatch([1], [(0, 0)]), 'a', 3).id.tolist() == [3]
+    assert fusion.GetStatistics().objects == 2
+
+
+# Test if detections without id or Rijksdriehoek coordinates are fused
+def test_MissingValues():
+    fusion = PositionFusion(1.0, 1.0)
+    (latitude, longitude) = RijksdriehoekConversion.ToWgs(155000, 463000)
+    batch = DetectionBatch([0], [0], [DetectionBatch.NO_ID], [0], ('human',)).WithPositions(latitude, longitude, 0)
+    fusion.Fuse(CreateBatch([1], [(0, 0)]), 'a', 0)
+
+    assert fusion.Fuse(batch, 'b', 0).id.tolist() == [1]
+    assert fusion.Fuse(batch, 'a', 0).id.tolist() == [2]
+    assert fusion.Fuse(DetectionBatch.Empty(), 'a', 0) is not None
+    assert fusion.Fuse(None, 'a', 0) is None
+
+
+# Test if many positions of two cameras are matched one to one
+def test_Scale():
+    fusion = PositionFusion(0.5, 1.0)
+    positions = np.stack(np.meshgrid(np.arange(50) * 2.0, np.arange(50) * 2.0), axis=-1).reshape(-1, 2)
+    first = fusion.Fuse(CreateBatch(np.arange(len(positions)), positions), 'a', 0)
+    second = fusion.Fuse(CreateBatch(np.arange(len(positions))[::-1], positions[::-1] + 0.1), 'b', 0.1)
+
+    assert np.array_equal(first.id, second.id[::-1])
+
+
+# Test if the arguments are added and validated
+def test_Arguments():
+    parser = argparse.ArgumentParser()
+    PositionFusion.AddPositionFusionArguments(parser)
+    arguments = vars(parser.parse_args([]))
+    PositionFusion.ValidatePositionFusionArguments(arguments)
+    assert PositionFusion.FromArguments(arguments) is None
+    assert PositionFusion.FromArguments({**arguments, "fusionDistance": 2}).mergeDistance == 2
+
+    with pytest.raises(ValueError):
+        PositionFusion.ValidatePositionFusionArguments({**arguments, "fusionDistance": -1})
+    with pytest.raises(TypeError):
+        PositionFusion.ValidatePositionFusionArguments(None)
+    PositionFusion.ValidatePositionFusionArguments({**arguments, "fusionDistance": 2, "fusionCameras": ["b.mp4"]})
+    with pytest.raises(ValueError):
+        PositionFusion.ValidatePositionFusionArguments({**arguments, "fusionCameras": ["b.mp4"]})
+    with pytest.raises(TypeError):
+        PositionFusion.ValidatePositionFusionArguments({**arguments, "fusionDistance": 2, "fusionCameras": [""]})
+    with pytest.raises(ValueError):
+        PositionFusion(0)
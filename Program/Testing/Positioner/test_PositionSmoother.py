@@ -0,0 +1,109 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+import argparse
+import functools
+import time
+
+import numpy as np
+import pytest
+
+from FrameAnalyzer.DetectionBatch import DetectionBatch
+from Positioner.PositionSmoother import PositionSmoother
+from Positioner.RijksdriehoekConversion import RijksdriehoekConversion
+from Testing.Positioner import BatchFactory
+
+origin = np.array([155000.0, 463000.0])
+
+
+# Create a converted batch with the given ids and Rijksdriehoek positions relative to the origin
+CreateBatch = functools.partial(BatchFactory.CreateBatch, origin=origin, toWgs=True)
+
+
+# Get the Rijksdriehoek positions of a batch relative to the origin
+def Positions(detectionBatch: DetectionBatch) -> np.ndarray:
+    return np.column_stack((detectionBatch.rijksdriehoekX, detectionBatch.rijksdriehoekY)) - origin
+
+
+# Test if the jitter of a standing object is reduced
+def test_Jitter():
+    smoother = PositionSmoother(0.1, 0.5)
+    random = np.random.default_rng(0)
+    errors = []
+    for t in range(100):
+        noisy = random.normal(0, 0.5, (1, 2))
+        smoothed = smoother.Smooth(CreateBatch([1], noisy), t * 0.1)
+        if t >= 20:
+            errors.append(np.linalg.norm(Positions(smoothed)))
+    assert np.mean(errors) < 0.35
+
+
+# Test if a moving object is followed and its position can be extrapolated
+def test_Velocity():
+    smoother = PositionSmoother(1.0, 0.1)
+    for t in range(50):
+        smoothed = smoother.Smooth(CreateBatch([1, 2], [(t * 0.1, 0), (0, -t * 0.2)]), t * 0.1)
+    assert Positions(smoothed) == pytest.approx(np.array([[4.9, 0], [0, -9.8]]), abs=0.05)
+
+    smoothed = smoother.Smooth(CreateBatch([1, 2, 3], [(5, 0), (0, -10), (1, 1)]), 5.0)
+    extrapolated = smoother.Extrapolate(smoothed, 5.0, 6.0)
+    assert Positions(extrapolated) == pytest.approx(np.array([[6, 0], [0, -12], [1, 1]]), abs=0.1)
+    assert Positions(smoother.Extrapolate(smoothed, 5.0, 5.0)) == pytest.approx(Positions(smoothed))
+    assert smoother.GetTrackCount() == 3
+
+
+# Test if the WGS-84 positions are moved with the Rijksdriehoek positions
+def test_WgsPositions():
+    smoother = PositionSmoother()
+    smoother.Smooth(CreateBatch([1], [(0, 0)]), 0)
+    smoothed = smoother.Smooth(CreateBatch([1], [(1, 1)]), 0.1)
+
+    (latitude, longitude) = RijksdriehoekConversion.ToWgs(smoothed.rijksdriehoekX, smoothed.rijksdriehoekY)
+    assert smoothed.latitude == pytest.approx(latitude, abs=1e-9)
+    assert smoothed.longitude == pytest.approx(longitude, abs=1e-9)
+
+
+# Test if detections without id or position and new tracks are left as they are
+def test_PassThrough():
+    smoother = PositionSmoother()
+    batch = CreateBatch([DetectionBatch.NO_ID, 1, 2], [(3, 3), (1, 1), (2, 2)])
+    rijksdriehoekX = batch.rijksdriehoekX.copy()
+    rijksdriehoekX[2] = np.nan
+    batch = batch.WithPositions(batch.latitude, batch.longitude, 0, None, rijksdriehoekX, batch.rijksdriehoekY)
+
+    smoothed = smoother.Smooth(batch, 0)
+    assert np.array_equal(Positions(smoothed), Positions(batch), equal_nan=True)
+    assert smoother.GetTrackCount() == 1
+    assert smoother.Smooth(DetectionBatch.Empty(), 0) is not None
+    assert smoother.Smooth(None, 0) is None
+
+
+# Test if the cost of a frame does not grow with the number of tracks
+def test_ManyTracks():
+    smoother = PositionSmoother(maxTracks=500)
+    positions = np.random.default_rng(0).uniform(0, 100, (500, 2))
+    smoother.Smooth(CreateBatch(np.arange(500), positions), 0)
+
+    start = time.perf_counter()
+    for t in range(1, 11):
+        smoothed = smoother.Smooth(CreateBatch(np.arange(500), positions), t * 0.1)
+    assert (time.perf_counter() - start) / 10 < 0.1
+    assert Positions(smoothed) == pytest.approx(positions, abs=1e-6)
+
+
+# Test if the arguments are added and validated
+def test_Arguments():
+    parser = argparse.ArgumentParser()
+    PositionSmoother.AddPositionSmootherArguments(parser)
+    arguments = vars(parser.parse_args([]))
+    PositionSmoother.ValidatePositionSmootherArguments(arguments)
+
+    with pytest.raises(ValueError):
+        PositionSmoother.ValidatePositionSmootherArguments({**arguments, "measurementNoise": 0})
+    with pytest.raises(ValueError):
+        PositionSmoother.ValidatePositionSmootherArguments({**arguments, "extrapolate": True})
+    with pytest.raises(TypeError):
+        PositionSmoother.ValidatePositionSmootherArguments(None)
+    with pytest.raises(ValueError):
+        PositionSmoother(0)
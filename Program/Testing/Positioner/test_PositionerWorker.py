@@ -0,0 +1,132 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+import argparse
+import threading
+from datetime import datetime
+
+import pytest
+
+from FrameAnalyzer.IDataWriteConnection import IDataWriteConnection
+from FrameAnalyzer.IDetector import DetectedObject
+from Positioner.PositionerWorker import PositionerWorker, QueueOverflowPolicy
+
+detections = [DetectedObject(1, 1, 0, 'human')]
+
+
+# Test implementation of the IDataWriteConnection, remembers the written frames and can be held up
+class RecordingConnection(IDataWriteConnection):
+    def __init__(self):
+        self.frameIndices = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def WriteData(self, detections, frameIndex: int, frameReadDatetime: datetime):
+        self.release.wait()
+        self.frameIndices.append(frameIndex)
+
+
+# Fill the queue of a worker that has not been started with the given number of frames
+def WriteFrames(worker, count):
+    for frameIndex in range(count):
+        worker.WriteData(detections, frameIndex, datetime.now())
+
+
+# Test if all frames are written in order on the worker thread
+def test_Normal():
+    connection = RecordingConnection()
+    worker = PositionerWorker(connection, 4)
+    worker.Start()
+    WriteFrames(worker, 3)
+    assert worker.WaitUntilIdle(5)
+    worker.Stop()
+
+    assert connection.frameIndices == [0, 1, 2]
+    assert worker.GetStatistics() == (0, 4, 3, 3, 0)
+
+
+# Test which frames remain when the queue overflows, a stopped worker can't block
+@pytest.mark.parametrize("policy, expected, dropped", [
+    (QueueOverflowPolicy.DropOldest, [3, 4, 5], 3),
+    (QueueOverflowPolicy.KeepLatest, [3, 4, 5], 3),
+    (QueueOverflowPolicy.Block, [3, 4, 5], 3)
+])
+def test_Overflow(policy, expected, dropped):
+    connection = RecordingConnection()
+    worker = PositionerWorker(connection, 3, policy)
+    WriteFrames(worker, 6)
+    statistics = worker.GetStatistics()
+    assert statistics.depth <= 3 and statistics.dropped == dropped and statistics.written == 6
+
+    worker.Start()
+    worker.Stop()
+    assert connection.frameIndices == expected
+
+
+# Test if keep latest only keeps the newest frame when the queue overflows
+def test_KeepLatest():
+    connection = RecordingConnection()
+    worker = PositionerWorker(connection, 2, QueueOverflowPolicy.KeepLatest)
+    WriteFrames(worker, 5)
+    worker.Start()
+    worker.Stop()
+    assert connection.frameIndices == [4]
+    assert worker.GetStatistics().dropped == 4
+
+
+# Test if a blocking worker makes the writer wait instead of dropping frames
+def test_Block():
+    connection = RecordingConnection()
+    connection.release.clear()
+    worker = PositionerWorker(connection, 1, QueueOverflowPolicy.Block)
+    worker.Start()
+
+    writer = threading.Thread(target=WriteFrames, args=(worker, 4))
+    writer.start()
+    writer.join(0.2)
+    assert writer.is_alive(), "The writer did not block"
+
+    connection.release.set()
+    writer.join(5)
+    assert worker.WaitUntilIdle(5)
+    worker.Stop()
+    assert connection.frameIndices == [0, 1, 2, 3]
+    assert worker.GetStatistics().dropped == 0
+
+
+# Test if an error in the positioner does not stop the worker, and stopping without draining drops the queue
+def test_ErrorAndStop():
+    connection = RecordingConnection()
+    original = connection.WriteData
+    connection.WriteData = lambda d, frameIndex, t: original(d, frameIndex, t) if frameIndex != 0 else 1 / 0
+    worker = PositionerWorker(connection, 4)
+    worker.Start()
+    WriteFrames(worker, 2)
+    assert worker.WaitUntilIdle(5)
+    assert connection.frameIndices == [1]
+
+    connection.release.clear()
+    WriteFrames(worker, 3)
+    connection.release.set()
+    worker.Stop(False)
+    assert worker.GetStatistics().depth == 0
+
+    with pytest.raises(ValueError):
+        PositionerWorker(connection, 0)
+
+
+# Test if the arguments are added and validated
+def test_Arguments():
+    parser = argparse.ArgumentParser()
+    PositionerWorker.AddPositionerWorkerArguments(parser)
+    arguments = vars(parser.parse_args([]))
+    PositionerWorker.ValidatePositionerWorkerArguments(arguments)
+    assert QueueOverflowPolicy(arguments["positionerQueuePolicy"]) == QueueOverflowPolicy.DropOldest
+
+    with pytest.raises(ValueError):
+        PositionerWorker.ValidatePositionerWorkerArguments({**arguments, "positionerQueueSize": 0})
+    with pytest.raises(ValueError):
+        PositionerWorker.ValidatePositionerWorkerArguments({**arguments, "positionerQueuePolicy": "never"})
+    with pytest.raises(TypeError):
+        PositionerWorker.ValidatePositionerWorkerArguments(None)
@@ -0,0 +1,61 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+import numpy as np
+import pytest
+from Positioner.ProjectionModel import ProjectionModel
+from Positioner.IConvertor import IConvertor
+from Calibrator.Configurations.HomographyCalibrationConfiguration import HomographyCalibrationConfiguration, \
+    HomographyGeoData, GeoPosition
+
+
+def CreateConfiguration(anchorRdPosition=None):
+    return HomographyCalibrationConfiguration(
+        np.array([[2.5, 0.3, 12], [-0.05, 3.1, 7], [0.0001, 0.0015, 1.0]]),
+        (960, 540),
+        HomographyGeoData((639, 639), GeoPosition(52.08850112867399, 5.165728014316017, 3), 0.1, anchorRdPosition)
+    )
+
+
+def test_FromConfiguration():
+    configuration = CreateConfiguration()
+    model = ProjectionModel.FromConfiguration(configuration)
+
+    # The anchor Rd position is resolved, but not written back into the configuration
+    assert configuration.homographyGeoData.anchorRdPosition is None
+    assert 130000 < model.anchorRdPosition[0] < 140000 and 450000 < model.anchorRdPosition[1] < 460000
+    assert model.altitude == 3
+    assert model.key == ProjectionModel.GetKey(configuration.homographyMatrix, configuration.homographyGeoData)
+
+    # The model is immutable
+    pytest.raises(AttributeError, setattr, model, 'pixelScale', 1)
+    pytest.raises(ValueError, model.homographyMatrix.__setitem__, (0, 0), 1)
+
+
+def test_Anchor():
+    model = ProjectionModel.FromConfiguration(CreateConfiguration((136000, 455000)))
+    world = model.TopDownToWorld(np.array([[639.0, 639.0], [649.0, 629.0]]))
+
+    assert np.allclose(world[0], [52.08850112867399, 5.165728014316017, 136000, 455000])
+    # 10 pixels east and north is a meter east and north
+    assert np.allclose(world[1, 2:], [136001, 455001])
+    assert np.abs(IConvertor.MetersBetweenGeoPositions(tuple(world[0, :2]), tuple(world[1, :2])) - np.sqrt(2)) < 0.01
+
+
+def test_ApproximationError():
+    model = ProjectionModel.FromConfiguration(CreateConfiguration())
+    pixelPositions = np.array([[0, 0], [480, 270], [959, 539]])
+    errors = model.ApproximationErrors(pixelPositions)
+    assert errors.shape == (3,)
+
+    # The reported maximum bounds the error of the exact spherical formula on the samples
+    assert np.all(errors <= model.MaxApproximationError((960, 540), 3) + 1e-12)
+    assert model.MaxApproximationError((960, 540)) < 0.01
+
+
+def test_KeyChanges():
+    configuration = CreateConfiguration()
+    key = ProjectionModel.GetKey(configuration.homographyMatrix, configuration.homographyGeoData)
+    configuration.homographyGeoData.pixelScale = 0.2
+    assert ProjectionModel.GetKey(configuration.homographyMatrix, configuration.homographyGeoData) != key
@@ -0,0 +1,46 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+import numpy as np
+
+from Positioner.RijksdriehoekConversion import RijksdriehoekConversion
+
+# reference values calculated with the rijksdriehoek package
+geoPositions = np.array([(52.0907, 5.1214), (53.2, 6.56), (51.44, 5.47), (52.37, 4.89)])
+rdPositions = np.array([(136783.54055556376, 455859.9059479142), (233370.54196325192, 579899.2741960245),
+                        (160756.68035441628, 383436.547100499), (121138.1468815166, 487018.15403470263)])
+rdPositions2 = np.array([(136000, 455800), (233000, 582000), (121000, 487000)])
+geoPositions2 = np.array([(52.09013524141677, 5.109970408740459), (53.21892708491997, 6.554965681006998),
+                          (52.36982831137717, 4.887973441181912)])
+
+
+# Test if the batch conversion to Rijksdriehoek matches the reference values
+def test_FromWgs():
+    (x, y) = RijksdriehoekConversion.FromWgs(geoPositions[:, 0], geoPositions[:, 1])
+    assert np.allclose(x, rdPositions[:, 0], rtol=0, atol=1e-6)
+    assert np.allclose(y, rdPositions[:, 1], rtol=0, atol=1e-6)
+
+
+# Test if the batch conversion to WGS-84 matches the reference values
+def test_ToWgs():
+    (latitudes, longitudes) = RijksdriehoekConversion.ToWgs(rdPositions2[:, 0], rdPositions2[:, 1])
+    assert np.allclose(latitudes, geoPositions2[:, 0], rtol=0, atol=1e-10)
+    assert np.allclose(longitudes, geoPositions2[:, 1], rtol=0, atol=1e-10)
+
+
+# Test if single values and empty arrays are converted as well
+def test_ScalarAndEmpty():
+    (x, y) = RijksdriehoekConversion.FromWgs(geoPositions[0, 0], geoPositions[0, 1])
+    assert np.isclose(x, rdPositions[0, 0]) and np.isclose(y, rdPositions[0, 1])
+
+    (latitudes, longitudes) = RijksdriehoekConversion.ToWgs(np.empty(0), np.empty(0))
+    assert latitudes.shape == (0,) and longitudes.shape == (0,)
+
+
+# Test if converting back and forth stays within the accuracy of the approximations
+def test_RoundTrip():
+    (x, y) = RijksdriehoekConversion.FromWgs(geoPositions[:, 0], geoPositions[:, 1])
+    (latitudes, longitudes) = RijksdriehoekConversion.ToWgs(x, y)
+    (x2, y2) = RijksdriehoekConversion.FromWgs(latitudes, longitudes)
+    assert np.all(np.hypot(x2 - x, y2 - y) < 1)
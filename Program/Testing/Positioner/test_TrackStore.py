@@ -0,0 +1,111 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+import argparse
+
+import numpy as np
+import pytest
+
+from FrameAnalyzer.DetectionBatch import DetectionBatch
+from Positioner.TrackStore import TrackStore
+from Testing.Positioner.BatchFactory import CreateBatch
+
+
+# Test if the samples of a track are kept in order and the oldest samples are overwritten
+def test_RingBuffer():
+    store = TrackStore(3, 10.0, 4)
+    for t in range(5):
+        store.Update(CreateBatch([1, 2], [(t, 0), (0, t)]), float(t))
+
+    track = store.GetTrack(1)
+    assert track[:, 0].tolist() == [2, 3, 4]
+    assert track[:, 3].tolist() == [2, 3, 4]
+    assert store.GetTrack(2, 1.0)[:, 0].tolist() == [3, 4]
+    assert store.GetTrack(3) is None
+
+
+# Test if the speed and heading follow the movement of a track
+def test_Velocity():
+    store = TrackStore(8, 10.0, 4)
+    for t in range(4):
+        store.Update(CreateBatch([1, 2], [(2 * t, 0), (0, -t)]), t * 0.5)
+
+    east = store.GetState(1)
+    assert east.speed == pytest.approx(4 * (1 - 0.5 ** 3))
+    assert east.heading == pytest.approx(90)
+    south = store.GetState(2)
+    assert south.heading == pytest.approx(180)
+    assert south.time == 1.5
+    assert store.GetState(3) is None
+
+
+# Test if tracks time out and the oldest track is evicted when the store is full
+def test_Eviction():
+    store = TrackStore(4, 2.0, 2)
+    store.Update(CreateBatch([1], [(0, 0)]), 0.0)
+    store.Update(CreateBatch([2], [(0, 0)]), 1.0)
+    store.Update(CreateBatch([3], [(0, 0)]), 1.5)
+    assert sorted(store.GetTrackIds()) == [2, 3]
+
+    store.Update(CreateBatch([3], [(0, 0)]), 3.5)
+    assert store.GetTrackIds() == [3]
+    assert store.GetStatistics().evicted == 2
+
+    # A batch with more tracks than slots never overwrites its own tracks
+    store.Update(CreateBatch([4, 5, 6, DetectionBatch.NO_ID], [(0, 0)] * 4), 4.0)
+    assert sorted(store.GetTrackIds()) == [4, 5]
+    assert len(store.GetTrack(4)) == 1
+
+
+# Test if tracks time out while the scene is empty
+def test_EmptyFrames():
+    store = TrackStore(4, 2.0, 2)
+    store.Update(CreateBatch([7], [(0, 0)]), 0.0)
+    store.Update(CreateBatch([], np.zeros((0, 2))), 1.0)
+    assert store.GetTrackIds() == [7]
+
+    store.Update(CreateBatch([], np.zeros((0, 2))), 99.0)
+    store.Update(CreateBatch([DetectionBatch.NO_ID], [(0, 0)]), 100.0)
+    assert store.GetTrackIds() == []
+    assert store.GetStatistics().evicted == 1
+    assert store.GetTrack(7) is None
+
+
+# Test if the memory of the store is fixed and reported
+def test_Memory():
+    store = TrackStore(16, 10.0, 8)
+    memory = store.GetMemoryUsage()
+    assert memory >= 8 * 16 * len(TrackStore.FIELDS) * 8
+    store.Update(CreateBatch(np.arange(100), np.zeros((100, 2))), 0.0)
+    assert store.GetStatistics() == (8, 8, 16, 0, memory)
+
+    with pytest.raises(ValueError):
+        TrackStore(1)
+
+
+# Test if a track is converted to a dictionary without missing values
+def test_ToDictionary():
+    store = TrackStore(4, 10.0, 2)
+    batch = DetectionBatch([0], [0], [7], [0], ('human',)).WithPositions(52.0, 5.0, 0)
+    store.Update(batch, 1.0)
+
+    track = store.ToDictionary(7)
+    assert track["id"] == 7
+    assert track["samples"] == [{"time": 1.0, "latitude": 52.0, "longitude": 5.0}]
+    assert store.ToDictionary(8) is None
+
+
+# Test if the arguments are added and validated
+def test_Arguments():
+    parser = argparse.ArgumentParser()
+    TrackStore.AddTrackStoreArguments(parser)
+    arguments = vars(parser.parse_args([]))
+    TrackStore.ValidateTrackStoreArguments(arguments)
+
+    with pytest.raises(ValueError):
+        TrackStore.ValidateTrackStoreArguments({**arguments, "trackLength": 1})
+    with pytest.raises(ValueError):
+        TrackStore.ValidateTrackStoreArguments({**arguments, "maxTracks": 0})
+    with pytest.raises(TypeError):
+        TrackStore.ValidateTrackStoreArguments(None)
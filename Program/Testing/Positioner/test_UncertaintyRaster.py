@@ -0,0 +1,52 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+import warnings
+
+import numpy as np
+
+from Positioner.UncertaintyRaster import UncertaintyRaster
+
+
+# Test if the raster adds the static error and looks up the nearest pixel
+def test_Lookup():
+    singlePixelErrors = np.arange(12, dtype=np.float64).reshape(3, 4)
+    raster = UncertaintyRaster.FromSinglePixelErrors(singlePixelErrors, 0.5, "key")
+
+    pixelPositions = np.array([[0, 0], [3, 2], [1.4, 0.6], [-1, 0], [3.5, 0]])
+    inside = raster.Contains(pixelPositions)
+    assert inside.tolist() == [True, True, True, False, False]
+    assert raster.Lookup(pixelPositions[inside]).tolist() == [0.5, 11.5, 5.5]
+    assert not raster.radii.flags.writeable
+
+
+# Test if the raster is rendered as an image with the size of the raster, and can be exported
+def test_Image(tmp_path):
+    raster = UncertaintyRaster.FromSinglePixelErrors(np.linspace(0, 1, 20).reshape(4, 5), 0, "key")
+    image = raster.ToImage()
+    assert image.shape == (4, 5, 3) and image.dtype == np.uint8
+    assert not np.array_equal(image[0, 0], image[3, 4])
+
+    # a constant raster does not divide by zero
+    assert UncertaintyRaster(np.ones((2, 2)), "key").ToImage().shape == (2, 2, 3)
+
+    assert raster.Export(tmp_path / "uncertainty.png")
+    assert (tmp_path / "uncertainty.png").exists()
+
+
+# Test if infinite and huge radii don't wash out the colors of the other pixels
+def test_ImageOutliers():
+    radii = np.linspace(0, 1, 100).reshape(10, 10)
+    radii[0, 0] = np.inf
+    radii[9, 9] = 1e9
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        image = UncertaintyRaster(radii, "key").ToImage()
+
+    red = image[0, 0]
+    assert np.array_equal(image[9, 9], red)
+    assert not np.array_equal(image[5, 5], image[0, 1]) and not np.array_equal(image[5, 5], red)
+
+    # a raster without finite radii is fully red
+    assert np.array_equal(UncertaintyRaster(np.full((2, 2), np.inf), "key").ToImage()[1, 1], red)
@@ -0,0 +1,117 @@
+# This program has been developed by students from the bachelor Computer Science at Utrecht University within the
+# Software Project course.
+# © Copyright Utrecht University (Department of Information and Computing Sciences)
+
+import argparse
+import json
+import os
+
+import numpy as np
+import pytest
+
+from FrameAnalyzer.DetectionBatch import DetectionBatch
+from Positioner.RijksdriehoekConversion import RijksdriehoekConversion
+from Positioner.ZoneIndex import ZoneIndex, Zone
+
+
+# Create a square zone with the given corner and size in Rijksdriehoek coordinates
+def Square(zoneId, left, bottom, size, holes=()):
+    return Zone(zoneId, [np.array([(left, bottom), (left + size, bottom), (left + size, bottom + size),
+                                   (left, bottom + size)], dtype=np.float64)] + list(holes))
+
+
+# Write a GeoJSON file with the given features
+def WriteZones(path, features):
+    with open(path, 'w') as file:
+        json.dump({"type": "FeatureCollection", "features": features}, file)
+
+
+# Test if positions are tagged with the overlapping zones they are inside
+def test_Lookup():
+    hole = np.array([(4, 4), (6, 4), (6, 6), (4, 6)], dtype=np.float64)
+    index = ZoneIndex([Square('a', 0, 0, 10, [hole]), Square('b', 5, 5, 10)], 0.1)
+
+    membership = index.Lookup(np.array([1, 8, 12, 5, 20, np.nan]), np.array([1, 8, 12, 5, 20, np.nan]))
+    assert index.zoneIds == ('a', 'b')
+    assert membership.tolist() == [[True, False], [True, True], [False, True], [False, True],
+                                   [False, False], [False, False]]
+
+
+# Test if many zones are stored in more than one word of the label map
+def test_ManyZones():
+    zones = [Square(str(i), i, 0, 0.5) for i in range(100)]
+    index = ZoneIndex(zones, 0.1)
+    membership = index.Lookup(np.arange(100) + 0.25, np.full(100, 0.25))
+    assert np.array_equal(membership, np.eye(100, dtype=bool))
+
+
+# Test if the zones are added to the batch and sent as a field of the positions
+def test_Tag():
+    index = ZoneIndex([Square('a', 0, 0, 10)], 0.5)
+    batch = DetectionBatch([0, 0], [0, 0], [1, 2], [0, 0], ('human',)).WithPositions(
+        52, 5, 0, None, [5, 50], [5, 50])
+
+    tagged = index.Tag(batch)
+    assert tagged.GetZones() == [('a',), ()]
+    assert [row['zones'] for row in tagged.ToDictionaries()] == [('a',), ()]
+    assert tagged.ToDetectedObjectPositions()[0].zones == ('a',)
+    assert tagged.WithIds([3, 4]).GetZones() == [('a',), ()]
+    assert 'zones' not in batch.ToDictionaries()[0]
+    assert index.Tag(None) is None
+
+
+# Test if zones are loaded from GeoJSON and only rebuilt when the file changes
+def test_File(tmp_path):
+    (latitudes, longitudes) = RijksdriehoekConversion.ToWgs([155000, 155100, 155100, 155000],
+                                                            [463000, 463000, 463100, 463100])
+    wgsZone = {"type": "Feature", "properties": {"id": "wgs"},
+               "geometry": {"type": "Polygon", "coordinates": [np.column_stack((longitudes, latitudes)).tolist()]}}
+    rdZone = {"type": "Feature", "properties": {"id": "rd", "rijksdriehoek": True},
+              "geometry": {"type": "MultiPolygon", "coordinates": [[[[155200, 463000], [155300, 463000],
+                                                                      [155300, 463100]]]]}}
+    path = tmp_path / "zones.json"
+    WriteZones(path, [wgsZone, rdZone])
+
+    index = ZoneIndex.FromFile(path, 1.0)
+    assert index.Lookup([155050, 155290, 155210], [463050, 463010, 463090]).tolist() == \
+        [[True, False], [False, True], [False, False]]
+
+    ZoneIndex.REFRESH_INTERVAL = 0
+    try:
+        assert not index.Refresh()
+        WriteZones(path, [rdZone, wgsZone])
+        os.utime(path, (0, 1))
+        assert index.Refresh()
+        assert index.zoneIds == ('rd', 'wgs')
+        assert not index.SetZones(ZoneIndex.LoadZones(path))
+
+        with open(path, 'w') as file:
+            file.write("{")
+        os.utime(path, (0, 2))
+        assert not index.Refresh()
+        assert index.builds == 2
+    finally:
+        ZoneIndex.REFRESH_INTERVAL = 1.0
+
+
+# Test if the label map of a large area stays bounded
+def test_LargeArea():
+    index = ZoneIndex([Square('a', 0, 0, 100000)], 0.1)
+    assert index.cellSize > 0.1
+    assert index.Lookup([50000], [50000]).tolist() == [[True]]
+    assert ZoneIndex([], 0.1).Lookup([0], [0]).shape == (1, 0)
+
+
+# Test if the arguments are added and validated
+def test_Arguments():
+    parser = argparse.ArgumentParser()
+    ZoneIndex.AddZoneIndexArguments(parser)
+    arguments = vars(parser.parse_args([]))
+    ZoneIndex.ValidateZoneIndexArguments(arguments)
+
+    with pytest.raises(ValueError):
+        ZoneIndex.ValidateZoneIndexArguments({**arguments, "zoneFile": "missing.json"})
+    with pytest.raises(ValueError):
+        ZoneIndex.ValidateZoneIndexArguments({**arguments, "zoneCellSize": 0})
+    with pytest.raises(TypeError):
+        ZoneIndex.ValidateZoneIndexArguments(None)
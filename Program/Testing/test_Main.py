@@ -8,6 +8,9 @@ from Main import *
 from CameraReader.CameraController import *
 from CameraReader.CameraVideoReader import *
 from Calibrator.MainCalibrator import *
+from Calibrator.Configurations.HomographyCalibrationConfiguration import GeoPosition, \
+    HomographyCalibrationConfiguration, HomographyGeoData
+from FrameAnalyzer.IDetector import DetectedObject
 import pytest
 import unittest
 from unittest.mock import Mock, MagicMock, patch
@@ -55,7 +58,34 @@ class MyTestCase(unittest.TestCase):
             'isStream': False,
             'detector': 'Manual',
             'keepID': True,
-            'noEncryption': True
+            'noEncryption': True,
+            'positionerQueueSize': 8,
+            'positionerQueuePolicy': 'dropOldest',
+            'fusionDistance': 0,
+            'fusionWindow': 1.0,
+            'fusionCameras': [],
+            'trackLength': 128,
+            'trackTimeout': 10.0,
+            'maxTracks': 256,
+            'smoothing': False,
+            'measurementNoise': 0.5,
+            'extrapolate': False,
+            'zoneFile': '',
+            'zoneCellSize': 0.25,
+            'counterInterval': 5.0,
+            'socialDistance': 0,
+            'socialDistanceInterval': 1.0,
+            'heatmap': False,
+            'heatmapCellSize': 0.5,
+            'heatmapHalfLife': 60.0,
+            'heatmapInterval': 10.0,
+            'rollupFile': "",
+            'rollupCellSize': 10.0,
+            'apiQueueBytes': 4194304,
+            'apiSlowClientPolicy': 'drop',
+            'apiKeyframeFrames': 30,
+            'apiKeyframeSeconds': 5.0,
+            'apiDeltaEpsilon': 0.05
         }
         CameraController.ValidateReaderArguments(arguments)
 
@@ -66,6 +96,7 @@ class MyTestCase(unittest.TestCase):
         assert pipeline.cameraController is not None
         assert pipeline.mainWindow is not None
         assert pipeline.frameAnalyzer is not None
+        assert pipeline.positionerWorker is not None
         assert calibrationDoneEvent.is_set()
         assert not videoAnalyzerCancelEvent.is_set()
 
@@ -89,7 +120,34 @@ class MyTestCase(unittest.TestCase):
             'isStream': False,
             'detector': 'Manual',
             'keepID': True,
-            'noEncryption': True
+            'noEncryption': True,
+            'positionerQueueSize': 8,
+            'positionerQueuePolicy': 'dropOldest',
+            'fusionDistance': 0,
+            'fusionWindow': 1.0,
+            'fusionCameras': [],
+            'trackLength': 128,
+            'trackTimeout': 10.0,
+            'maxTracks': 256,
+            'smoothing': False,
+            'measurementNoise': 0.5,
+            'extrapolate': False,
+            'zoneFile': '',
+            'zoneCellSize': 0.25,
+            'counterInterval': 5.0,
+            'socialDistance': 0,
+            'socialDistanceInterval': 1.0,
+            'heatmap': False,
+            'heatmapCellSize': 0.5,
+            'heatmapHalfLife': 60.0,
+            'heatmapInterval': 10.0,
+            'rollupFile': "",
+            'rollupCellSize': 10.0,
+            'apiQueueBytes': 4194304,
+            'apiSlowClientPolicy': 'drop',
+            'apiKeyframeFrames': 30,
+            'apiKeyframeSeconds': 5.0,
+            'apiDeltaEpsilon': 0.05
         }
         CameraController.ValidateReaderArguments(arguments)
 
@@ -123,7 +181,34 @@ class MyTestCase(unittest.TestCase):
             'isStream': False,
             'detector': 'Manual',
             'keepID': True,
-            'noEncryption': True
+            'noEncryption': True,
+            'positionerQueueSize': 8,
+            'positionerQueuePolicy': 'dropOldest',
+            'fusionDistance': 0,
+            'fusionWindow': 1.0,
+            'fusionCameras': [],
+            'trackLength': 128,
+            'trackTimeout': 10.0,
+            'maxTracks': 256,
+            'smoothing': False,
+            'measurementNoise': 0.5,
+            'extrapolate': False,
+            'zoneFile': '',
+            'zoneCellSize': 0.25,
+            'counterInterval': 5.0,
+            'socialDistance': 0,
+            'socialDistanceInterval': 1.0,
+            'heatmap': False,
+            'heatmapCellSize': 0.5,
+            'heatmapHalfLife': 60.0,
+            'heatmapInterval': 10.0,
+            'rollupFile': "",
+            'rollupCellSize': 10.0,
+            'apiQueueBytes': 4194304,
+            'apiSlowClientPolicy': 'drop',
+            'apiKeyframeFrames': 30,
+            'apiKeyframeSeconds': 5.0,
+            'apiDeltaEpsilon': 0.05
         }
         CameraController.ValidateReaderArguments(arguments)
 
@@ -144,6 +229,91 @@ class MyTestCase(unittest.TestCase):
 
     @pytest.mark.order(4)
     @patch('cv2.resize', MagicMock(return_value=np.array([[[255, 255, 255]]])))
+    @patch('Positioner.IConvertor.IConvertor._CalculateStaticError', Mock())
+    def test_FusionCameras(self):
+        self.MockObjects()
+        MainCalibrator.calibrated = True
+
+        arguments = {
+            'analyzeWidth': 960,
+            'analyzeHeight': 540,
+            'fileOrStreamLocation': 'loc',
+            'isStream': False,
+            'detector': 'Manual',
+            'keepID': True,
+            'calibrator': 'Homography',
+            'noEncryption': True,
+            'positionerQueueSize': 8,
+            'positionerQueuePolicy': 'dropOldest',
+            'fusionDistance': 1.0,
+            'fusionWindow': 1.0,
+            'fusionCameras': ['b'],
+            'trackLength': 128,
+            'trackTimeout': 10.0,
+            'maxTracks': 256,
+            'smoothing': False,
+            'measurementNoise': 0.5,
+            'extrapolate': False,
+            'zoneFile': '',
+            'zoneCellSize': 0.25,
+            'counterInterval': 5.0,
+            'socialDistance': 0,
+            'socialDistanceInterval': 1.0,
+            'heatmap': False,
+            'heatmapCellSize': 0.5,
+            'heatmapHalfLife': 60.0,
+            'heatmapInterval': 10.0,
+            'rollupFile': "",
+            'rollupCellSize': 10.0,
+            'apiQueueBytes': 4194304,
+            'apiSlowClientPolicy': 'drop',
+            'apiKeyframeFrames': 30,
+            'apiKeyframeSeconds': 5.0,
+            'apiDeltaEpsilon': 0.05
+        }
+        CameraController.ValidateReaderArguments(arguments)
+        PositionFusion.ValidatePositionFusionArguments(arguments)
+
+        # Camera b sees the same area as camera a, 10 pixels to the right
+        geoData = HomographyGeoData((500, 500), GeoPosition(52.08850112867399, 5.165728014316017, 0), 0.1,
+                                    (136000, 455000))
+        MainCalibrator.Calibrate.return_value = HomographyCalibrationConfiguration(np.identity(3), None, geoData, None)
+        MainCalibrator.GetConfiguredCalibrationMethod = Mock(return_value=HomographyCalibrationConfiguration(
+            np.array([[1, 0, -10], [0, 1, 0], [0, 0, 1]], dtype=float), None, geoData, None))
+        CameraController.GetUniqueIdentifier = lambda controller: str(id(controller))
+
+        api = Mock()
+        fusion = PositionFusion.FromArguments(arguments)
+        pipelines = [PositionerPipeline(), PositionerPipeline(False)]
+        for pipeline, location in zip(pipelines, ['a'] + arguments['fusionCameras']):
+            pipeline._Startup(api, {**arguments, 'fileOrStreamLocation': location}, fusion)
+        assert pipelines[1].mainWindow is None and pipelines[1].frameAnalyzer is not None
+        assert not videoAnalyzerCancelEvent.is_set()
+
+        # The object seen by both cameras is merged into one id
+        frameTime = datetime.now()
+        pipelines[0].positionerWorker.dataWriteConnection.WriteData([DetectedObject(100, 100, 7, 'human')], 0,
+                                                                    frameTime)
+        pipelines[1].positionerWorker.dataWriteConnection.WriteData([DetectedObject(110, 100, 3, 'human')], 0,
+                                                                    frameTime)
+        (first, second) = [call[0][0] for call in api.Send.call_args_list]
+        assert first.id.tolist() == second.id.tolist() == [1]
+        assert first.rijksdriehoekX.tolist() == second.rijksdriehoekX.tolist()
+        assert fusion.GetStatistics().merged == 1
+
+        for pipeline in pipelines:
+            pipeline._Cleanup()
+        assert videoAnalyzerCancelEvent.is_set()
+
+        # A fusion camera without a saved calibration stops the program
+        videoAnalyzerCancelEvent.clear()
+        MainCalibrator.GetConfiguredCalibrationMethod.return_value = None
+        pipeline = PositionerPipeline(False)
+        pipeline._Startup(api, {**arguments, 'fileOrStreamLocation': 'b'}, fusion)
+        assert pipeline.frameAnalyzer is None and videoAnalyzerCancelEvent.is_set()
+
+    @pytest.mark.order(5)
+    @patch('cv2.resize', MagicMock(return_value=np.array([[[255, 255, 255]]])))
     def test_Main(self):
         self.MockObjects()
         MainCalibrator.calibrated = False
@@ -162,7 +332,34 @@ class MyTestCase(unittest.TestCase):
             'keepID': True,
             'port': poort,
             'displayArgsGUI': False,
-            'noEncryption': True
+            'noEncryption': True,
+            'positionerQueueSize': 8,
+            'positionerQueuePolicy': 'dropOldest',
+            'fusionDistance': 0,
+            'fusionWindow': 1.0,
+            'fusionCameras': [],
+            'trackLength': 128,
+            'trackTimeout': 10.0,
+            'maxTracks': 256,
+            'smoothing': False,
+            'measurementNoise': 0.5,
+            'extrapolate': False,
+            'zoneFile': '',
+            'zoneCellSize': 0.25,
+            'counterInterval': 5.0,
+            'socialDistance': 0,
+            'socialDistanceInterval': 1.0,
+            'heatmap': False,
+            'heatmapCellSize': 0.5,
+            'heatmapHalfLife': 60.0,
+            'heatmapInterval': 10.0,
+            'rollupFile': "",
+            'rollupCellSize': 10.0,
+            'apiQueueBytes': 4194304,
+            'apiSlowClientPolicy': 'drop',
+            'apiKeyframeFrames': 30,
+            'apiKeyframeSeconds': 5.0,
+            'apiDeltaEpsilon': 0.05
         }
         CameraController.ValidateReaderArguments(arguments)
         ma.CommandInput = self.CommandInput2
@@ -171,6 +368,7 @@ class MyTestCase(unittest.TestCase):
         builtins.vars = Mock(return_value=arguments)
         testProgram = Program()
         asyncio.run(testProgram.Main())
+        assert len(testProgram.pipelines) == 1
 
     @staticmethod
     async def CommandInput2(api: APIController):